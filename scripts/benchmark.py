@@ -0,0 +1,415 @@
+"""
+Offline benchmark suite for the data, prompt-assembly, parsing and session hot paths.
+No network and no API key: call_llm is replaced by a fake that returns a canned, schema-shaped response (streamed
+in chunks when the caller asks for tokens), so run_workflow timings are pure orchestration overhead.
+
+Benchmarks (each timed over --repeat runs, after one warm-up):
+- data: load_* and summarize_for_llm / describe_for_llm on generated data at each --scales value (CSV, and
+  month-partitioned Parquet when pyarrow is installed)
+- workflow: run_workflow end to end with the fake LLM, markdown and structured output
+- parse: parse_scope, _extract_json_list, parse_markdown_table and json_to_table on large and adversarial outputs
+  (huge fenced arrays, truncated JSON, unbalanced brackets, ragged pipe tables)
+- sessions: save_session / load_session / list_sessions over --sessions stored sessions
+
+Results are written as JSON. With a baseline (default benchmarks/baseline.json), each benchmark's best time (the
+least noisy statistic; medians are recorded too) is compared with the baseline's and the run fails when it is
+slower by more than the threshold (per-benchmark
+overrides in the baseline's "thresholds"). Timings are machine-specific: refresh the baseline with
+--save-baseline on the machine that runs the comparison.
+
+Usage:
+    python scripts/benchmark.py
+    python scripts/benchmark.py --quick --output bench_results.json
+    python scripts/benchmark.py --only parse,sessions --threshold 0.3
+    python scripts/benchmark.py --save-baseline
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional
+from unittest.mock import patch
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
+
+BASELINE_DEFAULT = PROJECT_ROOT / "benchmarks" / "baseline.json"
+RESULTS_VERSION = 1
+GROUPS = ("data", "workflow", "parse", "sessions")
+SCALES_DEFAULT = (1.0, 10.0, 50.0)
+SCALES_QUICK = (1.0,)
+SESSIONS_DEFAULT = 5000
+SESSIONS_QUICK = 500
+REPEAT_DEFAULT = 5
+REPEAT_QUICK = 3
+# A benchmark regresses when its best time is this much (relative) slower than the baseline's...
+THRESHOLD_DEFAULT = 0.25
+# ...and at least this many seconds slower: sub-millisecond jitter is not a regression.
+MIN_DELTA_S = 0.0005
+AS_OF = datetime(2025, 6, 30)
+LLM_CHUNK_CHARS = 64
+CANNED_ROWS = 8
+
+# The agents' LLM calls all go through src.data_tools.run_agent.
+AGENT_LLM_MODULE = "src.data_tools"
+
+
+# --- Fake LLM ---
+
+def canned_response(response_schema: Optional[dict[str, Any]]) -> str:
+    """Schema-shaped JSON (structured mode) or a markdown table (default), CANNED_ROWS rows per table."""
+    if response_schema:
+        body = {}
+        for key, prop in response_schema.get("properties", {}).items():
+            fields = list(prop.get("items", {}).get("properties", {})) or ["text"]
+            body[key] = [{f: f"{f} {i}: evidence from data, segment and daypart" for f in fields} for i in range(CANNED_ROWS)]
+        return json.dumps(body, indent=2)
+    header = "| Name | Mechanic | Channel | Duration | Target | Evidence |"
+    rows = [f"| Offer {i} | Bundle {i} | App | 4 weeks | Discount hunters | Trend {i}; review {i} |" for i in range(CANNED_ROWS)]
+    return "### Results\n\n" + "\n".join([header, "|---|---|---|---|---|---|", *rows]) + "\n\nRationale follows."
+
+
+def fake_call_llm(
+    system_prompt: str,
+    user_content: str,
+    model: Optional[str] = None,
+    response_schema: Optional[dict[str, Any]] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+    cached_prefix: Optional[str] = None,
+    temperature: Optional[float] = None,
+    seed: Optional[int] = None,
+) -> str:
+    """Drop-in for src.llm.call_llm: canned output, streamed to on_token in LLM_CHUNK_CHARS pieces."""
+    text = canned_response(response_schema)
+    if on_token:
+        for i in range(0, len(text), LLM_CHUNK_CHARS):
+            on_token(text[i:i + LLM_CHUNK_CHARS])
+    return text
+
+
+def offline_llm(stack: ExitStack) -> None:
+    """Patch the agents' call_llm with fake_call_llm for the life of stack."""
+    stack.enter_context(patch(f"{AGENT_LLM_MODULE}.call_llm", fake_call_llm))
+
+
+# --- Timing ---
+
+def measure(fn: Callable[[], Any], repeat: int = REPEAT_DEFAULT, number: int = 1) -> dict[str, Any]:
+    """Per-call seconds of fn: median and min over repeat runs of number calls each (after one warm-up call)."""
+    fn()
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number)
+    return {"median_s": statistics.median(runs), "min_s": min(runs), "repeat": repeat, "number": number}
+
+
+def _scale_label(scale: float) -> str:
+    return f"x{scale:g}"
+
+
+# --- Benchmark groups (each returns {name: measurement}) ---
+
+def bench_data(work_dir: Path, scales: tuple[float, ...], repeat: int) -> dict[str, dict[str, Any]]:
+    from generate_data import generate_vectorized
+    from src.data_loaders import (
+        _parquet_supported,
+        describe_for_llm,
+        load_competitor_intel,
+        load_customer_feedback,
+        load_customer_transactions,
+        load_market_trends,
+        summarize_for_llm,
+    )
+
+    loaders = {
+        "market_trends": load_market_trends,
+        "customer_transactions": load_customer_transactions,
+        "customer_feedback": load_customer_feedback,
+        "competitor_intel": load_competitor_intel,
+    }
+    formats = ["csv"] + (["parquet"] if _parquet_supported() else [])
+    results = {}
+    for scale in scales:
+        for fmt in formats:
+            data_dir = work_dir / f"data_{_scale_label(scale)}_{fmt}"
+            data_dir.mkdir(parents=True, exist_ok=True)
+            generate_vectorized(data_dir, scale=scale, seed=0, workers=1, as_of=AS_OF, formats=(fmt,))
+            for table, load in loaders.items():
+                results[f"data.load.{table}.{fmt}.{_scale_label(scale)}"] = measure(lambda: load(data_dir), repeat)
+        # The text digests do not depend on the storage format.
+        df = load_customer_transactions(work_dir / f"data_{_scale_label(scale)}_csv")
+        results[f"data.summarize_for_llm.{_scale_label(scale)}"] = measure(lambda: summarize_for_llm(df), repeat)
+        results[f"data.describe_for_llm.{_scale_label(scale)}"] = measure(lambda: describe_for_llm(df), repeat)
+    return results
+
+
+def bench_workflow(work_dir: Path, repeat: int) -> dict[str, dict[str, Any]]:
+    from generate_data import generate_vectorized
+    from src.orchestrator import run_workflow
+
+    data_dir = work_dir / "data_workflow"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    generate_vectorized(data_dir, scale=1.0, seed=0, workers=1, as_of=AS_OF)
+    query = "Develop 3 breakfast offers for discount hunters next quarter"
+    results = {}
+    with ExitStack() as stack:
+        offline_llm(stack)
+        for structured in (False, True):
+            label = "structured" if structured else "markdown"
+            results[f"workflow.run_workflow.{label}"] = measure(
+                lambda: run_workflow(query, data_dir=data_dir, structured=structured), repeat
+            )
+            results[f"workflow.run_workflow.{label}.streamed"] = measure(
+                lambda: run_workflow(query, data_dir=data_dir, structured=structured, on_row=lambda *a: None), repeat
+            )
+    return results
+
+
+def adversarial_outputs(rows: int = 2000) -> dict[str, str]:
+    """Large LLM outputs, well-formed and not: the shapes the display parsers must survive quickly."""
+    rng = random.Random(0)
+    items = [
+        {
+            "name": f"Offer {i} [limited] {{promo}}",
+            "evidence": [f"signal {j}: \"quoted\" ] }} text" for j in range(3)],
+            "metrics": {"lift": rng.random(), "note": "a | b | c"},
+        }
+        for i in range(rows)
+    ]
+    array = json.dumps(items, indent=2)
+    wrapped = json.dumps({"offer_concepts": items})
+    header = "| " + " | ".join(f"Col {c}" for c in range(8)) + " |"
+    table_rows = [
+        "| " + " | ".join(f"r{i}c{c} \\| esc" for c in range(8 - i % 3)) + (" |" if i % 2 else "")
+        for i in range(rows)
+    ]
+    markdown = "\n".join(["Intro text.", "", header, "|" + "---|" * 8, *table_rows, "", "Outro."])
+    return {
+        "fenced_array": f"Here are the offers:\n\n```json\n{array}\n```\n\nLet me know.",
+        "wrapped_object": wrapped,
+        "truncated_json": array[: len(array) * 3 // 4],
+        "unbalanced_brackets": ("[{ " * rows) + "text ] } " * (rows // 2),
+        "prose_with_brackets": " ".join(f"See [note {i}] and {{ref {i}}}; ratio 3:{i}." for i in range(rows * 2)),
+        "markdown_table": markdown,
+        "many_small_tables": "\n\n".join(f"| a | b |\n|---|---|\n| {i} | {i + 1} |" for i in range(rows // 4)),
+    }
+
+
+def bench_parse(repeat: int) -> dict[str, dict[str, Any]]:
+    from src.orchestrator import parse_scope
+    from streamlit_app import _extract_json_list, json_to_table, parse_markdown_table
+
+    queries = [
+        "Breakfast offers for loyal customers next quarter",
+        "Develop 3 innovative offers to increase traffic for discount hunters in a 6 week campaign",
+        "late night value q3 " * 50,
+        "x" * 20000 + " 12 weeks",
+        " ".join(f"{i} weeks" if i % 7 == 0 else f"word{i}" for i in range(5000)),
+    ]
+    results = {"parse.parse_scope": measure(lambda: [parse_scope(q) for q in queries], repeat, number=20)}
+    for name, text in adversarial_outputs().items():
+        results[f"parse._extract_json_list.{name}"] = measure(lambda: _extract_json_list(text), repeat)
+        results[f"parse.parse_markdown_table.{name}"] = measure(lambda: parse_markdown_table(text), repeat)
+        results[f"parse.json_to_table.{name}"] = measure(lambda: json_to_table(text), repeat)
+    return results
+
+
+def synthetic_steps(i: int) -> list[dict[str, Any]]:
+    """Four steps shaped like a real run: shared prompts and data dumps, per-session query and output."""
+    data_dump = "\n\n".join(f"row {r}: theme {r % 12}, velocity {r % 100}, text " + "lorem ipsum " * 20 for r in range(60))
+    query = f"Offers for segment {i % 5} at breakfast, run {i}"
+    return [
+        {
+            "agent": agent,
+            "user_query": query,
+            "system_prompt": f"You are the {agent} agent. " + "Follow the rubric. " * 80,
+            "user_content": data_dump + f"\n\nUser request: {query}",
+            "input_summary": data_dump[:2000],
+            "input_data_sample": [{"row": r, "value": f"v{r}"} for r in range(5)],
+            "output": canned_response(None) + f"\n\nSession {i}.",
+        }
+        for agent in ("Market Trends & Deep Research", "Customer Insights", "Competitor Intelligence", "Offer Design")
+    ]
+
+
+def bench_sessions(work_dir: Path, n_sessions: int, repeat: int) -> dict[str, dict[str, Any]]:
+    import streamlit_app
+    from streamlit_app import list_sessions, load_session, save_session
+
+    sessions_dir = work_dir / "sessions"
+    # Timings depend on the store size, so it is part of every name.
+    n = f"n{n_sessions}"
+    segments = ["discount hunters", "loyal repeaters", "value-conscious customers", "app-first users"]
+    queries = [f"Develop offers for {segments[i % 4]} at {'breakfast' if i % 2 else 'lunch'} (run {i})" for i in range(n_sessions)]
+    results = {}
+    with patch("streamlit_app.SESSIONS_DIR", sessions_dir), patch.dict(streamlit_app._session_stores, clear=True):
+        start = time.perf_counter()
+        for i, q in enumerate(queries):
+            save_session(f"s{i:07d}", q, synthetic_steps(i))
+        per_save = (time.perf_counter() - start) / n_sessions
+        results[f"sessions.save_session.{n}"] = {"median_s": per_save, "min_s": per_save, "repeat": 1, "number": n_sessions}
+        ids = [f"s{i:07d}" for i in range(0, n_sessions, max(1, n_sessions // 50))]
+
+        def load_all(resolve: bool):
+            for session_id in ids:
+                sess = load_session(session_id)
+                for step in sess["steps"]:
+                    step.resolve() if resolve else step["output"]
+
+        results[f"sessions.load_session.output_only.{n}"] = measure(lambda: load_all(False), repeat)
+        results[f"sessions.load_session.resolved.{n}"] = measure(lambda: load_all(True), repeat)
+        results[f"sessions.list_sessions.first_page.{n}"] = measure(lambda: list_sessions(), repeat, number=20)
+        results[f"sessions.list_sessions.last_page.{n}"] = measure(lambda: list_sessions(offset=n_sessions - 20), repeat, number=20)
+        results[f"sessions.list_sessions.search.{n}"] = measure(lambda: list_sessions(search="discount breakfast"), repeat, number=20)
+        results[f"sessions.list_sessions.segment.{n}"] = measure(
+            lambda: list_sessions(segment="loyal_repeaters", daypart="lunch"), repeat, number=20
+        )
+    return results
+
+
+# --- Runner, results and comparison ---
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmarks(
+    groups: tuple[str, ...] = GROUPS,
+    scales: tuple[float, ...] = SCALES_DEFAULT,
+    n_sessions: int = SESSIONS_DEFAULT,
+    repeat: int = REPEAT_DEFAULT,
+    work_dir: Optional[Path] = None,
+) -> dict[str, Any]:
+    """Run the selected groups; returns {"version", "meta", "results": {name: measurement}}."""
+    results: dict[str, dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        work = Path(work_dir or tmp)
+        if "data" in groups:
+            results.update(bench_data(work, scales, repeat))
+        if "workflow" in groups:
+            results.update(bench_workflow(work, repeat))
+        if "parse" in groups:
+            results.update(bench_parse(repeat))
+        if "sessions" in groups:
+            results.update(bench_sessions(work, n_sessions, repeat))
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "groups": list(groups),
+            "scales": list(scales),
+            "sessions": n_sessions,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    current: dict[str, Any], baseline: dict[str, Any], threshold: float = THRESHOLD_DEFAULT
+) -> list[dict[str, Any]]:
+    """
+    One row per current benchmark (best times): name, baseline_s, current_s, ratio and status ("ok", "regression", "improved",
+    or "new" when the baseline has no entry). The baseline's "thresholds" map overrides threshold per benchmark.
+    """
+    base_results = baseline.get("results", {})
+    overrides = baseline.get("thresholds", {})
+    rows = []
+    for name, m in sorted(current.get("results", {}).items()):
+        cur = m["min_s"]
+        base = base_results.get(name, {}).get("min_s")
+        row = {"name": name, "baseline_s": base, "current_s": cur, "ratio": None, "status": "new"}
+        if base:
+            limit = overrides.get(name, threshold)
+            row["ratio"] = cur / base
+            if cur > base * (1 + limit) and cur - base > MIN_DELTA_S:
+                row["status"] = "regression"
+            elif cur < base / (1 + limit) and base - cur > MIN_DELTA_S:
+                row["status"] = "improved"
+            else:
+                row["status"] = "ok"
+        rows.append(row)
+    return rows
+
+
+def format_report(rows: list[dict[str, Any]]) -> str:
+    width = max([len(r["name"]) for r in rows] + [9])
+    lines = [f"{'benchmark':<{width}}  {'baseline':>10}  {'current':>10}  {'ratio':>6}  status"]
+    for r in rows:
+        base = f"{r['baseline_s'] * 1000:.2f}ms" if r["baseline_s"] else "-"
+        ratio = f"{r['ratio']:.2f}" if r["ratio"] is not None else "-"
+        lines.append(f"{r['name']:<{width}}  {base:>10}  {r['current_s'] * 1000:>8.2f}ms  {ratio:>6}  {r['status']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks with baseline comparison.")
+    parser.add_argument("--quick", action="store_true", help="Small scales, fewer sessions and repeats (smoke run)")
+    parser.add_argument("--only", type=str, default=",".join(GROUPS), help=f"Comma-separated groups ({', '.join(GROUPS)})")
+    parser.add_argument("--scales", type=str, default=None, help="Comma-separated data scales (default: 1,10,50; quick: 1)")
+    parser.add_argument("--sessions", type=int, default=None, help=f"Stored sessions (default: {SESSIONS_DEFAULT}; quick: {SESSIONS_QUICK})")
+    parser.add_argument("--repeat", type=int, default=None, help=f"Timed runs per benchmark (default: {REPEAT_DEFAULT})")
+    parser.add_argument("--output", type=str, default="bench_results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", type=str, default=str(BASELINE_DEFAULT), help="Baseline results JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD_DEFAULT, help="Allowed relative slowdown (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline instead of comparing")
+    args = parser.parse_args()
+
+    groups = tuple(g.strip() for g in args.only.split(",") if g.strip())
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"Unknown benchmark groups: {', '.join(sorted(unknown))}")
+    if args.scales:
+        scales = tuple(float(s) for s in args.scales.split(","))
+    else:
+        scales = SCALES_QUICK if args.quick else SCALES_DEFAULT
+    n_sessions = args.sessions or (SESSIONS_QUICK if args.quick else SESSIONS_DEFAULT)
+    repeat = args.repeat or (REPEAT_QUICK if args.quick else REPEAT_DEFAULT)
+
+    t0 = time.time()
+    current = run_benchmarks(groups, scales, n_sessions, repeat)
+    Path(args.output).write_text(json.dumps(current, indent=2), encoding="utf-8")
+    print(f"{len(current['results'])} benchmarks in {time.time() - t0:.1f}s -> {args.output}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        # Keep the hand-tuned per-benchmark thresholds of the existing baseline.
+        if baseline_path.exists():
+            current["thresholds"] = json.loads(baseline_path.read_text(encoding="utf-8")).get("thresholds", {})
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(current, indent=2), encoding="utf-8")
+        print(f"Baseline saved to {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; run with --save-baseline to create one.")
+        return
+    rows = compare(current, json.loads(baseline_path.read_text(encoding="utf-8")), args.threshold)
+    print(format_report(rows))
+    regressions = [r["name"] for r in rows if r["status"] == "regression"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond the threshold: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
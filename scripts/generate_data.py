@@ -5,15 +5,31 @@ Rewritten from 00_GCP_Setup_and_Data_Generation.ipynb for local use:
 no GCP, Colab, or BigQuery. Same schemas and record counts.
 Output: CSV files in data/ (or path given via --output-dir).
 
+--scale multiplies every row count. Scaled runs use a NumPy-vectorized generator (vectorized UUIDs, dates and
+choices; feedback text drawn from a pre-generated pool) split into shards of --shard-rows, generated in parallel
+processes. Each shard has its own seed derived from --seed, the table and the shard index, so the output for a
+given seed is identical whatever the number of workers. --profile realistic shapes the data like production
+(skewed customers, daypart peaks, weekly/holiday seasonality, theme bursts, correlated ratings and redemptions).
+
 Usage:
     python scripts/generate_data.py
     python scripts/generate_data.py --output-dir ./data
+    python scripts/generate_data.py --scale 25000 --seed 7 --workers 8 --output-dir ./data_50m
 """
 
 import argparse
+import json
+import os
 import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 from faker import Faker
 
@@ -23,6 +39,22 @@ MARKET_TRENDS_ROWS = 1500
 CUSTOMER_TRANSACTIONS_ROWS = 2000
 CUSTOMER_FEEDBACK_ROWS = 1000
 COMPETITOR_INTEL_ROWS = 1000
+# Vectorized generator
+SHARD_ROWS_DEFAULT = 1_000_000
+FEEDBACK_TEXT_POOL = 2000
+CUSTOMER_ID_MIN = 100
+CUSTOMERS_PER_SCALE = 401  # cust_100..cust_500 at scale 1
+# Partitioned output
+PARQUET_DIR = "parquet"
+DERIVED_DIR = "derived"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+DATE_COLUMNS = {
+    "market_trends": "publication_date",
+    "customer_transactions": "visit_date",
+    "customer_feedback": "feedback_date",
+    "competitor_intel": "observed_date",
+}
 
 TREND_TEMPLATES = {
     "Gamification": [
@@ -61,10 +93,10 @@ COMPETITORS = ["McDonald's", "Burger King", "Taco Bell", "Chick-fil-A"]
 MECHANICS = ["BOGO", "Discount %", "Meal Deal", "Gamified App Challenge", "Loyalty Points Multiplier"]
 
 
-def generate_market_trends(fake: Faker) -> pd.DataFrame:
+def generate_market_trends(fake: Faker, n: int = MARKET_TRENDS_ROWS) -> pd.DataFrame:
     records = []
     themes = list(TREND_TEMPLATES.keys())
-    for _ in range(MARKET_TRENDS_ROWS):
+    for _ in range(n):
         theme = random.choice(themes)
         text_template = random.choice(TREND_TEMPLATES[theme])
         records.append({
@@ -78,13 +110,13 @@ def generate_market_trends(fake: Faker) -> pd.DataFrame:
     return pd.DataFrame(records)
 
 
-def generate_customer_transactions(fake: Faker) -> pd.DataFrame:
+def generate_customer_transactions(fake: Faker, n: int = CUSTOMER_TRANSACTIONS_ROWS) -> pd.DataFrame:
     records = []
-    for _ in range(CUSTOMER_TRANSACTIONS_ROWS):
+    for _ in range(n):
         records.append({
             "transaction_id": fake.uuid4(),
             "customer_id": f"cust_{random.randint(100, 500)}",
-            "visit_date": fake.date_time_between(start_date="-6m", end_date="now"),
+            "visit_date": fake.date_time_between(start_date="-6M", end_date="now"),
             "total_spend": round(random.uniform(5.50, 25.00), 2),
             "redeemed_offer": random.choice(OFFERS),
             "channel": random.choice(["in-store", "drive-thru", "app"]),
@@ -92,22 +124,22 @@ def generate_customer_transactions(fake: Faker) -> pd.DataFrame:
     return pd.DataFrame(records)
 
 
-def generate_customer_feedback(fake: Faker) -> pd.DataFrame:
+def generate_customer_feedback(fake: Faker, n: int = CUSTOMER_FEEDBACK_ROWS) -> pd.DataFrame:
     records = []
-    for _ in range(CUSTOMER_FEEDBACK_ROWS):
+    for _ in range(n):
         records.append({
             "feedback_id": fake.uuid4(),
             "customer_id": f"cust_{random.randint(100, 500)}",
-            "feedback_date": fake.date_time_between(start_date="-6m", end_date="now"),
+            "feedback_date": fake.date_time_between(start_date="-6M", end_date="now"),
             "rating": random.randint(1, 5),
             "feedback_text": fake.paragraph(nb_sentences=3),
         })
     return pd.DataFrame(records)
 
 
-def generate_competitor_intel(fake: Faker) -> pd.DataFrame:
+def generate_competitor_intel(fake: Faker, n: int = COMPETITOR_INTEL_ROWS) -> pd.DataFrame:
     records = []
-    for _ in range(COMPETITOR_INTEL_ROWS):
+    for _ in range(n):
         records.append({
             "observation_id": fake.uuid4(),
             "brand": random.choice(COMPETITORS),
@@ -119,6 +151,422 @@ def generate_competitor_intel(fake: Faker) -> pd.DataFrame:
     return pd.DataFrame(records)
 
 
+# --- Vectorized generator (--scale / --engine numpy) ---
+
+TABLES = {
+    "market_trends": MARKET_TRENDS_ROWS,
+    "customer_transactions": CUSTOMER_TRANSACTIONS_ROWS,
+    "customer_feedback": CUSTOMER_FEEDBACK_ROWS,
+    "competitor_intel": COMPETITOR_INTEL_ROWS,
+}
+_HEX = np.frombuffer(b"0123456789abcdef", dtype="S1")
+_UUID_HEX_POS = [i for i in range(36) if i not in (8, 13, 18, 23)]
+
+
+def uuid4_strings(rng: np.random.Generator, n: int) -> np.ndarray:
+    """n random version-4 UUID strings, built without a Python loop."""
+    b = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    b[:, 6] = (b[:, 6] & 0x0F) | 0x40
+    b[:, 8] = (b[:, 8] & 0x3F) | 0x80
+    hexed = np.empty((n, 32), dtype="S1")
+    hexed[:, 0::2] = _HEX[b >> 4]
+    hexed[:, 1::2] = _HEX[b & 0x0F]
+    out = np.full((n, 36), b"-", dtype="S1")
+    out[:, _UUID_HEX_POS] = hexed
+    return out.view("S36").ravel().astype("U36")
+
+
+def random_datetimes(rng: np.random.Generator, n: int, start: datetime, end: datetime, unit: str = "s") -> np.ndarray:
+    lo = np.datetime64(start, unit).astype(np.int64)
+    hi = np.datetime64(end, unit).astype(np.int64)
+    return rng.integers(lo, hi, size=n).astype(f"datetime64[{unit}]")
+
+
+def _choice(rng: np.random.Generator, values: list, n: int) -> pd.Categorical:
+    """Uniform choice as a Categorical; None in values becomes a missing value."""
+    codes = rng.integers(0, len(values), size=n)
+    categories = [v for v in values if v is not None]
+    remap = np.array([categories.index(v) if v is not None else -1 for v in values])
+    return pd.Categorical.from_codes(remap[codes], categories=categories)
+
+
+def _customer_codes(codes: np.ndarray, scale: float) -> pd.Categorical:
+    count = max(1, int(round(CUSTOMERS_PER_SCALE * scale)))
+    categories = [f"cust_{i}" for i in range(CUSTOMER_ID_MIN, CUSTOMER_ID_MIN + count)]
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def _customer_ids(rng: np.random.Generator, n: int, scale: float) -> pd.Categorical:
+    return _customer_codes(rng.integers(0, max(1, int(round(CUSTOMERS_PER_SCALE * scale))), size=n), scale)
+
+
+def feedback_text_pool(seed: int, size: int = FEEDBACK_TEXT_POOL) -> list[str]:
+    """Faker paragraphs generated once per run and sampled by every shard."""
+    fake = Faker()
+    fake.seed_instance(seed)
+    return [fake.paragraph(nb_sentences=3) for _ in range(size)]
+
+
+def vectorized_table(
+    table: str,
+    n: int,
+    rng: np.random.Generator,
+    scale: float,
+    now: datetime,
+    text_pool: list[str],
+    profile: Optional["RealisticProfile"] = None,
+) -> pd.DataFrame:
+    """n rows of table with the same columns as the Faker generator (uniform, or shaped by profile)."""
+    if profile is not None:
+        return realistic_table(table, n, rng, profile, scale, text_pool)
+    six_months_ago = now - timedelta(days=182)
+    if table == "market_trends":
+        themes = list(TREND_TEMPLATES)
+        theme_codes = rng.integers(0, len(themes), size=n)
+        texts = [t for theme in themes for t in TREND_TEMPLATES[theme]]
+        offsets = np.cumsum([0] + [len(TREND_TEMPLATES[t]) for t in themes])
+        sizes = np.diff(offsets)
+        text_codes = offsets[theme_codes] + (rng.random(n) * sizes[theme_codes]).astype(np.int64)
+        return pd.DataFrame({
+            "source_id": uuid4_strings(rng, n),
+            "source_type": _choice(rng, ["Reddit", "FoodBlog", "X (Twitter)"], n),
+            "text_content": pd.Categorical.from_codes(text_codes, categories=texts),
+            "publication_date": random_datetimes(rng, n, datetime(now.year, 1, 1), now),
+            "trend_theme": pd.Categorical.from_codes(theme_codes, categories=themes),
+            "velocity_score": np.round(rng.uniform(1.0, 5.0, size=n), 2),
+        })
+    if table == "customer_transactions":
+        return pd.DataFrame({
+            "transaction_id": uuid4_strings(rng, n),
+            "customer_id": _customer_ids(rng, n, scale),
+            "visit_date": random_datetimes(rng, n, six_months_ago, now),
+            "total_spend": np.round(rng.uniform(5.50, 25.00, size=n), 2),
+            "redeemed_offer": _choice(rng, OFFERS, n),
+            "channel": _choice(rng, ["in-store", "drive-thru", "app"], n),
+        })
+    if table == "customer_feedback":
+        return pd.DataFrame({
+            "feedback_id": uuid4_strings(rng, n),
+            "customer_id": _customer_ids(rng, n, scale),
+            "feedback_date": random_datetimes(rng, n, six_months_ago, now),
+            "rating": rng.integers(1, 6, size=n),
+            "feedback_text": pd.Categorical.from_codes(rng.integers(0, len(text_pool), size=n), categories=text_pool),
+        })
+    if table == "competitor_intel":
+        return pd.DataFrame({
+            "observation_id": uuid4_strings(rng, n),
+            "brand": _choice(rng, COMPETITORS, n),
+            "offer_mechanic": _choice(rng, MECHANICS, n),
+            "duration_days": rng.integers(7, 31, size=n),
+            "channel": _choice(rng, ["app-exclusive", "all-channels", "in-store"], n),
+            "observed_date": random_datetimes(rng, n, datetime(now.year, 1, 1), now, unit="D"),
+        })
+    raise ValueError(f"Unknown table: {table}")
+
+
+# --- Generation profiles (--profile) ---
+# "uniform" draws every column uniformly (the original behaviour). "realistic" adds production-like structure:
+# Zipf customer frequency, daypart peaks, weekly and holiday seasonality, theme bursts, and per-customer
+# satisfaction driving both ratings and offer redemptions.
+
+PROFILES = ("uniform", "realistic")
+ZIPF_EXPONENT = 0.8
+# Relative visit volume by hour of day: breakfast, lunch (largest) and dinner peaks, small late-night bump.
+HOUR_WEIGHTS = np.array([
+    0.3, 0.2, 0.1, 0.1, 0.1, 0.3, 1.0, 2.2, 2.6, 1.6, 1.4, 3.2,
+    4.0, 3.0, 1.4, 1.2, 1.6, 2.8, 3.0, 2.2, 1.4, 1.1, 0.9, 0.6,
+])
+DOW_WEIGHTS = np.array([0.9, 0.85, 0.9, 0.95, 1.15, 1.3, 1.05])  # Monday..Sunday
+FIXED_HOLIDAYS = [(1, 1), (2, 14), (7, 4), (10, 31), (12, 24), (12, 25), (12, 31)]
+HOLIDAY_WINDOW_DAYS = 2
+HOLIDAY_BOOST = 0.8
+THEME_BURSTS = 2
+THEME_BURST_DAYS = 10
+THEME_BURST_MULTIPLIER = 6.0
+BRAND_WEIGHTS = {"McDonald's": 0.4, "Burger King": 0.25, "Taco Bell": 0.2, "Chick-fil-A": 0.15}
+_PROFILE_SEED_KEY = 7919
+
+
+def _holidays(year: int) -> list[np.datetime64]:
+    days = [np.datetime64(f"{year}-{m:02d}-{d:02d}") for m, d in FIXED_HOLIDAYS]
+    nov1 = np.datetime64(f"{year}-11-01")
+    first_thursday = nov1 + (-nov1.astype(np.int64)) % 7  # day 0 (1970-01-01) was a Thursday
+    days.append(first_thursday + 21)  # Thanksgiving
+    return days
+
+
+def day_weights(days: np.ndarray) -> np.ndarray:
+    """Weekly pattern times a boost within HOLIDAY_WINDOW_DAYS of a holiday; sums to 1."""
+    dow = (days.astype(np.int64) + 3) % 7  # 0 = Monday
+    weights = DOW_WEIGHTS[dow].astype(float)
+    years = set(days.astype("datetime64[Y]").astype(int) + 1970)
+    holidays = np.array([h for y in years for h in _holidays(y)], dtype="datetime64[D]")
+    if len(holidays):
+        distance = np.abs(days[:, None] - holidays[None, :]).astype(np.int64).min(axis=1)
+        weights *= 1.0 + HOLIDAY_BOOST * (distance <= HOLIDAY_WINDOW_DAYS)
+    return weights / weights.sum()
+
+
+class RealisticProfile:
+    """Run-wide structure for the realistic profile, derived from the run seed only (same in every shard)."""
+
+    def __init__(self, seed: int, scale: float, now: datetime):
+        rng = np.random.default_rng(np.random.SeedSequence([seed, _PROFILE_SEED_KEY]))
+        n_customers = max(1, int(round(CUSTOMERS_PER_SCALE * scale)))
+        rank = rng.permutation(n_customers)  # popularity rank per customer, so cust_100 is not always the top
+        weights = 1.0 / (rank + 1.0) ** ZIPF_EXPONENT
+        self.customer_p = weights / weights.sum()
+        self.customer_satisfaction = rng.standard_normal(n_customers)
+        end = np.datetime64(now.date(), "D")
+        self.half_year = np.arange(end - 182, end)
+        self.this_year = np.arange(np.datetime64(f"{now.year}-01-01"), max(end, np.datetime64(f"{now.year}-01-02")))
+        self.half_year_p = day_weights(self.half_year)
+        self.this_year_p = day_weights(self.this_year)
+        # Theme bursts: per theme, THEME_BURSTS windows where its share of posts multiplies.
+        themes = list(TREND_TEMPLATES)
+        burst = np.zeros((len(self.this_year), len(themes)), dtype=bool)
+        for t in range(len(themes)):
+            for start in rng.integers(0, max(1, len(self.this_year) - THEME_BURST_DAYS), size=THEME_BURSTS):
+                burst[start:start + THEME_BURST_DAYS, t] = True
+        self.theme_burst = burst
+
+    def customers(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        return rng.choice(len(self.customer_p), size=n, p=self.customer_p)
+
+    def datetimes(self, rng: np.random.Generator, n: int, days: np.ndarray, p: np.ndarray, hourly: bool = True):
+        """(day index, datetime64[s]) with seasonal day weights and, if hourly, daypart peaks."""
+        day_idx = rng.choice(len(days), size=n, p=p)
+        if hourly:
+            hours = rng.choice(24, size=n, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+            seconds = hours * 3600 + rng.integers(0, 3600, size=n)
+        else:
+            seconds = rng.integers(0, 86400, size=n)
+        return day_idx, days[day_idx].astype("datetime64[s]") + seconds.astype("timedelta64[s]")
+
+
+_profiles: dict[tuple, RealisticProfile] = {}
+
+
+def get_profile(name: str, seed: int, scale: float, now: datetime) -> Optional[RealisticProfile]:
+    """Profile structure, built once per process and run."""
+    if name == "uniform":
+        return None
+    if name != "realistic":
+        raise ValueError(f"Unknown profile: {name}")
+    key = (seed, scale, now)
+    if key not in _profiles:
+        _profiles.clear()
+        _profiles[key] = RealisticProfile(seed, scale, now)
+    return _profiles[key]
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def realistic_table(table: str, n: int, rng: np.random.Generator, profile: RealisticProfile, scale: float, text_pool: list[str]) -> pd.DataFrame:
+    """n rows of table under the realistic profile; same columns and value domains as the uniform one."""
+    if table == "market_trends":
+        themes = list(TREND_TEMPLATES)
+        day_idx, published = profile.datetimes(rng, n, profile.this_year, profile.this_year_p, hourly=False)
+        in_burst = profile.theme_burst[day_idx]
+        theme_w = np.where(in_burst, THEME_BURST_MULTIPLIER, 1.0)
+        cum = np.cumsum(theme_w / theme_w.sum(axis=1, keepdims=True), axis=1)
+        theme_codes = np.minimum((cum < rng.random(n)[:, None]).sum(axis=1), len(themes) - 1)
+        texts = [t for theme in themes for t in TREND_TEMPLATES[theme]]
+        offsets = np.cumsum([0] + [len(TREND_TEMPLATES[t]) for t in themes])
+        sizes = np.diff(offsets)
+        text_codes = offsets[theme_codes] + (rng.random(n) * sizes[theme_codes]).astype(np.int64)
+        bursting = in_burst[np.arange(n), theme_codes]
+        velocity = np.clip(rng.normal(2.2, 0.6, size=n) + 1.8 * bursting, 1.0, 5.0)
+        return pd.DataFrame({
+            "source_id": uuid4_strings(rng, n),
+            "source_type": _choice(rng, ["Reddit", "FoodBlog", "X (Twitter)"], n),
+            "text_content": pd.Categorical.from_codes(text_codes, categories=texts),
+            "publication_date": published,
+            "trend_theme": pd.Categorical.from_codes(theme_codes, categories=themes),
+            "velocity_score": np.round(velocity, 2),
+        })
+    if table == "customer_transactions":
+        customers = profile.customers(rng, n)
+        satisfaction = profile.customer_satisfaction[customers]
+        redeemed = rng.random(n) < _sigmoid(-0.4 + 0.9 * satisfaction)
+        offers = [o for o in OFFERS if o is not None]
+        offer_codes = np.where(redeemed, rng.integers(0, len(offers), size=n), -1)
+        # Redeemers skew to the app; spend is log-normal rather than uniform.
+        app_share = np.where(redeemed, 0.5, 0.2)
+        u = rng.random(n)
+        channel_codes = np.where(u < app_share, 2, np.where(u < app_share + (1 - app_share) * 0.55, 1, 0))
+        _, visited = profile.datetimes(rng, n, profile.half_year, profile.half_year_p)
+        return pd.DataFrame({
+            "transaction_id": uuid4_strings(rng, n),
+            "customer_id": _customer_codes(customers, scale),
+            "visit_date": visited,
+            "total_spend": np.round(np.clip(rng.lognormal(np.log(11.0), 0.35, size=n), 5.50, 25.00), 2),
+            "redeemed_offer": pd.Categorical.from_codes(offer_codes, categories=offers),
+            "channel": pd.Categorical.from_codes(channel_codes, categories=["in-store", "drive-thru", "app"]),
+        })
+    if table == "customer_feedback":
+        customers = profile.customers(rng, n)
+        satisfaction = profile.customer_satisfaction[customers]
+        rating = np.clip(np.rint(3.3 + 0.9 * satisfaction + rng.normal(0, 0.7, size=n)), 1, 5).astype(np.int64)
+        _, dated = profile.datetimes(rng, n, profile.half_year, profile.half_year_p)
+        return pd.DataFrame({
+            "feedback_id": uuid4_strings(rng, n),
+            "customer_id": _customer_codes(customers, scale),
+            "feedback_date": dated,
+            "rating": rating,
+            "feedback_text": pd.Categorical.from_codes(rng.integers(0, len(text_pool), size=n), categories=text_pool),
+        })
+    if table == "competitor_intel":
+        brands = list(BRAND_WEIGHTS)
+        brand_p = np.array(list(BRAND_WEIGHTS.values()))
+        day_idx = rng.choice(len(profile.this_year), size=n, p=profile.this_year_p)
+        return pd.DataFrame({
+            "observation_id": uuid4_strings(rng, n),
+            "brand": pd.Categorical.from_codes(rng.choice(len(brands), size=n, p=brand_p / brand_p.sum()), categories=brands),
+            "offer_mechanic": _choice(rng, MECHANICS, n),
+            "duration_days": rng.integers(7, 31, size=n),
+            "channel": _choice(rng, ["app-exclusive", "all-channels", "in-store"], n),
+            "observed_date": profile.this_year[day_idx],
+        })
+    raise ValueError(f"Unknown table: {table}")
+
+
+def shard_sizes(total: int, shard_rows: int) -> list[int]:
+    return [min(shard_rows, total - start) for start in range(0, total, shard_rows)] or [0]
+
+
+def shard_seed(seed: int, table: str, shard: int) -> np.random.SeedSequence:
+    """Per-shard seed: depends only on the run seed, the table and the shard index."""
+    return np.random.SeedSequence([seed, list(TABLES).index(table), shard])
+
+
+def _write_shard(args: tuple) -> tuple[Optional[str], dict[str, dict]]:
+    table, shard, n, seed, scale, now, text_pool, part_path, out_dir, formats, profile = args
+    rng = np.random.default_rng(shard_seed(seed, table, shard))
+    df = vectorized_table(table, n, rng, scale, now, text_pool, get_profile(profile, seed, scale, now))
+    partitions = write_partitions(df, table, out_dir, shard) if "parquet" in formats else {}
+    if "csv" not in formats:
+        return None, partitions
+    df.to_csv(part_path, index=False, header=False)
+    return part_path, partitions
+
+
+def generate_vectorized(
+    out_dir: Path,
+    scale: float = 1.0,
+    seed: int = 0,
+    workers: int = 1,
+    shard_rows: int = SHARD_ROWS_DEFAULT,
+    as_of: Optional[datetime] = None,
+    formats: tuple[str, ...] = ("csv",),
+    profile: str = "uniform",
+) -> dict[str, int]:
+    """
+    Write the four tables at scale x the default row counts, as CSV and/or month-partitioned Parquet, plus
+    manifest.json. Shards are generated in parallel and streamed to disk as they complete (CSV parts are appended in
+    shard order), so memory stays at about workers x shard_rows rows and output depends only on seed and as_of
+    (end of the date window; default: today 00:00), not on workers. Returns rows per table.
+    """
+    now = as_of or datetime.combine(datetime.now().date(), datetime.min.time())
+    text_pool = feedback_text_pool(seed)
+    counts = {}
+    tables_info = {}
+    with tempfile.TemporaryDirectory(dir=out_dir) as tmp, ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        for table, base_rows in TABLES.items():
+            total = int(round(base_rows * scale))
+            if "parquet" in formats:
+                shutil.rmtree(out_dir / PARQUET_DIR / table, ignore_errors=True)
+            tasks = [
+                (
+                    table, i, n, seed, scale, now, text_pool if table == "customer_feedback" else [],
+                    os.path.join(tmp, f"{table}.{i:05d}.csv"), out_dir, formats, profile,
+                )
+                for i, n in enumerate(shard_sizes(total, shard_rows))
+            ]
+            results = pool.map(_write_shard, tasks) if workers > 1 else map(_write_shard, tasks)
+            empty = vectorized_table(table, 0, np.random.default_rng(0), scale, now, text_pool)
+            partitions: dict[str, dict] = {}
+            out = open(out_dir / f"{table}.csv", "w", encoding="utf-8", newline="") if "csv" in formats else None
+            try:
+                if out:
+                    out.write(",".join(empty.columns) + "\n")
+                for part, shard_partitions in results:
+                    merge_partitions(partitions, shard_partitions)
+                    if out and part:
+                        with open(part, "r", encoding="utf-8", newline="") as f:
+                            shutil.copyfileobj(f, out, 1 << 20)
+                        os.remove(part)
+            finally:
+                if out:
+                    out.close()
+            counts[table] = total
+            tables_info[table] = table_manifest(table, empty, total, formats, partitions)
+    write_manifest(out_dir, tables_info, engine="numpy", profile=profile, seed=seed, scale=scale, as_of=now.isoformat())
+    return counts
+
+
+# --- Partitioned Parquet output and manifest ---
+
+def write_partitions(df: pd.DataFrame, table: str, out_dir: Path, part: int) -> dict[str, dict]:
+    """
+    Write df as Parquet under parquet/<table>/month=YYYY-MM/part-<part>.parquet, one file per month present.
+    Returns {month: {"rows": n, "files": [relative path]}}.
+    """
+    dates = pd.to_datetime(df[DATE_COLUMNS[table]])
+    months = dates.dt.strftime("%Y-%m")
+    # Plain values rather than per-shard Categoricals, so every file of a table has the same schema.
+    df = df.assign(**{c: df[c].astype(object) for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+    df[DATE_COLUMNS[table]] = dates
+    partitions = {}
+    for month, group in df.groupby(months, sort=True):
+        rel = f"{PARQUET_DIR}/{table}/month={month}/part-{part:05d}.parquet"
+        path = out_dir / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        group.to_parquet(path, index=False)
+        partitions[month] = {"rows": len(group), "files": [rel]}
+    return partitions
+
+
+def merge_partitions(into: dict[str, dict], new: dict[str, dict]) -> None:
+    for month, info in new.items():
+        entry = into.setdefault(month, {"rows": 0, "files": []})
+        entry["rows"] += info["rows"]
+        entry["files"].extend(info["files"])
+
+
+def table_manifest(table: str, empty: pd.DataFrame, rows: int, formats: tuple[str, ...], partitions: dict) -> dict:
+    schema = {
+        c: "datetime" if c == DATE_COLUMNS[table]
+        else "string" if isinstance(t, pd.CategoricalDtype) or pd.api.types.is_string_dtype(t)
+        else str(t)
+        for c, t in empty.dtypes.items()
+    }
+    info = {"rows": rows, "schema": schema, "date_column": DATE_COLUMNS[table]}
+    if "csv" in formats:
+        info["csv"] = f"{table}.csv"
+    if "parquet" in formats:
+        info["partitions"] = dict(sorted(partitions.items()))
+    return info
+
+
+def write_manifest(out_dir: Path, tables: dict[str, dict], **run: object) -> None:
+    # Derived stats and the query database (src/ingest.py, src/data_tools.py) describe the previous data.
+    shutil.rmtree(out_dir / DERIVED_DIR, ignore_errors=True)
+    manifest = {"version": MANIFEST_VERSION, "generated_at": datetime.now().isoformat(timespec="seconds"), **run, "tables": tables}
+    tmp = out_dir / f".{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, out_dir / MANIFEST_NAME)
+
+
+def require_parquet_support() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate Wendy's Hackathon synthetic data (local, no GCP).")
     parser.add_argument(
@@ -127,28 +575,77 @@ def main():
         default=DATA_DIR_DEFAULT,
         help=f"Directory to write CSV files (default: {DATA_DIR_DEFAULT})",
     )
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every table's row count (default: 1)")
+    parser.add_argument(
+        "--engine",
+        choices=["faker", "numpy"],
+        default=None,
+        help="faker: row-by-row Faker records; numpy: vectorized, sharded, seeded (default: numpy when --scale != 1)",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible output")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes for the numpy engine")
+    parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS_DEFAULT, help="Rows per shard for the numpy engine")
+    parser.add_argument("--as-of", type=str, default=None, help="End of the date window, YYYY-MM-DD (numpy engine; default: today)")
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet", "both"],
+        default="csv",
+        help="csv: one file per table; parquet: partitioned by month (needs pyarrow); both (default: csv)",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILES,
+        default="uniform",
+        help="uniform: every column uniform; realistic: skew, dayparts, seasonality, bursts (numpy engine)",
+    )
     args = parser.parse_args()
     out_dir = Path(args.output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
+    engine = args.engine or ("faker" if args.scale == 1 and args.profile == "uniform" else "numpy")
+    if engine == "faker" and args.profile != "uniform":
+        parser.error("--profile realistic needs the numpy engine")
+    formats = ("csv", "parquet") if args.format == "both" else (args.format,)
+    if "parquet" in formats:
+        require_parquet_support()
 
+    if engine == "numpy":
+        seed = args.seed if args.seed is not None else random.SystemRandom().randrange(2**31)
+        print(f"Generating synthetic data (numpy engine, {args.profile} profile, scale={args.scale}, seed={seed}, workers={args.workers})...")
+        start = time.perf_counter()
+        as_of = datetime.strptime(args.as_of, "%Y-%m-%d") if args.as_of else None
+        counts = generate_vectorized(out_dir, args.scale, seed, args.workers, args.shard_rows, as_of, formats, args.profile)
+        for table, n in counts.items():
+            target = f"{table}.csv" if "csv" in formats else f"{PARQUET_DIR}/{table}/"
+            print(f"  {n} records -> {out_dir / target}")
+        print(f"Data generation complete in {time.perf_counter() - start:.1f}s.")
+        return
+
+    rows = {table: int(round(n * args.scale)) for table, n in TABLES.items()}
     fake = Faker()
+    if args.seed is not None:
+        random.seed(args.seed)
+        fake.seed_instance(args.seed)
     print("Generating synthetic data for all agents...")
 
-    df_market_trends = generate_market_trends(fake)
-    df_market_trends.to_csv(out_dir / "market_trends.csv", index=False)
-    print(f"  {len(df_market_trends)} records -> {out_dir / 'market_trends.csv'}")
-
-    df_customer_transactions = generate_customer_transactions(fake)
-    df_customer_transactions.to_csv(out_dir / "customer_transactions.csv", index=False)
-    print(f"  {len(df_customer_transactions)} records -> {out_dir / 'customer_transactions.csv'}")
-
-    df_customer_feedback = generate_customer_feedback(fake)
-    df_customer_feedback.to_csv(out_dir / "customer_feedback.csv", index=False)
-    print(f"  {len(df_customer_feedback)} records -> {out_dir / 'customer_feedback.csv'}")
-
-    df_competitor_intel = generate_competitor_intel(fake)
-    df_competitor_intel.to_csv(out_dir / "competitor_intel.csv", index=False)
-    print(f"  {len(df_competitor_intel)} records -> {out_dir / 'competitor_intel.csv'}")
+    generators = {
+        "market_trends": generate_market_trends,
+        "customer_transactions": generate_customer_transactions,
+        "customer_feedback": generate_customer_feedback,
+        "competitor_intel": generate_competitor_intel,
+    }
+    tables_info = {}
+    for table, generate in generators.items():
+        df = generate(fake, rows[table])
+        partitions = {}
+        if "csv" in formats:
+            df.to_csv(out_dir / f"{table}.csv", index=False)
+            print(f"  {len(df)} records -> {out_dir / f'{table}.csv'}")
+        if "parquet" in formats:
+            shutil.rmtree(out_dir / PARQUET_DIR / table, ignore_errors=True)
+            partitions = write_partitions(df, table, out_dir, 0)
+            print(f"  {len(df)} records -> {out_dir / PARQUET_DIR / table} ({len(partitions)} monthly partitions)")
+        tables_info[table] = table_manifest(table, df.head(0), len(df), formats, partitions)
+    write_manifest(out_dir, tables_info, engine="faker", profile="uniform", seed=args.seed, scale=args.scale)
 
     print("Data generation complete.")
 
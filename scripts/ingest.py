@@ -0,0 +1,51 @@
+"""
+Append a batch of new rows to one table of the data directory (see src/ingest.py).
+The batch is a CSV (or Parquet) file with the table's columns; the data version is bumped and the derived
+aggregates, sample and term index are updated from the batch alone.
+
+Usage:
+    python scripts/ingest.py customer_transactions new_transactions.csv
+    python scripts/ingest.py customer_feedback feedback_2026-10-19.parquet --data-dir ./data
+    python scripts/ingest.py --rebuild      # recompute derived/ from the full tables
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.data_loaders import get_data_dir
+from src.ingest import TABLES, append_batch, rebuild_derived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append a batch of rows to a table (append-only ingestion).")
+    parser.add_argument("table", nargs="?", choices=TABLES, help="Table to append to")
+    parser.add_argument("batch", nargs="?", type=str, help="CSV or Parquet file with the new rows")
+    parser.add_argument("--data-dir", type=str, default=None, help="Data directory (default: WENDYS_DATA_DIR or data/)")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the derived artifacts of every table")
+    args = parser.parse_args()
+    data_dir = Path(args.data_dir) if args.data_dir else get_data_dir()
+
+    if args.rebuild:
+        for table, rows in rebuild_derived(data_dir).items():
+            print(f"  {table}: {rows} rows")
+        return
+    if not args.table or not args.batch:
+        parser.error("table and batch are required (or --rebuild)")
+
+    import pandas as pd
+
+    path = Path(args.batch)
+    df = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path)
+    try:
+        result = append_batch(args.table, df, data_dir)
+    except (ValueError, FileNotFoundError, RuntimeError) as e:
+        raise SystemExit(f"Ingestion failed: {e}")
+    print(f"Appended {result['rows']} rows to {result['table']} ({result['total_rows']} total); data version {result['data_version']}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Concurrent load test: N simulated users drive run_workflow (or the Streamlit app, headless) against the stub LLM
+gateway (src/stub_llm.py), and the run reports throughput, p50/p95/p99 latency and error rates, for sizing Cloud
+Run concurrency (WORKFLOW_WORKERS, LLM_RATE_LIMIT_PER_MIN) without gateway cost or provider rate limits.
+
+Modes:
+- workflow: each user calls run_workflow in a loop, in this process (one app instance's worker threads).
+- app: each user opens the app with streamlit.testing (a fresh browser session per run), submits a request and
+  polls until the run completes, so admission control, the shared worker pool and session saving are included.
+  Sessions and caches go to a scratch directory.
+
+The stub starts in-process unless --base-url points at a running one (scripts/stub_llm_server.py). Data: --data-dir,
+or a fresh scale-1 dataset in a temp directory. Note that the process-wide LLM rate limit (default 60 calls/min)
+applies; pass --llm-rate-limit 0 to measure without it.
+
+Usage:
+    python scripts/load_test.py --users 8 --runs-per-user 3
+    python scripts/load_test.py --mode app --users 4 --duration-s 120 --latency-ms 1500 --rate-limit-rate 0.05
+    python scripts/load_test.py --base-url http://127.0.0.1:8766/v1 --users 16 --llm-rate-limit 0
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
+
+from stub_llm_server import add_stub_arguments, stub_config
+
+APP_PATH = PROJECT_ROOT / "streamlit_app.py"
+QUERIES = [
+    "Develop 3 innovative offers to increase traffic for discount hunters",
+    "Breakfast offers for loyal repeaters next quarter",
+    "Late-night value offers for app-first users in a 6 week campaign",
+    "Lunch bundles for value-conscious customers in Q3",
+    "Drive engagement with convenience-driven customers all day",
+]
+AS_OF = datetime(2025, 6, 30)
+
+
+def query_for(user: int, run: int) -> str:
+    """Distinct per user and run, so neither the semantic cache nor the stage cache answers for the LLM."""
+    return f"{QUERIES[(user + run) % len(QUERIES)]} (load test user {user} run {run})"
+
+
+def percentile(values: list[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile (p in 0-100); None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(results: list[tuple[float, Optional[str]]], elapsed_s: float) -> dict[str, Any]:
+    """results: (latency_s, error or None) per run."""
+    latencies = [lat for lat, err in results if err is None]
+    errors = Counter(err for _, err in results if err is not None)
+    runs = len(results)
+    return {
+        "runs": runs,
+        "ok": len(latencies),
+        "failed": runs - len(latencies),
+        "error_rate": (runs - len(latencies)) / runs if runs else 0.0,
+        "elapsed_s": elapsed_s,
+        "throughput_per_min": len(latencies) / elapsed_s * 60 if elapsed_s > 0 else 0.0,
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+            "mean": statistics.fmean(latencies) if latencies else None,
+        },
+        "errors": dict(errors.most_common(10)),
+    }
+
+
+def run_users(
+    users: int,
+    one_run: Callable[[int, int], None],
+    runs_per_user: Optional[int] = None,
+    duration_s: Optional[float] = None,
+    think_time_s: float = 0.0,
+) -> tuple[list[tuple[float, Optional[str]]], float]:
+    """
+    users threads each call one_run(user, run) until runs_per_user runs or duration_s seconds (whichever is set;
+    the last run started before the deadline finishes). Returns ((latency_s, error) per run, elapsed seconds).
+    """
+    results: list[tuple[float, Optional[str]]] = []
+    lock = threading.Lock()
+    start = time.monotonic()
+    deadline = start + duration_s if duration_s else None
+
+    def user_loop(user: int) -> None:
+        run = 0
+        while (runs_per_user is None or run < runs_per_user) and (deadline is None or time.monotonic() < deadline):
+            t0 = time.monotonic()
+            try:
+                one_run(user, run)
+                outcome = (time.monotonic() - t0, None)
+            except Exception as e:
+                outcome = (time.monotonic() - t0, f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"[:200])
+            with lock:
+                results.append(outcome)
+            run += 1
+            if think_time_s:
+                time.sleep(think_time_s)
+
+    threads = [threading.Thread(target=user_loop, args=(u,), name=f"user-{u}") for u in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.monotonic() - start
+
+
+def workflow_runner(data_dir: Path, structured: bool, stream: bool) -> Callable[[int, int], None]:
+    from src.orchestrator import run_workflow
+
+    def one_run(user: int, run: int) -> None:
+        run_workflow(
+            query_for(user, run), data_dir=data_dir, structured=structured,
+            on_row=(lambda *a: None) if stream else None,
+        )
+    return one_run
+
+
+def app_runner(timeout_s: float, poll_s: float) -> Callable[[int, int], None]:
+    from streamlit.testing.v1 import AppTest
+
+    # Script runs (page renders) take turns: the GIL serializes them anyway, and compiling the script from several
+    # threads at once trips CPython's parser. The workflows themselves run concurrently on the app's worker pool.
+    render_lock = threading.Lock()
+
+    def render(at: "AppTest") -> "AppTest":
+        with render_lock:
+            return at.run()
+
+    def one_run(user: int, run: int) -> None:
+        at = render(AppTest.from_file(str(APP_PATH), default_timeout=timeout_s))
+        at.text_area(key="query_input").input(query_for(user, run))
+        render(at)
+        run_button = next((b for b in at.button if b.label == "Run workflow"), None)
+        if run_button is None:
+            raise RuntimeError(f"no Run workflow button: {at.exception[0].message if at.exception else 'page did not render'}")
+        render(run_button.click())
+        deadline = time.monotonic() + timeout_s
+        while True:
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+            if at.error:
+                raise RuntimeError(at.error[0].value)
+            if any("Workflow complete" in s.value for s in at.success):
+                return
+            if any("near-identical request" in i.value for i in at.info):
+                raise RuntimeError("answered from the semantic cache")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"run not complete after {timeout_s:g}s")
+            time.sleep(poll_s)
+            render(at)
+    return one_run
+
+
+def stub_stats(base_url: str) -> Optional[dict[str, int]]:
+    try:
+        with urllib.request.urlopen(f"{base_url.rstrip('/')}/stats", timeout=10) as resp:
+            return json.loads(resp.read())
+    except OSError:
+        return None
+
+
+def format_report(summary: dict[str, Any]) -> str:
+    lat = summary["latency_s"]
+
+    def fmt(v: Optional[float]) -> str:
+        return f"{v:.2f}s" if v is not None else "-"
+
+    lines = [
+        f"runs: {summary['runs']} ({summary['ok']} ok, {summary['failed']} failed, "
+        f"error rate {summary['error_rate']:.1%}) in {summary['elapsed_s']:.1f}s",
+        f"throughput: {summary['throughput_per_min']:.1f} runs/min",
+        f"latency: p50 {fmt(lat['p50'])}  p95 {fmt(lat['p95'])}  p99 {fmt(lat['p99'])}  max {fmt(lat['max'])}",
+    ]
+    for err, n in summary["errors"].items():
+        lines.append(f"  {n} x {err}")
+    llm = summary.get("llm")
+    if llm:
+        lines.append(
+            f"LLM calls: {llm['requests']} requests, {llm['rate_limited']} answered 429, {llm['errors']} answered 500, "
+            f"{llm['completed']} completed"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent users against the stub LLM gateway.")
+    parser.add_argument("--mode", choices=["workflow", "app"], default="workflow")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent simulated users (default: 4)")
+    parser.add_argument("--runs-per-user", type=int, default=None, help="Runs per user (default: 3 unless --duration-s)")
+    parser.add_argument("--duration-s", type=float, default=None, help="Keep starting runs for this long instead")
+    parser.add_argument("--think-time-s", type=float, default=0.0, help="Pause between a user's runs")
+    parser.add_argument("--base-url", type=str, default=None, help="Running stub (…/v1); default: start one in-process")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host for the in-process stub")
+    parser.add_argument("--data-dir", type=str, default=None, help="Dataset to use (default: fresh scale-1 data)")
+    parser.add_argument("--structured", action="store_true", help="Ask agents for JSON (STRUCTURED_OUTPUT)")
+    parser.add_argument("--no-stream", action="store_true", help="workflow mode: no per-row streaming callbacks")
+    parser.add_argument("--llm-rate-limit", type=float, default=None, help="LLM calls/min for the process (0 = unlimited)")
+    parser.add_argument("--workers", type=int, default=None, help="app mode: WORKFLOW_WORKERS (concurrent runs)")
+    parser.add_argument("--timeout-s", type=float, default=300, help="app mode: give up on a run after this long")
+    parser.add_argument("--poll-s", type=float, default=0.5, help="app mode: seconds between reruns while polling")
+    parser.add_argument("--output", type=str, default="load_test_results.json", help="Where to write the results JSON")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    runs_per_user = args.runs_per_user or (None if args.duration_s else 3)
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        from src.stub_llm import serve_stub_llm
+        server = serve_stub_llm(stub_config(args), args.host, 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://{args.host}:{server.server_address[1]}/v1"
+
+    # Set before anything reads them; values already in the environment win over .env.
+    os.environ["GEMINI_BASE_URL"] = base_url
+    os.environ["GEMINI_API_KEY"] = "stub"
+    os.environ["STRUCTURED_OUTPUT"] = "1" if args.structured else "0"
+    if args.llm_rate_limit is not None:
+        os.environ["LLM_RATE_LIMIT_PER_MIN"] = f"{args.llm_rate_limit:g}"
+    if args.workers is not None:
+        os.environ["WORKFLOW_WORKERS"] = str(args.workers)
+
+    with tempfile.TemporaryDirectory(prefix="load_test_") as tmp:
+        scratch = Path(tmp)
+        if args.data_dir:
+            data_dir = Path(args.data_dir)
+        else:
+            from generate_data import generate_vectorized
+            data_dir = scratch / "data"
+            data_dir.mkdir()
+            generate_vectorized(data_dir, scale=1.0, seed=0, workers=1, as_of=AS_OF)
+        if args.mode == "app":
+            os.environ["WENDYS_DATA_DIR"] = str(data_dir)
+            os.environ["WENDYS_SESSIONS_DIR"] = str(scratch / "sessions")
+            os.environ["WENDYS_CACHE_DIR"] = str(scratch / "cache")
+            os.environ.pop("STORAGE_URL", None)
+            # Load-test queries differ only in their suffix: without this, most runs would be semantic-cache hits.
+            os.environ["SEMANTIC_CACHE_THRESHOLD"] = "2"
+            one_run = app_runner(args.timeout_s, args.poll_s)
+        else:
+            one_run = workflow_runner(data_dir, args.structured, not args.no_stream)
+
+        from src.rate_limit import get_rate_limiter
+        print(
+            f"{args.mode}: {args.users} users, {f'{runs_per_user} runs each' if runs_per_user else f'{args.duration_s:g}s'}, "
+            f"LLM at {base_url}, rate limit {get_rate_limiter().per_minute:g}/min"
+        )
+        results, elapsed = run_users(args.users, one_run, runs_per_user, args.duration_s, args.think_time_s)
+
+    summary = summarize(results, elapsed)
+    summary["llm"] = server.stats.snapshot() if server is not None else stub_stats(base_url)
+    summary["config"] = {k: v for k, v in vars(args).items() if k != "output"}
+    if server is not None:
+        server.shutdown()
+    print(format_report(summary))
+    Path(args.output).write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    print(f"Results -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Local stand-in for the shared session/cache store (see src/storage.py).
+Serves a directory over the HttpStorage protocol so several app instances on one machine (or tests) can share
+sessions and stage-cache entries the way Cloud Run instances share the real store.
+
+Usage:
+    python scripts/storage_server.py --root ./shared_store --port 8765
+    STORAGE_URL=http://127.0.0.1:8765 streamlit run streamlit_app.py
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.storage import LocalStorage, serve_storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a directory as the shared storage backend.")
+    parser.add_argument("--root", type=str, default="shared_store", help="Directory holding the stored keys")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server = serve_storage(LocalStorage(Path(args.root)), args.host, args.port)
+    print(f"Serving {Path(args.root).resolve()} on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Local stand-in for the OpenAI-compatible LLM gateway (see src/stub_llm.py): canned agent-shaped replies with
+configurable latency, streaming speed, and error and 429 rates. No API cost, no provider rate limits.
+
+Usage:
+    python scripts/stub_llm_server.py --port 8766 --latency-ms 800 --tokens-per-s 80 --rate-limit-rate 0.05
+    GEMINI_BASE_URL=http://127.0.0.1:8766/v1 GEMINI_API_KEY=stub streamlit run streamlit_app.py
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.stub_llm import StubConfig, serve_stub_llm
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=800, help="Median time to first token (default: 800)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal spread of latency; 0 = fixed (default: 0.5)")
+    parser.add_argument("--tokens-per-s", type=float, default=80, help="Streaming speed; 0 = instant (default: 80)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with HTTP 429")
+    parser.add_argument("--retry-after-s", type=float, default=1.0, help="Retry-After sent with 429s (default: 1)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible latency and error draws")
+
+
+def stub_config(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        latency_s=args.latency_ms / 1000.0,
+        latency_sigma=args.latency_sigma,
+        tokens_per_s=args.tokens_per_s,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_s=args.retry_after_s,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a stub OpenAI-compatible chat-completions endpoint.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    server = serve_stub_llm(stub_config(args), args.host, args.port)
+    print(f"Stub LLM gateway on http://{args.host}:{server.server_address[1]}/v1 (stats: /v1/stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
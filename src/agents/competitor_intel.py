@@ -4,7 +4,8 @@ Purpose: Track competitor promotions; surface whitespace opportunities.
 Input: Competitor intel data. Output: competitive_landscape[] + whitespace_opportunities[].
 """
 
-from src.llm import call_llm
+from src.data_tools import run_agent
+from src.structured import JSON_INSTRUCTION, COMPETITOR_INTEL_SCHEMA
 
 SYSTEM_PROMPT = """You are the Competitor Intelligence Agent for Wendy's offer innovation.
 
@@ -28,13 +29,30 @@ Scope: If the user specifies a daypart (e.g. breakfast), time horizon (e.g. Q1,
 """
 
 
-def run(competitor_intel_text: str, user_query: str):
-    """Run Competitor Intelligence agent. Returns dict with output, system_prompt, user_content."""
-    user_content = f"""User request: {user_query}
+def run(competitor_intel_text: str, user_query: str, structured: bool = False, on_row=None, model=None, tools=None):
+    """
+    Run Competitor Intelligence agent. Returns dict with output, tables, system_prompt, user_content.
+    structured=True asks for JSON matching COMPETITOR_INTEL_SCHEMA; on_row(table, row) is called as rows stream in.
+    model overrides the default model (see src/routing.py).
+    tools: optional src.data_tools.DataTools the model may query for exact figures over every row (function
+    calling); the result then has "tool_calls" (trace of the calls).
+    """
+    # Static data context first so it can be served from the provider's context cache across queries.
+    context = f"""Competitor intelligence data (sample/summary):
+{competitor_intel_text}"""
+    user_content = f"""{context}
 
-Competitor intelligence data (sample/summary):
-{competitor_intel_text}
+User request: {user_query}
 
 Analyze the above and produce competitive_landscape and whitespace_opportunities."""
-    output = call_llm(SYSTEM_PROMPT, user_content)
-    return {"output": output, "system_prompt": SYSTEM_PROMPT, "user_content": user_content}
+    if structured:
+        user_content += "\n\n" + JSON_INSTRUCTION
+    return run_agent(
+        SYSTEM_PROMPT,
+        user_content,
+        response_schema=COMPETITOR_INTEL_SCHEMA if structured else None,
+        on_row=on_row,
+        model=model,
+        cached_prefix=context,
+        tools=tools,
+    )
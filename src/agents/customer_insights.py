@@ -4,7 +4,8 @@ Purpose: Understand what customers value in offers (behavioral + sentiment).
 Input: Customer transactions + feedback. Output: customer_insights[] (segment_id, description, preferred mechanics, messaging, metrics).
 """
 
-from src.llm import call_llm
+from src.data_tools import run_agent
+from src.structured import JSON_INSTRUCTION, CUSTOMER_INSIGHTS_SCHEMA
 
 SYSTEM_PROMPT = """You are the Customer Insights Agent for Wendy's offer innovation.
 
@@ -33,16 +34,33 @@ Scope: If the user specifies a daypart (e.g. breakfast), time horizon (e.g. Q1,
 """
 
 
-def run(transactions_text: str, feedback_text: str, user_query: str):
-    """Run Customer Insights agent. Returns dict with output, system_prompt, user_content."""
-    user_content = f"""User request: {user_query}
-
-Customer transactions (sample/summary):
+def run(transactions_text: str, feedback_text: str, user_query: str, structured: bool = False, on_row=None, model=None, tools=None):
+    """
+    Run Customer Insights agent. Returns dict with output, tables, system_prompt, user_content.
+    structured=True asks for JSON matching CUSTOMER_INSIGHTS_SCHEMA; on_row(table, row) is called as rows stream in.
+    model overrides the default model (see src/routing.py).
+    tools: optional src.data_tools.DataTools the model may query for exact figures over every row (function
+    calling); the result then has "tool_calls" (trace of the calls).
+    """
+    # Static data context first so it can be served from the provider's context cache across queries.
+    context = f"""Customer transactions (sample/summary):
 {transactions_text}
 
 Customer feedback (sample/summary):
-{feedback_text}
+{feedback_text}"""
+    user_content = f"""{context}
+
+User request: {user_query}
 
 Analyze the above and produce your customer_insights segment profiles."""
-    output = call_llm(SYSTEM_PROMPT, user_content)
-    return {"output": output, "system_prompt": SYSTEM_PROMPT, "user_content": user_content}
+    if structured:
+        user_content += "\n\n" + JSON_INSTRUCTION
+    return run_agent(
+        SYSTEM_PROMPT,
+        user_content,
+        response_schema=CUSTOMER_INSIGHTS_SCHEMA if structured else None,
+        on_row=on_row,
+        model=model,
+        cached_prefix=context,
+        tools=tools,
+    )
@@ -4,7 +4,8 @@ Purpose: Scan external channels for emerging behaviors/sentiments around fast-fo
 Input: Market trends data (CSV). Output: trend_briefs[] (title, summary, evidence, signal strength, directions).
 """
 
-from src.llm import call_llm
+from src.data_tools import run_agent
+from src.structured import JSON_INSTRUCTION, MARKET_RESEARCH_SCHEMA
 
 SYSTEM_PROMPT = """You are the Market Trends & Deep Research Agent for Wendy's offer innovation.
 
@@ -33,13 +34,30 @@ Scope: If the user specifies a daypart (e.g. breakfast, lunch, late-night), time
 """
 
 
-def run(market_trends_text: str, user_query: str):
-    """Run Market Research agent. Returns dict with output, system_prompt, user_content."""
-    user_content = f"""User request: {user_query}
+def run(market_trends_text: str, user_query: str, structured: bool = False, on_row=None, model=None, tools=None):
+    """
+    Run Market Research agent. Returns dict with output, tables, system_prompt, user_content.
+    structured=True asks for JSON matching MARKET_RESEARCH_SCHEMA; on_row(table, row) is called as rows stream in.
+    model overrides the default model (see src/routing.py).
+    tools: optional src.data_tools.DataTools the model may query for exact figures over every row (function
+    calling); the result then has "tool_calls" (trace of the calls).
+    """
+    # Static data context first so it can be served from the provider's context cache across queries.
+    context = f"""Market trends data (sample/summary):
+{market_trends_text}"""
+    user_content = f"""{context}
 
-Market trends data (sample/summary):
-{market_trends_text}
+User request: {user_query}
 
 Analyze the above data and produce your trend_briefs. Focus on themes, velocity, and recommended directions for Wendy's."""
-    output = call_llm(SYSTEM_PROMPT, user_content)
-    return {"output": output, "system_prompt": SYSTEM_PROMPT, "user_content": user_content}
+    if structured:
+        user_content += "\n\n" + JSON_INSTRUCTION
+    return run_agent(
+        SYSTEM_PROMPT,
+        user_content,
+        response_schema=MARKET_RESEARCH_SCHEMA if structured else None,
+        on_row=on_row,
+        model=model,
+        cached_prefix=context,
+        tools=tools,
+    )
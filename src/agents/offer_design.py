@@ -1,11 +1,12 @@
 """
 Offer Design Agent.
 Purpose: Synthesize trend, customer, competitor signals into evidence-backed offer concepts.
-Input: trend_briefs[], customer_insights[], competitive_landscape[], whitespace_opportunities[].
+Input: trend_briefs[], customer_insights[], competitive_landscape[], whitespace_opportunities[] (compact JSON from src/handoff.py).
 Output: top 3 offer_concepts[] (name, mechanic, channel, duration, target, evidence map, rationale, feasibility, impact).
 """
 
-from src.llm import call_llm
+from src.data_tools import run_agent
+from src.structured import JSON_INSTRUCTION, OFFER_DESIGN_SCHEMA
 
 SYSTEM_PROMPT = """You are the Offer Design Agent for Wendy's offer innovation.
 
@@ -41,6 +42,14 @@ Produce exactly 3 offer concepts. For each offer include:
 Example style: "Name: Wendy's Streak Week — Daily app-only challenges with growing rewards. Why: Aligns with Gen Z gamification trend (Market Trends), leverages app-first audience (Customer Insights), and fills a competitive gap (Competitor Intelligence)."
 """
 
+SYNTHESIS_ASK = "Synthesize the above and output your TOP 3 offer concepts with name, mechanic, channel, duration, target, evidence map, rationale, feasibility, and impact."
+
+# Prose mode closes with a markdown summary table; structured mode replaces it with the schema (one offer_concepts row per offer).
+SUMMARY_TABLE_ASK = (
+    'At the end, add a "TOP 3 SUMMARY TABLE" as markdown with columns: Offer name | Channel | Target segment | Duration | '
+    "Evidence (bullet: Market Trends, Customer Insights, Competitor). One row per offer."
+)
+
 
 def run(
     trend_briefs: str,
@@ -48,8 +57,21 @@ def run(
     competitive_landscape: str,
     whitespace_opportunities: str,
     user_query: str,
-) -> str:
-    """Run Offer Design agent. All prior agent outputs are passed as text."""
+    structured: bool = False,
+    on_row=None,
+    model=None,
+    tools=None,
+    temperature=None,
+    seed=None,
+) -> dict:
+    """
+    Run Offer Design agent. Prior agent artifacts are passed as text (compact JSON from the hand-off stage).
+    structured=True asks for JSON matching OFFER_DESIGN_SCHEMA (offer_concepts) instead of prose + markdown table.
+    model overrides the default model (see src/routing.py).
+    tools: optional src.data_tools.DataTools the model may query to check the data behind the inputs; the result
+    then has "tool_calls" (trace of the calls).
+    temperature, seed: sampling settings, to draw several different designs for the same inputs (src/offer_ranking.py).
+    """
     user_content = f"""User request: {user_query}
 
 Inputs from other agents:
@@ -57,18 +79,29 @@ Inputs from other agents:
 --- Market Trends (trend_briefs) ---
 {trend_briefs}
 
---- Customer Insights ---
+--- Customer Insights (customer_insights) ---
 {customer_insights}
 
---- Competitor Intelligence (competitive_landscape + whitespace_opportunities) ---
+--- Competitor Intelligence (competitive_landscape) ---
 {competitive_landscape}
 
+--- Competitor Intelligence (whitespace_opportunities) ---
 {whitespace_opportunities}
 
 ---
 
-Synthesize the above and output your TOP 3 offer concepts with name, mechanic, channel, duration, target, evidence map, rationale, feasibility, and impact.
-
-At the end, add a "TOP 3 SUMMARY TABLE" as markdown with columns: Offer name | Channel | Target segment | Duration | Evidence (bullet: Market Trends, Customer Insights, Competitor). One row per offer."""
-    output = call_llm(SYSTEM_PROMPT, user_content)
-    return {"output": output, "system_prompt": SYSTEM_PROMPT, "user_content": user_content}
+{SYNTHESIS_ASK}
+
+{JSON_INSTRUCTION if structured else SUMMARY_TABLE_ASK}"""
+    return run_agent(
+        SYSTEM_PROMPT,
+        user_content,
+        response_schema=OFFER_DESIGN_SCHEMA if structured else None,
+        on_row=on_row,
+        model=model,
+        # Inputs differ per query and the system prompt alone is below the provider's cache minimum: never cache.
+        cached_prefix=None,
+        tools=tools,
+        temperature=temperature,
+        seed=seed,
+    )
@@ -0,0 +1,145 @@
+"""
+Content-addressed, compressed blobs for the large, repetitive fields of saved steps.
+Every step used to carry the full system prompt, the full user content (with the data dumps embedded), the input
+summary and the input sample; thousands of sessions stored the same bytes over and over. Those fields are now split
+into chunks at paragraph boundaries, each chunk is written once under its SHA-256 (zstd-compressed when the
+zstandard package is installed, gzip otherwise) and the step keeps only the list of hashes. Identical prompts and
+data-dump paragraphs are therefore stored once however many sessions use them.
+Reads are lazy: LazyStep resolves a field from its blobs the first time it is accessed, so showing a session's
+top-3 table never touches its prompts.
+"""
+
+import gzip
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from src.storage import LocalStorage, Storage
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+BLOB_FIELDS = ("system_prompt", "user_content", "input_summary", "input_data_sample")
+# Fields smaller than this (serialized) stay inline.
+MIN_BLOB_CHARS = 1024
+# Chunks are cut at the first paragraph break after this many characters.
+CHUNK_CHARS = 4096
+REF_KEY = "$blobs"
+BLOB_PREFIX = "blobs/"
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_PARAGRAPH_RE = re.compile(r"(?<=\n\n)")
+
+
+def split_chunks(text: str, chunk_chars: int = CHUNK_CHARS) -> list[str]:
+    """Split text at paragraph breaks into chunks of at least chunk_chars (except the last); same prefix, same chunks."""
+    chunks: list[str] = []
+    current = ""
+    for part in _PARAGRAPH_RE.split(text):
+        current += part
+        if len(current) >= chunk_chars:
+            chunks.append(current)
+            current = ""
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
+
+
+def is_ref(value: Any) -> bool:
+    return isinstance(value, dict) and REF_KEY in value
+
+
+class BlobStore:
+    """Write-once, compressed blobs under blobs/<2 hex>/<sha256> in a Storage (or a local directory)."""
+
+    def __init__(self, storage: Union[Storage, Path], level: int = 6):
+        self.storage = storage if isinstance(storage, Storage) else LocalStorage(storage)
+        self.level = level
+
+    @staticmethod
+    def _key(digest: str) -> str:
+        return f"{BLOB_PREFIX}{digest[:2]}/{digest}"
+
+    def _compress(self, data: bytes) -> bytes:
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    @staticmethod
+    def _decompress(raw: bytes) -> bytes:
+        if raw[:4] == _ZSTD_MAGIC:
+            if zstandard is None:
+                raise RuntimeError("Blob is zstd-compressed but the zstandard package is not installed.")
+            return zstandard.ZstdDecompressor().decompress(raw)
+        if raw[:2] == _GZIP_MAGIC:
+            return gzip.decompress(raw)
+        return raw
+
+    def put(self, data: bytes) -> str:
+        """Store data (if not already present) and return its SHA-256 hex digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        key = self._key(digest)
+        # Same key, same bytes: concurrent writers of one blob are harmless.
+        if not self.storage.exists(key):
+            self.storage.put(key, self._compress(data))
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        raw = self.storage.get(self._key(digest))
+        if raw is None:
+            raise FileNotFoundError(f"Blob {digest} is missing from storage.")
+        return self._decompress(raw)
+
+    def put_value(self, value: Any) -> dict[str, Any]:
+        """Reference for a text (chunked) or JSON value (one blob)."""
+        if isinstance(value, str):
+            return {REF_KEY: [self.put(c.encode("utf-8")) for c in split_chunks(value)]}
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return {REF_KEY: [self.put(data)], "json": True}
+
+    def get_value(self, ref: dict[str, Any]) -> Any:
+        data = b"".join(self.get(d) for d in ref[REF_KEY])
+        return json.loads(data) if ref.get("json") else data.decode("utf-8")
+
+    def pack_step(self, step: dict[str, Any]) -> dict[str, Any]:
+        """Copy of step with each large BLOB_FIELDS value replaced by a blob reference."""
+        packed = dict(step)
+        for field in BLOB_FIELDS:
+            value = packed.get(field)
+            if value is None or is_ref(value):
+                continue
+            size = len(value) if isinstance(value, str) else len(json.dumps(value, default=str))
+            if size >= MIN_BLOB_CHARS:
+                packed[field] = self.put_value(value)
+        return packed
+
+    def stats(self) -> dict[str, int]:
+        sizes = [self.storage.stat(k) for k in self.storage.list(BLOB_PREFIX)]
+        return {"blobs": len(sizes), "bytes": sum(st[0] for st in sizes if st)}
+
+
+class LazyStep(dict):
+    """A saved step whose blob-referenced fields are read and decompressed on first access."""
+
+    def __init__(self, payload: dict[str, Any], blobs: Optional[BlobStore]):
+        super().__init__(payload)
+        self._blobs = blobs
+
+    def __getitem__(self, key: str) -> Any:
+        value = super().__getitem__(key)
+        if is_ref(value) and self._blobs is not None:
+            value = self._blobs.get_value(value)
+            super().__setitem__(key, value)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def resolve(self) -> dict[str, Any]:
+        """Plain dict with every field read."""
+        return {k: self[k] for k in self}
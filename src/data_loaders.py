@@ -1,17 +1,41 @@
 """
 Load Wendy's Hackathon CSV data from data/ (or custom path).
 Loads .env from project root so WENDYS_DATA_DIR is applied when set.
+pandas is imported on first load, so path/fingerprint helpers stay cheap on the app's startup path.
+When the generator wrote month-partitioned Parquet (manifest.json lists the partitions), tables are read from it,
+and load_*(months=[...]) reads only the partitions for those months; otherwise the CSVs are read (and filtered).
 """
 
+import hashlib
+import json
 import os
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Iterable, Optional
 
-import pandas as pd
+from src.metrics import DATA_LOAD_SECONDS
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Default data directory relative to project root
 DEFAULT_DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 
+DATA_FILES = [
+    "market_trends.csv",
+    "customer_transactions.csv",
+    "customer_feedback.csv",
+    "competitor_intel.csv",
+]
+
+MANIFEST_NAME = "manifest.json"
+# Month-partitioning column per table (as in scripts/generate_data.py).
+DATE_COLUMNS = {
+    "market_trends.csv": "publication_date",
+    "customer_transactions.csv": "visit_date",
+    "customer_feedback.csv": "feedback_date",
+    "competitor_intel.csv": "observed_date",
+}
+
 _env_loaded = False
 
 
@@ -39,53 +63,124 @@ def _path(name: str, data_dir: Optional[Path] = None) -> Path:
     return d / name
 
 
+def data_fingerprint(data_dir: Optional[Path] = None) -> str:
+    """Short hash of the four CSVs' names, sizes and mtimes; changes whenever data is regenerated."""
+    d = data_dir or get_data_dir()
+    h = hashlib.sha256()
+    for name in DATA_FILES + [MANIFEST_NAME]:
+        p = _path(name, d)
+        st = p.stat() if p.exists() else None
+        h.update(f"{name}:{st.st_size if st else -1}:{st.st_mtime_ns if st else -1};".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def read_manifest(data_dir: Optional[Path] = None) -> Optional[dict]:
+    """The generator's manifest.json (row counts, schema, partitions per table), or None."""
+    p = _path(MANIFEST_NAME, data_dir)
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def data_version(data_dir: Optional[Path] = None) -> int:
+    """Monotonic data version: 0 as generated, +1 per batch appended through src/ingest.py."""
+    return int((read_manifest(data_dir) or {}).get("data_version", 0))
+
+
+def _partitions(name: str, data_dir: Optional[Path] = None) -> Optional[dict]:
+    table = (read_manifest(data_dir) or {}).get("tables", {}).get(name[: -len(".csv")]) or {}
+    return table.get("partitions")
+
+
 def data_available(data_dir: Optional[Path] = None) -> bool:
-    """True if all four CSV files exist."""
+    """True if all four tables exist (as CSV or as Parquet partitions)."""
     d = data_dir or get_data_dir()
-    return all(
-        (_path(f, d).exists() for f in [
-            "market_trends.csv",
-            "customer_transactions.csv",
-            "customer_feedback.csv",
-            "competitor_intel.csv",
-        ])
-    )
+    return all(_path(f, d).exists() or _partitions(f, d) for f in DATA_FILES)
 
 
-def load_market_trends(data_dir: Optional[Path] = None) -> pd.DataFrame:
-    p = _path("market_trends.csv", data_dir)
-    if not p.exists():
-        raise FileNotFoundError(f"Data not found: {p}. Run scripts/generate_data.py first.")
-    return pd.read_csv(p)
+def _read_csv(path: Path) -> "pd.DataFrame":
+    import pandas as pd
+    return pd.read_csv(path)
 
 
-def load_customer_transactions(data_dir: Optional[Path] = None) -> pd.DataFrame:
-    p = _path("customer_transactions.csv", data_dir)
-    if not p.exists():
-        raise FileNotFoundError(f"Data not found: {p}. Run scripts/generate_data.py first.")
-    return pd.read_csv(p)
+def _parquet_supported() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _load_table(name: str, data_dir: Optional[Path] = None, months: Optional[Iterable[str]] = None) -> "pd.DataFrame":
+    """Table from Parquet partitions (only the given "YYYY-MM" months) if available, else from CSV."""
+    import pandas as pd
+
+    d = data_dir or get_data_dir()
+    wanted = set(months) if months is not None else None
+    partitions = _partitions(name, d)
+    csv_path = _path(name, d)
+    if partitions and (_parquet_supported() or not csv_path.exists()):
+        files = [d / f for month, part in partitions.items() if wanted is None or month in wanted for f in part["files"]]
+        with DATA_LOAD_SECONDS.time(table=name.split(".")[0], format="parquet"):
+            if not files:
+                first = next(iter(partitions.values()))["files"][0]
+                return pd.read_parquet(d / first).head(0)
+            return pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+    if not csv_path.exists():
+        raise FileNotFoundError(f"Data not found: {csv_path}. Run scripts/generate_data.py first.")
+    with DATA_LOAD_SECONDS.time(table=name.split(".")[0], format="csv"):
+        df = _read_csv(csv_path)
+        if wanted is not None:
+            df = df[pd.to_datetime(df[DATE_COLUMNS[name]]).dt.strftime("%Y-%m").isin(wanted)].reset_index(drop=True)
+    return df
 
 
-def load_customer_feedback(data_dir: Optional[Path] = None) -> pd.DataFrame:
-    p = _path("customer_feedback.csv", data_dir)
-    if not p.exists():
-        raise FileNotFoundError(f"Data not found: {p}. Run scripts/generate_data.py first.")
-    return pd.read_csv(p)
+def load_market_trends(data_dir: Optional[Path] = None, months: Optional[Iterable[str]] = None) -> "pd.DataFrame":
+    return _load_table("market_trends.csv", data_dir, months)
 
 
-def load_competitor_intel(data_dir: Optional[Path] = None) -> pd.DataFrame:
-    p = _path("competitor_intel.csv", data_dir)
-    if not p.exists():
-        raise FileNotFoundError(f"Data not found: {p}. Run scripts/generate_data.py first.")
-    return pd.read_csv(p)
+def load_customer_transactions(data_dir: Optional[Path] = None, months: Optional[Iterable[str]] = None) -> "pd.DataFrame":
+    return _load_table("customer_transactions.csv", data_dir, months)
 
 
-def summarize_for_llm(df: pd.DataFrame, max_rows: int = 80, max_chars: int = 12000) -> str:
-    """Sample and truncate a DataFrame to text for LLM context."""
+def load_customer_feedback(data_dir: Optional[Path] = None, months: Optional[Iterable[str]] = None) -> "pd.DataFrame":
+    return _load_table("customer_feedback.csv", data_dir, months)
+
+
+def load_competitor_intel(data_dir: Optional[Path] = None, months: Optional[Iterable[str]] = None) -> "pd.DataFrame":
+    return _load_table("competitor_intel.csv", data_dir, months)
+
+
+def summarize_for_llm(df: "pd.DataFrame", max_rows: int = 80, max_chars: Optional[int] = 12000) -> str:
+    """Sample and truncate a DataFrame to text for LLM context. max_chars=None leaves trimming to the prompt budget."""
     sample = df.sample(n=min(max_rows, len(df)), random_state=42) if len(df) > max_rows else df
     text = sample.to_string(max_colwidth=200)
-    if len(text) > max_chars:
+    if max_chars is not None and len(text) > max_chars:
         text = text[:max_chars] + "\n... (truncated)"
     return text
 
 
+def describe_for_llm(df: "pd.DataFrame", max_values: int = 6) -> str:
+    """
+    Compact whole-table digest for LLM context: row count, numeric ranges, top categorical values.
+    Covers every row (unlike summarize_for_llm's sample) in a few hundred characters.
+    """
+    import pandas as pd
+
+    lines = [f"rows={len(df)}"]
+    for col in df.columns:
+        s = df[col].dropna()
+        if s.empty:
+            lines.append(f"{col}: (empty)")
+        elif pd.api.types.is_numeric_dtype(s):
+            lines.append(f"{col}: min={s.min():.2f} mean={s.mean():.2f} max={s.max():.2f}")
+        elif s.nunique() <= max(max_values * 4, 20):
+            counts = s.value_counts().head(max_values)
+            lines.append(f"{col}: " + ", ".join(f"{k} ({v})" for k, v in counts.items()))
+        else:
+            lines.append(f"{col}: {s.nunique()} distinct values")
+    return "\n".join(lines)
+
+
@@ -0,0 +1,612 @@
+"""
+Function-calling data access for the agents: four tools over a local SQLite copy of the four tables.
+- group_by_aggregate: count / sum / avg / min / max / count_distinct of a column by up to two columns, including
+  the derived month, week, day, weekday, hour and daypart of the table's date.
+- filter_rows: the rows in a scope (daypart, date range, column conditions), with the total matched.
+- search_text: top-k distinct trend post or feedback texts for a query, with how often each occurs, ranked by FTS5
+  bm25 (LIKE where SQLite was built without FTS5).
+- theme_timeseries: volume and mean velocity (trends) or rating (feedback) of a theme per month, week or day.
+The database is derived/query.db next to the data, built from the cached tables (CSV or Parquet partitions) the
+first time a tool runs. It follows the data: rows appended through src/ingest.py are inserted incrementally, and
+anything else (regenerated data) rebuilds it. Table and column names in tool arguments are checked against the
+database and values are bound as parameters, so model-written arguments never become SQL text. Results are capped
+at DATA_TOOLS_MAX_ROWS rows ("truncated": true when cut) and cached per call: the same data, tool and arguments
+are answered from memory.
+DATA_TOOLS=1 gives the agents the tools for every run (see run_with_tools).
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+from src.data_loaders import DATE_COLUMNS, _load_table, data_fingerprint, get_data_dir, read_manifest
+from src.ingest import DERIVED_DIR, TABLES, TEXT_COLUMNS, appended_rows
+from src.llm import call_llm, call_llm_with_tools, env_number
+from src.metrics import CACHE_LOOKUPS
+from src.storage import LocalStorage
+from src.structured import TableStreamParser
+
+DB_NAME = "query.db"
+DEFAULT_MAX_ROWS = 50
+DEFAULT_LIMIT = 20
+CACHE_SIZE = 256
+SYNC_LOCK = "query-db"
+INSERT_CHUNK_ROWS = 50_000
+
+METRICS = ("count", "sum", "avg", "min", "max", "count_distinct")
+OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+INTERVALS = ("month", "week", "day")
+DAYPARTS = ("breakfast", "lunch", "afternoon", "dinner", "late-night")
+# Derived columns, computed from the table's date column (stored as "YYYY-MM-DD HH:MM:SS").
+DERIVED_COLUMNS = {
+    "month": "substr({d}, 1, 7)",
+    "week": "strftime('%Y-W%W', {d})",
+    "day": "substr({d}, 1, 10)",
+    "weekday": (
+        "CASE CAST(strftime('%w', {d}) AS INTEGER) WHEN 0 THEN 'Sunday' WHEN 1 THEN 'Monday' WHEN 2 THEN 'Tuesday' "
+        "WHEN 3 THEN 'Wednesday' WHEN 4 THEN 'Thursday' WHEN 5 THEN 'Friday' ELSE 'Saturday' END"
+    ),
+    "hour": "CAST(substr({d}, 12, 2) AS INTEGER)",
+    "daypart": (
+        "CASE WHEN CAST(substr({d}, 12, 2) AS INTEGER) BETWEEN 5 AND 10 THEN 'breakfast' "
+        "WHEN CAST(substr({d}, 12, 2) AS INTEGER) BETWEEN 11 AND 13 THEN 'lunch' "
+        "WHEN CAST(substr({d}, 12, 2) AS INTEGER) BETWEEN 14 AND 16 THEN 'afternoon' "
+        "WHEN CAST(substr({d}, 12, 2) AS INTEGER) BETWEEN 17 AND 20 THEN 'dinner' ELSE 'late-night' END"
+    ),
+}
+# Mean reported by theme_timeseries next to the volume.
+THEME_MEASURES = {"market_trends": "velocity_score", "customer_feedback": "rating"}
+
+_DATE_ARG_RE = re.compile(r"^\d{4}(-\d{2}(-\d{2})?)?$")
+_WORD_RE = re.compile(r"\w+")
+
+TOOLS_INSTRUCTION = (
+    "You can query every row of the data with the provided tools. Use them for the counts, shares, trends over "
+    "time and quotes you cite instead of estimating from the summary; make only the calls you need, then answer "
+    "in the requested format."
+)
+
+_SCOPE_PROPERTIES = {
+    "daypart": {"type": "string", "enum": list(DAYPARTS), "description": "Only rows in this daypart (by hour of the date)."},
+    "date_from": {"type": "string", "description": "Only rows on or after this date (YYYY, YYYY-MM or YYYY-MM-DD)."},
+    "date_to": {"type": "string", "description": "Only rows on or before this date (YYYY, YYYY-MM or YYYY-MM-DD)."},
+    "where": {
+        "type": "array",
+        "description": "Column conditions, all of which must hold (several = conditions on one column: any of them).",
+        "items": {
+            "type": "object",
+            "properties": {
+                "column": {"type": "string"},
+                "op": {"type": "string", "enum": list(OPERATORS)},
+                "value": {"type": "string"},
+            },
+            "required": ["column", "value"],
+        },
+    },
+}
+
+TOOL_DECLARATIONS = [
+    {
+        "name": "group_by_aggregate",
+        "description": (
+            "Aggregate a table grouped by one or two columns. Besides the table's columns you can group by "
+            "month, week, day, weekday, hour and daypart (derived from the table's date)."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "table": {"type": "string", "enum": TABLES},
+                "group_by": {"type": "array", "items": {"type": "string"}, "description": "One or two columns."},
+                "metric": {"type": "string", "enum": list(METRICS), "description": "Default count (rows)."},
+                "column": {"type": "string", "description": "Column the metric is computed over (not needed for count)."},
+                **_SCOPE_PROPERTIES,
+                "order": {"type": "string", "enum": ["value_desc", "value_asc", "group"], "description": "Default value_desc."},
+                "limit": {"type": "integer"},
+            },
+            "required": ["table", "group_by"],
+        },
+    },
+    {
+        "name": "filter_rows",
+        "description": "Rows of a table within a scope, newest first, with the total number of matching rows.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "table": {"type": "string", "enum": TABLES},
+                "columns": {"type": "array", "items": {"type": "string"}, "description": "Columns to return (default all)."},
+                **_SCOPE_PROPERTIES,
+                "order": {"type": "string", "enum": ["newest", "oldest"]},
+                "limit": {"type": "integer"},
+            },
+            "required": ["table"],
+        },
+    },
+    {
+        "name": "search_text",
+        "description": (
+            "Top-k trend posts or feedback texts most relevant to a text query, each with how many rows contain it."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "table": {"type": "string", "enum": list(TEXT_COLUMNS)},
+                "query": {"type": "string"},
+                "k": {"type": "integer", "description": f"Number of results (default {DEFAULT_LIMIT})."},
+                **_SCOPE_PROPERTIES,
+            },
+            "required": ["table", "query"],
+        },
+    },
+    {
+        "name": "theme_timeseries",
+        "description": (
+            "Volume of a theme over time: rows per period whose trend_theme or text mentions it, with the mean "
+            "velocity_score (market_trends) or rating (customer_feedback)."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "theme": {"type": "string"},
+                "interval": {"type": "string", "enum": list(INTERVALS), "description": "Default month."},
+                "table": {"type": "string", "enum": list(TEXT_COLUMNS), "description": "Default market_trends."},
+                **_SCOPE_PROPERTIES,
+            },
+            "required": ["theme"],
+        },
+    },
+]
+
+
+class ToolError(ValueError):
+    """A tool call the model can correct (unknown table or column, bad argument); returned to it as an error."""
+
+
+def data_tools_enabled() -> bool:
+    """DATA_TOOLS=1 in .env/env gives the agents the data tools for every workflow run."""
+    return os.environ.get("DATA_TOOLS", "").strip().lower() in ("1", "true", "yes")
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _value(v: Any) -> Any:
+    return round(v, 4) if isinstance(v, float) else v
+
+
+def _prepare(df: Any, table: str) -> Any:
+    """Frame as stored: dates as "YYYY-MM-DD HH:MM:SS" text, so SQLite date functions and prefixes work."""
+    import pandas as pd
+
+    date_col = DATE_COLUMNS[f"{table}.csv"]
+    dates = pd.to_datetime(df[date_col], format="mixed")
+    return df.assign(**{date_col: dates.dt.strftime("%Y-%m-%d %H:%M:%S")})
+
+
+class DataTools:
+    """
+    The tools over one data directory. execute(name, arguments) runs a call and returns its result dict
+    ({"error": ...} for calls the model can correct). Thread-safe: one SQLite connection per thread.
+    """
+
+    def __init__(
+        self,
+        data_dir: Optional[Path] = None,
+        db_path: Optional[Path] = None,
+        max_rows: Optional[int] = None,
+        cache_size: int = CACHE_SIZE,
+    ):
+        self.data_dir = Path(data_dir or get_data_dir())
+        self.db_path = Path(db_path or self.data_dir / DERIVED_DIR / DB_NAME)
+        self.max_rows = max(1, max_rows or env_number("DATA_TOOLS_MAX_ROWS", DEFAULT_MAX_ROWS, int))
+        self.cache_size = cache_size
+        self.fts = True
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._synced: Optional[str] = None
+        self._columns: dict[str, list[str]] = {}
+        self._cache: "OrderedDict[tuple, dict[str, Any]]" = OrderedDict()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Keeping the database in step with the data ---
+
+    def sync(self) -> str:
+        """Bring the database up to date with the data directory if it changed. Returns the data fingerprint."""
+        fingerprint = data_fingerprint(self.data_dir)
+        if fingerprint == self._synced:
+            return fingerprint
+        with self._lock, LocalStorage(self.data_dir).lock(SYNC_LOCK):
+            if fingerprint != self._synced:
+                conn = self._conn()
+                conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                row = conn.execute("SELECT value FROM meta WHERE key = 'state'").fetchone()
+                state = json.loads(row[0]) if row else {}
+                if state.get("fingerprint") != fingerprint:
+                    self._update(conn, state, fingerprint)
+                self._columns = {
+                    t: [r[1] for r in conn.execute(f"PRAGMA table_info({_quote(t)})")] for t in TABLES
+                }
+                self.fts = all(self._has_table(conn, f"{t}_fts") for t in TEXT_COLUMNS)
+                self._synced = fingerprint
+                self._cache.clear()
+        return fingerprint
+
+    @staticmethod
+    def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+    def _update(self, conn: sqlite3.Connection, state: dict[str, Any], fingerprint: str) -> None:
+        manifest = read_manifest(self.data_dir) or {}
+        version = int(manifest.get("data_version", 0))
+        # Same generated data, newer batches: only the appended rows are inserted.
+        appendable = (
+            state.get("generated_at") is not None
+            and state.get("generated_at") == manifest.get("generated_at")
+            and version > state.get("data_version", 0)
+        )
+        for table in TABLES:
+            rows = ((manifest.get("tables") or {}).get(table) or {}).get("rows")
+            new = appended_rows(table, state.get("data_version", 0), self.data_dir) if appendable and self._has_table(conn, table) else None
+            have = conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0] if new is not None else None
+            if new is not None and rows is not None and have + len(new) == rows:
+                self._insert(conn, table, new)
+            else:
+                self._rebuild(conn, table)
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('state', ?)",
+            (json.dumps({"fingerprint": fingerprint, "generated_at": manifest.get("generated_at"), "data_version": version}),),
+        )
+        conn.commit()
+
+    def _rebuild(self, conn: sqlite3.Connection, table: str) -> None:
+        df = _load_table(f"{table}.csv", self.data_dir)
+        conn.execute(f"DROP TABLE IF EXISTS {_quote(table + '_fts')}")
+        conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+        _prepare(df.head(0), table).to_sql(table, conn, index=False)
+        date_col = DATE_COLUMNS[f"{table}.csv"]
+        conn.execute(f"CREATE INDEX {_quote(table + '_date')} ON {_quote(table)} ({_quote(date_col)})")
+        if table in TEXT_COLUMNS:
+            cols = ", ".join(_quote(c) for c in TEXT_COLUMNS[table])
+            try:
+                conn.execute(
+                    f"CREATE VIRTUAL TABLE {_quote(table + '_fts')} USING fts5({cols}, content={_quote(table)}, "
+                    "content_rowid='rowid', tokenize='porter unicode61')"
+                )
+            except sqlite3.OperationalError:
+                pass
+        self._insert(conn, table, df)
+
+    def _insert(self, conn: sqlite3.Connection, table: str, df: Any) -> None:
+        if df.empty:
+            return
+        last = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {_quote(table)}").fetchone()[0]
+        for start in range(0, len(df), INSERT_CHUNK_ROWS):
+            _prepare(df.iloc[start:start + INSERT_CHUNK_ROWS], table).to_sql(table, conn, index=False, if_exists="append")
+        if self._has_table(conn, f"{table}_fts"):
+            cols = ", ".join(_quote(c) for c in TEXT_COLUMNS[table])
+            conn.execute(
+                f"INSERT INTO {_quote(table + '_fts')} (rowid, {cols}) "
+                f"SELECT rowid, {cols} FROM {_quote(table)} WHERE rowid > ?",
+                (last,),
+            )
+
+    # --- Argument checking and SQL building ---
+
+    def _table(self, table: Any, allowed: Optional[Any] = None) -> str:
+        if table not in (allowed or TABLES):
+            raise ToolError(f"Unknown table {table!r}; expected one of {', '.join(allowed or TABLES)}")
+        return table
+
+    def _expr(self, table: str, column: Any) -> str:
+        """SQL for a column or derived column of table."""
+        if column in self._columns[table]:
+            return _quote(column)
+        if column in DERIVED_COLUMNS:
+            return DERIVED_COLUMNS[column].format(d=_quote(DATE_COLUMNS[f"{table}.csv"]))
+        raise ToolError(
+            f"Unknown column {column!r} for {table}; columns: {', '.join(self._columns[table])}; "
+            f"derived: {', '.join(DERIVED_COLUMNS)}"
+        )
+
+    def _scope(self, table: str, args: dict[str, Any]) -> tuple[list[str], list[Any]]:
+        """WHERE clauses and parameters for the scope arguments (daypart, date_from, date_to, where)."""
+        clauses: list[str] = []
+        params: list[Any] = []
+        date = _quote(DATE_COLUMNS[f"{table}.csv"])
+        if args.get("daypart"):
+            if args["daypart"] not in DAYPARTS:
+                raise ToolError(f"Unknown daypart {args['daypart']!r}; expected one of {', '.join(DAYPARTS)}")
+            clauses.append(f"{self._expr(table, 'daypart')} = ?")
+            params.append(args["daypart"])
+        for key, op in (("date_from", ">="), ("date_to", "<=")):
+            value = args.get(key)
+            if value:
+                if not _DATE_ARG_RE.match(str(value)):
+                    raise ToolError(f"{key} must be YYYY, YYYY-MM or YYYY-MM-DD, got {value!r}")
+                clauses.append(f"substr({date}, 1, {len(value)}) {op} ?")
+                params.append(value)
+        equals: dict[str, list[Any]] = {}
+        for cond in args.get("where") or []:
+            if not isinstance(cond, dict) or "column" not in cond or "value" not in cond:
+                raise ToolError("where items need a column and a value")
+            op = cond.get("op") or "="
+            if op not in OPERATORS:
+                raise ToolError(f"Unknown operator {op!r}; expected one of {', '.join(OPERATORS)}")
+            expr = self._expr(table, cond["column"])
+            if op == "=":
+                equals.setdefault(expr, []).append(cond["value"])
+            else:
+                clauses.append(f"{expr} {op} ? COLLATE NOCASE")
+                params.append(cond["value"])
+        for expr, values in equals.items():
+            clauses.append(f"{expr} COLLATE NOCASE IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        return clauses, params
+
+    def _limit(self, value: Any, default: int = DEFAULT_LIMIT) -> int:
+        try:
+            n = int(value) if value is not None else default
+        except (TypeError, ValueError):
+            raise ToolError(f"limit must be an integer, got {value!r}") from None
+        return max(1, min(n, self.max_rows))
+
+    def _match(self, table: str, text: str, any_word: bool) -> tuple[str, list[Any]]:
+        """Clause selecting rows whose text columns match the words of text (any or all of them)."""
+        words = _WORD_RE.findall(text.lower())
+        if not words:
+            raise ToolError("query has no words to search for")
+        if self.fts:
+            fts = _quote(table + "_fts")
+            query = (" OR " if any_word else " ").join(f'"{w}"' for w in words)
+            return f"rowid IN (SELECT rowid FROM {fts} WHERE {fts} MATCH ?)", [query]
+        cols = TEXT_COLUMNS[table]
+        word_clauses = ["(" + " OR ".join(f"{_quote(c)} LIKE ?" for c in cols) + ")" for _ in words]
+        return "(" + (" OR " if any_word else " AND ").join(word_clauses) + ")", [f"%{w}%" for w in words for _ in cols]
+
+    def _rows(self, sql: str, params: list[Any], limit: int) -> tuple[list[dict[str, Any]], bool]:
+        """First limit rows of the query (fetching one more to tell whether it was cut)."""
+        cur = self._conn().execute(f"{sql} LIMIT {limit + 1}", params)
+        names = [c[0] for c in cur.description]
+        rows = [dict(zip(names, map(_value, r))) for r in cur.fetchall()]
+        return rows[:limit], len(rows) > limit
+
+    @staticmethod
+    def _where_sql(clauses: list[str]) -> str:
+        return " WHERE " + " AND ".join(clauses) if clauses else ""
+
+    # --- The tools ---
+
+    def group_by_aggregate(self, args: dict[str, Any]) -> dict[str, Any]:
+        table = self._table(args.get("table"))
+        group_by = args.get("group_by") or []
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        if not 1 <= len(group_by) <= 2:
+            raise ToolError("group_by needs one or two columns")
+        metric = args.get("metric") or "count"
+        if metric not in METRICS:
+            raise ToolError(f"Unknown metric {metric!r}; expected one of {', '.join(METRICS)}")
+        if metric == "count":
+            value = "COUNT(*)"
+        elif not args.get("column"):
+            raise ToolError(f"metric {metric} needs a column")
+        elif metric == "count_distinct":
+            value = f"COUNT(DISTINCT {self._expr(table, args['column'])})"
+        else:
+            value = f"{metric.upper()}({self._expr(table, args['column'])})"
+        groups = [self._expr(table, g) for g in group_by]
+        clauses, params = self._scope(table, args)
+        order = {"value_desc": "value DESC", "value_asc": "value ASC", "group": ", ".join(str(i + 1) for i in range(len(groups)))}
+        if (args.get("order") or "value_desc") not in order:
+            raise ToolError(f"Unknown order {args['order']!r}; expected one of {', '.join(order)}")
+        select = ", ".join(f"{g} AS {_quote(name)}" for g, name in zip(groups, group_by))
+        sql = (
+            f"SELECT {select}, {value} AS value, COUNT(*) AS n_rows FROM {_quote(table)}{self._where_sql(clauses)} "
+            f"GROUP BY {', '.join(str(i + 1) for i in range(len(groups)))} ORDER BY {order[args.get('order') or 'value_desc']}"
+        )
+        rows, truncated = self._rows(sql, params, self._limit(args.get("limit"), self.max_rows))
+        return {"rows": rows, "truncated": truncated}
+
+    def filter_rows(self, args: dict[str, Any]) -> dict[str, Any]:
+        table = self._table(args.get("table"))
+        columns = args.get("columns") or self._columns[table]
+        select = ", ".join(f"{self._expr(table, c)} AS {_quote(c)}" for c in columns)
+        clauses, params = self._scope(table, args)
+        where = self._where_sql(clauses)
+        matched = self._conn().execute(f"SELECT COUNT(*) FROM {_quote(table)}{where}", params).fetchone()[0]
+        direction = "ASC" if args.get("order") == "oldest" else "DESC"
+        sql = f"SELECT {select} FROM {_quote(table)}{where} ORDER BY {_quote(DATE_COLUMNS[f'{table}.csv'])} {direction}"
+        rows, truncated = self._rows(sql, params, self._limit(args.get("limit")))
+        return {"rows": rows, "truncated": truncated, "matched": matched}
+
+    def search_text(self, args: dict[str, Any]) -> dict[str, Any]:
+        table = self._table(args.get("table"), list(TEXT_COLUMNS))
+        match, match_params = self._match(table, str(args.get("query") or ""), any_word=True)
+        clauses, params = self._scope(table, args)
+        limit = self._limit(args.get("k"))
+        date = _quote(DATE_COLUMNS[f"{table}.csv"])
+        if self.fts:
+            fts = _quote(table + "_fts")
+            matches = (
+                f"SELECT t.*, -{fts}.rank AS score FROM {fts} JOIN {_quote(table)} t ON t.rowid = {fts}.rowid"
+                f"{self._where_sql([f'{fts} MATCH ?', *clauses])}"
+            )
+        else:
+            # No relevance ranking without FTS5: newest matches first.
+            matches = f"SELECT *, 0 AS score FROM {_quote(table)}{self._where_sql([match, *clauses])}"
+        # Texts repeat across posts and customers: one result per distinct text, with how often it occurs.
+        texts = ", ".join(_quote(c) for c in TEXT_COLUMNS[table])
+        sql = (
+            f"SELECT {texts}, COUNT(*) AS mentions, MAX({date}) AS latest, ROUND(MAX(score), 4) AS score "
+            f"FROM ({matches}) GROUP BY {texts} ORDER BY MAX(score) DESC, latest DESC"
+        )
+        rows, truncated = self._rows(sql, [*match_params, *params], limit)
+        return {"rows": rows, "truncated": truncated}
+
+    def theme_timeseries(self, args: dict[str, Any]) -> dict[str, Any]:
+        table = self._table(args.get("table") or "market_trends", list(TEXT_COLUMNS))
+        theme = str(args.get("theme") or "").strip()
+        interval = args.get("interval") or "month"
+        if interval not in INTERVALS:
+            raise ToolError(f"Unknown interval {interval!r}; expected one of {', '.join(INTERVALS)}")
+        match, params = self._match(table, theme, any_word=False)
+        if "trend_theme" in self._columns[table]:
+            match = f"({_quote('trend_theme')} = ? COLLATE NOCASE OR {match})"
+            params = [theme, *params]
+        clauses, scope_params = self._scope(table, args)
+        measure = THEME_MEASURES[table]
+        sql = (
+            f"SELECT {self._expr(table, interval)} AS period, COUNT(*) AS n_rows, AVG({_quote(measure)}) AS mean_{measure} "
+            f"FROM {_quote(table)}{self._where_sql([match, *clauses])} GROUP BY 1 ORDER BY 1"
+        )
+        rows, truncated = self._rows(sql, [*params, *scope_params], self.max_rows)
+        return {"rows": rows, "truncated": truncated}
+
+    # --- Dispatch, cache and tracing ---
+
+    def call(self, name: str, arguments: dict[str, Any]) -> tuple[dict[str, Any], bool]:
+        """(result, cached) for one tool call. Errors the model can correct come back as {"error": ...}."""
+        tool = getattr(self, name, None) if name in TOOL_NAMES else None
+        if tool is None:
+            return {"error": f"Unknown tool {name!r}; expected one of {', '.join(TOOL_NAMES)}"}, False
+        fingerprint = self.sync()
+        key = (fingerprint, name, json.dumps(arguments, sort_keys=True, default=str))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        CACHE_LOOKUPS.inc(cache="data_tools", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached, True
+        try:
+            result = {"tool": name, **tool(arguments)}
+            result["row_count"] = len(result["rows"])
+        except (ToolError, sqlite3.OperationalError) as e:
+            return {"error": str(e)}, False
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result, False
+
+    def execute(self, name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+        return self.call(name, arguments)[0]
+
+    def declarations(self) -> list[dict[str, Any]]:
+        """TOOL_DECLARATIONS with the tables' columns listed in each description."""
+        self.sync()
+        columns = "; ".join(f"{t}: {', '.join(cols)}" for t, cols in self._columns.items())
+        return [
+            {**d, "description": f"{d['description']} Tables and columns: {columns}. At most {self.max_rows} rows are returned."}
+            for d in TOOL_DECLARATIONS
+        ]
+
+
+TOOL_NAMES = [d["name"] for d in TOOL_DECLARATIONS]
+
+
+class ToolSession:
+    """One agent call's use of DataTools: runs its tool calls and keeps a trace of them for the workflow step."""
+
+    def __init__(self, tools: DataTools):
+        self.tools = tools
+        self.calls: list[dict[str, Any]] = []
+
+    def execute(self, name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+        start = time.perf_counter()
+        result, cached = self.tools.call(name, arguments)
+        self.calls.append({
+            "tool": name,
+            "arguments": arguments,
+            "rows": result.get("row_count"),
+            "truncated": result.get("truncated", False),
+            "error": result.get("error"),
+            "cached": cached,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+        return result
+
+
+_instances: dict[str, DataTools] = {}
+_instances_lock = threading.Lock()
+
+
+def get_data_tools(data_dir: Optional[Path] = None) -> DataTools:
+    """Process-wide DataTools per data directory, so the per-call cache is shared by every run."""
+    d = Path(data_dir or get_data_dir()).resolve()
+    with _instances_lock:
+        if str(d) not in _instances:
+            _instances[str(d)] = DataTools(d)
+        return _instances[str(d)]
+
+
+def run_with_tools(
+    tools: DataTools,
+    system_prompt: str,
+    user_content: str,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    seed: Optional[int] = None,
+) -> tuple[str, list[dict[str, Any]]]:
+    """An agent's LLM call with the data tools (call_llm_with_tools). Returns (output, trace of the tool calls)."""
+    session = ToolSession(tools)
+    output = call_llm_with_tools(
+        system_prompt, user_content, tools.declarations(), session.execute, model=model, temperature=temperature, seed=seed,
+    )
+    return output, session.calls
+
+
+def run_agent(
+    system_prompt: str,
+    user_content: str,
+    response_schema: Optional[dict[str, Any]] = None,
+    on_row: Any = None,
+    model: Optional[str] = None,
+    cached_prefix: Optional[str] = None,
+    tools: Optional[DataTools] = None,
+    temperature: Optional[float] = None,
+    seed: Optional[int] = None,
+) -> dict[str, Any]:
+    """
+    An agent's LLM call and result dict {output, tables, system_prompt, user_content}. Without tools: call_llm,
+    streamed into on_row(table, row). With tools: TOOLS_INSTRUCTION is added to user_content, run_with_tools makes
+    the call (no schema, no streaming; rows are parsed from the final output) and the result has "tool_calls".
+    """
+    if tools is not None:
+        user_content += "\n\n" + TOOLS_INSTRUCTION
+    parser = TableStreamParser(on_row)
+    tool_calls = None
+    if tools is not None:
+        output, tool_calls = run_with_tools(tools, system_prompt, user_content, model=model, temperature=temperature, seed=seed)
+        if on_row:
+            parser.feed(output)
+    else:
+        output = call_llm(
+            system_prompt,
+            user_content,
+            response_schema=response_schema,
+            on_token=parser.feed if on_row else None,
+            model=model,
+            cached_prefix=cached_prefix,
+            temperature=temperature,
+            seed=seed,
+        )
+    result = {"output": output, "tables": parser.finish(output), "system_prompt": system_prompt, "user_content": user_content}
+    if tool_calls is not None:
+        result["tool_calls"] = tool_calls
+    return result
@@ -0,0 +1,205 @@
+"""
+Deep-research mode for Market Research and Customer Insights: hierarchical map-reduce over the full tables.
+Normally an agent sees a digest plus an 80-row sample. In deep mode each table is cut into consecutive chunks in
+table order and each chunk is summarized by its own LLM call (map). The calls run in parallel, and every one of
+them goes through the shared rate limit in call_llm. Summaries are then merged REDUCE_FANIN at a time, level by
+level, into one brief per table (reduce). The brief becomes a "brief:<table>" prompt section next to the digest.
+Summaries are cached by content (model, prompt, and the chunk's rows), tagged with the data version that produced
+them. Ingestion only appends rows (src/ingest.py), so after an append only the last partial chunk, the new chunks
+and the reduce steps above them call the LLM again. Summaries do not depend on the request, so every query on the
+same data reuses them.
+DEEP_RESEARCH=1 turns the mode on for every run. DEEP_RESEARCH_CHUNK_ROWS, DEEP_RESEARCH_MAX_CHUNKS and
+DEEP_RESEARCH_WORKERS tune it.
+"""
+
+import contextvars
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from src.data_loaders import describe_for_llm
+from src.llm import call_llm, env_number
+from src.metrics import CACHE_LOOKUPS
+from src.storage import LocalStorage, Storage
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 150
+# Chunks per table are capped: past it, chunks double in size (and are sampled down to CHUNK_ROWS rows plus a
+# digest of all their rows), so boundaries only move when a table doubles.
+DEFAULT_MAX_CHUNKS = 48
+DEFAULT_WORKERS = 4
+REDUCE_FANIN = 8
+SUMMARY_WORDS = 250
+BRIEF_WORDS = 400
+# Bump when the prompts change so cached summaries are not reused.
+PROMPT_VERSION = 1
+
+MAP_FOCUS = {
+    "market_trends": (
+        "Social and web posts about fast-food offers. Report each trend_theme present with its post count and "
+        "average velocity_score, the source types that carry it, the date range, and 1-2 verbatim quotes per theme."
+    ),
+    "customer_transactions": (
+        "Restaurant visits. Report the visit count and spend (mean, range), redemptions per offer and per channel "
+        "(with redemption share), time-of-day and weekday patterns, and customers who visit repeatedly."
+    ),
+    "customer_feedback": (
+        "Customer feedback. Report the rating distribution and mean, recurring praise and complaints with how "
+        "often they occur, and 2-3 verbatim quotes."
+    ),
+}
+
+MAP_PROMPT = """You summarize one slice of a larger dataset for Wendy's offer research.
+Dataset: {focus}
+Be factual and quantitative: give counts, rates and ranges computed from the rows provided, and never invent data.
+Write at most {words} words as plain-text bullets."""
+
+REDUCE_PROMPT = """You merge summaries of consecutive slices of one dataset into a single summary covering all of them.
+Dataset: {focus}
+Add up counts, recompute shares and means weighted by slice size, combine ranges, keep the strongest quotes, and
+point out changes over time (the slices are in table order). Never invent data.
+Write at most {words} words as plain-text bullets."""
+
+
+def deep_research_enabled() -> bool:
+    """DEEP_RESEARCH=1 in .env/env runs deep research for every workflow run."""
+    return os.environ.get("DEEP_RESEARCH", "").strip().lower() in ("1", "true", "yes")
+
+
+class SummaryCache:
+    """Chunk and reduce summaries by content key, in a Storage or a local directory (one JSON value each)."""
+
+    def __init__(self, root: Union[Path, Storage]):
+        self.storage = root if isinstance(root, Storage) else LocalStorage(root)
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        raw = json.dumps([PROMPT_VERSION, *parts], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def get(self, key: str) -> Optional[str]:
+        raw = self.storage.get(f"{key}.json")
+        try:
+            summary = json.loads(raw)["summary"] if raw is not None else None
+        except (ValueError, KeyError, TypeError):
+            summary = None
+        CACHE_LOOKUPS.inc(cache="summary", result="miss" if summary is None else "hit")
+        return summary
+
+    def put(self, key: str, summary: str, **meta: Any) -> None:
+        entry = {"summary": summary, "created": time.time(), **meta}
+        self.storage.put(f"{key}.json", json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+
+
+def chunk_rows_for(n_rows: int, chunk_rows: Optional[int] = None, max_chunks: Optional[int] = None) -> int:
+    """Rows per chunk: chunk_rows, doubled until the table fits in max_chunks chunks."""
+    size = max(1, chunk_rows or env_number("DEEP_RESEARCH_CHUNK_ROWS", DEFAULT_CHUNK_ROWS, int))
+    limit = max(1, max_chunks or env_number("DEEP_RESEARCH_MAX_CHUNKS", DEFAULT_MAX_CHUNKS, int))
+    while math.ceil(n_rows / size) > limit:
+        size *= 2
+    return size
+
+
+def chunk_text(chunk: "pd.DataFrame", sample_rows: int) -> str:
+    """What the map call sees: every row as CSV, or for oversized chunks a digest of all rows plus a sample."""
+    if len(chunk) <= sample_rows:
+        return chunk.to_csv(index=False)
+    sample = chunk.sample(n=sample_rows, random_state=42).sort_index()
+    return f"Digest of all {len(chunk)} rows:\n{describe_for_llm(chunk)}\n\nSample rows (CSV):\n{sample.to_csv(index=False)}"
+
+
+class _Summarizer:
+    """Cached summarize calls for one run, with counters for the step report."""
+
+    def __init__(self, model: Optional[str], cache: Optional[SummaryCache], data_version: int):
+        self.model = model
+        self.cache = cache
+        self.data_version = data_version
+        self.calls = 0
+        self.cached = 0
+
+    def __call__(self, system_prompt: str, text: str, table: str) -> str:
+        key = SummaryCache.key(self.model or "", system_prompt, text) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cached += 1
+                return cached
+        summary = call_llm(system_prompt, text, model=self.model)
+        self.calls += 1
+        if key is not None:
+            self.cache.put(key, summary, table=table, data_version=self.data_version)
+        return summary
+
+
+def _parallel(pool: ThreadPoolExecutor, fn: Any, tasks: list[tuple]) -> list[Any]:
+    # Each task runs in a copy of the caller's context, so agent labels and LLM priority carry over.
+    futures = [pool.submit(contextvars.copy_context().run, fn, *t) for t in tasks]
+    return [f.result() for f in futures]
+
+
+def research_briefs(
+    tables: dict[str, "pd.DataFrame"],
+    model: Optional[str] = None,
+    cache: Optional[SummaryCache] = None,
+    data_version: int = 0,
+    workers: Optional[int] = None,
+    chunk_rows: Optional[int] = None,
+    max_chunks: Optional[int] = None,
+) -> tuple[dict[str, str], dict[str, Any]]:
+    """
+    One brief per table covering all of its rows. Returns (briefs, report): report has per-table rows, chunks and
+    chunk_rows, plus llm_calls and cached (summaries reused) for the whole run.
+    """
+    summarize = _Summarizer(model, cache, data_version)
+    workers = max(1, workers or env_number("DEEP_RESEARCH_WORKERS", DEFAULT_WORKERS, int))
+    sample_rows = max(1, chunk_rows or env_number("DEEP_RESEARCH_CHUNK_ROWS", DEFAULT_CHUNK_ROWS, int))
+    report: dict[str, Any] = {"tables": {}}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="deep-research") as pool:
+        # Map: every chunk of every table in one parallel batch.
+        tasks, owners = [], []
+        for table, df in tables.items():
+            size = chunk_rows_for(len(df), chunk_rows, max_chunks)
+            prompt = MAP_PROMPT.format(focus=MAP_FOCUS[table], words=SUMMARY_WORDS)
+            n_chunks = max(1, math.ceil(len(df) / size))
+            for i in range(n_chunks):
+                tasks.append((prompt, chunk_text(df.iloc[i * size:(i + 1) * size], sample_rows), table))
+                owners.append(table)
+            report["tables"][table] = {"rows": len(df), "chunks": n_chunks, "chunk_rows": size}
+        summaries: dict[str, list[str]] = {table: [] for table in tables}
+        for table, summary in zip(owners, _parallel(pool, summarize, tasks)):
+            summaries[table].append(summary)
+
+        # Reduce: merge REDUCE_FANIN summaries at a time until each table has one; levels run in parallel.
+        levels = 0
+        while any(len(s) > 1 for s in summaries.values()):
+            levels += 1
+            tasks, owners = [], []
+            for table, parts in summaries.items():
+                if len(parts) == 1:
+                    continue
+                final = len(parts) <= REDUCE_FANIN
+                prompt = REDUCE_PROMPT.format(focus=MAP_FOCUS[table], words=BRIEF_WORDS if final else SUMMARY_WORDS)
+                for i in range(0, len(parts), REDUCE_FANIN):
+                    group = parts[i:i + REDUCE_FANIN]
+                    text = "\n\n".join(f"### Slice {i + j + 1}\n{s}" for j, s in enumerate(group))
+                    tasks.append((prompt, text, table))
+                    owners.append(table)
+                summaries[table] = []
+            for table, summary in zip(owners, _parallel(pool, summarize, tasks)):
+                summaries[table].append(summary)
+    report.update({
+        "levels": levels,
+        "llm_calls": summarize.calls,
+        "cached": summarize.cached,
+        "seconds": round(time.perf_counter() - start, 3),
+    })
+    return {table: parts[0] for table, parts in summaries.items()}, report
@@ -0,0 +1,258 @@
+"""
+Hand-off stage between the evidence agents and Offer Design.
+Extracts the structured artifacts (trend_briefs, customer_insights segment profiles, competitive_landscape,
+whitespace_opportunities) from each upstream output, drops duplicates, and serializes them as compact JSON,
+so Offer Design receives the evidence once and without the surrounding prose.
+"""
+
+import json
+import re
+from typing import Any, Optional
+
+from src.prompt_budget import estimate_tokens
+
+ARTIFACT_KINDS = ("trend_briefs", "customer_insights", "competitive_landscape", "whitespace_opportunities")
+
+# Heading keywords that switch which artifact list subsequent items belong to.
+_GROUP_KEYWORDS = [
+    ("whitespace", "whitespace_opportunities"),
+    ("landscape", "competitive_landscape"),
+    ("trend brief", "trend_briefs"),
+    ("trend_brief", "trend_briefs"),
+    ("customer insight", "customer_insights"),
+    ("customer_insight", "customer_insights"),
+    ("segment profile", "customer_insights"),
+]
+
+# Field-name aliases as the agents tend to write them -> compact key.
+_FIELD_ALIASES = {
+    "title": "title",
+    "name": "title",
+    "trend": "title",
+    "summary": "summary",
+    "short_summary": "summary",
+    "description": "description",
+    "evidence": "evidence",
+    "evidence_snippets": "evidence",
+    "signal_strength": "signal_strength",
+    "velocity": "signal_strength",
+    "velocity_score": "signal_strength",
+    "recommended_directions": "directions",
+    "directions": "directions",
+    "segment": "segment",
+    "segment_id": "segment",
+    "segment_name": "segment",
+    "preferred_mechanics": "preferred_mechanics",
+    "key_messaging_phrases": "messaging",
+    "messaging": "messaging",
+    "empirical_metrics": "metrics",
+    "metrics": "metrics",
+    "redemption_rate": "redemption_rate",
+    "brand": "brand",
+    "mechanic": "mechanic",
+    "duration": "duration",
+    "channel": "channel",
+    "target_audience": "target",
+    "reported_lift": "lift",
+    "lift": "lift",
+    "opportunity": "opportunity",
+    "rationale": "rationale",
+}
+
+MAX_FIELD_CHARS = 300
+MAX_NOTES = 3
+DUPLICATE_SIMILARITY = 0.8
+
+_HEADING_RE = re.compile(r"^\s*#{1,6}\s+(.+?)\s*#*\s*$")
+_NUMBERED_RE = re.compile(r"^\s*\d+[.)]\s+(.+)$")
+_BOLD_LINE_RE = re.compile(r"^\s*[-*]?\s*\*\*(.+?)\*\*\s*:?\s*$")
+_FIELD_RE = re.compile(r"^\s*[-*]?\s*\**\s*([A-Za-z][A-Za-z _/()-]{1,40}?)\s*\**\s*:\s*\**\s*(.+?)\s*$")
+_JSON_BLOCK_RE = re.compile(r"```(?:json)?\s*([\[{][\s\S]*?[\]}])\s*```")
+
+
+def _norm_key(raw: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", raw.strip().lower()).strip("_")
+
+
+def _clean(text: str) -> str:
+    """Collapse whitespace and markdown emphasis; cap length."""
+    text = re.sub(r"\*\*|__|`", "", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) > MAX_FIELD_CHARS:
+        text = text[:MAX_FIELD_CHARS].rstrip() + "..."
+    return text
+
+
+def _group_for(heading: str) -> Optional[str]:
+    h = heading.lower()
+    for keyword, kind in _GROUP_KEYWORDS:
+        if keyword in h:
+            return kind
+    return None
+
+
+def _from_json(output: str) -> Optional[dict[str, list]]:
+    """Artifacts from a JSON block or a whole-JSON (structured-output) response: object keyed by artifact kind, or a bare list."""
+    stripped = output.strip()
+    candidates = [stripped] if stripped[:1] in ("{", "[") else []
+    candidates += [m.group(1) for m in _JSON_BLOCK_RE.finditer(output)]
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            found = {k: v for k, v in data.items() if k in ARTIFACT_KINDS and isinstance(v, list)}
+            if found:
+                return found
+        if isinstance(data, list) and all(isinstance(x, dict) for x in data):
+            return {"": data}
+    return None
+
+
+def _table_rows(lines: list[str]) -> list[dict[str, str]]:
+    header = [c.strip() for c in lines[0].strip().strip("|").split("|")]
+    rows = []
+    for line in lines[1:]:
+        if re.match(r"^\s*\|?\s*:?-{3,}", line):
+            continue
+        cells = [c.strip() for c in line.strip().strip("|").split("|")]
+        if len(cells) >= len(header):
+            rows.append({_FIELD_ALIASES.get(_norm_key(h), _norm_key(h)): _clean(c) for h, c in zip(header, cells) if h})
+    return rows
+
+
+def extract_artifacts(output: str, default_kind: str) -> dict[str, list[dict[str, Any]]]:
+    """
+    Parse one agent output into {kind: [item, ...]}.
+    Items start at headings, numbered lines or bold-only lines; "Field: value" lines become keys,
+    other lines are kept as a few short notes. Markdown tables become one item per row.
+    """
+    result: dict[str, list[dict[str, Any]]] = {}
+    parsed = _from_json(output or "")
+    if parsed:
+        for kind, items in parsed.items():
+            result.setdefault(kind or default_kind, []).extend(
+                {_FIELD_ALIASES.get(_norm_key(k), _norm_key(k)): (_clean(v) if isinstance(v, str) else v) for k, v in item.items()}
+                for item in items if isinstance(item, dict)
+            )
+        return result
+
+    kind = default_kind
+    item: Optional[dict[str, Any]] = None
+    pending_field: Optional[str] = None
+    table: list[str] = []
+
+    def _flush_item():
+        nonlocal item
+        # Title-only items (e.g. an "Analysis" heading with prose under it) carry no artifact fields.
+        if item and len(item) > 1:
+            result.setdefault(kind, []).append(item)
+        item = None
+
+    def _flush_table():
+        nonlocal table
+        if len(table) >= 2:
+            result.setdefault(kind, []).extend(_table_rows(table))
+        table = []
+
+    for line in (output or "").split("\n"):
+        if "|" in line and line.strip().startswith("|"):
+            table.append(line)
+            continue
+        _flush_table()
+        if not line.strip():
+            continue
+        m = _HEADING_RE.match(line) or _BOLD_LINE_RE.match(line)
+        if not m and (item is None or "**" in line):
+            m = _NUMBERED_RE.match(line)
+        if m:
+            title = _clean(m.group(1)).rstrip(":")
+            key = _FIELD_ALIASES.get(_norm_key(title))
+            if item is not None and key and key != "title":
+                # "**Evidence:**" on its own line: following lines belong to that field.
+                pending_field = key
+                continue
+            group = _group_for(title)
+            _flush_item()
+            pending_field = None
+            if group:
+                kind = group
+                continue
+            # "1. **Title:** rest" -> title plus summary
+            field = _FIELD_RE.match(title)
+            if field and _norm_key(field.group(1)) not in _FIELD_ALIASES:
+                item = {"title": _clean(field.group(1)), "summary": _clean(field.group(2))}
+            else:
+                item = {"title": title}
+            continue
+        if item is None:
+            continue
+        field = _FIELD_RE.match(line)
+        if field and _norm_key(field.group(1)) in _FIELD_ALIASES:
+            key = _FIELD_ALIASES[_norm_key(field.group(1))]
+            item[key] = _clean(field.group(2)) if key not in item else _clean(f"{item[key]}; {field.group(2)}")
+            pending_field = None
+            continue
+        text = _clean(line.lstrip("-*0123456789.) "))
+        if pending_field:
+            item[pending_field] = text if pending_field not in item else _clean(f"{item[pending_field]}; {text}")
+            continue
+        notes = item.setdefault("notes", [])
+        if len(notes) < MAX_NOTES:
+            notes.append(text)
+    _flush_table()
+    _flush_item()
+    return result
+
+
+def _signature(item: dict[str, Any]) -> set[str]:
+    text = " ".join(str(item.get(k, "")) for k in ("title", "segment", "brand", "mechanic", "summary", "opportunity", "description", "text"))
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def dedupe(items: list[dict[str, Any]], threshold: float = DUPLICATE_SIMILARITY) -> list[dict[str, Any]]:
+    """Drop items whose title/summary words overlap a kept item by >= threshold (Jaccard)."""
+    kept: list[dict[str, Any]] = []
+    signatures: list[set[str]] = []
+    for item in items:
+        sig = _signature(item) or set(json.dumps(item, sort_keys=True).lower().split())
+        if any(len(sig & s) / max(1, len(sig | s)) >= threshold for s in signatures):
+            continue
+        kept.append(item)
+        signatures.append(sig)
+    return kept
+
+
+def build_handoff(trend_output: str, customer_output: str, competitor_output: str) -> dict[str, list[dict[str, Any]]]:
+    """
+    Structured, deduplicated artifacts from the three evidence agents.
+    If an output yields no structure, its whitespace-collapsed text is forwarded as a single item so nothing is lost.
+    """
+    merged: dict[str, list[dict[str, Any]]] = {kind: [] for kind in ARTIFACT_KINDS}
+    for output, default_kind in (
+        (trend_output, "trend_briefs"),
+        (customer_output, "customer_insights"),
+        (competitor_output, "competitive_landscape"),
+    ):
+        artifacts = extract_artifacts(output, default_kind)
+        if not any(artifacts.values()):
+            text = re.sub(r"\s+", " ", output or "").strip()
+            if text:
+                artifacts = {default_kind: [{"text": text}]}
+        for kind, items in artifacts.items():
+            merged.setdefault(kind, []).extend(items)
+    return {kind: dedupe(items) for kind, items in merged.items()}
+
+
+def to_compact_json(items: Any) -> str:
+    """Minified JSON (no spaces, UTF-8 kept) for prompt hand-off."""
+    return json.dumps(items, separators=(",", ":"), ensure_ascii=False)
+
+
+def fit_to_tokens(items: list[dict[str, Any]], max_tokens: int) -> list[dict[str, Any]]:
+    """Leading items whose compact JSON fits max_tokens; whole items are dropped from the tail so the JSON stays valid."""
+    kept = list(items)
+    while kept and estimate_tokens(to_compact_json(kept)) > max_tokens:
+        kept.pop()
+    return kept
@@ -0,0 +1,391 @@
+"""
+Append-only ingestion of new data batches (daily transactions, feedback, trends, competitor observations).
+append_batch(table, rows) appends the rows to the table's CSV and/or month partitions (a new Parquet file per
+month touched; existing files are never rewritten), bumps data_version in manifest.json (so data_fingerprint, and
+with it every stage/semantic cache key, changes) and folds the batch into the table's derived artifacts in
+derived/<table>.json: row count, per-column aggregates (numeric count/sum/min/max, date range, categorical value
+counts), a fixed-size reservoir sample and a term index over the text columns. Only the batch is scanned; derived
+files that are missing or behind the manifest are rebuilt once from the full table.
+The orchestrator uses current derived artifacts for the agents' digests and samples instead of loading the tables.
+scripts/ingest.py is the command-line entry point.
+"""
+
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Union
+
+from src.data_loaders import (
+    DATA_FILES,
+    DATE_COLUMNS,
+    MANIFEST_NAME,
+    _load_table,
+    _parquet_supported,
+    get_data_dir,
+    read_manifest,
+)
+from src.storage import LocalStorage
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+TABLES = [name[: -len(".csv")] for name in DATA_FILES]
+DERIVED_DIR = "derived"
+PARQUET_DIR = "parquet"
+MANIFEST_VERSION = 1
+# Same row count as summarize_for_llm's sample.
+SAMPLE_ROWS = 80
+# Categorical columns stop counting values past this many distinct ones (ids, timestamps, free text).
+MAX_TRACKED_VALUES = 1000
+TEXT_COLUMNS = {"market_trends": ("text_content",), "customer_feedback": ("feedback_text",)}
+TOP_TERMS = 10
+INGEST_LOCK = "ingest"
+
+_BATCH_FILE_RE = re.compile(r"batch-(\d+)\.parquet$")
+_WORD_RE = re.compile(r"[a-z][a-z']{2,}")
+STOPWORDS = frozenset(
+    "the and for with that this you your are was were but not have has had they them their its it's our out all "
+    "can could would should will just like get got from more most very what when where which who why how any "
+    "one off too also than then there about into over some such only other being been doesn't don't i'm".split()
+)
+
+
+def _table_name(table: str) -> str:
+    name = table[: -len(".csv")] if table.endswith(".csv") else table
+    if name not in TABLES:
+        raise ValueError(f"Unknown table {table!r}; expected one of {', '.join(TABLES)}")
+    return name
+
+
+def _derived_path(data_dir: Path, table: str) -> Path:
+    return data_dir / DERIVED_DIR / f"{table}.json"
+
+
+def _write_json(path: Path, data: dict[str, Any], indent: Optional[int] = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data, indent=indent, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _read_stats(data_dir: Path, table: str) -> Optional[dict[str, Any]]:
+    try:
+        return json.loads(_derived_path(data_dir, table).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _column_kind(schema_type: Optional[str], column: str, table: str, series: "pd.Series") -> str:
+    import pandas as pd
+
+    if column == DATE_COLUMNS[f"{table}.csv"] or schema_type == "datetime":
+        return "date"
+    if schema_type is not None:
+        return "category" if schema_type == "string" else "numeric"
+    return "numeric" if pd.api.types.is_numeric_dtype(series) else "category"
+
+
+def _records(frame: "pd.DataFrame") -> list[dict[str, Any]]:
+    """JSON-ready rows (timestamps as text, NaN as null)."""
+    import pandas as pd
+
+    frame = frame.assign(**{c: frame[c].astype(str) for c in frame.columns if pd.api.types.is_datetime64_any_dtype(frame[c])})
+    return json.loads(frame.to_json(orient="records", force_ascii=False))
+
+
+def new_stats(table: str, columns: Iterable[str]) -> dict[str, Any]:
+    return {
+        "table": table,
+        "data_version": 0,
+        "rows": 0,
+        "columns": {c: {"kind": None, "count": 0} for c in columns},
+        "sample": [],
+        "terms": {c: {} for c in TEXT_COLUMNS.get(table, ())},
+    }
+
+
+def update_stats(stats: dict[str, Any], df: "pd.DataFrame", seed: int, schema: Optional[dict[str, str]] = None) -> None:
+    """Fold the rows of df into stats (in place): aggregates, reservoir sample (seeded by seed), term counts."""
+    import numpy as np
+    import pandas as pd
+
+    table = stats["table"]
+    for col, agg in stats["columns"].items():
+        s = df[col].dropna()
+        if agg["kind"] is None:
+            agg["kind"] = _column_kind((schema or {}).get(col), col, table, df[col])
+            if agg["kind"] == "category":
+                agg["values"] = {}
+            else:
+                agg.update({"min": None, "max": None}, **({"sum": 0.0} if agg["kind"] == "numeric" else {}))
+        if s.empty:
+            continue
+        agg["count"] += len(s)
+        if agg["kind"] == "numeric":
+            s = pd.to_numeric(s)
+            agg["sum"] += float(s.sum())
+            agg["min"] = float(s.min()) if agg["min"] is None else min(agg["min"], float(s.min()))
+            agg["max"] = float(s.max()) if agg["max"] is None else max(agg["max"], float(s.max()))
+        elif agg["kind"] == "date":
+            s = s.astype(str)
+            agg["min"] = s.min() if agg["min"] is None else min(agg["min"], s.min())
+            agg["max"] = s.max() if agg["max"] is None else max(agg["max"], s.max())
+        elif agg["values"] is not None:
+            values = agg["values"]
+            for value, n in s.astype(str).value_counts(sort=False).items():
+                values[value] = values.get(value, 0) + int(n)
+            if len(values) > MAX_TRACKED_VALUES:
+                agg["values"] = None
+
+    # Reservoir sample (algorithm R): every row seen so far is in the sample with equal probability.
+    sample, seen, n = stats["sample"], stats["rows"], len(df)
+    fill = min(max(SAMPLE_ROWS - len(sample), 0), n)
+    sample.extend(_records(df.iloc[:fill]))
+    if fill < n:
+        rng = np.random.default_rng([seed, TABLES.index(table)])
+        positions = np.arange(seen + fill, seen + n)
+        slots = rng.integers(0, positions + 1)
+        picked = np.nonzero(slots < SAMPLE_ROWS)[0]
+        for slot, record in zip(slots[picked], _records(df.iloc[fill + picked])):
+            sample[int(slot)] = record
+    stats["rows"] = seen + n
+
+    for col, terms in stats["terms"].items():
+        # Texts repeat (templates, pooled feedback): tokenize each distinct text once.
+        for text, count in df[col].dropna().astype(str).value_counts(sort=False).items():
+            for term in set(_WORD_RE.findall(text.lower())) - STOPWORDS:
+                terms[term] = terms.get(term, 0) + int(count)
+
+
+def describe_stats(stats: dict[str, Any], max_values: int = 6) -> str:
+    """describe_for_llm's digest from derived stats (plus date ranges and top terms of text columns)."""
+    lines = [f"rows={stats['rows']}"]
+    for col, agg in stats["columns"].items():
+        if not agg["count"]:
+            lines.append(f"{col}: (empty)")
+        elif agg["kind"] == "numeric":
+            lines.append(f"{col}: min={agg['min']:.2f} mean={agg['sum'] / agg['count']:.2f} max={agg['max']:.2f}")
+        elif agg["kind"] == "date":
+            lines.append(f"{col}: {agg['min'][:10]} to {agg['max'][:10]}")
+        elif agg["values"] is None:
+            lines.append(f"{col}: over {MAX_TRACKED_VALUES} distinct values")
+        elif len(agg["values"]) <= max(max_values * 4, 20):
+            top = sorted(agg["values"].items(), key=lambda kv: (-kv[1], kv[0]))[:max_values]
+            lines.append(f"{col}: " + ", ".join(f"{k} ({v})" for k, v in top))
+        else:
+            lines.append(f"{col}: {len(agg['values'])} distinct values")
+    for col, terms in stats["terms"].items():
+        top = sorted(terms.items(), key=lambda kv: (-kv[1], kv[0]))[:TOP_TERMS]
+        if top:
+            lines.append(f"{col} top terms: " + ", ".join(f"{t} ({n})" for t, n in top))
+    return "\n".join(lines)
+
+
+def sample_frame(stats: dict[str, Any]) -> "pd.DataFrame":
+    """The reservoir sample as a DataFrame, columns in table order."""
+    import pandas as pd
+
+    return pd.DataFrame(stats["sample"], columns=list(stats["columns"]))
+
+
+def _table_version(manifest: Optional[dict[str, Any]], table: str) -> int:
+    return int(((manifest or {}).get("tables", {}).get(table) or {}).get("data_version", 0))
+
+
+def current_stats(table: str, data_dir: Optional[Path] = None) -> Optional[dict[str, Any]]:
+    """
+    Derived stats for table if they match the manifest (same dataset, version and row count), else None.
+    A regenerated dataset restarts at version 0 with the same row counts, so generated_at tells the two apart.
+    """
+    d = data_dir or get_data_dir()
+    table = _table_name(table)
+    stats = _read_stats(d, table)
+    manifest = read_manifest(d)
+    if stats is None or manifest is None:
+        return None
+    info = manifest.get("tables", {}).get(table) or {}
+    if stats.get("generated_at") != manifest.get("generated_at"):
+        return None
+    if stats["data_version"] != _table_version(manifest, table) or stats["rows"] != info.get("rows"):
+        return None
+    return stats
+
+
+def _schema(manifest: dict[str, Any], table: str) -> Optional[dict[str, str]]:
+    return (manifest.get("tables", {}).get(table) or {}).get("schema")
+
+
+def _rebuild(data_dir: Path, table: str, manifest: dict[str, Any]) -> dict[str, Any]:
+    df = _load_table(f"{table}.csv", data_dir)
+    version = _table_version(manifest, table)
+    stats = new_stats(table, df.columns)
+    update_stats(stats, df, version, _schema(manifest, table))
+    stats.update({"data_version": version, "generated_at": manifest.get("generated_at")})
+    return stats
+
+
+def rebuild_derived(data_dir: Optional[Path] = None, tables: Optional[Iterable[str]] = None) -> dict[str, int]:
+    """Recompute derived/<table>.json from the full tables (all by default). Returns rows per table."""
+    d = data_dir or get_data_dir()
+    counts = {}
+    with LocalStorage(d).lock(INGEST_LOCK):
+        manifest = read_manifest(d) or _new_manifest()
+        for table in [_table_name(t) for t in (tables or TABLES)]:
+            stats = _rebuild(d, table, manifest)
+            _write_json(_derived_path(d, table), stats)
+            manifest["tables"].setdefault(table, {})["rows"] = stats["rows"]
+            counts[table] = stats["rows"]
+        _write_json(d / MANIFEST_NAME, manifest, indent=2)
+    return counts
+
+
+def _new_manifest() -> dict[str, Any]:
+    """Manifest for a data directory written before the generator produced one (CSV only)."""
+    return {"version": MANIFEST_VERSION, "generated_at": datetime.now().isoformat(timespec="seconds"), "tables": {}}
+
+
+def _columns(data_dir: Path, table: str, manifest: dict[str, Any]) -> list[str]:
+    schema = _schema(manifest, table)
+    if schema:
+        return list(schema)
+    csv_path = data_dir / f"{table}.csv"
+    if not csv_path.exists():
+        raise FileNotFoundError(f"Data not found: {csv_path}. Run scripts/generate_data.py first.")
+    with open(csv_path, "r", encoding="utf-8") as f:
+        return f.readline().strip().split(",")
+
+
+def _validate(df: "pd.DataFrame", table: str, columns: list[str], schema: Optional[dict[str, str]]) -> "pd.DataFrame":
+    """Batch in table column order; raises ValueError on missing/extra columns, bad dates or non-numeric values."""
+    import pandas as pd
+
+    missing = [c for c in columns if c not in df.columns]
+    extra = [c for c in df.columns if c not in columns]
+    if missing or extra:
+        raise ValueError(f"{table}: batch columns do not match the table (missing: {missing or '-'}, unexpected: {extra or '-'})")
+    df = df[columns].reset_index(drop=True)
+    date_col = DATE_COLUMNS[f"{table}.csv"]
+    bad_dates = int(pd.to_datetime(df[date_col], errors="coerce", format="mixed").isna().sum())
+    if bad_dates:
+        raise ValueError(f"{table}: {bad_dates} row(s) without a valid {date_col}")
+    for col, kind in (schema or {}).items():
+        if kind not in ("string", "datetime"):
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"{table}.{col}: expected numbers ({e})") from None
+    return df
+
+
+def _append_csv(path: Path, df: "pd.DataFrame") -> None:
+    with open(path, "rb+") as f:
+        if f.seek(0, os.SEEK_END):
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    df.to_csv(path, mode="a", header=False, index=False)
+
+
+def _append_partitions(data_dir: Path, table: str, df: "pd.DataFrame", partitions: dict[str, dict], version: int) -> None:
+    """One new Parquet file per month in the batch (same layout as scripts/generate_data.py)."""
+    import pandas as pd
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError(f"{table} is stored as Parquet partitions; appending needs pyarrow: pip install pyarrow")
+    date_col = DATE_COLUMNS[f"{table}.csv"]
+    dates = pd.to_datetime(df[date_col], format="mixed")
+    df = df.assign(**{date_col: dates})
+    for month, group in df.groupby(dates.dt.strftime("%Y-%m"), sort=True):
+        rel = f"{PARQUET_DIR}/{table}/month={month}/batch-{version:06d}.parquet"
+        path = data_dir / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        group.to_parquet(path, index=False)
+        entry = partitions.setdefault(month, {"rows": 0, "files": []})
+        entry["rows"] += len(group)
+        entry["files"].append(rel)
+
+
+def append_batch(
+    table: str,
+    rows: Union["pd.DataFrame", Iterable[dict[str, Any]]],
+    data_dir: Optional[Path] = None,
+) -> dict[str, Any]:
+    """
+    Append rows (DataFrame or dicts with the table's columns) to table and update its derived artifacts from the
+    batch alone. Serialized across threads and processes. Returns {table, rows, total_rows, data_version}.
+    """
+    import pandas as pd
+
+    d = data_dir or get_data_dir()
+    table = _table_name(table)
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    if df.empty:
+        raise ValueError(f"{table}: empty batch")
+    with LocalStorage(d).lock(INGEST_LOCK):
+        manifest = read_manifest(d) or _new_manifest()
+        schema = _schema(manifest, table)
+        df = _validate(df, table, _columns(d, table, manifest), schema)
+        stats = current_stats(table, d)
+        if stats is None:
+            stats = _rebuild(d, table, manifest)
+        version = int(manifest.get("data_version", 0)) + 1
+        info = manifest["tables"].setdefault(table, {"date_column": DATE_COLUMNS[f"{table}.csv"]})
+        csv_path = d / f"{table}.csv"
+        if not info.get("partitions") and not csv_path.exists():
+            raise FileNotFoundError(f"Data not found: {csv_path}. Run scripts/generate_data.py first.")
+        if info.get("partitions"):
+            _append_partitions(d, table, df, info["partitions"], version)
+            info["partitions"] = dict(sorted(info["partitions"].items()))
+        if csv_path.exists():
+            _append_csv(csv_path, df)
+        update_stats(stats, df, version, schema)
+        stats["data_version"] = version
+        # Data, then derived stats, then the manifest: a crash in between leaves stats that do not match the
+        # manifest, and they are rebuilt on the next append.
+        _write_json(_derived_path(d, table), stats)
+        info.update({"rows": stats["rows"], "data_version": version})
+        manifest["data_version"] = version
+        manifest.setdefault("batches", []).append({
+            "data_version": version,
+            "table": table,
+            "rows": len(df),
+            "ingested_at": datetime.now().isoformat(timespec="seconds"),
+        })
+        _write_json(d / MANIFEST_NAME, manifest, indent=2)
+    return {"table": table, "rows": len(df), "total_rows": stats["rows"], "data_version": version}
+
+
+def _batch_version(path: str) -> Optional[int]:
+    """Data version of a batch partition file written by _append_partitions (None for generated files)."""
+    m = _BATCH_FILE_RE.search(path)
+    return int(m.group(1)) if m else None
+
+
+def appended_rows(table: str, since_version: int, data_dir: Optional[Path] = None) -> Optional["pd.DataFrame"]:
+    """
+    Rows appended to table by the batches after data version since_version (their Parquet files, or the tail of
+    the CSV). None without a manifest; callers that saw different data (generated_at changed) must not use it.
+    """
+    import pandas as pd
+
+    d = data_dir or get_data_dir()
+    table = _table_name(table)
+    manifest = read_manifest(d)
+    if manifest is None:
+        return None
+    versions = {
+        b["data_version"] for b in manifest.get("batches", []) if b["table"] == table and b["data_version"] > since_version
+    }
+    if not versions:
+        return pd.DataFrame(columns=_columns(d, table, manifest))
+    info = manifest["tables"].get(table) or {}
+    csv_path = d / f"{table}.csv"
+    if info.get("partitions") and (_parquet_supported() or not csv_path.exists()):
+        files = [d / f for part in info["partitions"].values() for f in part["files"] if _batch_version(f) in versions]
+        return pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+    n = sum(b["rows"] for b in manifest["batches"] if b["table"] == table and b["data_version"] in versions)
+    return pd.read_csv(csv_path, skiprows=range(1, int(info["rows"]) - n + 1))
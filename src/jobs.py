@@ -0,0 +1,216 @@
+"""
+Background workflow jobs, decoupled from Streamlit reruns.
+run_workflow used to run inline in the script thread: any widget interaction during a run triggered a rerun that
+killed or blocked it. Jobs now run on a process-wide worker pool, keyed by the session ID the app assigns to the
+run. The UI only polls Job.snapshot() (status, progress messages, completed steps), so reruns and page reloads
+re-attach to the same job; submitting an ID that is already queued or running never starts it twice.
+Admission control: at most max_workers workflows run at once across all sessions; the rest wait in a FIFO queue
+(position shown in the UI). Each user may have at most per_user runs queued or running, and once max_queue runs
+are waiting new ones are shed with a clear message instead of piling more load on the gateway.
+"""
+
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from src.llm import env_number
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE = (QUEUED, RUNNING)
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_QUEUE = 20
+DEFAULT_PER_USER = 2
+# Finished jobs are kept this long for late pollers, then dropped (their sessions are on disk).
+FINISHED_TTL_S = 3600
+
+
+class AdmissionError(RuntimeError):
+    """A workflow was not admitted; the message is shown to the user."""
+
+
+class QueueFullError(AdmissionError):
+    pass
+
+
+class QuotaExceededError(AdmissionError):
+    pass
+
+
+class Job:
+    """One workflow run. Workers update it through the callbacks; readers take snapshot()s."""
+
+    def __init__(self, job_id: str, query: str, owner: str = "", seq: int = 0):
+        self.id = job_id
+        self.seq = seq
+        self.query = query
+        self.owner = owner
+        self.status = QUEUED
+        self.events: list[tuple[str, str]] = []
+        self.steps: list[dict[str, Any]] = []
+        self.row_counts: dict[str, int] = {}
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    # --- callbacks for run_workflow (called on the worker thread) ---
+    def on_agent_start(self, agent_name: str, status_message: str) -> None:
+        with self._lock:
+            self.events.append((agent_name, status_message))
+            self.row_counts[agent_name] = 0
+
+    def on_row(self, agent_name: str, table: str, row: dict[str, Any]) -> None:
+        with self._lock:
+            self.row_counts[agent_name] = self.row_counts.get(agent_name, 0) + 1
+
+    def on_step(self, step: dict[str, Any]) -> None:
+        with self._lock:
+            self.steps.append(step)
+
+    def _set(self, **fields: Any) -> None:
+        with self._lock:
+            for k, v in fields.items():
+                setattr(self, k, v)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Consistent copy for the UI: id, query, status, events, steps, row_counts, error, timings."""
+        with self._lock:
+            return {
+                "id": self.id,
+                "query": self.query,
+                "owner": self.owner,
+                "status": self.status,
+                "events": list(self.events),
+                "steps": list(self.steps),
+                "row_counts": dict(self.row_counts),
+                "error": self.error,
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+            }
+
+
+class JobManager:
+    """Runs jobs on a shared thread pool with admission control; one job per ID."""
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_WORKERS,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        per_user: int = DEFAULT_PER_USER,
+        finished_ttl_s: float = FINISHED_TTL_S,
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.per_user = per_user
+        self.finished_ttl_s = finished_ttl_s
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="workflow")
+        self._jobs: dict[str, Job] = {}
+        self._seq = 0
+        self._shed = 0
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: str, query: str, work: Callable[[Job], Any], owner: str = "") -> Job:
+        """
+        Queue work(job) under job_id and return the Job. If job_id is already known (queued, running or
+        recently finished) that job is returned unchanged: a reload never restarts a run.
+        Raises QuotaExceededError when owner already has per_user active runs, QueueFullError when the queue is full.
+        """
+        with self._lock:
+            self._prune()
+            existing = self._jobs.get(job_id)
+            if existing is not None:
+                return existing
+            active = [j for j in self._jobs.values() if j.status in ACTIVE]
+            if owner and self.per_user > 0 and sum(j.owner == owner for j in active) >= self.per_user:
+                self._shed += 1
+                raise QuotaExceededError(
+                    f"You already have {self.per_user} runs in progress. Wait for one to finish, then try again."
+                )
+            queued = sum(j.status == QUEUED for j in active)
+            if queued >= self.max_queue:
+                self._shed += 1
+                raise QueueFullError(
+                    f"The service is at capacity ({self.max_workers} runs in progress, {queued} waiting). "
+                    "Please try again in a few minutes."
+                )
+            self._seq += 1
+            job = Job(job_id, query, owner, self._seq)
+            self._jobs[job_id] = job
+        # The pool's work queue is FIFO, so jobs start in submission order.
+        self._pool.submit(self._run, job, work)
+        return job
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based place in the wait queue, or None if the job is not waiting."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return None
+            return 1 + sum(j.status == QUEUED and j.seq < job.seq for j in self._jobs.values())
+
+    def stats(self) -> dict[str, int]:
+        """running, queued, capacity (max concurrent runs), max_queue, shed (runs rejected so far)."""
+        with self._lock:
+            statuses = [j.status for j in self._jobs.values()]
+            return {
+                "running": statuses.count(RUNNING),
+                "queued": statuses.count(QUEUED),
+                "capacity": self.max_workers,
+                "max_queue": self.max_queue,
+                "shed": self._shed,
+            }
+
+    def _run(self, job: Job, work: Callable[[Job], Any]) -> None:
+        job._set(status=RUNNING, started=time.time())
+        try:
+            work(job)
+        except Exception as e:
+            job._set(status=FAILED, error=f"{e}\n\n{traceback.format_exc()}", finished=time.time())
+            return
+        job._set(status=DONE, finished=time.time())
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self) -> list[Job]:
+        with self._lock:
+            return [j for j in self._jobs.values() if j.status in ACTIVE]
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.finished_ttl_s
+        for job_id in [k for k, j in self._jobs.items() if j.finished and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Process-wide job manager. WORKFLOW_WORKERS (concurrent runs), WORKFLOW_QUEUE_MAX (waiting runs before
+    shedding) and WORKFLOW_PER_USER_MAX (active runs per user; 0 = no quota) configure admission.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(
+                max_workers=max(1, env_number("WORKFLOW_WORKERS", DEFAULT_WORKERS, int)),
+                max_queue=max(0, env_number("WORKFLOW_QUEUE_MAX", DEFAULT_MAX_QUEUE, int)),
+                per_user=max(0, env_number("WORKFLOW_PER_USER_MAX", DEFAULT_PER_USER, int)),
+            )
+        return _manager
@@ -5,9 +5,20 @@ LLM client for all agents.
 - When GEMINI_BASE_URL not set: uses google-generativeai (direct Gemini).
 """
 
+import hashlib
+import json
+import logging
 import os
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Optional
+
+from src.metrics import LLM_REQUESTS, LLM_SECONDS, LLM_TOKENS, LLM_WAIT_SECONDS, current_agent
+from src.prompt_budget import estimate_tokens
+from src.rate_limit import get_rate_limiter
+
+logger = logging.getLogger(__name__)
 
 # Load .env from project root (parent of src/)
 _env_loaded = False
@@ -23,6 +34,18 @@ def _load_dotenv():
     except ImportError:
         pass
 
+
+def env_number(name: str, default: Any, cast: Any = float) -> Any:
+    """Numeric setting from env/.env; unset or malformed values fall back to default."""
+    _load_dotenv()
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        return default
+
 # Lazy imports so app can run without key until workflow is triggered
 _genai = None
 
@@ -88,6 +111,26 @@ def get_base_url() -> Optional[str]:
     return None
 
 
+def get_model_name(model: Optional[str] = None) -> str:
+    """
+    Model the next call will use.
+    Gateway: GEMINI_MODEL from .env/env/secrets, else gemini-2.0-flash (key often allows gemini-2.0-flash, gemini-2.5-flash, etc.).
+    Direct Gemini: the explicit model argument, else gemini-1.5-flash.
+    """
+    _load_dotenv()
+    if get_base_url():
+        model_name = os.environ.get("GEMINI_MODEL")
+        if not model_name:
+            try:
+                import streamlit as st
+                if hasattr(st, "secrets") and st.secrets:
+                    model_name = st.secrets.get("GEMINI_MODEL")
+            except Exception:
+                pass
+        return model_name or "gemini-2.0-flash"
+    return model or "gemini-1.5-flash"
+
+
 def _get_client():
     global _genai
     if _genai is None:
@@ -99,16 +142,231 @@ def _get_client():
     return _genai
 
 
-def call_llm(system_prompt: str, user_content: str, model: str = "gemini-1.5-flash") -> str:
+def structured_output_enabled() -> bool:
+    """STRUCTURED_OUTPUT=1 in .env/env asks every agent for JSON matching its response schema."""
+    _load_dotenv()
+    return os.environ.get("STRUCTURED_OUTPUT", "").strip().lower() in ("1", "true", "yes")
+
+
+def context_caching_enabled() -> bool:
+    """CONTEXT_CACHE=1 in .env/env enables provider-side caching of static prompt prefixes."""
+    _load_dotenv()
+    return os.environ.get("CONTEXT_CACHE", "").strip().lower() in ("1", "true", "yes")
+
+
+class ContextCache:
+    """
+    Registry of cached prompt prefixes (system prompt + static data context), keyed by content hash.
+    The base class keeps handles in memory only: it is the local stand-in used on the gateway path
+    (where the provider caches marked prefixes itself) and in tests. GeminiContextCache creates real
+    provider-side cached contents.
+    """
+
+    # A failed create (quota, transient error, prefix below the provider minimum) is retried after this long.
+    FAILURE_RETRY_SECONDS = 60
+
+    def __init__(self, ttl_seconds: Optional[int] = None, failure_retry_seconds: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds or env_number("CONTEXT_CACHE_TTL_SECONDS", 3600, int)
+        self.failure_retry_seconds = self.FAILURE_RETRY_SECONDS if failure_retry_seconds is None else failure_retry_seconds
+        self._entries: dict[str, tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+        self._too_small: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, system_prompt: str, prefix: str) -> str:
+        h = hashlib.sha256()
+        for part in (model, system_prompt, prefix):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _create(self, model: str, system_prompt: str, prefix: str) -> Any:
+        """Create the provider-side entry; return a handle, or None if the prefix cannot be cached."""
+        return self.key(model, system_prompt, prefix)
+
+    def min_tokens(self, model: str) -> int:
+        """Smallest system prompt + prefix (estimated tokens) the provider caches; 0 = no minimum."""
+        return 0
+
+    def get_or_create(self, model: str, system_prompt: str, prefix: str) -> Any:
+        """
+        Handle for the cached prefix (created on first use, re-created after TTL), or None if uncacheable.
+        Prefixes below min_tokens(model) are not sent to the provider at all (logged once per model).
+        """
+        minimum = self.min_tokens(model)
+        if minimum and estimate_tokens(system_prompt + "\n" + prefix) < minimum:
+            with self._lock:
+                first = model not in self._too_small
+                self._too_small.add(model)
+            if first:
+                logger.info("Context cache skipped for %s: prompt prefix is below the %d-token minimum", model, minimum)
+            return None
+        k = self.key(model, system_prompt, prefix)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(k)
+            if entry and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        try:
+            handle = self._create(model, system_prompt, prefix)
+            expires = now + self.ttl_seconds
+        except Exception:
+            # Too small for the provider's minimum, unsupported model, quota...: send uncached, retry shortly.
+            handle = None
+            expires = now + self.failure_retry_seconds
+        with self._lock:
+            self._entries[k] = (handle, expires)
+        return handle
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class GeminiContextCache(ContextCache):
+    """
+    Direct Gemini: prefixes become google.generativeai CachedContent objects.
+    CachedContent has a minimum size. Google's documented minimums when this was written were 32,768 input tokens
+    on Gemini 1.5, 4,096 on 2.0 and 2.5 Pro, and 1,024 on 2.5 Flash (MIN_TOKENS, longest model prefix wins;
+    CONTEXT_CACHE_MIN_TOKENS overrides). Agent prompts are kept to the prompt budget (6-12k tokens), so on 1.5 models
+    nothing is cached; smaller prefixes are sent uncached instead of failing a create call on every run.
+    """
+
+    MIN_TOKENS = {
+        "gemini-1.5": 32768,
+        "gemini-2.0": 4096,
+        "gemini-2.5-pro": 4096,
+        "gemini-2.5-flash": 1024,
+    }
+    # Unknown models: assume the largest minimum.
+    DEFAULT_MIN_TOKENS = 32768
+
+    def min_tokens(self, model: str) -> int:
+        override = env_number("CONTEXT_CACHE_MIN_TOKENS", 0, int)
+        if override:
+            return override
+        name = model.removeprefix("models/")
+        matches = [p for p in self.MIN_TOKENS if name.startswith(p)]
+        return self.MIN_TOKENS[max(matches, key=len)] if matches else self.DEFAULT_MIN_TOKENS
+
+    def _create(self, model: str, system_prompt: str, prefix: str) -> Any:
+        import datetime
+        genai = _get_client()
+        return genai.caching.CachedContent.create(
+            model=model if model.startswith("models/") else f"models/{model}",
+            system_instruction=system_prompt,
+            contents=[prefix] if prefix else [],
+            ttl=datetime.timedelta(seconds=self.ttl_seconds),
+        )
+
+
+_context_cache: Optional[ContextCache] = None
+
+
+def get_context_cache() -> ContextCache:
+    """Process-wide context cache for the active provider (Gemini cached contents, or local bookkeeping on the gateway)."""
+    global _context_cache
+    if _context_cache is None:
+        _context_cache = ContextCache() if get_base_url() else GeminiContextCache()
+    return _context_cache
+
+
+def set_context_cache(cache: Optional[ContextCache]) -> None:
+    """Replace the process-wide context cache (tests, or a custom provider implementation)."""
+    global _context_cache
+    _context_cache = cache
+
+
+def _split_prefix(user_content: str, cached_prefix: Optional[str]) -> tuple[Optional[str], str]:
+    """(prefix, suffix) when user_content starts with cached_prefix, else (None, user_content)."""
+    if cached_prefix is None or not user_content.startswith(cached_prefix):
+        return None, user_content
+    return cached_prefix, user_content[len(cached_prefix):].lstrip("\n")
+
+
+def call_llm(
+    system_prompt: str,
+    user_content: str,
+    model: Optional[str] = None,
+    response_schema: Optional[dict[str, Any]] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+    cached_prefix: Optional[str] = None,
+    temperature: Optional[float] = None,
+    seed: Optional[int] = None,
+) -> str:
     """
     Call LLM with system + user content. Returns full text response.
     When GEMINI_BASE_URL is set, uses OpenAI-compatible client (e.g. AI Gateway).
     Otherwise uses Google Generative AI (Gemini) directly.
+    model: explicit model (e.g. from src/routing.py); default is get_model_name().
+    response_schema: JSON schema; the model is asked for JSON output matching it (structured-output mode).
+    on_token: if given, the response is streamed and on_token(text_chunk) is called as chunks arrive.
+    cached_prefix: static leading part of user_content (data context; "" = system prompt only). With CONTEXT_CACHE=1
+    the system prompt + prefix are served from the provider's context cache and only the remaining suffix is sent.
+    temperature, seed: sampling settings (provider defaults when None; direct Gemini has no seed).
     Raises if GEMINI_API_KEY is missing or API fails.
     """
     key = get_api_key()
     if not key:
         raise ValueError("GEMINI_API_KEY not set. Set it in environment or Streamlit secrets.")
+    return _metered(
+        model,
+        system_prompt + "\n" + user_content,
+        lambda: _complete(
+            key, system_prompt, user_content, model, response_schema, on_token, cached_prefix, _sampling(temperature, seed),
+        ),
+    )
+
+
+def _sampling(temperature: Optional[float], seed: Optional[int]) -> dict[str, Any]:
+    """Sampling settings that were set, as OpenAI-style request fields."""
+    return {k: v for k, v in (("temperature", temperature), ("seed", seed)) if v is not None}
+
+
+def _gemini_sampling(sampling: dict[str, Any]) -> Optional[dict[str, Any]]:
+    # google-generativeai's generation config has no seed.
+    return {"temperature": sampling["temperature"]} if "temperature" in sampling else None
+
+
+def _metered(model: Optional[str], prompt: str, request: Callable[[], Any], completion: Callable[[Any], str] = str) -> Any:
+    """Run one provider request under the shared rate limit, recording wait, latency, outcome and token metrics."""
+    # Shared across sessions and background jobs (see src/rate_limit.py).
+    t0 = time.perf_counter()
+    get_rate_limiter().acquire()
+    LLM_WAIT_SECONDS.observe(time.perf_counter() - t0)
+
+    agent = current_agent()
+    model_label = model or get_model_name()
+    t0 = time.perf_counter()
+    try:
+        result = request()
+    except Exception as e:
+        LLM_REQUESTS.inc(agent=agent, model=model_label, status=type(e).__name__)
+        raise
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - t0, agent=agent, model=model_label)
+    LLM_REQUESTS.inc(agent=agent, model=model_label, status="ok")
+    LLM_TOKENS.inc(estimate_tokens(prompt), agent=agent, model=model_label, kind="prompt")
+    LLM_TOKENS.inc(estimate_tokens(completion(result)), agent=agent, model=model_label, kind="completion")
+    return result
+
+
+def _complete(
+    key: str,
+    system_prompt: str,
+    user_content: str,
+    model: Optional[str],
+    response_schema: Optional[dict[str, Any]],
+    on_token: Optional[Callable[[str], None]],
+    cached_prefix: Optional[str],
+    sampling: dict[str, Any],
+) -> str:
+    """One request to the gateway or Gemini (call_llm after the key check and rate limit)."""
+    prefix, suffix = _split_prefix(user_content, cached_prefix) if context_caching_enabled() else (None, user_content)
 
     base_url = get_base_url()
     if base_url:
@@ -119,35 +377,226 @@ def call_llm(system_prompt: str, user_content: str, model: str = "gemini-1.5-fla
         except ImportError:
             raise ImportError("Install openai: pip install openai")
         client = OpenAI(api_key=key, base_url=base_url)
-        # Default gemini-2.0-flash for gateway (key often allows gemini-2.0-flash, gemini-2.5-flash, etc.)
-        model_name = os.environ.get("GEMINI_MODEL")
-        if not model_name:
-            try:
-                import streamlit as st
-                if hasattr(st, "secrets") and st.secrets:
-                    model_name = st.secrets.get("GEMINI_MODEL")
-            except Exception:
-                pass
-        model_name = model_name or "gemini-2.0-flash"
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
+        model_name = model or get_model_name()
+        kwargs: dict[str, Any] = dict(sampling)
+        if response_schema:
+            kwargs["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "agent_output", "schema": response_schema},
+            }
+        if prefix is not None:
+            # Gateway caches the marked blocks provider-side (e.g. LiteLLM -> Gemini context caching); the
+            # local registry only tracks reuse.
+            get_context_cache().get_or_create(model_name, system_prompt, prefix)
+            cache_control = {"type": "ephemeral"}
+            user_parts = [{"type": "text", "text": prefix, "cache_control": cache_control}] if prefix else []
+            messages = [
+                {"role": "system", "content": [{"type": "text", "text": system_prompt, "cache_control": cache_control}]},
+                {"role": "user", "content": user_parts + [{"type": "text", "text": suffix}]},
+            ]
+        else:
+            messages = [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_content},
-            ],
-        )
+            ]
+        if on_token:
+            parts = []
+            for chunk in client.chat.completions.create(model=model_name, messages=messages, stream=True, **kwargs):
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    on_token(delta)
+            text = "".join(parts).strip()
+            if not text:
+                raise RuntimeError(f"Empty streamed response from {model_name}")
+            return text
+        response = client.chat.completions.create(model=model_name, messages=messages, **kwargs)
         if not response.choices or not response.choices[0].message.content:
             raise RuntimeError(f"Empty response from {model_name}: {response}")
         return response.choices[0].message.content.strip()
 
     # Direct Gemini
+    model = get_model_name(model)
     genai = _get_client()
     genai.configure(api_key=key)
-    model_obj = genai.GenerativeModel(
-        model_name=model,
-        system_instruction=system_prompt,
-    )
-    response = model_obj.generate_content(user_content)
+    cached = get_context_cache().get_or_create(model, system_prompt, prefix) if prefix is not None else None
+    if cached is not None:
+        model_obj = genai.GenerativeModel.from_cached_content(cached_content=cached)
+        contents = suffix
+    else:
+        model_obj = genai.GenerativeModel(
+            model_name=model,
+            system_instruction=system_prompt,
+        )
+        contents = user_content
+    generation_config = _gemini_sampling(sampling)
+    if response_schema:
+        generation_config = {**(generation_config or {}), "response_mime_type": "application/json", "response_schema": response_schema}
+    if on_token:
+        parts = []
+        for chunk in model_obj.generate_content(contents, generation_config=generation_config, stream=True):
+            if chunk.text:
+                parts.append(chunk.text)
+                on_token(chunk.text)
+        if not parts:
+            raise RuntimeError(f"Empty streamed response from {model}")
+        return "".join(parts)
+    response = model_obj.generate_content(contents, generation_config=generation_config)
     if not response.text:
         raise RuntimeError(f"Empty response from {model}: {getattr(response, 'prompt_feedback', '')}")
     return response.text
+
+
+# Model/tool round trips per call_llm_with_tools; the round after the last one must answer without tools.
+DEFAULT_TOOL_ROUNDS = 4
+
+
+def _run_tool(execute: Callable[[str, dict[str, Any]], Any], name: str, arguments: Any) -> str:
+    """One tool call as the JSON text sent back to the model; failures are reported to it as {"error": ...}."""
+    try:
+        args = json.loads(arguments or "{}") if isinstance(arguments, str) else dict(arguments or {})
+        result = execute(name, args)
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    return json.dumps(result, ensure_ascii=False, default=str)
+
+
+def _plain(value: Any) -> Any:
+    """Gemini function-call arguments (proto maps and lists) as plain dicts and lists."""
+    if isinstance(value, str):
+        return value
+    if hasattr(value, "items"):
+        return {k: _plain(v) for k, v in value.items()}
+    if hasattr(value, "__iter__"):
+        return [_plain(v) for v in value]
+    return value
+
+
+def call_llm_with_tools(
+    system_prompt: str,
+    user_content: str,
+    tools: list[dict[str, Any]],
+    execute: Callable[[str, dict[str, Any]], Any],
+    model: Optional[str] = None,
+    max_rounds: Optional[int] = None,
+    temperature: Optional[float] = None,
+    seed: Optional[int] = None,
+) -> str:
+    """
+    call_llm with function calling. tools: declarations ({"name", "description", "parameters": JSON schema});
+    execute(name, arguments) runs one call and returns a JSON-serializable result. The model may call tools for up
+    to max_rounds rounds (default TOOL_ROUNDS env or DEFAULT_TOOL_ROUNDS), then has to answer. Every round is one
+    request under the shared rate limit and metrics, like call_llm. temperature and seed as in call_llm. Returns
+    the final text.
+    Responses are not streamed, and output schemas are not enforced (providers do not combine them with tools):
+    callers that want JSON ask for it in the prompt.
+    """
+    key = get_api_key()
+    if not key:
+        raise ValueError("GEMINI_API_KEY not set. Set it in environment or Streamlit secrets.")
+    sampling = _sampling(temperature, seed)
+    rounds = max(0, max_rounds if max_rounds is not None else env_number("TOOL_ROUNDS", DEFAULT_TOOL_ROUNDS, int))
+    base_url = get_base_url()
+    if base_url:
+        return _tool_loop_gateway(key, base_url, system_prompt, user_content, tools, execute, model, rounds, sampling)
+    return _tool_loop_gemini(key, system_prompt, user_content, tools, execute, model, rounds, sampling)
+
+
+def _tool_loop_gateway(
+    key: str,
+    base_url: str,
+    system_prompt: str,
+    user_content: str,
+    tools: list[dict[str, Any]],
+    execute: Callable[[str, dict[str, Any]], Any],
+    model: Optional[str],
+    rounds: int,
+    sampling: dict[str, Any],
+) -> str:
+    _load_dotenv()
+    try:
+        from openai import OpenAI
+    except ImportError:
+        raise ImportError("Install openai: pip install openai")
+    client = OpenAI(api_key=key, base_url=base_url)
+    model_name = model or get_model_name()
+    specs = [{"type": "function", "function": t} for t in tools]
+    messages: list[dict[str, Any]] = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content},
+    ]
+    prompt = system_prompt + "\n" + user_content
+    for done in range(rounds + 1):
+        final = done == rounds
+
+        def request() -> Any:
+            response = client.chat.completions.create(
+                model=model_name, messages=messages, tools=specs, tool_choice="none" if final else "auto", **sampling,
+            )
+            if not response.choices:
+                raise RuntimeError(f"Empty response from {model_name}: {response}")
+            return response.choices[0].message
+
+        message = _metered(model, prompt, request, lambda m: (m.content or "") + "".join(
+            c.function.arguments or "" for c in m.tool_calls or []
+        ))
+        calls = [] if final else message.tool_calls or []
+        if not calls:
+            if not message.content:
+                raise RuntimeError(f"Empty response from {model_name}: {message}")
+            return message.content.strip()
+        messages.append({
+            "role": "assistant",
+            "content": message.content,
+            "tool_calls": [
+                {"id": c.id, "type": "function", "function": {"name": c.function.name, "arguments": c.function.arguments}}
+                for c in calls
+            ],
+        })
+        for c in calls:
+            result = _run_tool(execute, c.function.name, c.function.arguments)
+            messages.append({"role": "tool", "tool_call_id": c.id, "content": result})
+            prompt += "\n" + c.function.arguments + "\n" + result
+    raise AssertionError("the final round always answers")
+
+
+def _tool_loop_gemini(
+    key: str,
+    system_prompt: str,
+    user_content: str,
+    tools: list[dict[str, Any]],
+    execute: Callable[[str, dict[str, Any]], Any],
+    model: Optional[str],
+    rounds: int,
+    sampling: dict[str, Any],
+) -> str:
+    model = get_model_name(model)
+    genai = _get_client()
+    genai.configure(api_key=key)
+    chat = genai.GenerativeModel(
+        model_name=model,
+        system_instruction=system_prompt,
+        tools=[{"function_declarations": tools}],
+    ).start_chat()
+    content: Any = user_content
+    prompt = system_prompt + "\n" + user_content
+    for done in range(rounds + 1):
+        final = done == rounds
+        config = {"function_calling_config": {"mode": "NONE" if final else "AUTO"}}
+        response = _metered(
+            model, prompt, lambda: chat.send_message(content, generation_config=_gemini_sampling(sampling), tool_config=config),
+            lambda r: "".join(getattr(p, "text", "") or "" for p in r.parts),
+        )
+        calls = [] if final else [p.function_call for p in response.parts if p.function_call and p.function_call.name]
+        if not calls:
+            if not response.text:
+                raise RuntimeError(f"Empty response from {model}: {getattr(response, 'prompt_feedback', '')}")
+            return response.text
+        content = []
+        for c in calls:
+            result = _run_tool(execute, c.name, _plain(c.args))
+            content.append(genai.protos.Part(function_response=genai.protos.FunctionResponse(
+                name=c.name, response={"result": json.loads(result)},
+            )))
+            prompt += "\n" + result
+    raise AssertionError("the final round always answers")
@@ -0,0 +1,342 @@
+"""
+In-process metrics (Prometheus text format) for the app process.
+Counters and histograms are sharded per thread: each thread only ever updates its own shard, so the hot path
+(call_llm, loaders, session I/O) takes no lock and concurrent sessions never lose an update; readers sum the
+shards. A thread's shard is folded into a shared total when the thread exits, so short-lived script threads do
+not pile up. Gauges are read at scrape time from callbacks (queue depth, session count, cache sizes).
+Exposure (start_exporter(), once per process): METRICS_PORT serves GET /metrics over HTTP next to Streamlit;
+METRICS_FILE is rewritten every METRICS_INTERVAL_S seconds (for sidecars / node-exporter textfile collectors).
+agent_label(name) tags the LLM calls made inside it with the calling agent.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import os
+import threading
+import time
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, Union
+
+# Seconds; covers fast local work (loads, session I/O) through slow LLM calls and whole runs.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+DEFAULT_INTERVAL_S = 15.0
+
+_agent: contextvars.ContextVar[str] = contextvars.ContextVar("metrics_agent", default="")
+
+
+@contextlib.contextmanager
+def agent_label(agent: str) -> Iterator[None]:
+    """Attribute the metrics recorded inside (LLM calls) to agent."""
+    token = _agent.set(agent)
+    try:
+        yield
+    finally:
+        _agent.reset(token)
+
+
+def current_agent() -> str:
+    return _agent.get() or "other"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Shard:
+    """One thread's values; dropping it (thread exit) folds the values into the metric's total."""
+
+    __slots__ = ("values", "__weakref__")
+
+    def __init__(self):
+        self.values: dict[tuple[str, ...], Any] = {}
+
+
+class _Sharded:
+    """Per-thread value dicts: writers touch only their own, readers merge all of them."""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._live: dict[int, dict[tuple[str, ...], Any]] = {}
+        self._retired: dict[tuple[str, ...], Any] = {}
+
+    def _values(self) -> dict[tuple[str, ...], Any]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._live[id(shard)] = shard.values
+            weakref.finalize(shard, self._retire, id(shard))
+        return shard.values
+
+    def _retire(self, shard_id: int) -> None:
+        with self._lock:
+            values = self._live.pop(shard_id, None)
+            if values:
+                for key, value in values.items():
+                    self._retired[key] = self._merge(self._retired.get(key), value)
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    @staticmethod
+    def _merge(total: Any, value: Any) -> Any:
+        raise NotImplementedError
+
+    def collect(self) -> dict[tuple[str, ...], Any]:
+        """Merged values across threads, by label values."""
+        with self._lock:
+            shards = [dict(v) for v in self._live.values()]
+            total = dict(self._retired)
+        for shard in shards:
+            for key, value in shard.items():
+                total[key] = self._merge(total.get(key), value)
+        return total
+
+
+class Counter(_Sharded):
+    """Monotonic count (e.g. requests by status)."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        values = self._values()
+        key = self._key(labels)
+        values[key] = values.get(key, 0) + amount
+
+    @staticmethod
+    def _merge(total: Any, value: Any) -> Any:
+        return (total or 0) + value
+
+    def value(self, **labels: Any) -> float:
+        return self.collect().get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_labels_text(self.labelnames, k)} {_fmt(v)}" for k, v in sorted(self.collect().items())]
+
+
+class Histogram(_Sharded):
+    """Distribution of observed values (seconds, bytes...) over fixed buckets, with sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        values = self._values()
+        key = self._key(labels)
+        # [per-bucket counts..., overflow count, sum, count]
+        entry = values.get(key)
+        if entry is None:
+            entry = values[key] = [0] * (len(self.buckets) + 3)
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the duration of the enclosed block (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def _merge(total: Any, value: Any) -> Any:
+        return list(value) if total is None else [a + b for a, b in zip(total, value)]
+
+    def count(self, **labels: Any) -> int:
+        entry = self.collect().get(self._key(labels))
+        return entry[-1] if entry else 0
+
+    def render(self) -> list[str]:
+        lines = []
+        for key, entry in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), entry[:-2]):
+                cumulative += n
+                le = 'le="' + _fmt(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labelnames, key)} {_fmt(entry[-2])}")
+            lines.append(f"{self.name}_count{_labels_text(self.labelnames, key)} {entry[-1]}")
+        return lines
+
+
+GaugeValue = Union[float, dict[tuple[str, ...], float]]
+
+
+class Gauge:
+    """Current value read at scrape time from fn: a number, or {label values: number}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...], fn: Callable[[], GaugeValue]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def collect(self) -> dict[tuple[str, ...], float]:
+        try:
+            value = self.fn()
+        except Exception:
+            return {}
+        return value if isinstance(value, dict) else {(): value}
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_labels_text(self.labelnames, k)} {_fmt(v)}" for k, v in sorted(self.collect().items())]
+
+
+class Registry:
+    """Named metrics; counter()/histogram()/gauge() return the existing metric for a name."""
+
+    def __init__(self):
+        self._metrics: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = factory()
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._get(name, lambda: Counter(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get(name, lambda: Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], GaugeValue], labelnames: tuple[str, ...] = ()) -> Gauge:
+        """Register (or re-point) a callback gauge."""
+        gauge = self._get(name, lambda: Gauge(name, help, labelnames, fn))
+        gauge.fn = fn
+        return gauge
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for name in sorted(self._metrics):
+            metric = self._metrics[name]
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- Metrics recorded by the app (one definition each, shared by the instrumented modules) ---
+WORKFLOWS = REGISTRY.counter("workflows_total", "Workflow runs by outcome (started, completed, failed).", ("status",))
+WORKFLOW_SECONDS = REGISTRY.histogram("workflow_duration_seconds", "Wall time of completed workflow runs.")
+LLM_REQUESTS = REGISTRY.counter("llm_requests_total", "LLM calls by agent, model and outcome.", ("agent", "model", "status"))
+LLM_SECONDS = REGISTRY.histogram("llm_request_duration_seconds", "LLM call latency by agent and model.", ("agent", "model"))
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "Estimated tokens by agent, model and kind (prompt, completion).", ("agent", "model", "kind"))
+LLM_WAIT_SECONDS = REGISTRY.histogram("llm_rate_limit_wait_seconds", "Time LLM calls waited for the shared rate limit.")
+CACHE_LOOKUPS = REGISTRY.counter("cache_lookups_total", "Cache lookups by cache and result (hit, miss).", ("cache", "result"))
+DATA_LOAD_SECONDS = REGISTRY.histogram("data_load_duration_seconds", "Table load time by table and format.", ("table", "format"))
+SESSION_IO_SECONDS = REGISTRY.histogram("session_io_duration_seconds", "Session store operation time.", ("op",))
+
+
+def serve_metrics(registry: Registry = REGISTRY, host: str = "0.0.0.0", port: int = 0) -> ThreadingHTTPServer:
+    """HTTP server answering GET /metrics (already listening; port=0 picks a free port)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0].rstrip("/") not in ("", "/metrics"):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def write_metrics_file(path: Path, registry: Registry = REGISTRY) -> None:
+    """Replace path with the current metrics (atomic rename, so scrapers never read a partial file)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(registry.render(), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+_exporter: Optional[dict[str, Any]] = None
+_exporter_lock = threading.Lock()
+
+
+def start_exporter(registry: Registry = REGISTRY) -> dict[str, Any]:
+    """
+    Start the configured exporters once per process: METRICS_PORT (HTTP /metrics) and/or METRICS_FILE (rewritten
+    every METRICS_INTERVAL_S). Returns {"port": ..., "file": ...} (None for what is not configured).
+    """
+    from src.llm import env_number  # src.llm imports this module
+
+    global _exporter
+    with _exporter_lock:
+        if _exporter is not None:
+            return _exporter
+        _exporter = {"port": None, "file": None}
+        port = env_number("METRICS_PORT", 0, int)
+        if port > 0:
+            try:
+                server = serve_metrics(registry, os.environ.get("METRICS_HOST", "0.0.0.0"), port)
+            except OSError:
+                server = None  # another process on this host already serves the port
+            if server is not None:
+                threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+                _exporter["port"] = server.server_address[1]
+        path = os.environ.get("METRICS_FILE", "").strip()
+        if path:
+            interval = max(1.0, env_number("METRICS_INTERVAL_S", DEFAULT_INTERVAL_S, float))
+
+            def _write_loop():
+                while True:
+                    try:
+                        write_metrics_file(Path(path), registry)
+                    except OSError:
+                        pass
+                    time.sleep(interval)
+
+            threading.Thread(target=_write_loop, name="metrics-file", daemon=True).start()
+            _exporter["file"] = path
+        return _exporter
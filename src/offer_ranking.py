@@ -0,0 +1,373 @@
+"""
+Multi-candidate Offer Design: K parallel design calls, merged and ranked by a deterministic scorer.
+design_offer_candidates runs Offer Design K times at once with different sampling settings (temperature spread over
+CANDIDATE_TEMPERATURES, one seed per candidate). Every call goes through the shared rate limit, so wall time is
+about one call while K stays under the limit. The offers of every candidate are parsed into records (parse_offers),
+near-identical ones are merged (merge_offers: the same offer proposed by several candidates counts as agreement),
+and OfferScorer ranks them. The top TOP_N become the step's output, as markdown or as offer_concepts JSON.
+The scorer only uses the inputs and the data, never another LLM call, so the same candidates always give the same
+ranking. Each offer gets four scores between 0 and 1:
+- evidence: how many of the three sources (trends, customers, competitors) the offer cites, and how many of the
+  upstream artifact kinds share terms with it;
+- segment_fit: whether the target matches the requested segment (or a profiled one), and the share of visits on
+  the offer's channel in the transaction data;
+- whitespace: overlap with the whitespace opportunities, less how common the mechanic is among competitor
+  observations;
+- agreement: the share of candidates that proposed the offer.
+The weighted sum (WEIGHTS) is the score. OFFER_CANDIDATES sets K (1 = a single call, as before).
+"""
+
+import contextvars
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+from src.agents.offer_design import run as run_offer_design
+from src.data_loaders import get_data_dir, load_competitor_intel, load_customer_transactions
+from src.handoff import extract_artifacts
+from src.ingest import current_stats
+from src.llm import env_number
+from src.semantic_cache import _canonical_tokens
+from src.structured import parse_tables
+
+TOP_N = 3
+MAX_CANDIDATES = 8
+# Temperatures of the first and last candidate; the others are spread evenly in between.
+CANDIDATE_TEMPERATURES = (0.4, 1.0)
+OFFER_SIMILARITY = 0.5
+WEIGHTS = {"evidence": 0.35, "segment_fit": 0.3, "whitespace": 0.25, "agreement": 0.1}
+
+OFFER_FIELDS = ("name", "mechanic", "channel", "duration", "target", "evidence", "rationale", "feasibility", "impact")
+# Field names as Offer Design writes them (JSON keys, table headers, "Field:" lines) -> record field.
+_OFFER_ALIASES = {
+    "name": "name",
+    "title": "name",
+    "offer": "name",
+    "offer_name": "name",
+    "mechanic": "mechanic",
+    "channel": "channel",
+    "duration": "duration",
+    "target": "target",
+    "target_segment": "target",
+    "segment": "target",
+    "evidence": "evidence",
+    "evidence_map": "evidence",
+    "rationale": "rationale",
+    "why": "rationale",
+    "feasibility": "feasibility",
+    "impact": "impact",
+    "expected_impact": "impact",
+}
+# Words that show an offer cites each upstream source.
+SOURCE_TERMS = {
+    "trends": ("trend", "market", "social", "velocity"),
+    "customers": ("customer", "insight", "segment", "transaction", "feedback", "redemption"),
+    "competitors": ("competitor", "whitespace", "landscape", "mcdonald", "burger king", "taco bell", "chick-fil-a"),
+}
+# Channel words in offers -> channel values in the transaction data; "all channels" fits every visit.
+CHANNEL_TERMS = {"app": ("app", "mobile", "digital", "online"), "in-store": ("in-store", "store", "dine"), "drive-thru": ("drive",)}
+ALL_CHANNELS = ("all-channels", "all channels", "omni", "every channel")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_NUMBERED_NAME_RE = re.compile(r"^(offer|concept|option)\s*#?\d+\s*$", re.IGNORECASE)
+_NAME_PREFIX_RE = re.compile(r"^(offer|concept|option)\s*#?\d+\s*[:.\-\u2013\u2014]\s*", re.IGNORECASE)
+# Short, common words that say nothing about an offer's content.
+_STOPWORDS = frozenset(
+    "the and for with that this your are was but not from into over more most very will can all any each per "
+    "via new get off its our their they them than then also offer offers wendy wendys customers customer".split()
+)
+
+
+def offer_candidates_setting() -> int:
+    """K from OFFER_CANDIDATES in .env/env (default 1: one Offer Design call)."""
+    return env_number("OFFER_CANDIDATES", 1, int)
+
+
+def candidate_settings(k: int) -> list[dict[str, Any]]:
+    """Sampling settings per candidate: temperatures spread over CANDIDATE_TEMPERATURES, seeds 1..k."""
+    low, high = CANDIDATE_TEMPERATURES
+    return [
+        {"temperature": round(low + (high - low) * i / (k - 1), 2) if k > 1 else low, "seed": i + 1}
+        for i in range(k)
+    ]
+
+
+def _segments(text: Any, with_default: bool = False) -> set[str]:
+    """Canonical segment tokens (seg_*) named in text; with_default adds the agents' default when none is named."""
+    tokens, defaults = _canonical_tokens(str(text or ""))
+    return {t for t in tokens + (defaults if with_default else []) if t.startswith("seg_")}
+
+
+def _words(text: Any) -> set[str]:
+    # Numbers stay: "2 for $4" and "4 for $4" are different offers.
+    return {w for w in _WORD_RE.findall(str(text or "").lower()) if (len(w) > 2 or w.isdigit()) and w not in _STOPWORDS}
+
+
+def _field_text(value: Any) -> str:
+    """Field value as one line of text (evidence maps and lists are flattened)."""
+    if isinstance(value, dict):
+        return "; ".join(f"{k}: {_field_text(v)}" for k, v in value.items())
+    if isinstance(value, list):
+        return "; ".join(_field_text(v) for v in value)
+    return re.sub(r"\s+", " ", str(value)).strip()
+
+
+def parse_offers(output: str) -> list[dict[str, str]]:
+    """
+    Offer records (OFFER_FIELDS, missing ones left out) from one Offer Design output: the offer_concepts JSON in
+    structured mode, else the prose offers and the summary table. Entries with the same name are combined.
+    """
+    tables = parse_tables(output)
+    rows: list[dict[str, Any]] = list(tables.get("offer_concepts") or [])
+    if not rows:
+        for items in extract_artifacts(output, "offer_concepts").values():
+            rows.extend(items)
+    records: dict[str, dict[str, str]] = {}
+    for row in rows:
+        record: dict[str, str] = {}
+        for key, value in row.items():
+            field = _OFFER_ALIASES.get(re.sub(r"[^a-z0-9]+", "_", str(key).lower()).strip("_"))
+            text = _field_text(value) if value not in (None, "") else ""
+            if field and text and field not in record:
+                record[field] = text
+        # "### Offer 1: Streak Week" parses as title "Offer 1" with the name as its summary.
+        if _NUMBERED_NAME_RE.match(record.get("name", "")) and row.get("summary"):
+            record["name"] = _field_text(row["summary"])
+        elif record.get("name"):
+            # "### Offer 1: Streak Week" and the table's "Streak Week" are the same offer.
+            record["name"] = _NAME_PREFIX_RE.sub("", record["name"]) or record["name"]
+        if not record.get("name") or len(record) < 2:
+            continue
+        key = " ".join(sorted(_words(record["name"]))) or record["name"].lower()
+        if key in records:
+            for field, text in record.items():
+                records[key].setdefault(field, text)
+        else:
+            records[key] = record
+    return list(records.values())
+
+
+def _similarity(a: dict[str, Any], b: dict[str, Any]) -> float:
+    wa = _words(f"{a.get('name')} {a.get('mechanic')}")
+    wb = _words(f"{b.get('name')} {b.get('mechanic')}")
+    return len(wa & wb) / max(1, len(wa | wb))
+
+
+def merge_offers(offers: list[dict[str, Any]], threshold: float = OFFER_SIMILARITY) -> list[dict[str, Any]]:
+    """
+    Group offers whose name + mechanic words overlap by >= threshold (Jaccard, in order). Each group becomes its
+    most complete record, with missing fields filled from the others and "candidates" (which candidates proposed it).
+    """
+    groups: list[list[dict[str, Any]]] = []
+    for offer in offers:
+        group = next((g for g in groups if any(_similarity(offer, o) >= threshold for o in g)), None)
+        if group is None:
+            groups.append([offer])
+        else:
+            group.append(offer)
+    merged = []
+    for group in groups:
+        best = max(group, key=lambda o: sum(1 for f in OFFER_FIELDS if o.get(f)))
+        record = {f: best[f] for f in OFFER_FIELDS if best.get(f)}
+        for other in group:
+            for f in OFFER_FIELDS:
+                if other.get(f) and f not in record:
+                    record[f] = other[f]
+        record["candidates"] = sorted({o["candidate"] for o in group if "candidate" in o})
+        merged.append(record)
+    return merged
+
+
+def data_signals(data_dir: Optional[Path] = None) -> dict[str, dict[str, int]]:
+    """Visits per channel (transactions) and observations per mechanic (competitors), from derived stats if current."""
+    d = data_dir or get_data_dir()
+    signals = {}
+    for name, table, column, loader in (
+        ("channels", "customer_transactions", "channel", load_customer_transactions),
+        ("competitor_mechanics", "competitor_intel", "offer_mechanic", load_competitor_intel),
+    ):
+        stats = current_stats(table, d)
+        counts = ((stats or {}).get("columns", {}).get(column) or {}).get("values")
+        if counts is None:
+            counts = {str(k): int(v) for k, v in loader(d)[column].value_counts().items()}
+        signals[name] = counts
+    return signals
+
+
+class OfferScorer:
+    """Deterministic offer scores from the hand-off artifacts, the request and data_signals (see module docstring)."""
+
+    def __init__(self, handoff: dict[str, list[dict[str, Any]]], user_query: str, signals: dict[str, dict[str, int]], k: int):
+        self.k = max(1, k)
+        self.kind_words = {
+            "trends": set().union(*(_words(_field_text(i)) for i in handoff.get("trend_briefs", []))),
+            "customers": set().union(*(_words(_field_text(i)) for i in handoff.get("customer_insights", []))),
+            "competitors": set().union(*(
+                _words(_field_text(i))
+                for kind in ("competitive_landscape", "whitespace_opportunities") for i in handoff.get(kind, [])
+            )),
+        }
+        self.whitespace = [_words(_field_text(i)) for i in handoff.get("whitespace_opportunities", [])]
+        # The agents assume value-conscious customers when the request names no segment; so does the scorer.
+        self.requested = _segments(user_query, with_default=True)
+        self.profiled = [_segments(_field_text(i.get("segment") or i.get("title"))) for i in handoff.get("customer_insights", [])]
+        channels = signals.get("channels") or {}
+        top = max(channels.values(), default=0)
+        self.channel_share = {c: n / top for c, n in channels.items()} if top else {}
+        mechanics = signals.get("competitor_mechanics") or {}
+        self.mechanics = [(_words(m), n) for m, n in mechanics.items()]
+        self.observations = sum(mechanics.values())
+
+    def _evidence(self, offer: dict[str, Any], words: set[str]) -> float:
+        cited_text = f"{offer.get('evidence', '')} {offer.get('rationale', '')}".lower()
+        cited = sum(1 for terms in SOURCE_TERMS.values() if any(t in cited_text for t in terms))
+        grounded = sum(1 for kind_words in self.kind_words.values() if len(words & kind_words) >= 2)
+        return 0.5 * cited / len(SOURCE_TERMS) + 0.5 * grounded / len(self.kind_words)
+
+    def _segment_fit(self, offer: dict[str, Any]) -> float:
+        target = _segments(offer.get("target"))
+        if target & self.requested:
+            target_fit = 1.0
+        elif any(target & p for p in self.profiled):
+            # A segment Customer Insights profiled, though not the one asked for.
+            target_fit = 0.5
+        else:
+            target_fit = 0.0
+        channel = offer.get("channel", "").lower()
+        if not self.channel_share:
+            channel_fit = 0.5
+        elif any(t in channel for t in ALL_CHANNELS):
+            channel_fit = 1.0
+        else:
+            shares = [
+                share for value, share in self.channel_share.items()
+                if any(t in channel for t in CHANNEL_TERMS.get(value, (value,)))
+            ]
+            channel_fit = max(shares, default=0.5)
+        return 0.5 * target_fit + 0.5 * channel_fit
+
+    def _whitespace(self, offer: dict[str, Any], words: set[str]) -> float:
+        gap = max((len(words & w) / len(w) for w in self.whitespace if w), default=0.0)
+        mechanic = _words(offer.get("mechanic") or offer.get("name"))
+        crowded = sum(n for m, n in self.mechanics if m and mechanic and len(m & mechanic) / len(m) >= 0.5)
+        crowding = crowded / self.observations if self.observations else 0.0
+        return 0.5 * min(1.0, 2 * gap) + 0.5 * (1 - crowding)
+
+    def score(self, offer: dict[str, Any]) -> dict[str, float]:
+        """Component scores and the weighted total, rounded to 3 places."""
+        words = _words(" ".join(str(offer.get(f, "")) for f in OFFER_FIELDS))
+        parts = {
+            "evidence": self._evidence(offer, words),
+            "segment_fit": self._segment_fit(offer),
+            "whitespace": self._whitespace(offer, words),
+            "agreement": len(offer.get("candidates") or [0]) / self.k,
+        }
+        parts["total"] = sum(WEIGHTS[k] * v for k, v in parts.items())
+        return {k: round(v, 3) for k, v in parts.items()}
+
+    def rank(self, offers: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Offers with a "score" dict, best first (ties: more candidates, then name)."""
+        scored = [{**o, "score": self.score(o)} for o in offers]
+        return sorted(scored, key=lambda o: (-o["score"]["total"], -len(o.get("candidates") or []), o["name"].lower()))
+
+
+def render_offers(offers: list[dict[str, Any]], k: int, structured: bool) -> str:
+    """The ranked offers as Offer Design would write them: offer_concepts JSON, or prose plus the summary table."""
+    if structured:
+        return json.dumps({"offer_concepts": [{f: o.get(f, "") for f in OFFER_FIELDS} for o in offers]}, indent=2)
+    parts = [f"## Top offers (ranked from {k} candidate designs)", ""]
+    for i, o in enumerate(offers, 1):
+        s = o["score"]
+        parts.append(f"### {i}. {o['name']}")
+        parts.extend(f"- **{f.title()}:** {o[f]}" for f in OFFER_FIELDS[1:] if o.get(f))
+        parts.append(
+            f"- **Score:** {s['total']:.2f} (evidence {s['evidence']:.2f}, segment fit {s['segment_fit']:.2f}, "
+            f"whitespace {s['whitespace']:.2f}, proposed by {len(o.get('candidates') or [])}/{k} candidates)"
+        )
+        parts.append("")
+    parts += [
+        "TOP 3 SUMMARY TABLE",
+        "",
+        "| Offer name | Channel | Target segment | Duration | Evidence | Score |",
+        "|---|---|---|---|---|---|",
+    ]
+    for o in offers:
+        cells = [o.get(f, "").replace("|", "/") for f in ("name", "channel", "target", "duration", "evidence")]
+        parts.append("| " + " | ".join(cells + [f"{o['score']['total']:.2f}"]) + " |")
+    return "\n".join(parts)
+
+
+def design_offer_candidates(
+    trend_briefs: str,
+    customer_insights: str,
+    competitive_landscape: str,
+    whitespace_opportunities: str,
+    user_query: str,
+    k: int,
+    scorer: OfferScorer,
+    structured: bool = False,
+    on_row: Any = None,
+    model: Optional[str] = None,
+    tools: Any = None,
+) -> dict[str, Any]:
+    """
+    run_offer_design K times in parallel (candidate_settings) and the top TOP_N of the merged, scored offers.
+    Returns run_offer_design's result shape for the first candidate's prompt, with output and tables replaced by
+    the ranking, plus "candidates": {k, succeeded, failed, offers (parsed), unique (after merging), seconds,
+    ranking}. Fails only if every candidate does; if no candidate output has parseable offers, the first one is
+    used as it is.
+    """
+    k = max(1, min(k, MAX_CANDIDATES))
+    args = (trend_briefs, customer_insights, competitive_landscape, whitespace_opportunities, user_query)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=k, thread_name_prefix="offer-candidates") as pool:
+        # Each call runs in a copy of the caller's context, so agent labels and LLM priority carry over.
+        futures = [
+            pool.submit(
+                contextvars.copy_context().run, run_offer_design, *args,
+                structured=structured, model=model, tools=tools, **setting,
+            )
+            for setting in candidate_settings(k)
+        ]
+    results, errors = [], []
+    for i, future in enumerate(futures):
+        try:
+            results.append((i, future.result()))
+        except Exception as e:
+            errors.append(e)
+    if not results:
+        raise errors[0]
+
+    offers = [{**o, "candidate": i} for i, res in results for o in parse_offers(res["output"])]
+    ranked = scorer.rank(merge_offers(offers))
+    top = ranked[:TOP_N]
+    first = results[0][1]
+    report = {
+        "k": k,
+        "succeeded": len(results),
+        "failed": len(errors),
+        "offers": len(offers),
+        "unique": len(ranked),
+        "seconds": round(time.perf_counter() - start, 3),
+        "ranking": [{"name": o["name"], "candidates": o["candidates"], **o["score"]} for o in ranked],
+    }
+    if not top:
+        return {**first, "candidates": report}
+    rows = [{f: o.get(f, "") for f in OFFER_FIELDS} for o in top]
+    if on_row:
+        for row in rows:
+            on_row("offer_concepts", row)
+    result = {
+        "output": render_offers(top, k, structured),
+        "tables": {"offer_concepts": rows},
+        "system_prompt": first["system_prompt"],
+        "user_content": first["user_content"],
+        "candidates": report,
+    }
+    tool_calls = [c for _, res in results for c in res.get("tool_calls") or []]
+    if tools is not None:
+        result["tool_calls"] = tool_calls
+    return result
@@ -3,135 +3,488 @@ Orchestrator: runs Market Research -> Customer Insights -> Competitor Intelligen
 in sequence and returns full trace + top 3 offers.
 """
 
-import pandas as pd
+import re
+import time
+
 from pathlib import Path
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Optional
 
-from src.agents.market_research import run as run_market_research
-from src.agents.customer_insights import run as run_customer_insights
-from src.agents.competitor_intel import run as run_competitor_intel
-from src.agents.offer_design import run as run_offer_design
+from src.agents.market_research import run as run_market_research, SYSTEM_PROMPT as MARKET_RESEARCH_PROMPT
+from src.agents.customer_insights import run as run_customer_insights, SYSTEM_PROMPT as CUSTOMER_INSIGHTS_PROMPT
+from src.agents.competitor_intel import run as run_competitor_intel, SYSTEM_PROMPT as COMPETITOR_INTEL_PROMPT
+from src.agents.offer_design import run as run_offer_design, SYSTEM_PROMPT as OFFER_DESIGN_PROMPT
 from src.data_loaders import (
     load_market_trends,
     load_customer_transactions,
     load_customer_feedback,
     load_competitor_intel,
     summarize_for_llm,
+    describe_for_llm,
+    data_fingerprint,
+    data_version,
     get_data_dir,
 )
+from src.data_tools import data_tools_enabled, get_data_tools
+from src.deep_research import deep_research_enabled, research_briefs
+from src.handoff import build_handoff, fit_to_tokens, to_compact_json
+from src.ingest import current_stats, describe_stats, sample_frame
+from src.llm import structured_output_enabled
+from src.metrics import WORKFLOW_SECONDS, WORKFLOWS, agent_label
+from src.offer_ranking import OfferScorer, data_signals, design_offer_candidates, offer_candidates_setting
+from src.prompt_budget import estimate_tokens, format_budget_report, get_prompt_budget, pack_sections
+from src.routing import record_latency, route
+from src.stage_cache import request_key
+from src.structured import parse_tables
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Fixed instruction text each agent wraps around its inputs (headers, closing ask); reserved from the budget.
+TEMPLATE_OVERHEAD_TOKENS = 150
+# Fixed allowance for the user query + parsed scope in every prompt.
+QUERY_TOKENS = 400
 
+STAGE_STATUS = {
+    "Market Trends & Deep Research": "Detecting trends and themes...",
+    "Customer Insights": "Profiling segments and preferences...",
+    "Competitor Intelligence": "Mapping landscape and whitespace...",
+    "Offer Design": "Synthesizing top 3 offers...",
+}
 
-def _sample_df(df: pd.DataFrame, n: int = 5) -> list[dict[str, Any]]:
+
+def _sample_df(df: "pd.DataFrame", n: int = 5) -> list[dict[str, Any]]:
     """First n rows as list of dicts for table display."""
     return df.head(n).fillna("").astype(str).to_dict(orient="records")
 
 
-def _enhance_query_with_scope(user_query: str, scope: Optional[dict[str, Optional[str]]]) -> str:
-    """Prepend parsed scope (daypart, time_horizon) so agents explicitly see it."""
-    if not scope or not any(scope.get(k) for k in ("daypart", "time_horizon")):
-        return user_query
+def _table_source(table: str, loader: Any, data_dir: Path) -> tuple["pd.DataFrame", Any, Any]:
+    """
+    (rows, digest fn, full-table fn) for one dataset. With current derived stats (src/ingest.py) the rows are the
+    stored reservoir sample and the digest comes from the stats, so the table is only loaded if deep research
+    asks for it; otherwise rows is the full table.
+    """
+    stats = current_stats(table, data_dir)
+    if stats is not None:
+        return sample_frame(stats), lambda: describe_stats(stats), lambda: loader(data_dir)
+    df = loader(data_dir)
+    return df, lambda: describe_for_llm(df), lambda: df
+
+
+def _scope_note(scope: Optional[dict[str, Optional[str]]]) -> str:
+    """Parsed scope (daypart, time_horizon) as a note appended to the query; empty when nothing was parsed."""
+    if not scope:
+        return ""
     parts = [f"daypart={scope['daypart']}" if scope.get("daypart") else None, f"time_horizon={scope['time_horizon']}" if scope.get("time_horizon") else None]
     parts = [p for p in parts if p]
     if not parts:
-        return user_query
-    return user_query + "\n\n[Parsed scope from your request: " + ", ".join(parts) + "]"
+        return ""
+    return "\n\n[Parsed scope from your request: " + ", ".join(parts) + "]"
 
 
-def run_workflow(
+def _enhance_query_with_scope(user_query: str, scope: Optional[dict[str, Optional[str]]]) -> str:
+    """Prepend parsed scope (daypart, time_horizon) so agents explicitly see it."""
+    return user_query + _scope_note(scope)
+
+
+def _assemble_prompt(
+    system_prompt: str,
     user_query: str,
-    data_dir: Optional[Path] = None,
-    on_agent_start: Optional[Any] = None,
-    scope: Optional[dict[str, Optional[str]]] = None,
-) -> list[dict[str, Any]]:
+    scope: Optional[dict[str, Optional[str]]],
+    sections: dict[str, str],
+    budget: int,
+) -> tuple[str, dict[str, str], dict[str, Any]]:
     """
-    Run full agent flow. Returns list of step results.
-    If on_agent_start(agent_name, status_message) is provided, it is called before each agent runs.
-    scope: optional dict with daypart, time_horizon (parsed from user query) to inject into agent context.
+    Pack query, scope and agent-specific sections into the token budget.
+    Query + scope get a fixed allowance so the data sections pack identically for every query on the same
+    data and model; that keeps the agents' data prefix byte-stable for context caching.
+    Returns (effective query, packed sections, budget report).
     """
-    data_dir = data_dir or get_data_dir()
-    steps = []
-    effective_query = _enhance_query_with_scope(user_query, scope)
+    reserve = estimate_tokens(system_prompt) + TEMPLATE_OVERHEAD_TOKENS
+    query_packed, query_report = pack_sections({"query": user_query, "scope": _scope_note(scope)}, QUERY_TOKENS)
+    packed, report = pack_sections(sections, budget, reserve=reserve + QUERY_TOKENS)
+    report["reserve"] = reserve
+    report["sections"] = {**query_report["sections"], **report["sections"]}
+    report["used"] = reserve + sum(s["tokens"] for s in report["sections"].values())
+    return query_packed["query"] + query_packed["scope"], packed, report
+
+
+def _data_text(packed: dict[str, str], name: str) -> str:
+    """Digest + sampled rows for one dataset, as handed to an agent."""
+    parts = []
+    if packed.get(f"digest:{name}"):
+        parts.append("Summary (all rows):\n" + packed[f"digest:{name}"])
+    if packed.get(f"brief:{name}"):
+        parts.append("Deep-research brief (every row, summarized in chunks):\n" + packed[f"brief:{name}"])
+    if packed.get(f"samples:{name}"):
+        parts.append("Sample rows:\n" + packed[f"samples:{name}"])
+    return "\n\n".join(parts)
+
+
+def _fit_handoff(
+    handoff: dict[str, list[dict[str, Any]]],
+    packed: dict[str, str],
+    report: dict[str, Any],
+) -> None:
+    """
+    Replace hand-off sections the budget cut mid-text with their leading whole items, so Offer Design always
+    gets valid JSON within each section's allotted tokens. Updates packed and report in place.
+    """
+    for kind, items in handoff.items():
+        name = f"upstream:{kind}"
+        section = report["sections"][name]
+        if not section["truncated"]:
+            continue
+        fitted = fit_to_tokens(items, section["tokens"])
+        packed[name] = to_compact_json(fitted) if fitted else ""
+        section["tokens"] = estimate_tokens(packed[name])
+        section["items"] = f"{len(fitted)}/{len(items)}"
+    report["used"] = report["reserve"] + sum(s["tokens"] for s in report["sections"].values())
+
+
+def _call_routed(decision: dict[str, Any], agent_fn: Any, *args: Any, **kwargs: Any) -> dict[str, Any]:
+    """Run an agent on its routed model and record the observed latency on the routing decision."""
+    start = time.perf_counter()
+    with agent_label(decision["agent"]):
+        res = agent_fn(*args, model=decision["model"], **kwargs)
+    record_latency(decision, time.perf_counter() - start)
+    return res
+
 
+def _tables(res: dict[str, Any]) -> dict[str, list[dict[str, Any]]]:
+    """Tables the agent's stream parser already produced (possibly none); output is only parsed if it returned none."""
+    return res["tables"] if "tables" in res else parse_tables(res["output"])
+
+
+def _input_summary(effective_query: str, report: dict[str, Any]) -> str:
+    return f"User query: {effective_query}\n\n{format_budget_report(report)}"
+
+
+def parse_scope(query: str) -> dict:
+    """Extract daypart and time_horizon from user query so agents can scope offers (e.g. breakfast only, Q1)."""
+    q = (query or "").lower()
+    daypart = None
+    if any(x in q for x in ("breakfast", "morning")):
+        daypart = "breakfast"
+    elif any(x in q for x in ("lunch", "midday")):
+        daypart = "lunch"
+    elif any(x in q for x in ("late-night", "late night", "dinner", "evening")):
+        daypart = "late-night"
+    time_horizon = None
+    if re.search(r"\bq1\b", q):
+        time_horizon = "Q1"
+    elif re.search(r"\bq2\b", q):
+        time_horizon = "Q2"
+    elif re.search(r"\bq3\b", q):
+        time_horizon = "Q3"
+    elif re.search(r"\bq4\b", q):
+        time_horizon = "Q4"
+    elif any(x in q for x in ("quarter", "next quarter", "this quarter")):
+        time_horizon = "quarter"
+    else:
+        m = re.search(r"(\d+)[\s-]*weeks?", q)
+        if m:
+            time_horizon = f"{m.group(1)} weeks"
+    return {"daypart": daypart, "time_horizon": time_horizon}
+
+
+def _notifier(on_agent_start: Optional[Any]):
     def _notify(name: str, msg: str):
         if on_agent_start:
             try:
                 on_agent_start(name, msg)
             except Exception:
                 pass
+    return _notify
 
-    df_market = load_market_trends(data_dir)
-    df_txn = load_customer_transactions(data_dir)
-    df_feedback = load_customer_feedback(data_dir)
-    df_comp = load_competitor_intel(data_dir)
 
-    market_text = summarize_for_llm(df_market)
-    txn_text = summarize_for_llm(df_txn)
-    feedback_text = summarize_for_llm(df_feedback)
-    comp_text = summarize_for_llm(df_comp)
+def _rows_for(on_row: Optional[Any], agent_name: str):
+    if not on_row:
+        return None
 
-    # 1. Market Research
-    _notify("Market Trends & Deep Research", "Detecting trends and themes...")
-    step1_input = f"User query: {effective_query}\n\nMarket trends data (sample): {market_text[:4000]}..."
-    res1 = run_market_research(market_text, effective_query)
-    steps.append({
-        "agent": "Market Trends & Deep Research",
-        "user_query": user_query,
-        "input_data_sample": _sample_df(df_market),
-        "input_summary": step1_input[:1500] + "..." if len(step1_input) > 1500 else step1_input,
-        "system_prompt": res1["system_prompt"],
-        "user_content": res1["user_content"],
-        "output": res1["output"],
-        "hand_off": "Trend briefs passed to Customer Insights and Offer Design.",
-    })
-    out1 = res1["output"]
-
-    # 2. Customer Insights
-    _notify("Customer Insights", "Profiling segments and preferences...")
-    step2_input = f"User query: {effective_query}\n\nTransactions + feedback (sample): {txn_text[:2000]}... {feedback_text[:2000]}..."
-    res2 = run_customer_insights(txn_text, feedback_text, effective_query)
-    # Combine two dfs for display: show txn head + feedback head
-    combined_sample = _sample_df(df_txn) + _sample_df(df_feedback)
-    steps.append({
-        "agent": "Customer Insights",
-        "user_query": user_query,
-        "input_data_sample": combined_sample[:5],
-        "input_summary": step2_input[:1500] + "..." if len(step2_input) > 1500 else step2_input,
-        "system_prompt": res2["system_prompt"],
-        "user_content": res2["user_content"],
-        "output": res2["output"],
-        "hand_off": "Customer segment insights passed to Offer Design.",
-    })
-    out2 = res2["output"]
+    def _cb(table: str, row: dict[str, Any]):
+        on_row(agent_name, table, row)
+    return _cb
+
+
+def _cached_stage(
+    stage_cache: Any,
+    cache_key: Optional[str],
+    step: dict[str, Any],
+    on_row: Optional[Any],
+) -> Optional[dict[str, Any]]:
+    """Fill step from a stage-cache entry (replaying its rows to on_row); None on a miss."""
+    if stage_cache is None or cache_key is None:
+        return None
+    cached = stage_cache.get(cache_key)
+    if not cached:
+        return None
+    for table, rows in (cached.get("tables") or {}).items():
+        for row in rows:
+            if on_row:
+                on_row(table, row)
+    step.update({k: cached[k] for k in ("input_summary", "prompt_budget", "system_prompt", "user_content", "output", "tables")})
+    step["stage_cache"] = {"status": "hit", "query": cached.get("user_query")}
+    return step
+
+
+def run_evidence_stages(
+    user_query: str,
+    data_dir: Optional[Path] = None,
+    on_agent_start: Optional[Any] = None,
+    scope: Optional[dict[str, Optional[str]]] = None,
+    on_row: Optional[Any] = None,
+    structured: Optional[bool] = None,
+    stage_cache: Optional[Any] = None,
+    on_step: Optional[Any] = None,
+    deep_research: Optional[bool] = None,
+    summary_cache: Optional[Any] = None,
+    data_tools: Optional[bool] = None,
+) -> list[dict[str, Any]]:
+    """
+    Run Market Research, Customer Insights and Competitor Intelligence. Returns their three step results.
+    stage_cache: optional src.stage_cache.StageCache. Requests made only of grid facets (goal, segment, daypart,
+    horizon) reuse a previous result for the same data, model and output mode; the step is marked
+    "stage_cache": {"status": "hit" | "stored", ...}. Other requests always call the LLM.
+    on_step(step): if provided, called with each step as soon as it completes.
+    deep_research: map-reduce the full tables into briefs for Market Research and Customer Insights (default:
+    DEEP_RESEARCH env; see src/deep_research.py); the step carries a "deep_research" report. summary_cache:
+    optional SummaryCache for the chunk summaries.
+    data_tools: let the agents query the full tables through function calls (default: DATA_TOOLS env; see
+    src/data_tools.py). Their prompts then carry the digests without sample rows, and each step has "tool_calls".
+    """
+    data_dir = data_dir or get_data_dir()
+    if structured is None:
+        structured = structured_output_enabled()
+    if deep_research is None:
+        deep_research = deep_research_enabled()
+    if data_tools is None:
+        data_tools = data_tools_enabled()
+    tools = get_data_tools(data_dir) if data_tools else None
+    notify = _notifier(on_agent_start)
+    req_key = request_key(user_query, scope) if stage_cache is not None else None
+    fingerprint = data_fingerprint(data_dir) if req_key is not None else ""
+
+    df_market, digest_market, full_market = _table_source("market_trends", load_market_trends, data_dir)
+    df_txn, digest_txn, full_txn = _table_source("customer_transactions", load_customer_transactions, data_dir)
+    df_feedback, digest_feedback, full_feedback = _table_source("customer_feedback", load_customer_feedback, data_dir)
+    df_comp, digest_comp, _ = _table_source("competitor_intel", load_competitor_intel, data_dir)
+
+    def _stage(agent, system_prompt, sections, agent_fn, data_names, sample, hand_off, deep=None):
+        # deep: {data name: (table, full-table fn)} researched in full when deep_research is on.
+        deep = deep if deep_research else None
+        notify(agent, STAGE_STATUS[agent])
+        decision = route(agent)
+        step = {
+            "agent": agent,
+            "user_query": user_query,
+            "input_data_sample": sample,
+            "routing": decision,
+            "hand_off": hand_off,
+        }
+        cache_key = None
+        if req_key is not None:
+            mode = (" [deep]" if deep else "") + (" [tools]" if tools else "")
+            cache_key = stage_cache.key(agent + mode, decision["model"], fingerprint, structured, req_key)
+        if _cached_stage(stage_cache, cache_key, step, _rows_for(on_row, agent)):
+            return step
+        stage_sections = sections()
+        if deep:
+            with agent_label(agent):
+                briefs, step["deep_research"] = research_briefs(
+                    {table: full() for table, full in deep.values()}, model=decision["model"],
+                    cache=summary_cache, data_version=data_version(data_dir),
+                )
+            stage_sections.update({f"brief:{name}": briefs[table] for name, (table, _) in deep.items()})
+        if tools:
+            # The agent reads rows through the tools; the sample would only take budget.
+            stage_sections = {k: v for k, v in stage_sections.items() if not k.startswith("samples:")}
+        # Character caps are off: each agent's prompt budget decides how much of the samples fit.
+        query, packed, report = _assemble_prompt(
+            system_prompt, user_query, scope, stage_sections, get_prompt_budget(decision["model"]),
+        )
+        res = _call_routed(
+            decision, agent_fn, *[_data_text(packed, n) for n in data_names], query,
+            structured=structured, on_row=_rows_for(on_row, agent), tools=tools,
+        )
+        step.update({
+            "input_summary": _input_summary(query, report),
+            "prompt_budget": report,
+            "system_prompt": res["system_prompt"],
+            "user_content": res["user_content"],
+            "output": res["output"],
+            "tables": _tables(res),
+        })
+        if "tool_calls" in res:
+            step["tool_calls"] = res["tool_calls"]
+        if cache_key is not None:
+            stage_cache.put(cache_key, {k: v for k, v in step.items() if k not in ("input_data_sample", "routing")})
+            step["stage_cache"] = {"status": "stored"}
+        return step
+
+    def _done(step: dict[str, Any]) -> dict[str, Any]:
+        if on_step:
+            on_step(step)
+        return step
 
+    steps = []
+    # 1. Market Research
+    steps.append(_done(_stage(
+        "Market Trends & Deep Research", MARKET_RESEARCH_PROMPT,
+        lambda: {
+            "digest:market": digest_market(),
+            "samples:market": summarize_for_llm(df_market, max_chars=None),
+        },
+        run_market_research, ["market"], _sample_df(df_market),
+        "Trend briefs passed to Customer Insights and Offer Design.",
+        deep={"market": ("market_trends", full_market)},
+    )))
+    # 2. Customer Insights (display sample: txn head + feedback head)
+    steps.append(_done(_stage(
+        "Customer Insights", CUSTOMER_INSIGHTS_PROMPT,
+        lambda: {
+            "digest:transactions": digest_txn(),
+            "digest:feedback": digest_feedback(),
+            "samples:transactions": summarize_for_llm(df_txn, max_chars=None),
+            "samples:feedback": summarize_for_llm(df_feedback, max_chars=None),
+        },
+        run_customer_insights, ["transactions", "feedback"], (_sample_df(df_txn) + _sample_df(df_feedback))[:5],
+        "Customer segment insights passed to Offer Design.",
+        deep={"transactions": ("customer_transactions", full_txn), "feedback": ("customer_feedback", full_feedback)},
+    )))
     # 3. Competitor Intelligence
-    _notify("Competitor Intelligence", "Mapping landscape and whitespace...")
-    step3_input = f"User query: {effective_query}\n\nCompetitor data (sample): {comp_text[:4000]}..."
-    res3 = run_competitor_intel(comp_text, effective_query)
-    steps.append({
-        "agent": "Competitor Intelligence",
-        "user_query": user_query,
-        "input_data_sample": _sample_df(df_comp),
-        "input_summary": step3_input[:1500] + "..." if len(step3_input) > 1500 else step3_input,
-        "system_prompt": res3["system_prompt"],
-        "user_content": res3["user_content"],
-        "output": res3["output"],
-        "hand_off": "Competitive landscape and whitespace opportunities passed to Offer Design.",
-    })
-    out3 = res3["output"]
+    steps.append(_done(_stage(
+        "Competitor Intelligence", COMPETITOR_INTEL_PROMPT,
+        lambda: {
+            "digest:competitors": digest_comp(),
+            "samples:competitors": summarize_for_llm(df_comp, max_chars=None),
+        },
+        run_competitor_intel, ["competitors"], _sample_df(df_comp),
+        "Competitive landscape and whitespace opportunities passed to Offer Design.",
+    )))
+    return steps
+
+
+def run_workflow(
+    user_query: str,
+    data_dir: Optional[Path] = None,
+    on_agent_start: Optional[Any] = None,
+    scope: Optional[dict[str, Optional[str]]] = None,
+    on_row: Optional[Any] = None,
+    structured: Optional[bool] = None,
+    stage_cache: Optional[Any] = None,
+    on_step: Optional[Any] = None,
+    deep_research: Optional[bool] = None,
+    summary_cache: Optional[Any] = None,
+    data_tools: Optional[bool] = None,
+    offer_candidates: Optional[int] = None,
+) -> list[dict[str, Any]]:
+    """
+    Run full agent flow. Returns list of step results.
+    If on_agent_start(agent_name, status_message) is provided, it is called before each agent runs.
+    scope: optional dict with daypart, time_horizon (parsed from user query) to inject into agent context.
+    on_row(agent_name, table_name, row): if provided, responses are streamed and called per parsed table row.
+    structured: request JSON output per agent schema (default: STRUCTURED_OUTPUT env).
+    stage_cache: optional StageCache for the evidence stages (see run_evidence_stages); Offer Design always runs.
+    on_step(step): if provided, called with each step as soon as it completes (partial results for the UI).
+    deep_research, summary_cache: deep-research mode for the evidence stages (see run_evidence_stages).
+    data_tools: give all four agents the data tools (default: DATA_TOOLS env; see run_evidence_stages).
+    offer_candidates: K > 1 runs K Offer Design calls in parallel and ranks their offers (default: OFFER_CANDIDATES
+    env; see src/offer_ranking.py); the step then carries an "offer_candidates" report.
+    Each step carries "tables" (parsed once here) so the UI never re-parses output text,
+    and "routing" (model chosen per src/routing.py, SLO fallback, observed latency).
+    """
+    WORKFLOWS.inc(status="started")
+    start = time.perf_counter()
+    try:
+        steps = _run_workflow(
+            user_query, data_dir=data_dir, on_agent_start=on_agent_start, scope=scope, on_row=on_row,
+            structured=structured, stage_cache=stage_cache, on_step=on_step, deep_research=deep_research,
+            summary_cache=summary_cache, data_tools=data_tools, offer_candidates=offer_candidates,
+        )
+    except Exception:
+        WORKFLOWS.inc(status="failed")
+        raise
+    WORKFLOWS.inc(status="completed")
+    WORKFLOW_SECONDS.observe(time.perf_counter() - start)
+    return steps
+
+
+def _run_workflow(
+    user_query: str,
+    *,
+    data_dir: Optional[Path],
+    on_agent_start: Optional[Any],
+    scope: Optional[dict[str, Optional[str]]],
+    on_row: Optional[Any],
+    structured: Optional[bool],
+    stage_cache: Optional[Any],
+    on_step: Optional[Any],
+    deep_research: Optional[bool],
+    summary_cache: Optional[Any],
+    data_tools: Optional[bool],
+    offer_candidates: Optional[int],
+) -> list[dict[str, Any]]:
+    data_dir = data_dir or get_data_dir()
+    if structured is None:
+        structured = structured_output_enabled()
+    if data_tools is None:
+        data_tools = data_tools_enabled()
+    if offer_candidates is None:
+        offer_candidates = offer_candidates_setting()
+    notify = _notifier(on_agent_start)
+
+    steps = run_evidence_stages(
+        user_query, data_dir, on_agent_start=on_agent_start, scope=scope, on_row=on_row,
+        structured=structured, stage_cache=stage_cache, on_step=on_step, deep_research=deep_research,
+        summary_cache=summary_cache, data_tools=data_tools,
+    )
+    out1, out2, out3 = (s["output"] for s in steps)
 
     # 4. Offer Design
-    _notify("Offer Design", "Synthesizing top 3 offers...")
-    step4_input = f"User query: {effective_query}\n\nInputs from agents:\n- Trend briefs: {out1[:2000]}...\n- Customer insights: {out2[:2000]}...\n- Competitor intel: {out3[:2000]}..."
-    res4 = run_offer_design(out1, out2, out3, out3, effective_query)
+    notify("Offer Design", STAGE_STATUS["Offer Design"])
+    # Hand off structured, deduplicated artifacts instead of the raw outputs (competitor output used to be sent twice).
+    handoff = build_handoff(out1, out2, out3)
+    route4 = route("Offer Design")
+    query4, packed4, report4 = _assemble_prompt(OFFER_DESIGN_PROMPT, user_query, scope, {
+        f"upstream:{kind}": to_compact_json(items) for kind, items in handoff.items()
+    }, get_prompt_budget(route4["model"]))
+    _fit_handoff(handoff, packed4, report4)
+    offer_args = (
+        packed4["upstream:trend_briefs"],
+        packed4["upstream:customer_insights"],
+        packed4["upstream:competitive_landscape"],
+        packed4["upstream:whitespace_opportunities"],
+        query4,
+    )
+    offer_kwargs = {
+        "structured": structured,
+        "on_row": _rows_for(on_row, "Offer Design"),
+        "tools": get_data_tools(data_dir) if data_tools else None,
+    }
+    if offer_candidates > 1:
+        scorer = OfferScorer(handoff, user_query, data_signals(data_dir), offer_candidates)
+        res4 = _call_routed(route4, design_offer_candidates, *offer_args, k=offer_candidates, scorer=scorer, **offer_kwargs)
+    else:
+        res4 = _call_routed(route4, run_offer_design, *offer_args, **offer_kwargs)
     steps.append({
         "agent": "Offer Design",
         "user_query": user_query,
         "input_data_sample": [],  # No raw table; inputs are prior agent outputs
-        "input_summary": step4_input[:1500] + "..." if len(step4_input) > 1500 else step4_input,
+        "input_summary": _input_summary(query4, report4),
+        "prompt_budget": report4,
+        "routing": route4,
+        "handoff_artifacts": handoff,
         "system_prompt": res4["system_prompt"],
         "user_content": res4["user_content"],
         "output": res4["output"],
+        "tables": _tables(res4),
         "hand_off": "Top 3 offer concepts delivered.",
     })
+    if "tool_calls" in res4:
+        steps[-1]["tool_calls"] = res4["tool_calls"]
+    if "candidates" in res4:
+        steps[-1]["offer_candidates"] = res4["candidates"]
+    if on_step:
+        on_step(steps[-1])
 
     return steps
@@ -0,0 +1,160 @@
+"""
+Background pre-warm of the evidence-stage cache over the prompt-help grid (goal x segment x daypart x horizon).
+After a data regeneration, each grid request runs through run_evidence_stages at background priority under the
+shared rate limit (src/rate_limit.py), so an analyst's run for a common ask only pays for Offer Design.
+Progress and budget use (LLM calls, estimated input tokens) are available from PrewarmJob.progress().
+"""
+
+import itertools
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from src.llm import env_number
+from src.orchestrator import parse_scope, run_evidence_stages
+from src.rate_limit import BACKGROUND, llm_priority
+from src.stage_cache import StageCache
+
+# Upper bound on LLM calls per job (3 per uncached grid request); 0 = no limit.
+DEFAULT_MAX_CALLS = 300
+
+
+def grid_queries(goals: list[str], segments: list[str], dayparts: list[str], horizons: list[str]) -> list[str]:
+    """One request per grid cell, phrased the way IDEAL_PROMPT_STRUCTURE suggests."""
+    return [
+        f"{goal} offers for {segment}, {daypart}, {horizon}"
+        for goal, segment, daypart, horizon in itertools.product(goals, segments, dayparts, horizons)
+    ]
+
+
+def max_calls_from_env() -> int:
+    return env_number("PREWARM_MAX_CALLS", DEFAULT_MAX_CALLS, int)
+
+
+class PrewarmJob:
+    """Runs the grid in a daemon thread; cancel() stops it after the current request."""
+
+    def __init__(
+        self,
+        queries: list[str],
+        data_dir: Path,
+        stage_cache: StageCache,
+        fingerprint: str,
+        structured: Optional[bool] = None,
+        max_calls: Optional[int] = None,
+    ):
+        self.queries = queries
+        self.data_dir = data_dir
+        self.stage_cache = stage_cache
+        self.fingerprint = fingerprint
+        self.structured = structured
+        self.max_calls = max_calls_from_env() if max_calls is None else max_calls
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._progress: dict[str, Any] = {
+            "status": "pending",
+            "total": len(queries),
+            "done": 0,
+            "llm_calls": 0,
+            "cache_hits": 0,
+            "est_input_tokens": 0,
+            "errors": 0,
+            "elapsed_s": 0.0,
+            "max_calls": self.max_calls,
+            "fingerprint": fingerprint,
+        }
+
+    def start(self) -> "PrewarmJob":
+        self._thread = threading.Thread(target=self.run, name="prewarm", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread:
+            self._thread.join(timeout)
+
+    def progress(self) -> dict[str, Any]:
+        with self._lock:
+            return dict(self._progress)
+
+    def _update(self, elapsed_s: float, status: Optional[str] = None, **increments: int) -> None:
+        with self._lock:
+            for k, v in increments.items():
+                self._progress[k] += v
+            self._progress["elapsed_s"] = round(elapsed_s, 1)
+            if status:
+                self._progress["status"] = status
+
+    def run(self) -> None:
+        """Warm every grid request (synchronously; start() runs this in a thread)."""
+        start = time.perf_counter()
+        self._update(0.0, status="running")
+        status = "done"
+        with llm_priority(BACKGROUND):
+            for query in self.queries:
+                if self._cancel.is_set():
+                    status = "cancelled"
+                    break
+                if self.max_calls and self.progress()["llm_calls"] + 3 > self.max_calls:
+                    status = "budget exhausted"
+                    break
+                try:
+                    steps = run_evidence_stages(
+                        query, self.data_dir, scope=parse_scope(query),
+                        structured=self.structured, stage_cache=self.stage_cache,
+                    )
+                except Exception:
+                    self._update(time.perf_counter() - start, done=1, errors=1)
+                    continue
+                calls = [s for s in steps if (s.get("stage_cache") or {}).get("status") != "hit"]
+                self._update(
+                    time.perf_counter() - start,
+                    done=1,
+                    llm_calls=len(calls),
+                    cache_hits=len(steps) - len(calls),
+                    est_input_tokens=sum(s["prompt_budget"]["used"] for s in calls if s.get("prompt_budget")),
+                )
+        self._update(time.perf_counter() - start, status=status)
+
+
+_job: Optional[PrewarmJob] = None
+_job_lock = threading.Lock()
+
+
+def start_prewarm(
+    queries: list[str],
+    data_dir: Path,
+    stage_cache: StageCache,
+    fingerprint: str,
+    structured: Optional[bool] = None,
+    max_calls: Optional[int] = None,
+) -> PrewarmJob:
+    """
+    Start the process-wide pre-warm job for this data fingerprint. A running job for the same data is kept;
+    one for older data is cancelled and replaced.
+    """
+    global _job
+    with _job_lock:
+        if _job is not None:
+            prog = _job.progress()
+            if prog["fingerprint"] == fingerprint and prog["status"] in ("pending", "running"):
+                return _job
+            _job.cancel()
+        _job = PrewarmJob(queries, data_dir, stage_cache, fingerprint, structured, max_calls).start()
+        return _job
+
+
+def current_prewarm() -> Optional[PrewarmJob]:
+    with _job_lock:
+        return _job
+
+
+def cancel_prewarm() -> None:
+    with _job_lock:
+        if _job is not None:
+            _job.cancel()
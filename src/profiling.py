@@ -0,0 +1,115 @@
+"""
+On-demand profiling of workflow runs.
+Off by default and free when off: callers only go through profile_call() when WORKFLOW_PROFILE=1 or the run asks
+for it (the app's ?profile=1 URL flag). profile_call() runs the function under cProfile (calling thread; the
+workflow runs its agents sequentially on its worker thread) and tracemalloc, and returns a JSON-ready report:
+the top-N functions by cumulative time (plus the pstats text) and the peak traced memory with the largest
+allocation sites still alive when the run ended.
+tracemalloc is process-wide, so only one profiled run at a time traces memory; concurrent ones report CPU only
+(as do runs on Python versions that refuse a second active profiler).
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Optional
+
+from src.llm import env_number
+
+DEFAULT_TOP_N = 30
+TOP_ALLOCATIONS = 15
+# Frames kept per allocation; 1 (the allocating line) keeps tracing overhead low.
+TRACE_FRAMES = 1
+
+_memory_lock = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    """WORKFLOW_PROFILE=1 in .env/env profiles every workflow run."""
+    return os.environ.get("WORKFLOW_PROFILE", "").strip().lower() in ("1", "true", "yes")
+
+
+def profile_top_n() -> int:
+    return max(1, env_number("WORKFLOW_PROFILE_TOP", DEFAULT_TOP_N, int))
+
+
+def _function_rows(stats: pstats.Stats, top_n: int) -> list[dict[str, Any]]:
+    rows = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "file": filename,
+            "line": line,
+            "ncalls": ncalls,
+            "tottime_s": round(tottime, 6),
+            "cumtime_s": round(cumtime, 6),
+        })
+    rows.sort(key=lambda r: r["cumtime_s"], reverse=True)
+    return rows[:top_n]
+
+
+def _memory_report(snapshot: "tracemalloc.Snapshot", peak: int, current: int) -> dict[str, Any]:
+    top = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ]).statistics("lineno")[:TOP_ALLOCATIONS]
+    return {
+        "peak_bytes": peak,
+        "end_bytes": current,
+        "top_allocations": [
+            {"location": f"{s.traceback[0].filename}:{s.traceback[0].lineno}", "size_bytes": s.size, "count": s.count}
+            for s in top
+        ],
+    }
+
+
+def profile_call(fn: Callable[..., Any], *args: Any, top_n: Optional[int] = None, **kwargs: Any) -> tuple[Any, dict[str, Any]]:
+    """
+    (fn(*args, **kwargs), report). Exceptions from fn propagate (no report). report: wall_s, cpu (top functions by
+    cumulative time, pstats text) or None, memory (peak_bytes, end_bytes, top_allocations) or None, notes.
+    """
+    top_n = top_n or profile_top_n()
+    notes: list[str] = []
+    profiler: Optional[cProfile.Profile] = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        profiler = None
+        notes.append("CPU profile skipped: another profiler is active in this process.")
+    # tracemalloc is process-wide: trace only if no other profiled run is, and leave it as found.
+    trace_memory = _memory_lock.acquire(blocking=False)
+    started_tracing = False
+    if trace_memory:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACE_FRAMES)
+        tracemalloc.reset_peak()
+    else:
+        notes.append("Memory profile skipped: another profiled run is tracing allocations.")
+    t0 = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        wall = time.perf_counter() - t0
+        if profiler is not None:
+            profiler.disable()
+        memory = None
+        if trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            memory = _memory_report(tracemalloc.take_snapshot(), peak, current)
+            if started_tracing:
+                tracemalloc.stop()
+            _memory_lock.release()
+
+    cpu = None
+    if profiler is not None:
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top_n)
+        cpu = {"sort": "cumulative", "functions": _function_rows(stats, top_n), "text": out.getvalue()}
+    report = {"created": time.time(), "wall_s": round(wall, 6), "top_n": top_n, "cpu": cpu, "memory": memory, "notes": notes}
+    return result, report
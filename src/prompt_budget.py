@@ -0,0 +1,162 @@
+"""
+Token-budget-aware prompt assembly.
+Each agent prompt is built from named sections (query, scope, digest, samples, upstream outputs).
+Sections are packed in priority order against a per-model token budget; lower-priority sections are
+trimmed (on line boundaries) to whatever budget is left. Token counts use a fast local estimate,
+so no tokenizer download or API round-trip is needed.
+"""
+
+import math
+import os
+import re
+from typing import Any, Optional
+
+# Input-token budget per model. Deliberately far below the context window: the budget caps latency, not capacity.
+MODEL_PROMPT_BUDGETS = {
+    "gemini-1.5-flash": 6000,
+    "gemini-2.0-flash": 6000,
+    "gemini-2.5-flash": 8000,
+    "gemini-1.5-pro": 12000,
+    "gemini-2.5-pro": 12000,
+}
+DEFAULT_PROMPT_BUDGET = 6000
+
+# Lower number = packed first. Section names may carry a suffix ("samples:feedback"); the part before ":" sets priority.
+SECTION_PRIORITIES = {
+    "query": 0,
+    "scope": 1,
+    "digest": 2,
+    "brief": 2,
+    "upstream": 3,
+    "samples": 4,
+}
+
+# Sections left with less than this are dropped rather than cut to a useless stub.
+MIN_SECTION_TOKENS = 32
+
+TRUNCATION_MARKER = "\n... (truncated)"
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Fast local token estimate: one token per ~4 characters of each word, one per punctuation mark."""
+    if not text:
+        return 0
+    return sum(math.ceil(len(m.group(0)) / 4) for m in _TOKEN_RE.finditer(text))
+
+
+def _cut_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of text whose estimate fits max_tokens (the estimate only grows with the prefix)."""
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Trim text to at most max_tokens (by estimate_tokens), cutting on line boundaries where possible."""
+    if max_tokens <= 0 or not text:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max_tokens - estimate_tokens(TRUNCATION_MARKER)
+    if limit <= 0:
+        # No room for the marker: plain cut.
+        return _cut_to_tokens(text, max_tokens)
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        cost = estimate_tokens(line)
+        if used + cost > limit:
+            if not kept:
+                # Single oversized line (e.g. compact JSON): cut characters until the estimate fits.
+                kept.append(_cut_to_tokens(line, limit))
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept) + TRUNCATION_MARKER
+
+
+def get_prompt_budget(model: Optional[str] = None) -> int:
+    """Prompt token budget for a model. PROMPT_TOKEN_BUDGET in env overrides the per-model table."""
+    override = os.environ.get("PROMPT_TOKEN_BUDGET", "").strip()
+    if override.isdigit():
+        return int(override)
+    if not model:
+        return DEFAULT_PROMPT_BUDGET
+    name = model.split("/")[-1]
+    if name in MODEL_PROMPT_BUDGETS:
+        return MODEL_PROMPT_BUDGETS[name]
+    # e.g. gemini-2.5-flash-lite -> gemini-2.5-flash
+    for known in sorted(MODEL_PROMPT_BUDGETS, key=len, reverse=True):
+        if name.startswith(known):
+            return MODEL_PROMPT_BUDGETS[known]
+    return DEFAULT_PROMPT_BUDGET
+
+
+def _priority(name: str, priorities: dict[str, int]) -> int:
+    return priorities.get(name.split(":", 1)[0], max(priorities.values(), default=0) + 1)
+
+
+def pack_sections(
+    sections: dict[str, str],
+    budget: int,
+    reserve: int = 0,
+    priorities: Optional[dict[str, int]] = None,
+) -> tuple[dict[str, str], dict[str, Any]]:
+    """
+    Fit sections into budget - reserve tokens, highest priority first.
+    Sections sharing a priority split what is left evenly (smaller ones keep their full text).
+    Returns (packed sections in input order, report with per-section token counts).
+    """
+    priorities = priorities or SECTION_PRIORITIES
+    remaining = max(0, budget - reserve)
+    sizes = {name: estimate_tokens(text) for name, text in sections.items()}
+    packed: dict[str, str] = {}
+
+    groups: dict[int, list[str]] = {}
+    for name in sections:
+        groups.setdefault(_priority(name, priorities), []).append(name)
+
+    for prio in sorted(groups):
+        names = sorted(groups[prio], key=lambda n: sizes[n])
+        for i, name in enumerate(names):
+            share = remaining // (len(names) - i)
+            if sizes[name] <= share:
+                packed[name] = sections[name]
+            elif share >= MIN_SECTION_TOKENS or prio == 0:
+                packed[name] = truncate_to_tokens(sections[name], share)
+            else:
+                packed[name] = ""
+            remaining -= estimate_tokens(packed[name])
+            remaining = max(0, remaining)
+
+    report_sections = {
+        name: {
+            "tokens": estimate_tokens(packed[name]),
+            "original_tokens": sizes[name],
+            "truncated": packed[name] != sections[name],
+        }
+        for name in sections
+    }
+    report = {
+        "budget": budget,
+        "reserve": reserve,
+        "used": reserve + sum(s["tokens"] for s in report_sections.values()),
+        "sections": report_sections,
+    }
+    return {name: packed[name] for name in sections}, report
+
+
+def format_budget_report(report: dict[str, Any]) -> str:
+    """One-line summary of a pack_sections report, e.g. for step input_summary."""
+    parts = []
+    for name, s in report.get("sections", {}).items():
+        note = f"{s['tokens']}/{s['original_tokens']}" if s["truncated"] else str(s["tokens"])
+        parts.append(f"{name}={note}")
+    return f"Prompt budget: {report.get('used', 0)}/{report.get('budget', 0)} tokens ({', '.join(parts)})"
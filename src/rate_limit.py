@@ -0,0 +1,115 @@
+"""
+Process-wide LLM rate limit shared by every session and background job.
+A token bucket (LLM_RATE_LIMIT_PER_MIN, LLM_RATE_LIMIT_BURST) gates each call_llm. Calls run at "interactive"
+priority unless wrapped in llm_priority("background"): background calls only take a token while the bucket
+is above a reserve and no interactive call is waiting, so pre-warm jobs never delay analysts.
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Iterator, Optional
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+DEFAULT_PER_MINUTE = 60
+DEFAULT_BURST = 10
+# Fraction of the burst kept free for interactive calls; background calls wait below it.
+BACKGROUND_RESERVE = 0.5
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    """Run the enclosed LLM calls at the given priority (INTERACTIVE or BACKGROUND)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class RateLimiter:
+    """Token bucket with interactive-first admission. per_minute <= 0 disables limiting."""
+
+    def __init__(self, per_minute: float = DEFAULT_PER_MINUTE, burst: Optional[int] = None):
+        self.per_minute = per_minute
+        self.burst = burst or DEFAULT_BURST
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+        self.acquired = {INTERACTIVE: 0, BACKGROUND: 0}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def acquire(self, priority: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """Take one call slot; blocks until available. Returns False if timeout expires first."""
+        priority = priority or current_priority()
+        if self.per_minute <= 0:
+            with self._cond:
+                self.acquired[priority] = self.acquired.get(priority, 0) + 1
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        floor = min(self.burst * BACKGROUND_RESERVE, self.burst - 1.0) if priority == BACKGROUND else 0.0
+        with self._cond:
+            if priority != BACKGROUND:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    self._refill()
+                    blocked = priority == BACKGROUND and self._interactive_waiting > 0
+                    if not blocked and self._tokens >= 1.0 + floor:
+                        self._tokens -= 1.0
+                        self.acquired[priority] = self.acquired.get(priority, 0) + 1
+                        return True
+                    wait = max(0.01, (1.0 + floor - self._tokens) * 60.0 / self.per_minute)
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                if priority != BACKGROUND:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def stats(self) -> dict[str, float]:
+        with self._cond:
+            self._refill()
+            return {"tokens": round(self._tokens, 2), "per_minute": self.per_minute, **self.acquired}
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide limiter configured from LLM_RATE_LIMIT_PER_MIN / LLM_RATE_LIMIT_BURST."""
+    from src.llm import env_number  # src.llm imports this module
+
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            per_minute = env_number("LLM_RATE_LIMIT_PER_MIN", DEFAULT_PER_MINUTE, float)
+            burst = env_number("LLM_RATE_LIMIT_BURST", DEFAULT_BURST, int)
+            _limiter = RateLimiter(per_minute, burst)
+        return _limiter
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]) -> None:
+    """Replace the process-wide limiter (tests)."""
+    global _limiter
+    with _limiter_lock:
+        _limiter = limiter
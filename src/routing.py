@@ -0,0 +1,146 @@
+"""
+Per-agent model routing with latency SLOs.
+Evidence agents (Market Research, Customer Insights, Competitor Intelligence) mostly summarize and go to the
+"fast" tier; Offer Design does the synthesis and goes to the "strong" tier. When a routed model's observed
+p95 latency exceeds the agent's SLO, the call falls back to the fast model. Fallback is not permanent: samples
+older than SAMPLE_MAX_AGE_S stop counting, and every PROBE_EVERY-th fallback decision sends the call to the routed
+model anyway (a probe) so its latency keeps being measured. Every decision is returned as a dict so the
+orchestrator can record it in the step trace.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+from src.llm import _load_dotenv, get_model_name
+
+# Agent -> tier and p95 latency SLO (seconds). SLO None = never fall back.
+AGENT_ROUTES = {
+    "Market Trends & Deep Research": {"tier": "fast", "slo_p95_s": 20.0},
+    "Customer Insights": {"tier": "fast", "slo_p95_s": 20.0},
+    "Competitor Intelligence": {"tier": "fast", "slo_p95_s": 20.0},
+    "Offer Design": {"tier": "strong", "slo_p95_s": 45.0},
+}
+
+# Tier -> env var naming its model. Unset tiers use the default model (GEMINI_MODEL / provider default).
+TIER_MODEL_ENV = {
+    "fast": "GEMINI_MODEL_FAST",
+    "strong": "GEMINI_MODEL_STRONG",
+}
+FALLBACK_TIER = "fast"
+
+# Fallback only kicks in once a model has this many observations in the window.
+MIN_SAMPLES = 5
+WINDOW_SIZE = 50
+# Samples older than this no longer count toward p95.
+SAMPLE_MAX_AGE_S = 600.0
+# While falling back, every Nth decision probes the routed model instead.
+PROBE_EVERY = 4
+
+
+class LatencyTracker:
+    """Rolling per-model latency window (thread-safe; shared by all sessions in the process)."""
+
+    def __init__(
+        self,
+        window: int = WINDOW_SIZE,
+        max_age_s: Optional[float] = SAMPLE_MAX_AGE_S,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._window = window
+        self._max_age_s = max_age_s
+        self._clock = clock
+        self._samples: dict[str, deque] = {}
+        self._fallbacks: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self._window)).append((self._clock(), seconds))
+
+    def _values(self, model: str) -> list[float]:
+        samples = self._samples.get(model, ())
+        if self._max_age_s is None:
+            return [v for _, v in samples]
+        cutoff = self._clock() - self._max_age_s
+        return [v for t, v in samples if t >= cutoff]
+
+    def count(self, model: str) -> int:
+        with self._lock:
+            return len(self._values(model))
+
+    def p95(self, model: str) -> Optional[float]:
+        """Nearest-rank p95 of the window (recent samples only), or None without observations."""
+        with self._lock:
+            values = sorted(self._values(model))
+        if not values:
+            return None
+        return values[max(0, math.ceil(0.95 * len(values)) - 1)]
+
+    def note_fallback(self, model: str) -> int:
+        """Count a fallback away from model; returns the running count."""
+        with self._lock:
+            self._fallbacks[model] = self._fallbacks.get(model, 0) + 1
+            return self._fallbacks[model]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._fallbacks.clear()
+
+
+LATENCY = LatencyTracker()
+
+
+def tier_model(tier: str) -> str:
+    """Model configured for a tier (env/.env), else the default model."""
+    _load_dotenv()
+    env_name = TIER_MODEL_ENV.get(tier)
+    model = os.environ.get(env_name, "").strip() if env_name else ""
+    return model or get_model_name()
+
+
+def route(agent: str, tracker: Optional[LatencyTracker] = None) -> dict[str, Any]:
+    """
+    Pick the model for an agent. Returns the routing decision:
+    {"agent", "tier", "model", "fallback", "reason", "p95_s", "slo_p95_s"}.
+    """
+    tracker = tracker or LATENCY
+    spec = AGENT_ROUTES.get(agent, {"tier": FALLBACK_TIER, "slo_p95_s": None})
+    tier = spec["tier"]
+    model = tier_model(tier)
+    slo = spec.get("slo_p95_s")
+    p95 = tracker.p95(model)
+    decision = {
+        "agent": agent,
+        "tier": tier,
+        "model": model,
+        "fallback": False,
+        "reason": f"{tier} tier",
+        "p95_s": round(p95, 3) if p95 is not None else None,
+        "slo_p95_s": slo,
+    }
+    if slo is None or tier == FALLBACK_TIER or p95 is None or tracker.count(model) < MIN_SAMPLES:
+        return decision
+    fast = tier_model(FALLBACK_TIER)
+    if p95 > slo and fast != model:
+        if tracker.note_fallback(model) % PROBE_EVERY == 0:
+            # Keep measuring the routed model so the fallback ends once it is fast again.
+            decision.update({"probe": True, "reason": f"probe: p95 {p95:.1f}s of {model} exceeds SLO {slo:.0f}s"})
+            return decision
+        decision.update({
+            "tier": FALLBACK_TIER,
+            "model": fast,
+            "fallback": True,
+            "reason": f"p95 {p95:.1f}s of {model} exceeds SLO {slo:.0f}s",
+        })
+    return decision
+
+
+def record_latency(decision: dict[str, Any], seconds: float, tracker: Optional[LatencyTracker] = None) -> None:
+    """Record an observed call latency for the routed model and note it on the decision."""
+    (tracker or LATENCY).record(decision["model"], seconds)
+    decision["latency_s"] = round(seconds, 3)
@@ -0,0 +1,248 @@
+"""
+Semantic query cache in front of run_workflow.
+Near-identical analyst requests ("3 offers for discount hunters" vs "develop three traffic offers for deal seekers")
+map to the same previous session when their vectors are similar enough and the data fingerprint matches.
+- Vectorizer: local and CPU-only. Text is canonicalized (number words, segment/goal/daypart synonyms), then
+  word unigrams, bigrams and character trigrams are hashed into a sparse, L2-normalized vector. Free words
+  (mechanics, audiences: "BOGO", "Gen Z") weigh most, so requests that differ in them do not match.
+- A hit also requires the parsed scope (daypart, time horizon) to be identical.
+- Index: a small JSON file on disk, read-modified-written under an exclusive file lock (several processes may share
+  it); least-recently-used entries are evicted past max_entries or max age.
+- Metrics: lookups, hits and hit rate are kept in the index file.
+"""
+
+import json
+import math
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Optional
+
+from src.llm import env_number
+from src.metrics import CACHE_LOOKUPS
+from src.storage import LocalStorage
+
+# Bump when canonicalization or weights change: stored vectors are rebuilt from their queries on load.
+CANON_VERSION = 2
+DEFAULT_THRESHOLD = 0.82
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_AGE_DAYS = 30
+HASH_DIM = 1 << 18
+
+# Canonical forms for the vocabulary analysts use interchangeably (see PROMPT_HELP_* in streamlit_app.py).
+SYNONYMS = [
+    (r"\b(deal|bargain|discount|coupon|value)[- ]?(seekers?|hunters?|shoppers?|lovers?)\b", "seg_discount_hunters"),
+    (r"\b(price|value)[- ]?(conscious|sensitive)( customers?| guests?)?\b", "seg_value_conscious"),
+    (r"\b(loyal|repeat|frequent|regular)( customers?| guests?| repeaters?| visitors?)?\b", "seg_loyal"),
+    (r"\b(convenience|on[- ]the[- ]go|busy)([- ]driven)?( customers?| guests?)?\b", "seg_convenience"),
+    (r"\b(app[- ]first|mobile[- ]first|app) (users?|customers?)\b", "seg_app_first"),
+    (r"\b(increase|grow|drive|boost)\w* (traffic|visits|footfall)\b|\btraffic\b", "goal_traffic"),
+    (r"\b(increase|grow|boost)\w* (profit|margin)s?\b|\bprofit\b", "goal_profit"),
+    (r"\b(drive|increase|grow|boost)\w* engagement\b|\bengagement\b", "goal_engagement"),
+    (r"\b(launch|test|try)\w* (a )?new mechanics?\b|\bnew mechanics?\b", "goal_new_mechanic"),
+    (r"\b(breakfast|morning)\b", "dp_breakfast"),
+    (r"\b(lunch|midday)\b", "dp_lunch"),
+    (r"\b(late[- ]night|dinner|evening)\b", "dp_late_night"),
+    (r"\b(promotions?|deals?|promos?)\b", "offers"),
+    (r"\b(develop|create|design|generate|propose|give me|come up with|suggest)\b", ""),
+]
+NUMBER_WORDS = {"one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "top": ""}
+# Unigram weights. Defaults are injected, not said, so they weigh least.
+WEIGHT_CONTENT = 2.5
+WEIGHT_CANONICAL = 1.5
+WEIGHT_DEFAULT = 0.7
+WEIGHT_FILLER = 0.3
+FILLER_TOKENS = {"offers"}
+STOPWORDS = {"a", "an", "the", "for", "to", "of", "and", "with", "our", "that", "new", "innovative", "some", "please", "me", "we"}
+
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+
+
+def _canonical_tokens(query: str) -> tuple[list[str], list[str]]:
+    """(tokens said in the query, default goal/segment tokens the agents would assume)."""
+    text = (query or "").lower()
+    for pattern, repl in SYNONYMS:
+        text = re.sub(pattern, f" {repl} ", text)
+    tokens = [NUMBER_WORDS.get(t, t) for t in _WORD_RE.findall(text)]
+    tokens = [t for t in tokens if t and t not in STOPWORDS]
+    # Same defaults the agents apply when the request omits them ("increase traffic", "value-conscious customers").
+    defaults = []
+    if not any(t.startswith("goal_") for t in tokens):
+        defaults.append("goal_traffic")
+    if not any(t.startswith("seg_") for t in tokens):
+        defaults.append("seg_value_conscious")
+    return tokens, defaults
+
+
+def _scope_tokens(scope: Optional[dict[str, Optional[str]]]) -> list[str]:
+    return [f"scope_{k}={str(v).lower().replace(' ', '_')}" for k, v in sorted((scope or {}).items()) if v]
+
+
+def canonicalize(query: str, scope: Optional[dict[str, Optional[str]]] = None) -> list[str]:
+    """Lower-cased, synonym-normalized tokens of query, the agents' defaults, plus parsed scope."""
+    tokens, defaults = _canonical_tokens(query)
+    return tokens + defaults + _scope_tokens(scope)
+
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % HASH_DIM
+
+
+def _weight(token: str) -> float:
+    if token.isdigit() or token in FILLER_TOKENS:
+        return WEIGHT_FILLER
+    return WEIGHT_CANONICAL if "_" in token else WEIGHT_CONTENT
+
+
+def vectorize(query: str, scope: Optional[dict[str, Optional[str]]] = None) -> dict[int, float]:
+    """Sparse, L2-normalized hashed vector: weighted unigrams, bigrams, char trigrams of free words."""
+    tokens, defaults = _canonical_tokens(query)
+    vec: dict[int, float] = {}
+
+    def _add(feature: str, weight: float):
+        b = _bucket(feature)
+        vec[b] = vec.get(b, 0.0) + weight
+
+    for t in tokens:
+        _add("w:" + t, _weight(t))
+        if "_" not in t and len(t) > 3:
+            for i in range(len(t) - 2):
+                _add("c:" + t[i:i + 3], 0.1)
+    for t in defaults:
+        _add("w:" + t, WEIGHT_DEFAULT)
+    for t in _scope_tokens(scope):
+        _add("w:" + t, WEIGHT_CANONICAL)
+    for a, b in zip(tokens, tokens[1:]):
+        _add(f"b:{a}|{b}", 0.3)
+    norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+    return {k: v / norm for k, v in vec.items()}
+
+
+def scope_signature(scope: Optional[dict[str, Optional[str]]]) -> dict[str, str]:
+    """Parsed scope reduced to its set values, normalized for exact comparison."""
+    return {k: str(v).lower() for k, v in (scope or {}).items() if v}
+
+
+def _stored_vector(query: str, scope: Optional[dict[str, Optional[str]]]) -> dict[str, float]:
+    return {str(k): round(v, 6) for k, v in vectorize(query, scope).items()}
+
+
+def cosine(a: dict[int, float], b: dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class SemanticCache:
+    """On-disk semantic index of past (query, scope, data fingerprint) -> session_id."""
+
+    def __init__(
+        self,
+        path: Path,
+        threshold: Optional[float] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+    ):
+        self.path = Path(path)
+        self.threshold = threshold if threshold is not None else env_number("SEMANTIC_CACHE_THRESHOLD", DEFAULT_THRESHOLD)
+        self.max_entries = max_entries
+        self.max_age_s = max_age_days * 86400
+        self._store = LocalStorage(self.path.parent)
+
+    def _locked(self):
+        return self._store.lock(self.path.name)
+
+    def _load(self) -> dict[str, Any]:
+        raw = self._store.get(self.path.name)
+        try:
+            data = json.loads(raw) if raw else {}
+        except ValueError:
+            data = {}
+        data.setdefault("entries", [])
+        data.setdefault("metrics", {"lookups": 0, "hits": 0, "evictions": 0})
+        if data.get("version") != CANON_VERSION:
+            # Index built with older canonicalization/weights: re-vectorize from the stored queries.
+            for entry in data["entries"]:
+                entry["vector"] = _stored_vector(entry["query"], entry.get("scope"))
+            data["version"] = CANON_VERSION
+        return data
+
+    def _save(self, data: dict[str, Any]) -> None:
+        self._store.put(self.path.name, json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+    def _evict(self, data: dict[str, Any], now: float) -> None:
+        entries = [e for e in data["entries"] if now - e.get("last_used", e["created"]) <= self.max_age_s]
+        entries.sort(key=lambda e: e.get("last_used", e["created"]), reverse=True)
+        evicted = len(data["entries"]) - min(len(entries), self.max_entries)
+        data["entries"] = entries[: self.max_entries]
+        data["metrics"]["evictions"] += max(0, evicted)
+
+    def lookup(self, query: str, scope: Optional[dict[str, Optional[str]]], fingerprint: str) -> Optional[dict[str, Any]]:
+        """
+        Best previous entry for this request on the same data and parsed scope, if similarity >= threshold.
+        Returns {"session_id", "query", "similarity"} or None. Counts toward hit-rate metrics.
+        """
+        vec = vectorize(query, scope)
+        wanted_scope = scope_signature(scope)
+        with self._locked():
+            data = self._load()
+            now = time.time()
+            best, best_sim = None, 0.0
+            for entry in data["entries"]:
+                if entry["fingerprint"] != fingerprint or scope_signature(entry.get("scope")) != wanted_scope:
+                    continue
+                sim = cosine(vec, {int(k): v for k, v in entry["vector"].items()})
+                if sim > best_sim:
+                    best, best_sim = entry, sim
+            data["metrics"]["lookups"] += 1
+            hit = best is not None and best_sim >= self.threshold
+            if hit:
+                data["metrics"]["hits"] += 1
+                best["last_used"] = now
+                best["hits"] = best.get("hits", 0) + 1
+            self._save(data)
+        CACHE_LOOKUPS.inc(cache="semantic", result="hit" if hit else "miss")
+        if not hit:
+            return None
+        return {"session_id": best["session_id"], "query": best["query"], "similarity": round(best_sim, 4)}
+
+    def add(self, query: str, scope: Optional[dict[str, Optional[str]]], fingerprint: str, session_id: str) -> None:
+        """Index a completed session; evicts least-recently-used entries beyond max_entries."""
+        now = time.time()
+        entry = {
+            "session_id": session_id,
+            "query": query,
+            "scope": scope or {},
+            "fingerprint": fingerprint,
+            "vector": _stored_vector(query, scope),
+            "created": now,
+            "last_used": now,
+            "hits": 0,
+        }
+        with self._locked():
+            data = self._load()
+            data["entries"] = [e for e in data["entries"] if e["session_id"] != session_id]
+            data["entries"].append(entry)
+            self._evict(data, now)
+            self._save(data)
+
+    def remove(self, session_id: str) -> None:
+        """Drop entries pointing at a session (e.g. one that no longer exists)."""
+        with self._locked():
+            data = self._load()
+            data["entries"] = [e for e in data["entries"] if e["session_id"] != session_id]
+            self._save(data)
+
+    def stats(self) -> dict[str, Any]:
+        """Entries, lookups, hits, hit_rate, evictions."""
+        with self._locked():
+            data = self._load()
+        m = data["metrics"]
+        return {
+            "entries": len(data["entries"]),
+            "lookups": m["lookups"],
+            "hits": m["hits"],
+            "hit_rate": round(m["hits"] / m["lookups"], 4) if m["lookups"] else 0.0,
+            "evictions": m["evictions"],
+        }
@@ -0,0 +1,305 @@
+"""
+Indexed session store (SQLite, WAL mode, local file).
+Replaces one pretty-printed JSON file per session: the sidebar lists a page of session metadata from an index
+instead of globbing and stat-ing every file, search is full-text over the query (FTS5; LIKE where SQLite was built
+without it) plus exact segment/daypart filters, and step payloads live in their own table so a session's metadata
+and individual steps load without parsing the rest. With a BlobStore, large step fields are stored as shared,
+compressed blobs (src/blob_store.py) and read only when accessed.
+With a Storage (src/storage.py), each session is also written there as a small manifest (metadata plus blob
+references); that copy is the source of truth shared by every instance, and the SQLite file is a local index that
+sync() fills with sessions saved elsewhere.
+A run's profile (src/profiling.py), when it was profiled, is kept next to the session (profiles table and
+profiles/<id>.json in the storage).
+Existing sessions/*.json files are imported once, the first time a store is opened over that directory.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from src.blob_store import BlobStore, LazyStep
+from src.metrics import SESSION_IO_SECONDS
+from src.orchestrator import parse_scope
+from src.semantic_cache import canonicalize
+from src.storage import LocalStorage, Storage
+
+DEFAULT_PAGE_SIZE = 20
+MANIFEST_PREFIX = "manifests/"
+PROFILE_PREFIX = "profiles/"
+# sync() lists shared manifests at most this often unless forced.
+SYNC_INTERVAL_S = 15.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    created REAL NOT NULL,
+    segment TEXT,
+    daypart TEXT,
+    time_horizon TEXT,
+    n_steps INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_created ON sessions (created DESC);
+CREATE INDEX IF NOT EXISTS sessions_segment ON sessions (segment, created DESC);
+CREATE INDEX IF NOT EXISTS sessions_daypart ON sessions (daypart, created DESC);
+CREATE TABLE IF NOT EXISTS steps (
+    session_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    agent TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (session_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS profiles (session_id TEXT PRIMARY KEY, report TEXT NOT NULL);
+"""
+
+_FTS_WORD_RE = re.compile(r"\w+")
+
+
+def session_facets(query: str, scope: Optional[dict[str, Optional[str]]] = None) -> dict[str, Optional[str]]:
+    """segment (canonical, e.g. "discount_hunters"), daypart and time_horizon of a request, for filtering."""
+    scope = scope if scope is not None else parse_scope(query)
+    segment = next((t[len("seg_"):] for t in canonicalize(query) if t.startswith("seg_")), None)
+    return {"segment": segment, "daypart": scope.get("daypart"), "time_horizon": scope.get("time_horizon")}
+
+
+def _manifest_key(session_id: str) -> str:
+    return f"{MANIFEST_PREFIX}{session_id}.json"
+
+
+def _profile_key(session_id: str) -> str:
+    return f"{PROFILE_PREFIX}{session_id}.json"
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class SessionStore:
+    """Sessions and their steps in one SQLite database; safe to share between threads (one connection each)."""
+
+    def __init__(
+        self,
+        db_path: Path,
+        blobs: Optional[BlobStore] = None,
+        storage: Optional[Storage] = None,
+        sync_interval_s: float = SYNC_INTERVAL_S,
+    ):
+        self.db_path = Path(db_path)
+        self.blobs = blobs
+        self.storage = storage
+        self.sync_interval_s = sync_interval_s
+        self._last_sync = 0.0
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        try:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(id UNINDEXED, query)")
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(
+        self,
+        session_id: str,
+        query: str,
+        steps: list[dict[str, Any]],
+        scope: Optional[dict[str, Optional[str]]] = None,
+        created: Optional[float] = None,
+    ) -> None:
+        """Insert or replace a session and all of its steps (index: one transaction; storage: one manifest)."""
+        facets = session_facets(query, scope)
+        created = created or time.time()
+        with SESSION_IO_SECONDS.time(op="save"):
+            # Blobs, then the manifest, then the index: nothing committed ever references data that is not written yet.
+            payloads = [self.blobs.pack_step(s) if self.blobs else s for s in steps]
+            if self.storage is not None:
+                manifest = {"session_id": session_id, "query": query, "created": created, "facets": facets, "steps": payloads}
+                self.storage.put(_manifest_key(session_id), _dumps(manifest).encode("utf-8"))
+            self._index(session_id, query, created, facets, payloads)
+
+    def _index(
+        self, session_id: str, query: str, created: float, facets: dict[str, Optional[str]], payloads: list[dict[str, Any]]
+    ) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM steps WHERE session_id = ?", (session_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, query, created, segment, daypart, time_horizon, n_steps) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, query, created, facets["segment"], facets["daypart"], facets["time_horizon"], len(payloads)),
+            )
+            conn.executemany(
+                "INSERT INTO steps (session_id, idx, agent, payload) VALUES (?, ?, ?, ?)",
+                [(session_id, i, p.get("agent", ""), _dumps(p)) for i, p in enumerate(payloads)],
+            )
+            if self.fts:
+                conn.execute("DELETE FROM sessions_fts WHERE id = ?", (session_id,))
+                conn.execute("INSERT INTO sessions_fts (id, query) VALUES (?, ?)", (session_id, query))
+
+    def _import_manifest(self, session_id: str) -> bool:
+        """Index a session from its shared manifest; False if there is none."""
+        raw = self.storage.get(_manifest_key(session_id)) if self.storage is not None else None
+        if raw is None:
+            return False
+        m = json.loads(raw)
+        facets = m.get("facets") or session_facets(m["query"])
+        self._index(session_id, m["query"], m.get("created") or time.time(), facets, m.get("steps") or [])
+        return True
+
+    def sync(self, force: bool = False) -> int:
+        """Index sessions other instances saved to the shared storage. Throttled to sync_interval_s; returns count."""
+        if self.storage is None or (not force and time.time() - self._last_sync < self.sync_interval_s):
+            return 0
+        if not force and isinstance(self.storage, LocalStorage) and self.storage.root.resolve() == self.db_path.parent.resolve():
+            # The store's own directory has nothing remote to pull: every manifest in it was saved through this
+            # index. A forced sync still runs, to re-index manifests if sessions.db was lost.
+            return 0
+        self._last_sync = time.time()
+        shared = {k[len(MANIFEST_PREFIX):-len(".json")] for k in self.storage.list(MANIFEST_PREFIX) if k.endswith(".json")}
+        known = {r[0] for r in self._conn().execute("SELECT id FROM sessions")}
+        return sum(self._import_manifest(session_id) for session_id in sorted(shared - known))
+
+    def delete(self, session_id: str) -> None:
+        if self.storage is not None:
+            self.storage.delete(_manifest_key(session_id))
+            self.storage.delete(_profile_key(session_id))
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM steps WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.execute("DELETE FROM profiles WHERE session_id = ?", (session_id,))
+            if self.fts:
+                conn.execute("DELETE FROM sessions_fts WHERE id = ?", (session_id,))
+
+    def save_profile(self, session_id: str, report: dict[str, Any]) -> None:
+        """Store a run's profiling report (see src/profiling.py) with its session."""
+        raw = _dumps(report)
+        if self.storage is not None:
+            self.storage.put(_profile_key(session_id), raw.encode("utf-8"))
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO profiles (session_id, report) VALUES (?, ?)", (session_id, raw))
+
+    def profile(self, session_id: str) -> Optional[dict[str, Any]]:
+        """The session's profiling report, or None if the run was not profiled."""
+        row = self._conn().execute("SELECT report FROM profiles WHERE session_id = ?", (session_id,)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+        raw = self.storage.get(_profile_key(session_id)) if self.storage is not None else None
+        if raw is None:
+            return None
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO profiles (session_id, report) VALUES (?, ?)", (session_id, raw.decode("utf-8")))
+        return json.loads(raw)
+
+    def get(self, session_id: str) -> Optional[dict[str, Any]]:
+        """Session metadata (id, query, created, segment, daypart, time_horizon, n_steps) without steps."""
+        row = self._conn().execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None and self._import_manifest(session_id):
+            row = self._conn().execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return dict(row) if row else None
+
+    def steps(self, session_id: str, agents: Optional[list[str]] = None) -> list[LazyStep]:
+        """Steps in run order (only the given agents' when agents is set); large fields are read on access."""
+        sql = "SELECT payload FROM steps WHERE session_id = ?"
+        params: list[Any] = [session_id]
+        if agents:
+            sql += f" AND agent IN ({','.join('?' * len(agents))})"
+            params += list(agents)
+        rows = self._conn().execute(sql + " ORDER BY idx", params).fetchall()
+        return [LazyStep(json.loads(r["payload"]), self.blobs) for r in rows]
+
+    def load(self, session_id: str) -> Optional[dict[str, Any]]:
+        """Full session in the old JSON-file shape: {"session_id", "query", "steps"}."""
+        with SESSION_IO_SECONDS.time(op="load"):
+            meta = self.get(session_id)
+            if meta is None:
+                return None
+            return {"session_id": session_id, "query": meta["query"], "steps": self.steps(session_id)}
+
+    def _where(
+        self, search: Optional[str], segment: Optional[str], daypart: Optional[str]
+    ) -> tuple[str, list[Any]]:
+        clauses: list[str] = []
+        params: list[Any] = []
+        words = _FTS_WORD_RE.findall(search or "")
+        if words and self.fts:
+            # Every word must match, as a prefix ("disc" finds "discount").
+            clauses.append("id IN (SELECT id FROM sessions_fts WHERE sessions_fts MATCH ?)")
+            params.append(" ".join(f'"{w}"*' for w in words))
+        elif words:
+            for w in words:
+                clauses.append("query LIKE ?")
+                params.append(f"%{w}%")
+        if segment:
+            clauses.append("segment = ?")
+            params.append(segment)
+        if daypart:
+            clauses.append("daypart = ?")
+            params.append(daypart)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def list_page(
+        self,
+        offset: int = 0,
+        limit: int = DEFAULT_PAGE_SIZE,
+        search: Optional[str] = None,
+        segment: Optional[str] = None,
+        daypart: Optional[str] = None,
+    ) -> list[dict[str, Any]]:
+        """One page of session metadata, newest first, filtered by full-text search, segment and daypart."""
+        where, params = self._where(search, segment, daypart)
+        rows = self._conn().execute(
+            f"SELECT * FROM sessions{where} ORDER BY created DESC, id LIMIT ? OFFSET ?", params + [limit, offset]
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self, search: Optional[str] = None, segment: Optional[str] = None, daypart: Optional[str] = None) -> int:
+        where, params = self._where(search, segment, daypart)
+        return self._conn().execute(f"SELECT COUNT(*) FROM sessions{where}", params).fetchone()[0]
+
+    def segments(self) -> list[str]:
+        rows = self._conn().execute("SELECT DISTINCT segment FROM sessions WHERE segment IS NOT NULL ORDER BY 1")
+        return [r[0] for r in rows]
+
+    def migrate_json_dir(self, sessions_dir: Path) -> int:
+        """
+        Import sessions/*.json once (files are left in place; later runs skip the scan).
+        Sessions already in the store are not overwritten. Returns the number imported.
+        """
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return 0
+        imported = 0
+        for path in sorted(Path(sessions_dir).glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            session_id = data.get("session_id") or path.stem
+            if self.get(session_id) is not None:
+                continue
+            self.save(session_id, data.get("query", ""), data.get("steps") or [], created=path.stat().st_mtime)
+            imported += 1
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (str(time.time()),))
+        return imported
@@ -0,0 +1,100 @@
+"""
+Stage cache for the evidence agents (Market Research, Customer Insights, Competitor Intelligence).
+An evidence stage's output depends on the data, the model, the output mode and the request's facets
+(goal, segment, daypart, time horizon) - not on how the request is worded. Requests made only of
+facets and filler words ("Develop 3 traffic offers for deal seekers, breakfast, Q1") share one entry;
+requests with anything else in them are not cached. Entries are one JSON value each in a Storage (a local
+directory by default, or the shared store so every instance reuses them; see src/storage.py).
+"""
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from src.metrics import CACHE_LOOKUPS
+from src.semantic_cache import canonicalize
+from src.storage import LocalStorage, Storage
+
+FACET_PREFIXES = ("goal_", "seg_", "dp_", "scope_")
+# Words that carry no evidence-stage meaning once facets are extracted (counts, horizon phrasing, "all day").
+FILLER = {
+    "offers", "offer", "next", "this", "quarter", "quarters", "q1", "q2", "q3", "q4",
+    "week", "weeks", "month", "months", "campaign", "all", "day", "only", "customers", "segment",
+    "in", "during", "over", "at", "on", "by",
+}
+DEFAULT_MAX_ENTRIES = 5000
+_EVICT_EVERY = 50
+
+
+def request_key(query: str, scope: Optional[dict[str, Optional[str]]] = None) -> Optional[str]:
+    """Facet key for a request, or None if it has content beyond facets (then it must not be cached)."""
+    tokens = canonicalize(query, scope)
+    facets = sorted({t for t in tokens if t.startswith(FACET_PREFIXES)})
+    extra = [t for t in tokens if not t.startswith(FACET_PREFIXES) and t not in FILLER and not t.isdigit()]
+    if extra:
+        return None
+    return "|".join(facets)
+
+
+class StageCache:
+    """Cache of evidence-stage results (output, tables, prompts) in a Storage or a local directory."""
+
+    def __init__(self, root: Union[Path, Storage], max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.storage = root if isinstance(root, Storage) else LocalStorage(root)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(agent: str, model: str, fingerprint: str, structured: bool, req_key: str) -> str:
+        raw = json.dumps([agent, model, fingerprint, bool(structured), req_key])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        raw = self.storage.get(self._key(key))
+        try:
+            result = json.loads(raw) if raw is not None else None
+        except ValueError:
+            result = None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        CACHE_LOOKUPS.inc(cache="stage", result="miss" if result is None else "hit")
+        return result
+
+    def contains(self, key: str) -> bool:
+        return self.storage.exists(self._key(key))
+
+    def put(self, key: str, result: dict[str, Any]) -> None:
+        data = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.storage.put(self._key(key), data)
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % _EVICT_EVERY == 0
+        if evict:
+            self._evict()
+
+    def _entries(self) -> list[str]:
+        return [k for k in self.storage.list() if k.endswith(".json") and "/" not in k]
+
+    def _evict(self) -> None:
+        """Drop the oldest entries beyond max_entries."""
+        stats = [(k, self.storage.stat(k)) for k in self._entries()]
+        stats.sort(key=lambda ks: ks[1][1] if ks[1] else 0.0, reverse=True)
+        for k, _ in stats[self.max_entries:]:
+            self.storage.delete(k)
+
+    def stats(self) -> dict[str, int]:
+        entries = len(self._entries())
+        with self._lock:
+            return {"entries": entries, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,367 @@
+"""
+Pluggable key/value storage for sessions, caches and checkpoints.
+Keys are relative, "/"-separated paths ("blobs/ab/abcd...", "manifests/1a2b3c4d.json"). Backends:
+- LocalStorage: a directory. Writes go to a temp file in the same directory and are renamed into place, so readers
+  never see a partial value; lock(key) is an exclusive advisory file lock (fcntl) that also serializes processes.
+- HttpStorage: a shared object store over HTTP (GET/PUT/DELETE/HEAD /o/<key>, GET /o/?prefix=...), so every
+  instance behind the load balancer sees the same sessions. serve_storage() runs a compatible stand-in over a
+  LocalStorage for local runs and tests (scripts/storage_server.py).
+- CachedStorage: a read-through local cache in front of another backend. Concurrent misses for one key are
+  collapsed into a single fetch; keys under immutable prefixes (content-addressed blobs) are cached for good,
+  everything else for ttl_s.
+get_storage() picks the backend from STORAGE_URL (unset: local directory).
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator, Optional
+
+from src.metrics import CACHE_LOOKUPS
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks are process-local only
+    fcntl = None
+
+_KEY_RE = re.compile(r"^[A-Za-z0-9._-]+(/[A-Za-z0-9._-]+)*$")
+LOCK_DIR = ".locks"
+DEFAULT_CACHE_TTL_S = 30.0
+IMMUTABLE_PREFIXES = ("blobs/",)
+HTTP_TIMEOUT_S = 30
+
+
+class StorageError(RuntimeError):
+    """A storage backend failed (I/O or remote error)."""
+
+
+def check_key(key: str) -> str:
+    if not _KEY_RE.match(key or "") or any(part in (".", "..") for part in key.split("/")):
+        raise ValueError(f"Invalid storage key: {key!r}")
+    return key
+
+
+class Storage:
+    """Interface. get returns None for a missing key; put replaces the value atomically."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def put(self, key: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Optional[tuple[int, float]]:
+        """(size in bytes, modification time) or None if missing."""
+        raise NotImplementedError
+
+    def list(self, prefix: str = "") -> list[str]:
+        """Keys starting with prefix, sorted."""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        """Exclusive lock for a read-modify-write of key. The base implementation only serializes this process."""
+        with _process_lock(key):
+            yield
+
+
+_process_locks: dict[str, threading.Lock] = {}
+_process_locks_guard = threading.Lock()
+
+
+def _process_lock(name: str) -> threading.Lock:
+    with _process_locks_guard:
+        return _process_locks.setdefault(name, threading.Lock())
+
+
+class LocalStorage(Storage):
+    """Keys as files under root."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        return self.root / check_key(key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self.path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def delete(self, key: str) -> None:
+        try:
+            self.path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def stat(self, key: str) -> Optional[tuple[int, float]]:
+        try:
+            st = self.path(key).stat()
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime
+
+    def list(self, prefix: str = "") -> list[str]:
+        # Walk only the directory holding the prefix (e.g. manifests/), not every blob under root.
+        base = self.root / prefix.rpartition("/")[0]
+        if not base.is_dir():
+            return []
+        keys = []
+        for p in base.rglob("*"):
+            rel = p.relative_to(self.root).as_posix()
+            # Skip temp files, lock files and local caches (dot-names).
+            if p.is_file() and rel.startswith(prefix) and not any(part.startswith(".") for part in rel.split("/")):
+                keys.append(rel)
+        return sorted(keys)
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        """Exclusive across threads (process lock) and processes (flock on root/.locks/<key>.lock)."""
+        lock_path = self.root / LOCK_DIR / (check_key(key).replace("/", "__") + ".lock")
+        with _process_lock(str(lock_path)):
+            if fcntl is None:
+                yield
+                return
+            lock_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(lock_path, "a") as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class HttpStorage(Storage):
+    """Shared object store at base_url (see serve_storage for the protocol)."""
+
+    def __init__(self, base_url: str, prefix: str = "", timeout: float = HTTP_TIMEOUT_S):
+        self.base_url = base_url.rstrip("/")
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def _request(self, method: str, key: str = "", data: Optional[bytes] = None, query: str = ""):
+        path = check_key(self.prefix + key) if key else ""
+        url = f"{self.base_url}/o/{urllib.parse.quote(path)}{query}"
+        req = urllib.request.Request(url, data=data, method=method)
+        try:
+            return urllib.request.urlopen(req, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise StorageError(f"{method} {url} failed: HTTP {e.code}") from e
+        except OSError as e:
+            raise StorageError(f"{method} {url} failed: {e}") from e
+
+    def get(self, key: str) -> Optional[bytes]:
+        resp = self._request("GET", key)
+        if resp is None:
+            return None
+        with resp:
+            return resp.read()
+
+    def put(self, key: str, data: bytes) -> None:
+        resp = self._request("PUT", key, data)
+        if resp is not None:
+            resp.close()
+
+    def delete(self, key: str) -> None:
+        resp = self._request("DELETE", key)
+        if resp is not None:
+            resp.close()
+
+    def stat(self, key: str) -> Optional[tuple[int, float]]:
+        resp = self._request("HEAD", key)
+        if resp is None:
+            return None
+        with resp:
+            return int(resp.headers.get("Content-Length", 0)), float(resp.headers.get("X-Mtime", 0))
+
+    def list(self, prefix: str = "") -> list[str]:
+        resp = self._request("GET", query="?" + urllib.parse.urlencode({"prefix": self.prefix + prefix}))
+        if resp is None:
+            return []
+        with resp:
+            return [k[len(self.prefix):] for k in json.loads(resp.read())]
+
+
+class CachedStorage(Storage):
+    """Read-through cache: reads come from cache when fresh, writes go to the backend first, then the cache."""
+
+    def __init__(
+        self,
+        backend: Storage,
+        cache: LocalStorage,
+        ttl_s: float = DEFAULT_CACHE_TTL_S,
+        immutable_prefixes: tuple[str, ...] = IMMUTABLE_PREFIXES,
+    ):
+        self.backend = backend
+        self.cache = cache
+        self.ttl_s = ttl_s
+        self.immutable_prefixes = immutable_prefixes
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, key: str) -> bool:
+        st = self.cache.stat(key)
+        if st is None:
+            return False
+        return key.startswith(self.immutable_prefixes) or time.time() - st[1] < self.ttl_s
+
+    def get(self, key: str) -> Optional[bytes]:
+        if self._fresh(key):
+            data = self.cache.get(key)
+            if data is not None:
+                self.hits += 1
+                CACHE_LOOKUPS.inc(cache="storage", result="hit")
+                return data
+        # One fetch per key at a time: concurrent misses wait and then read what the first one cached.
+        with _process_lock(f"fetch:{id(self)}:{key}"):
+            if self._fresh(key):
+                data = self.cache.get(key)
+                if data is not None:
+                    self.hits += 1
+                    CACHE_LOOKUPS.inc(cache="storage", result="hit")
+                    return data
+            self.misses += 1
+            CACHE_LOOKUPS.inc(cache="storage", result="miss")
+            data = self.backend.get(key)
+            if data is None:
+                self.cache.delete(key)
+            else:
+                self.cache.put(key, data)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self.backend.put(key, data)
+        self.cache.put(key, data)
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+        self.cache.delete(key)
+
+    def stat(self, key: str) -> Optional[tuple[int, float]]:
+        if key.startswith(self.immutable_prefixes):
+            st = self.cache.stat(key)
+            if st is not None:
+                return st
+        return self.backend.stat(key)
+
+    def list(self, prefix: str = "") -> list[str]:
+        return self.backend.list(prefix)
+
+    def lock(self, key: str):
+        return self.backend.lock(key)
+
+
+def serve_storage(storage: Storage, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    HTTP stand-in for the shared store, backed by storage. Returns the server (already listening; call
+    serve_forever() or run it in a thread). port=0 picks a free port: server.server_address has the real one.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def _key(self) -> Optional[str]:
+            parsed = urllib.parse.urlparse(self.path)
+            if not parsed.path.startswith("/o/"):
+                return None
+            return urllib.parse.unquote(parsed.path[len("/o/"):])
+
+        def _reply(self, code: int, body: bytes = b"", headers: Optional[dict[str, str]] = None) -> None:
+            self.send_response(code)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def _handle(self, fn) -> None:
+            key = self._key()
+            if key is None:
+                return self._reply(404)
+            try:
+                fn(key)
+            except ValueError:
+                self._reply(400)
+
+        def do_GET(self):
+            def _get(key: str):
+                if not key:
+                    query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    prefix = query.get("prefix", [""])[0]
+                    return self._reply(200, json.dumps(storage.list(prefix)).encode("utf-8"))
+                data = storage.get(key)
+                self._reply(404) if data is None else self._reply(200, data)
+            self._handle(_get)
+
+        def do_HEAD(self):
+            def _head(key: str):
+                st = storage.stat(key) if key else None
+                if st is None:
+                    return self._reply(404)
+                self.send_response(200)
+                self.send_header("Content-Length", str(st[0]))
+                self.send_header("X-Mtime", str(st[1]))
+                self.end_headers()
+            self._handle(_head)
+
+        def do_PUT(self):
+            def _put(key: str):
+                data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                storage.put(key, data)
+                self._reply(204)
+            self._handle(_put)
+
+        def do_DELETE(self):
+            def _delete(key: str):
+                storage.delete(key)
+                self._reply(204)
+            self._handle(_delete)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def get_storage(local_root: Path, namespace: str) -> Storage:
+    """
+    Storage for one namespace ("sessions", "stages", ...). STORAGE_URL=http(s)://host:port selects the shared
+    HTTP store (keys under <namespace>/), with a read-through cache in local_root/.cache. Unset: LocalStorage(local_root).
+    """
+    url = os.environ.get("STORAGE_URL", "").strip()
+    if not url:
+        return LocalStorage(local_root)
+    if not url.startswith(("http://", "https://")):
+        raise ValueError(f"Unsupported STORAGE_URL {url!r}: expected http(s)://...")
+    return CachedStorage(HttpStorage(url, prefix=f"{namespace}/"), LocalStorage(Path(local_root) / ".cache"))
@@ -0,0 +1,240 @@
+"""
+Structured agent output: JSON schemas for the four agents and a single-pass incremental parser.
+The parser is fed LLM text as it streams in and emits table rows as soon as each one is complete:
+- JSON: every object that is an element of a top-level array (e.g. {"trend_briefs": [{...}, {...}]} or [{...}]),
+  grouped by the array's key.
+- Markdown: rows of pipe tables (outer pipes optional, as in GFM), grouped as "markdown", "markdown_2", ...
+Each character is scanned once; completed JSON rows are decoded from their own slice only.
+"""
+
+import json
+import logging
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_STR = {"type": "string"}
+
+
+def _array_of(properties: list[str], required: Optional[list[str]] = None) -> dict[str, Any]:
+    return {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {p: _STR for p in properties},
+            "required": required or properties[:1],
+        },
+    }
+
+
+# Response schemas (JSON Schema subset accepted by both the OpenAI-compatible gateway and Gemini).
+MARKET_RESEARCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "trend_briefs": _array_of(["title", "summary", "evidence", "signal_strength", "directions"]),
+    },
+    "required": ["trend_briefs"],
+}
+
+CUSTOMER_INSIGHTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "customer_insights": _array_of(["segment", "description", "preferred_mechanics", "messaging", "metrics"]),
+    },
+    "required": ["customer_insights"],
+}
+
+COMPETITOR_INTEL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "competitive_landscape": _array_of(["brand", "mechanic", "duration", "channel", "lift"]),
+        "whitespace_opportunities": _array_of(["opportunity", "rationale"]),
+    },
+    "required": ["competitive_landscape", "whitespace_opportunities"],
+}
+
+OFFER_DESIGN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "offer_concepts": _array_of([
+            "name", "mechanic", "channel", "duration", "target", "evidence", "rationale", "feasibility", "impact",
+        ]),
+    },
+    "required": ["offer_concepts"],
+}
+
+JSON_INSTRUCTION = "Respond only with JSON matching the provided response schema."
+
+MARKDOWN_TABLE = "markdown"
+
+
+class TableStreamParser:
+    """
+    Incremental, single-pass table extractor. Call feed(chunk) as text arrives, finish() at the end.
+    on_row(table_name, row) is called for each completed row.
+    """
+
+    def __init__(self, on_row: Optional[Callable[[str, dict[str, Any]], None]] = None):
+        self.tables: dict[str, list[dict[str, Any]]] = {}
+        self._on_row = on_row
+        self._fed = False
+        # JSON scanner state
+        self._stack: list[tuple[str, str]] = []  # (container, key of array / "" for objects)
+        self._in_string = False
+        self._escape = False
+        self._capture_key = False
+        self._key_chars: list[str] = []
+        self._last_key = ""
+        self._expect_key = False
+        self._row_depth = 0
+        self._row_table = ""
+        self._row_chars: list[str] = []
+        # Markdown state
+        self._line: list[str] = []
+        self._line_at_root = True
+        self._md_header: Optional[list[str]] = None
+        self._md_pending: Optional[list[str]] = None
+        self._md_name = ""
+        self._md_count = 0
+
+    def _emit(self, table: str, row: dict[str, Any]) -> None:
+        self.tables.setdefault(table, []).append(row)
+        if self._on_row:
+            try:
+                self._on_row(table, row)
+            except Exception:
+                # A failing display callback must not abort the LLM stream; keep the row and report the error.
+                logger.exception("on_row callback failed for table %r", table)
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        self._fed = True
+        for ch in chunk:
+            self._scan_json(ch)
+            if ch == "\n":
+                self._end_line()
+            else:
+                self._line.append(ch)
+
+    def _scan_json(self, ch: str) -> None:
+        if self._row_depth:
+            self._row_chars.append(ch)
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._capture_key:
+                    self._last_key = "".join(self._key_chars)
+                    self._capture_key = False
+            elif self._capture_key:
+                self._key_chars.append(ch)
+            return
+        if ch == '"':
+            # Strings only count inside a JSON container; stray quotes in prose are ignored.
+            if self._stack:
+                self._in_string = True
+                if self._stack[-1][0] == "{" and self._expect_key:
+                    self._capture_key = True
+                    self._key_chars = []
+                    self._expect_key = False
+        elif ch == "{":
+            parent = self._stack[-1] if self._stack else None
+            self._stack.append(("{", ""))
+            self._expect_key = True
+            if parent and parent[0] == "[" and not self._row_depth:
+                self._row_depth = len(self._stack)
+                self._row_table = parent[1]
+                self._row_chars = ["{"]
+        elif ch == "[":
+            if self._stack and self._stack[-1][0] == "{":
+                key = self._last_key
+            elif self._stack:
+                key = self._stack[-1][1]
+            else:
+                key = ""
+            self._stack.append(("[", key))
+        elif ch in "}]":
+            if not self._stack:
+                return
+            depth = len(self._stack)
+            self._stack.pop()
+            if ch == "}" and self._row_depth and depth == self._row_depth:
+                text = "".join(self._row_chars)
+                self._row_depth = 0
+                self._row_chars = []
+                try:
+                    row = json.loads(text)
+                except ValueError:
+                    row = None
+                if isinstance(row, dict):
+                    self._emit(self._row_table or "json", row)
+        elif ch == ",":
+            if self._stack and self._stack[-1][0] == "{":
+                self._expect_key = True
+
+    def _end_line(self) -> None:
+        line = "".join(self._line).strip()
+        at_root = self._line_at_root
+        self._line = []
+        self._line_at_root = not self._in_string
+        if not at_root:
+            return
+        if "|" not in line:
+            self._md_header = None
+            self._md_pending = None
+            return
+        cells = [c.strip() for c in line.strip("|").split("|")]
+        is_delimiter = any(cells) and all(set(c) <= set("-: ") for c in cells)
+        if self._md_header is None:
+            if is_delimiter:
+                # GFM tables may omit the outer pipes: a header line is only known once its delimiter row follows.
+                if self._md_pending:
+                    self._start_table(self._md_pending)
+                self._md_pending = None
+            elif line.startswith("|"):
+                self._start_table(cells)
+            else:
+                self._md_pending = cells
+            return
+        if is_delimiter:
+            return
+        if len(cells) >= len(self._md_header):
+            self._emit(self._md_name, {h: c for h, c in zip(self._md_header, cells) if h})
+
+    def _start_table(self, header: list[str]) -> None:
+        self._md_header = header
+        self._md_count += 1
+        self._md_name = MARKDOWN_TABLE if self._md_count == 1 else f"{MARKDOWN_TABLE}_{self._md_count}"
+
+    def finish(self, full_text: Optional[str] = None) -> dict[str, list[dict[str, Any]]]:
+        """
+        Flush the last line and return all tables. If nothing was fed (e.g. a non-streaming call),
+        full_text is parsed in one go.
+        """
+        if not self._fed and full_text:
+            self.feed(full_text)
+        if self._line:
+            self._end_line()
+        return self.tables
+
+
+def parse_tables(text: str) -> dict[str, list[dict[str, Any]]]:
+    """All JSON and markdown tables in text, in one pass."""
+    return TableStreamParser().finish(text or "")
+
+
+def primary_table(tables: Optional[dict[str, list[dict[str, Any]]]]) -> Optional[list[dict[str, Any]]]:
+    """Rows of the table to display for a step: first JSON table, else first markdown table."""
+    if not tables:
+        return None
+    for name, rows in tables.items():
+        if rows and not name.startswith(MARKDOWN_TABLE):
+            return rows
+    for rows in tables.values():
+        if rows:
+            return rows
+    return None
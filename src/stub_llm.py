@@ -0,0 +1,242 @@
+"""
+Local stand-in for the OpenAI-compatible gateway (GEMINI_BASE_URL), for load tests and offline runs.
+serve_stub_llm() answers POST .../chat/completions (plain and streamed, as call_llm sends them) with canned,
+agent-shaped outputs: the agent is recognized from its system prompt and the reply has that agent's tables, as
+JSON when response_format asks for a schema and as markdown otherwise. StubConfig sets the behaviour to load-test
+against: time to first token (log-normal around a median), streaming speed, and the share of requests answered
+with HTTP 500 or 429 (with Retry-After). Requests that offer tools get one tool call first (the first declared
+tool, with CANNED_TOOL_ARGS) and the canned output once a tool result is in the messages. Counters are served at
+GET /stats.
+scripts/stub_llm_server.py runs it standalone; scripts/load_test.py drives it with concurrent users.
+"""
+
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+from src.prompt_budget import estimate_tokens
+from src.structured import (
+    COMPETITOR_INTEL_SCHEMA,
+    CUSTOMER_INSIGHTS_SCHEMA,
+    MARKET_RESEARCH_SCHEMA,
+    OFFER_DESIGN_SCHEMA,
+)
+
+# Agent name in the system prompt -> the schema whose tables the canned reply contains.
+AGENT_SCHEMAS = {
+    "Market Trends": MARKET_RESEARCH_SCHEMA,
+    "Customer Insights": CUSTOMER_INSIGHTS_SCHEMA,
+    "Competitor Intelligence": COMPETITOR_INTEL_SCHEMA,
+    "Offer Design": OFFER_DESIGN_SCHEMA,
+}
+CANNED_ROWS = 5
+# Arguments of the stub's tool call, per tool name (src/data_tools.py); other tools are called without arguments.
+CANNED_TOOL_ARGS = {
+    "group_by_aggregate": {"table": "customer_transactions", "group_by": ["channel"], "metric": "count"},
+    "filter_rows": {"table": "customer_transactions", "daypart": "breakfast", "limit": 5},
+    "search_text": {"table": "customer_feedback", "query": "app deal", "k": 5},
+    "theme_timeseries": {"theme": "Gamification", "interval": "month"},
+}
+# Streamed chunks carry about this many tokens (~4 characters each).
+CHUNK_TOKENS = 4
+
+
+class StubConfig:
+    """
+    Behaviour of the stub. latency_s: median time to first token; latency_sigma: log-normal spread (0 = fixed);
+    tokens_per_s: streaming speed (0 = instant); error_rate / rate_limit_rate: share of requests answered with
+    HTTP 500 / 429; retry_after_s: Retry-After sent with 429s; seed: makes the draws reproducible.
+    """
+
+    def __init__(
+        self,
+        latency_s: float = 0.8,
+        latency_sigma: float = 0.5,
+        tokens_per_s: float = 80.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after_s: float = 1.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_s = latency_s
+        self.latency_sigma = latency_sigma
+        self.tokens_per_s = tokens_per_s
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_s = retry_after_s
+        self.seed = seed
+
+
+def _text_of(content: Any) -> str:
+    """Message content as text (plain string, or the list of parts sent with cache_control)."""
+    if isinstance(content, list):
+        return "".join(p.get("text", "") for p in content if isinstance(p, dict))
+    return content or ""
+
+
+def agent_schema(system_prompt: str) -> dict[str, Any]:
+    return next((s for name, s in AGENT_SCHEMAS.items() if name in system_prompt[:200]), OFFER_DESIGN_SCHEMA)
+
+
+def canned_output(system_prompt: str, structured: bool = False) -> str:
+    """The agent's tables (CANNED_ROWS rows each): JSON in structured mode, else markdown with a heading per table."""
+    tables = {}
+    for key, prop in agent_schema(system_prompt)["properties"].items():
+        fields = list(prop["items"]["properties"])
+        tables[key] = [{f: f"{f.replace('_', ' ')} {i + 1} for {key.replace('_', ' ')}" for f in fields} for i in range(CANNED_ROWS)]
+    if structured:
+        return json.dumps(tables, indent=2)
+    parts = []
+    for key, rows in tables.items():
+        fields = list(rows[0])
+        parts.append(f"### {key.replace('_', ' ').title()}\n")
+        parts.append("| " + " | ".join(f.replace("_", " ").title() for f in fields) + " |")
+        parts.append("|" + "---|" * len(fields))
+        parts.extend("| " + " | ".join(r[f] for f in fields) + " |" for r in rows)
+        parts.append("")
+    return "\n".join(parts)
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "streamed": 0, "completed": 0, "errors": 0, "rate_limited": 0}
+
+    def add(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+def serve_stub_llm(config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Stub gateway (already listening; call serve_forever() or run it in a thread). port=0 picks a free port. Point
+    call_llm at it with GEMINI_BASE_URL=http://host:port/v1 and any GEMINI_API_KEY. server.stats.snapshot() has
+    the counters.
+    """
+    config = config or StubConfig()
+    rng = random.Random(config.seed)
+    rng_lock = threading.Lock()
+    stats = _Stats()
+
+    def draw() -> tuple[float, float]:
+        with rng_lock:
+            latency = config.latency_s * (math.exp(rng.gauss(0, config.latency_sigma)) if config.latency_sigma > 0 else 1)
+            return latency, rng.random()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _json(self, code: int, body: dict[str, Any], headers: Optional[dict[str, str]] = None) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                return self._json(200, stats.snapshot())
+            if self.path.rstrip("/").endswith("/models"):
+                return self._json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+            self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                return self._json(404, {"error": {"message": "not found"}})
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            stats.add("requests")
+            latency, roll = draw()
+            if roll < config.rate_limit_rate:
+                stats.add("rate_limited")
+                return self._json(
+                    429,
+                    {"error": {"message": "Rate limit exceeded (stub)", "type": "rate_limit_error"}},
+                    {"Retry-After": f"{config.retry_after_s:g}"},
+                )
+            if roll < config.rate_limit_rate + config.error_rate:
+                stats.add("errors")
+                return self._json(500, {"error": {"message": "Internal error (stub)", "type": "server_error"}})
+
+            messages = body.get("messages") or []
+            system = next((_text_of(m.get("content")) for m in messages if m.get("role") == "system"), "")
+            prompt = "".join(_text_of(m.get("content")) for m in messages)
+            structured = (body.get("response_format") or {}).get("type") == "json_schema"
+            text = canned_output(system, structured)
+            model = body.get("model") or "stub"
+            tool_call = None
+            if body.get("tools") and body.get("tool_choice") != "none" and not any(m.get("role") == "tool" for m in messages):
+                name = body["tools"][0]["function"]["name"]
+                tool_call = {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {"name": name, "arguments": json.dumps(CANNED_TOOL_ARGS.get(name, {}))},
+                }
+                text = tool_call["function"]["arguments"]
+            usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(text)}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            time.sleep(latency)
+            if body.get("stream"):
+                stats.add("streamed")
+                self._stream(text, model)
+            else:
+                if config.tokens_per_s > 0:
+                    time.sleep(usage["completion_tokens"] / config.tokens_per_s)
+                if tool_call:
+                    message = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+                else:
+                    message = {"role": "assistant", "content": text}
+                self._json(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+                    "usage": usage,
+                })
+            stats.add("completed")
+
+        def _stream(self, text: str, model: str) -> None:
+            """Server-sent events, one chat.completion.chunk per CHUNK_TOKENS tokens, paced at tokens_per_s."""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            step = CHUNK_TOKENS * 4
+            delay = CHUNK_TOKENS / config.tokens_per_s if config.tokens_per_s > 0 else 0
+            for i in range(0, len(text), step):
+                if delay:
+                    time.sleep(delay)
+                self._event({"delta": {"content": text[i:i + step]}, "finish_reason": None}, chunk_id, model)
+            self._event({"delta": {}, "finish_reason": "stop"}, chunk_id, model)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _event(self, choice: dict[str, Any], chunk_id: str, model: str) -> None:
+            chunk = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, **choice}],
+            }
+            self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.stats = stats
+    return server
@@ -3,13 +3,16 @@ Wendy's Hackathon – Streamlit app.
 Multi-agent workflow: User Query -> Market Research -> Customer Insights -> Competitor Intelligence -> Offer Design (Top 3).
 """
 
+import hashlib
+import inspect
 import json
 import os
-import re
 import subprocess
 import sys
+import time
 import uuid
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
 # Default: load .env from project root (GEMINI_API_KEY, GEMINI_BASE_URL, GEMINI_MODEL)
 PROJECT_ROOT = Path(__file__).resolve().parent
@@ -19,18 +22,48 @@ try:
 except ImportError:
     pass
 
-import pandas as pd
 import streamlit as st
 
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from src.data_loaders import data_available, get_data_dir, load_market_trends, load_customer_transactions, load_customer_feedback, load_competitor_intel
-from src.llm import get_api_key, call_llm
-from src.orchestrator import run_workflow
-
-SESSIONS_DIR = PROJECT_ROOT / "sessions"
+from src.blob_store import BlobStore
+from src.data_tools import data_tools_enabled
+from src.deep_research import SummaryCache, deep_research_enabled
+from src.data_loaders import DATA_FILES, data_available, data_fingerprint, get_data_dir
+from src.llm import get_api_key, call_llm, get_context_cache
+from src.jobs import ACTIVE, FAILED, QUEUED, AdmissionError, get_job_manager
+from src.metrics import REGISTRY, start_exporter
+from src.offer_ranking import MAX_CANDIDATES, offer_candidates_setting
+from src.orchestrator import parse_scope, run_workflow
+from src.prewarm import cancel_prewarm, current_prewarm, grid_queries, start_prewarm
+from src.profiling import profile_call, profiling_enabled
+from src.semantic_cache import SemanticCache
+from src.session_store import SessionStore
+from src.stage_cache import StageCache
+from src.storage import get_storage
+from src.structured import MARKDOWN_TABLE, parse_tables, primary_table
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# WENDYS_SESSIONS_DIR / WENDYS_CACHE_DIR relocate sessions and caches (e.g. load tests against a scratch directory).
+SESSIONS_DIR = Path(os.environ.get("WENDYS_SESSIONS_DIR") or PROJECT_ROOT / "sessions")
+SESSION_DB_NAME = "sessions.db"
+SESSIONS_PAGE_SIZE = 20
+# Seconds between status polls of a background run.
+POLL_SECONDS = 1.0
+# A validated API key is re-checked with a live call at most this often per process.
+API_KEY_CHECK_TTL_S = 900
+# A failed key check is repeated on the next rerun after this long (the key or quota may have been fixed).
+API_KEY_FAILURE_RETRY_S = 30
+# Prompt views longer than this are cut, with a "Show full" option.
+PROMPT_PREVIEW_CHARS = 4000
+CACHE_DIR = Path(os.environ.get("WENDYS_CACHE_DIR") or PROJECT_ROOT / "cache")
 DATA_DIR = get_data_dir()
+SEMANTIC_CACHE = SemanticCache(CACHE_DIR / "semantic_index.json")
+STAGE_CACHE = StageCache(get_storage(CACHE_DIR / "stages", "stages"))
+SUMMARY_CACHE = SummaryCache(get_storage(CACHE_DIR / "summaries", "summaries"))
 
 AGENT_ICONS = {
     "Market Trends & Deep Research": "📊",
@@ -59,58 +92,58 @@ PROMPT_HELP_DAYPARTS = ["Breakfast", "Lunch", "Late-night", "All day"]
 PROMPT_HELP_HORIZONS = ["Next quarter", "Q1", "6 weeks", "2-week campaign"]
 
 
-def parse_scope(query: str) -> dict:
-    """Extract daypart and time_horizon from user query so agents can scope offers (e.g. breakfast only, Q1)."""
-    q = (query or "").lower()
-    daypart = None
-    if any(x in q for x in ("breakfast", "morning")):
-        daypart = "breakfast"
-    elif any(x in q for x in ("lunch", "midday")):
-        daypart = "lunch"
-    elif any(x in q for x in ("late-night", "late night", "dinner", "evening")):
-        daypart = "late-night"
-    time_horizon = None
-    if re.search(r"\bq1\b", q):
-        time_horizon = "Q1"
-    elif re.search(r"\bq2\b", q):
-        time_horizon = "Q2"
-    elif re.search(r"\bq3\b", q):
-        time_horizon = "Q3"
-    elif re.search(r"\bq4\b", q):
-        time_horizon = "Q4"
-    elif any(x in q for x in ("quarter", "next quarter", "this quarter")):
-        time_horizon = "quarter"
-    elif re.search(r"\d+\s*weeks?", q):
-        m = re.search(r"(\d+)\s*weeks?", q)
-        if m:
-            time_horizon = f"{m.group(1)} weeks"
-    return {"daypart": daypart, "time_horizon": time_horizon}
-
-
 def ensure_sessions_dir():
     SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def list_sessions():
+_session_stores: dict = {}
+
+
+def session_store() -> SessionStore:
+    """
+    Sessions in the configured storage (SESSIONS_DIR, or the shared store when STORAGE_URL is set), indexed in
+    SESSIONS_DIR/sessions.db. Old per-session JSON files are imported the first time the store is opened.
+    """
     ensure_sessions_dir()
-    files = sorted(SESSIONS_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
-    return [f.stem for f in files]
+    path = SESSIONS_DIR / SESSION_DB_NAME
+    store = _session_stores.get(path)
+    if store is None:
+        storage = get_storage(SESSIONS_DIR, "sessions")
+        store = _session_stores[path] = SessionStore(path, BlobStore(storage), storage)
+        store.migrate_json_dir(SESSIONS_DIR)
+        store.sync(force=True)
+    return store
+
+
+def list_sessions(offset: int = 0, limit: int = SESSIONS_PAGE_SIZE, search: str = "", segment=None, daypart=None):
+    """Session IDs, newest first: one page, optionally filtered by query text, segment and daypart."""
+    return [s["id"] for s in session_store().list_page(offset, limit, search, segment, daypart)]
 
 
 def load_session(session_id: str):
-    path = SESSIONS_DIR / f"{session_id}.json"
-    if not path.exists():
-        return None
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return session_store().load(session_id)
 
 
 def save_session(session_id: str, query: str, steps: list):
-    ensure_sessions_dir()
-    path = SESSIONS_DIR / f"{session_id}.json"
-    data = {"session_id": session_id, "query": query, "steps": steps}
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    session_store().save(session_id, query, steps)
+
+
+def find_similar_session(query: str, scope: dict, fingerprint: str):
+    """(cache hit, session) for a near-identical past request on the same data, or (None, None)."""
+    hit = SEMANTIC_CACHE.lookup(query, scope, fingerprint)
+    if not hit:
+        return None, None
+    sess = load_session(hit["session_id"])
+    if not sess:
+        SEMANTIC_CACHE.remove(hit["session_id"])
+        return None, None
+    return hit, sess
+
+
+def start_grid_prewarm():
+    """Warm the evidence-stage cache for every prompt-help combination on the current data (background)."""
+    queries = grid_queries(PROMPT_HELP_GOALS, PROMPT_HELP_SEGMENTS, PROMPT_HELP_DAYPARTS, PROMPT_HELP_HORIZONS)
+    return start_prewarm(queries, DATA_DIR, STAGE_CACHE, data_fingerprint(DATA_DIR))
 
 
 def run_data_generator():
@@ -127,11 +160,14 @@ def run_data_generator():
         return False, "", str(e)
 
 
-def get_data_summary():
-    """Return list of {file, rows, cols} for CSVs in DATA_DIR."""
+@st.cache_data(show_spinner=False, max_entries=8)
+def _data_summary(data_dir: str, fingerprint: str):
+    """CSV row/column counts; cached per data fingerprint, so files are only parsed again after they change."""
+    import pandas as pd
+
     summary = []
-    for name in ["market_trends.csv", "customer_transactions.csv", "customer_feedback.csv", "competitor_intel.csv"]:
-        p = DATA_DIR / name
+    for name in DATA_FILES:
+        p = Path(data_dir) / name
         if p.exists():
             try:
                 df = pd.read_csv(p)
@@ -141,32 +177,38 @@ def get_data_summary():
     return summary
 
 
+def get_data_summary():
+    """Return list of {file, rows, cols} for CSVs in DATA_DIR."""
+    return _data_summary(str(DATA_DIR), data_fingerprint(DATA_DIR))
+
+
+@st.cache_data(ttl=API_KEY_CHECK_TTL_S, show_spinner=False)
+def _check_api_key(key_digest: str) -> bool:
+    """
+    One live round-trip per key per process (until the TTL expires); every session reuses the result.
+    Only successes are cached: a failure raises, and Streamlit does not cache exceptions.
+    """
+    call_llm("You are a test. Reply with exactly: OK", "Say OK")
+    return True
+
+
 def validate_api_key():
-    if not get_api_key():
+    key = get_api_key()
+    if not key:
         return False, "GEMINI_API_KEY not set. Add it to .env in the project root."
     try:
-        call_llm("You are a test. Reply with exactly: OK", "Say OK")
-        return True, None
+        _check_api_key(hashlib.sha256(key.encode("utf-8")).hexdigest())
     except Exception as e:
         return False, str(e)
+    return True, None
 
 
 def _extract_json_list(text: str):
-    """Extract a JSON array of objects from text (e.g. ```json [...] ``` or raw [...]). Return list of dicts or None."""
-    # Code block
-    m = re.search(r"```(?:json)?\s*(\[\s*\{[\s\S]*?\}\s*\])\s*```", text)
-    if m:
-        try:
-            return json.loads(m.group(1))
-        except Exception:
-            pass
-    # Raw array
-    m = re.search(r"\[\s*\{[\s\S]*\}\s*\]", text)
-    if m:
-        try:
-            return json.loads(m.group(0))
-        except Exception:
-            pass
+    """Extract a JSON array of objects from text (e.g. ```json [...] ```, raw [...] or {"key": [...]}). Return list of dicts or None."""
+    tables = parse_tables(text or "")
+    for name, rows in tables.items():
+        if rows and not name.startswith(MARKDOWN_TABLE):
+            return rows
     return None
 
 
@@ -179,48 +221,25 @@ def _cell_to_display(val):
     return "" if val is None else str(val)
 
 
-def json_to_table(output: str):
-    """Parse JSON list of objects from LLM output; each item = row, keys = columns. Lists/dicts in cells as bullets."""
-    data = _extract_json_list(output)
-    if not data or not isinstance(data, list):
+def _rows_to_table(rows):
+    """List of row dicts -> DataFrame; lists/dicts in cells as bullets. None when there are no dict rows."""
+    if not rows or not isinstance(rows, list):
         return None
-    rows = []
-    for item in data:
-        if not isinstance(item, dict):
-            continue
-        row = {}
-        for k, v in item.items():
-            row[k] = _cell_to_display(v)
-        rows.append(row)
+    rows = [{k: _cell_to_display(v) for k, v in item.items()} for item in rows if isinstance(item, dict)]
     if not rows:
         return None
+    import pandas as pd
     return pd.DataFrame(rows)
 
 
+def json_to_table(output: str):
+    """Parse JSON list of objects from LLM output; each item = row, keys = columns. Lists/dicts in cells as bullets."""
+    return _rows_to_table(_extract_json_list(output))
+
+
 def parse_markdown_table(text: str):
     """Try to extract a markdown table from text; return list of dicts or None."""
-    lines = text.strip().split("\n")
-    table_lines = []
-    in_table = False
-    for line in lines:
-        if "|" in line and (line.strip().startswith("|") or "---" in line):
-            in_table = True
-            if "---" not in line:
-                table_lines.append(line)
-        elif in_table and "|" not in line:
-            break
-    if not table_lines:
-        return None
-    try:
-        header = [c.strip() for c in table_lines[0].split("|") if c.strip()]
-        rows = []
-        for line in table_lines[1:]:
-            cells = [c.strip() for c in line.split("|") if c.strip()]
-            if len(cells) >= len(header):
-                rows.append(dict(zip(header, cells[:len(header)])))
-        return rows if rows else None
-    except Exception:
-        return None
+    return parse_tables(text or "").get(MARKDOWN_TABLE) or None
 
 
 # Canonical columns for top 3 offers table
@@ -239,7 +258,7 @@ TOP3_COLUMN_MAP = {
 }
 
 
-def normalize_top3_table(df: pd.DataFrame) -> pd.DataFrame:
+def normalize_top3_table(df: "pd.DataFrame") -> "pd.DataFrame":
     """Rename columns to Offer, Channel, Target customer segments, Duration, Evidence map."""
     if df is None or df.empty:
         return df
@@ -253,17 +272,36 @@ def normalize_top3_table(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def output_to_table(output: str):
-    """Represent LLM output as table: try JSON list first (list->rows, keys->columns), then markdown table."""
-    tbl = json_to_table(output)
-    if tbl is not None and not tbl.empty:
-        return tbl
-    parsed = parse_markdown_table(output)
-    if parsed:
-        return pd.DataFrame(parsed)
-    return None
+    """Represent LLM output as table: JSON list first (list->rows, keys->columns), then markdown table. One parse pass."""
+    return _rows_to_table(primary_table(parse_tables(output or "")))
+
+
+def step_tables(step: dict) -> dict:
+    """Parsed tables for a step. Steps from older sessions are parsed once and the result kept on the step."""
+    if step.get("tables") is None:
+        step["tables"] = parse_tables(step.get("output", ""))
+    return step["tables"]
+
+
+def step_table(step: dict):
+    """Display table for a step (first JSON table, else first markdown table), from the step's parsed tables."""
+    return _rows_to_table(primary_table(step_tables(step)))
+
+
+def register_app_metrics() -> None:
+    """Scrape-time gauges for this process (run queue, stored sessions, context cache); starts the exporter."""
+    REGISTRY.gauge(
+        "workflow_jobs", "Background workflow runs by state (running, queued).",
+        lambda: {(k,): v for k, v in get_job_manager().stats().items() if k in ("running", "queued")}, ("state",),
+    )
+    REGISTRY.gauge("workflow_jobs_shed", "Runs rejected by admission control so far.", lambda: get_job_manager().stats()["shed"])
+    REGISTRY.gauge("sessions_stored", "Sessions in the session index.", lambda: session_store().count())
+    REGISTRY.gauge("context_cache_entries", "Live provider context-cache entries.", lambda: get_context_cache().stats()["entries"])
+    start_exporter()
 
 
 def main():
+    register_app_metrics()
     st.set_page_config(page_title="Wendy's Offer Innovation", layout="wide")
     st.title("Wendy's Hackathon: Agentic AI for Offer Innovation")
     st.caption("Multi-agent workflow: Market Research → Customer Insights → Competitor Intelligence → Offer Design")
@@ -271,16 +309,24 @@ def main():
     # --- Sidebar ---
     with st.sidebar:
         st.header("API key")
-        if "api_key_validated" not in st.session_state:
+        failed_at = st.session_state.get("api_key_failed_at")
+        if "api_key_validated" not in st.session_state or (
+            failed_at is not None and time.time() - failed_at > API_KEY_FAILURE_RETRY_S
+        ):
             with st.spinner("Validating API key..."):
                 ok, err = validate_api_key()
                 st.session_state["api_key_validated"] = ok
                 st.session_state["api_key_error"] = err
+                st.session_state["api_key_failed_at"] = None if ok else time.time()
         if st.session_state["api_key_validated"]:
             st.success("API key validated. Ready to run workflow.")
         else:
             st.error("API key validation failed.")
             st.caption(st.session_state.get("api_key_error", ""))
+            if st.button("Re-check API key"):
+                _check_api_key.clear()
+                st.session_state.pop("api_key_validated", None)
+                st.rerun()
 
         st.divider()
         st.header("Data")
@@ -291,7 +337,9 @@ def main():
                 st.success("Data generated. Summary below.")
                 summary = get_data_summary()
                 if summary:
-                    st.dataframe(pd.DataFrame(summary), use_container_width=True, hide_index=True)
+                    st.dataframe(summary, use_container_width=True, hide_index=True)
+                if os.environ.get("PREWARM_ON_REGENERATE", "").strip() in ("1", "true", "True", "yes") and get_api_key():
+                    start_grid_prewarm()
                 st.rerun()
             else:
                 st.error(f"Generation failed:\n{err}\n{out}")
@@ -299,25 +347,63 @@ def main():
             summary = get_data_summary()
             if summary:
                 st.caption("Data files summary")
-                st.dataframe(pd.DataFrame(summary), use_container_width=True, hide_index=True)
+                st.dataframe(summary, use_container_width=True, hide_index=True)
+
+        if data_available() and get_api_key():
+            job = current_prewarm()
+            prog = job.progress() if job else None
+            if prog and prog["status"] in ("pending", "running"):
+                if st.button("Stop pre-warm"):
+                    cancel_prewarm()
+            elif st.button("Pre-warm cache", help="Run the evidence agents for every goal/segment/daypart/horizon combination in the background."):
+                prog = start_grid_prewarm().progress()
+            if prog:
+                st.caption(
+                    f"Pre-warm {prog['status']}: {prog['done']}/{prog['total']} requests, "
+                    f"{prog['llm_calls']}/{prog['max_calls'] or '∞'} LLM calls (~{prog['est_input_tokens']:,} input tokens), "
+                    f"{prog['cache_hits']} cached, {prog['elapsed_s']:.0f}s"
+                )
 
         st.divider()
         st.header("Sessions")
-        session_ids = list_sessions()
-        if session_ids:
-            selected = st.selectbox("Open a past session", ["(New run)"] + session_ids, key="session_select")
-            if selected and selected != "(New run)":
-                sess = load_session(selected)
-                if sess:
-                    st.session_state["view_query"] = sess["query"]
-                    st.session_state["view_steps"] = sess["steps"]
-                    st.session_state["view_only"] = True
-                else:
-                    st.session_state["view_only"] = False
+        store = session_store()
+        store.sync()
+        search = st.text_input("Search sessions", key="session_search", placeholder="e.g. breakfast BOGO")
+        fcol1, fcol2 = st.columns(2)
+        segment = fcol1.selectbox("Segment", ["(Any)"] + store.segments(), key="session_segment")
+        daypart = fcol2.selectbox("Daypart", ["(Any)", "breakfast", "lunch", "late-night"], key="session_daypart")
+        filters = {
+            "search": search.strip(),
+            "segment": None if segment == "(Any)" else segment,
+            "daypart": None if daypart == "(Any)" else daypart,
+        }
+        total = store.count(**filters)
+        if total:
+            pages = (total + SESSIONS_PAGE_SIZE - 1) // SESSIONS_PAGE_SIZE
+            page = st.number_input("Page", 1, pages, 1, key="session_page") if pages > 1 else 1
+            rows = store.list_page((page - 1) * SESSIONS_PAGE_SIZE, SESSIONS_PAGE_SIZE, **filters)
+            labels = {r["id"]: f"{r['id']} — {r['query'][:60]}" for r in rows}
+            st.caption(f"{total} sessions" + (f", page {page} of {pages}" if pages > 1 else ""))
+            selected = st.selectbox(
+                "Open a past session", ["(New run)"] + list(labels), key="session_select",
+                format_func=lambda sid: labels.get(sid, sid),
+            )
+            meta = store.get(selected) if selected and selected != "(New run)" else None
+            if meta:
+                # Only metadata here; steps are read when the session is rendered.
+                st.session_state["view_query"] = meta["query"]
+                st.session_state["view_session"] = selected
+                st.session_state["view_only"] = True
             else:
                 st.session_state["view_only"] = False
         else:
-            st.info("No past sessions yet.")
+            st.info("No matching sessions." if any(filters.values()) else "No past sessions yet.")
+        load = get_job_manager().stats()
+        if load["running"] or load["queued"]:
+            st.caption(f"Load: {load['running']}/{load['capacity']} runs in progress, {load['queued']} queued")
+        cache_stats = SEMANTIC_CACHE.stats()
+        if cache_stats["lookups"]:
+            st.caption(f"Similar-request cache: {cache_stats['entries']} entries, {cache_stats['hit_rate']:.0%} hit rate")
 
     if not data_available():
         st.warning("Data not found. Click **Generate / regenerate data** in the sidebar, then reload.")
@@ -357,17 +443,42 @@ def main():
     col1, col2 = st.columns(2)
     with col1:
         run_clicked = st.button("Run workflow", type="primary")
+        # "Run fresh instead" on a semantic-cache hit reruns the script with this flag set.
+        run_fresh = st.session_state.pop("run_fresh", False)
+        run_clicked = run_clicked or run_fresh
+        deep_research = st.checkbox(
+            "Deep research",
+            value=deep_research_enabled(),
+            help="Summarize every row of the trend, transaction and feedback data (many more LLM calls on the first run; "
+            "chunk summaries are cached per data version).",
+        )
+        data_tools = st.checkbox(
+            "Query data with tools",
+            value=data_tools_enabled(),
+            help="Let the agents run aggregations, filters, text search and time series over every row "
+            "(a local SQLite copy of the data) instead of working from a sample.",
+        )
+        offer_candidates = st.number_input(
+            "Offer candidates",
+            min_value=1,
+            max_value=MAX_CANDIDATES,
+            value=min(max(1, offer_candidates_setting()), MAX_CANDIDATES),
+            help="Run Offer Design this many times in parallel and rank the merged offers (more candidates: better "
+            "coverage and more LLM calls, about the same wait).",
+        )
+    run_id = st.query_params.get("run")
     with col2:
         if st.session_state.get("view_only"):
             if st.button("New run"):
+                st.query_params.pop("run", None)
                 st.session_state["view_only"] = False
                 st.session_state["view_query"] = ""
-                st.session_state["view_steps"] = None
+                st.session_state["view_session"] = None
                 st.rerun()
 
     # --- View past session ---
-    if st.session_state.get("view_only") and st.session_state.get("view_steps"):
-        _render_session_result(st.session_state["view_steps"])
+    if st.session_state.get("view_only") and st.session_state.get("view_session"):
+        _render_session_result(session_store().steps(st.session_state["view_session"]), st.session_state["view_session"])
         st.stop()
 
     # --- Run workflow ---
@@ -377,91 +488,288 @@ def main():
             st.caption(st.session_state.get("api_key_error", ""))
             st.stop()
 
-        session_id = str(uuid.uuid4())[:8]
-        progress_bar = st.progress(0.0, text="Starting...")
-        status_placeholder = st.empty()
-        thinking_steps = []
-
-        def on_agent_start(agent_name: str, status_message: str):
-            p = list(AGENT_ICONS.keys()).index(agent_name) / 4.0 if agent_name in AGENT_ICONS else 0
-            progress_bar.progress(min(1.0, p + 0.25), text=status_message)
-            icon = AGENT_ICONS.get(agent_name, "🤖")
-            status_placeholder.markdown(f"**{icon} {agent_name}** — {status_message}")
-            thinking_steps.append((agent_name, status_message))
-
         scope = parse_scope(query)
+        fingerprint = data_fingerprint(DATA_DIR)
+        # A cached answer from a regular run would not reflect the full data or the candidate ranking, so deep,
+        # tool and multi-candidate runs always run.
+        if not run_fresh and not deep_research and not data_tools and offer_candidates == 1:
+            hit, cached = find_similar_session(query.strip(), scope, fingerprint)
+            if cached:
+                st.info(
+                    f"A near-identical request was already answered on the same data "
+                    f"({hit['similarity']:.0%} match): *{hit['query']}*. Showing those results."
+                )
+                st.button("Run fresh instead", on_click=lambda: st.session_state.update(run_fresh=True))
+                _render_session_result(cached["steps"], hit["session_id"])
+                st.stop()
+
+        session_id = str(uuid.uuid4())[:8]
         try:
-            steps = run_workflow(query.strip(), data_dir=DATA_DIR, on_agent_start=on_agent_start, scope=scope)
-            progress_bar.progress(1.0, text="Done.")
-            progress_bar.empty()
-            status_placeholder.empty()
-
-            save_session(session_id, query.strip(), steps)
-
-            # Thinking steps (agent actions during run)
-            with st.expander("Thinking steps", expanded=True):
-                for i, (agent_name, msg) in enumerate(thinking_steps, 1):
-                    icon = AGENT_ICONS.get(agent_name, "🤖")
-                    st.markdown(f"{i}. **{icon} {agent_name}** — {msg}")
-
-            # (a) Top 3 offers table
-            st.subheader("Recommended top 3 offers")
-            offer_step = next((s for s in steps if s["agent"] == "Offer Design"), None)
-            if offer_step:
-                tbl = output_to_table(offer_step["output"])
-                if tbl is not None and not tbl.empty:
-                    tbl = normalize_top3_table(tbl)
-                    st.dataframe(tbl, use_container_width=True, hide_index=True)
-                else:
-                    st.markdown(offer_step["output"])
-
-            # (b) Agent-wise details
-            st.subheader("Agent-wise details")
-            for i, step in enumerate(steps):
-                _render_agent_step(step, i == 3)
-
-            st.success("Workflow complete. Session saved.")
-            st.balloons()
-        except Exception as e:
-            st.error(f"Workflow failed: {e}")
-            import traceback
-            st.code(traceback.format_exc())
+            # WORKFLOW_PROFILE=1 profiles every run; ?profile=1 in the URL profiles this one.
+            profile = profiling_enabled() or st.query_params.get("profile", "").lower() in ("1", "true", "yes")
+            start_workflow_job(
+                session_id, query.strip(), scope, fingerprint, owner=current_user_id(), profile=profile,
+                deep_research=deep_research, data_tools=data_tools, offer_candidates=int(offer_candidates),
+            )
+        except AdmissionError as e:
+            st.error(str(e))
+            st.stop()
+        # The run ID lives in the URL so a reload re-attaches to the job instead of starting it again.
+        st.query_params["run"] = session_id
+        run_id = session_id
     elif run_clicked and not query.strip():
         st.warning("Enter a request to run the workflow.")
 
+    if run_id:
+        _render_run(run_id)
 
-def _render_agent_step(step: dict, expanded: bool):
+
+def current_user_id() -> str:
+    """
+    Who a run belongs to, for per-user quotas: signed-in email, else this browser session. WORKFLOW_QUOTA_BY_IP=1
+    keys anonymous users by client IP instead; off by default because users behind a proxy or NAT share one IP
+    (and with it one quota).
+    """
+    user = getattr(st, "user", None)
+    try:
+        if user is not None and user.is_logged_in and user.email:
+            return str(user.email)
+    except Exception:
+        pass
+    if os.environ.get("WORKFLOW_QUOTA_BY_IP", "").strip().lower() in ("1", "true", "yes"):
+        ip = getattr(getattr(st, "context", None), "ip_address", None)
+        if ip:
+            return f"ip:{ip}"
+    return st.session_state.setdefault("client_id", str(uuid.uuid4()))
+
+
+def start_workflow_job(
+    session_id: str,
+    query: str,
+    scope: dict,
+    fingerprint: str,
+    owner: str = "",
+    profile: bool = False,
+    deep_research: bool = False,
+    data_tools: bool = False,
+    offer_candidates: int = 1,
+):
+    """
+    Queue the workflow on the shared worker pool; the session is saved by the worker when it finishes.
+    profile: run under src/profiling.py and store the report with the session.
+    deep_research: map-reduce the full data for the evidence stages (src/deep_research.py).
+    data_tools: give the agents the data query tools (src/data_tools.py).
+    offer_candidates: parallel Offer Design candidates to rank (src/offer_ranking.py).
+    """
+    def work(job):
+        kwargs = dict(
+            data_dir=DATA_DIR, on_agent_start=job.on_agent_start, scope=scope, on_row=job.on_row,
+            on_step=job.on_step, stage_cache=STAGE_CACHE, deep_research=deep_research, summary_cache=SUMMARY_CACHE,
+            data_tools=data_tools, offer_candidates=offer_candidates,
+        )
+        if profile:
+            steps, report = profile_call(run_workflow, query, **kwargs)
+        else:
+            steps = run_workflow(query, **kwargs)
+        save_session(session_id, query, steps)
+        if profile:
+            session_store().save_profile(session_id, {"session_id": session_id, "query": query, **report})
+        SEMANTIC_CACHE.add(query, scope, fingerprint, session_id)
+    return get_job_manager().submit(session_id, query, work, owner=owner)
+
+
+def _run_progress(run_id: str):
+    """Live status of a background run: current agent, streamed rows, completed steps."""
+    job = get_job_manager().get(run_id)
+    snap = job.snapshot() if job else None
+    if not snap or snap["status"] not in ACTIVE:
+        st.rerun()
+    if snap["status"] == QUEUED:
+        position = get_job_manager().position(run_id)
+        load = get_job_manager().stats()
+        st.info(
+            f"Queued — position {position or 1} of {load['queued']}. "
+            f"{load['running']} of {load['capacity']} runs in progress; yours starts automatically."
+        )
+    else:
+        agent_name, msg = snap["events"][-1] if snap["events"] else ("", "Starting...")
+        rows = snap["row_counts"].get(agent_name, 0)
+        icon = AGENT_ICONS.get(agent_name, "🤖")
+        st.progress(min(1.0, (len(snap["steps"]) + 0.5) / 4.0), text=msg)
+        if agent_name:
+            st.markdown(f"**{icon} {agent_name}** — {msg}" + (f" ({rows} rows received)" if rows else ""))
+    st.caption(f"Run {run_id} continues in the background; you can keep using the page or reload it.")
+    for step in snap["steps"]:
+        _render_agent_step(step, False, "live")
+
+
+_FRAGMENT = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+# Expanders that report whether they are open (and rerun on toggle) let closed bodies be skipped entirely.
+_LAZY_EXPANDER = "on_change" in inspect.signature(st.expander).parameters
+_run_progress_fragment = _FRAGMENT(run_every=POLL_SECONDS)(_run_progress) if _FRAGMENT else None
+
+
+def _render_run(run_id: str):
+    """Attach to a run by ID: poll while active, then show its results (from memory or the saved session)."""
+    job = get_job_manager().get(run_id)
+    if job is None:
+        sess = load_session(run_id)
+        if sess:
+            _render_session_result(sess["steps"], run_id)
+        else:
+            st.warning(f"Run {run_id} is no longer available (the server restarted before it finished). Run it again.")
+        return
+    snap = job.snapshot()
+    if snap["status"] in ACTIVE:
+        if _run_progress_fragment:
+            _run_progress_fragment(run_id)
+        else:
+            _run_progress(run_id)
+            time.sleep(POLL_SECONDS)
+            st.rerun()
+        return
+    if snap["status"] == FAILED:
+        st.error(f"Workflow failed: {snap['error'].splitlines()[0] if snap['error'] else ''}")
+        st.code(snap["error"])
+        return
+    st.success("Workflow complete. Session saved.")
+    if st.session_state.get("celebrated") != run_id:
+        st.session_state["celebrated"] = run_id
+        st.balloons()
+    _render_session_result(snap["steps"], run_id)
+
+
+def step_digest(step: dict) -> str:
+    """Stable identity of a step's result, for memoized tables and widget keys."""
+    raw = json.dumps([step.get("agent"), step.get("output", "")], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _step_frames(digest: str, _step: dict) -> dict:
+    """Display DataFrames per table name, memoized per step digest (_step is not hashed)."""
+    tables = {name: _rows_to_table(rows) for name, rows in step_tables(_step).items()}
+    return {name: tbl for name, tbl in tables.items() if tbl is not None and not tbl.empty}
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _top3_frame(digest: str, _step: dict):
+    tbl = step_table(_step)
+    return normalize_top3_table(tbl) if tbl is not None and not tbl.empty else None
+
+
+def _render_long_text(label: str, text: str, key: str, height: int):
+    """Read-only text box showing at most PROMPT_PREVIEW_CHARS unless "Show full" is ticked."""
+    text = text or ""
+    if len(text) > PROMPT_PREVIEW_CHARS and not st.checkbox(f"Show full {label.lower()} ({len(text):,} characters)", key=f"full_{key}"):
+        text = text[:PROMPT_PREVIEW_CHARS] + "\n…"
+    st.text_area(label, value=text, height=height, disabled=True, key=key)
+
+
+def _render_agent_step_body(step: dict, key: str):
+    st.markdown("**(a) User query**")
+    st.text(step.get("user_query", ""))
+
+    st.markdown("**(b) Input data (sample, up to 5 rows)**")
+    sample = step.get("input_data_sample") or []
+    if sample:
+        st.dataframe(sample, use_container_width=True, hide_index=True)
+    else:
+        st.caption("No raw table (e.g. Offer Design uses prior agent outputs).")
+
+    st.markdown("**(c) LLM call** (system + user content as sent to the model)")
+    routing = step.get("routing")
+    if routing:
+        latency = f", {routing['latency_s']:.1f}s" if routing.get("latency_s") is not None else ""
+        st.caption(f"Model: {routing['model']} ({routing['reason']}{latency})")
+    if (step.get("stage_cache") or {}).get("status") == "hit":
+        st.caption(f"Reused cached result for: {step['stage_cache'].get('query')}")
+    deep = step.get("deep_research")
+    if deep:
+        rows = sum(t["rows"] for t in deep["tables"].values())
+        chunks = sum(t["chunks"] for t in deep["tables"].values())
+        st.caption(
+            f"Deep research: {rows} rows in {chunks} chunks, {deep['llm_calls']} summary calls "
+            f"({deep['cached']} summaries reused), {deep['seconds']:.1f}s"
+        )
+    tool_calls = step.get("tool_calls")
+    if tool_calls is not None:
+        failed = sum(1 for c in tool_calls if c.get("error"))
+        cached = sum(1 for c in tool_calls if c.get("cached"))
+        names = ", ".join(sorted({c["tool"] for c in tool_calls})) or "none"
+        st.caption(f"Data tools: {len(tool_calls)} calls ({names}; {cached} cached, {failed} failed)")
+    candidates = step.get("offer_candidates")
+    if candidates:
+        failed = f", {candidates['failed']} failed" if candidates["failed"] else ""
+        st.caption(
+            f"Offer candidates: {candidates['succeeded']} of {candidates['k']} designs{failed}, "
+            f"{candidates['offers']} offers ({candidates['unique']} unique), {candidates['seconds']:.1f}s"
+        )
+    budget = step.get("prompt_budget")
+    if budget:
+        st.caption(f"Prompt budget: ~{budget['used']} of {budget['budget']} tokens (local estimate)")
+    _render_long_text("System prompt", step.get("system_prompt", ""), f"sys_{key}", 120)
+    _render_long_text("User content", step.get("user_content", ""), f"usr_{key}", 150)
+
+    st.markdown("**(d) LLM response**")
+    out = step.get("output", "")
+    if out.lstrip()[:1] in ("{", "["):
+        st.code(out, language="json")
+    else:
+        st.markdown(out)
+
+    st.markdown("**(e) Outputs (tabular when possible)**")
+    tables = _step_frames(step_digest(step), step)
+    if tables:
+        for name, tbl in tables.items():
+            if len(tables) > 1:
+                st.caption(name)
+            st.dataframe(tbl, use_container_width=True, hide_index=True)
+    else:
+        st.caption("No table detected; full response shown above.")
+
+
+def _render_agent_step(step: dict, expanded: bool, key_prefix: str = "step"):
+    """
+    One agent's details in an expander. The body (prompts, response, tables) is only built while the expander is
+    open; Streamlit versions without expander state get a "Show details" toggle instead.
+    """
     icon = AGENT_ICONS.get(step["agent"], "🤖")
+    key = f"{key_prefix}_{step_digest(step)}"
+    if _LAZY_EXPANDER:
+        box = st.expander(f"{icon} {step['agent']}", expanded=expanded, key=f"exp_{key}", on_change="rerun")
+        with box:
+            if box.open:
+                _render_agent_step_body(step, key)
+        return
     with st.expander(f"{icon} {step['agent']}", expanded=expanded):
-        st.markdown("**(a) User query**")
-        st.text(step.get("user_query", ""))
+        if st.toggle("Show details", value=expanded, key=f"show_{key}"):
+            _render_agent_step_body(step, key)
 
-        st.markdown("**(b) Input data (sample, up to 5 rows)**")
-        sample = step.get("input_data_sample") or []
-        if sample:
-            st.dataframe(pd.DataFrame(sample), use_container_width=True, hide_index=True)
-        else:
-            st.caption("No raw table (e.g. Offer Design uses prior agent outputs).")
 
-        st.markdown("**(c) LLM call** (system + user content as sent to the model)")
-        st.text_area("System prompt", value=step.get("system_prompt", ""), height=120, disabled=True, key=f"sys_{step['agent']}_{id(step)}")
-        st.text_area("User content", value=step.get("user_content", ""), height=150, disabled=True, key=f"usr_{step['agent']}_{id(step)}")
+# Opening an agent's details reruns only that agent's fragment, not the whole results page.
+_render_agent_step_lazy = _FRAGMENT(_render_agent_step) if _FRAGMENT else _render_agent_step
 
-        st.markdown("**(d) LLM response**")
-        st.markdown(step.get("output", ""))
 
-        st.markdown("**(e) Outputs (tabular when possible)**")
-        out = step.get("output", "")
-        tbl = json_to_table(out)
-        if tbl is None or tbl.empty:
-            tbl = output_to_table(out)
-        if tbl is not None and not tbl.empty:
-            st.dataframe(tbl, use_container_width=True, hide_index=True)
-        else:
-            st.caption("No table detected; full response shown above.")
+def _render_profile_download(session_id: str):
+    """Download link for the run's profiling report, when the run was profiled."""
+    report = session_store().profile(session_id)
+    if not report:
+        return
+    peak = (report.get("memory") or {}).get("peak_bytes")
+    st.caption(
+        f"Profiled run: {report['wall_s']:.1f}s wall" + (f", peak traced memory {peak / 1e6:.1f} MB" if peak else "")
+    )
+    st.download_button(
+        "Download profile (JSON)",
+        data=json.dumps(report, indent=2),
+        file_name=f"profile_{session_id}.json",
+        mime="application/json",
+        key=f"profile_{session_id}",
+    )
 
 
-def _render_session_result(steps: list):
+def _render_session_result(steps: list, session_id: Optional[str] = None):
     st.subheader("Session result")
     with st.expander("Thinking steps", expanded=True):
         for i, step in enumerate(steps, 1):
@@ -471,15 +779,16 @@ def _render_session_result(steps: list):
     offer_step = next((s for s in steps if s["agent"] == "Offer Design"), None)
     if offer_step:
         st.subheader("Recommended top 3 offers")
-        tbl = output_to_table(offer_step.get("output", ""))
-        if tbl is not None and not tbl.empty:
-            tbl = normalize_top3_table(tbl)
+        tbl = _top3_frame(step_digest(offer_step), offer_step)
+        if tbl is not None:
             st.dataframe(tbl, use_container_width=True, hide_index=True)
         else:
             st.markdown(offer_step.get("output", ""))
     st.subheader("Agent-wise details")
     for step in steps:
-        _render_agent_step(step, step.get("agent") == "Offer Design")
+        _render_agent_step_lazy(step, step.get("agent") == "Offer Design", "result")
+    if session_id:
+        _render_profile_download(session_id)
 
 
 if __name__ == "__main__":
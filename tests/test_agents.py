@@ -15,7 +15,7 @@ from src.agents.offer_design import run as run_offer_design
 MOCK_RESPONSE = "Mocked LLM response for testing."
 
 
-@patch("src.agents.market_research.call_llm", return_value=MOCK_RESPONSE)
+@patch("src.data_tools.call_llm", return_value=MOCK_RESPONSE)
 def test_market_research_agent_returns_llm_output(mock_call_llm):
     """Market Research agent returns dict with output, system_prompt, user_content."""
     out = run_market_research("sample market data", "user query")
@@ -28,7 +28,7 @@ def test_market_research_agent_returns_llm_output(mock_call_llm):
     assert "user query" in args[0][1]
 
 
-@patch("src.agents.customer_insights.call_llm", return_value=MOCK_RESPONSE)
+@patch("src.data_tools.call_llm", return_value=MOCK_RESPONSE)
 def test_customer_insights_agent_returns_llm_output(mock_call_llm):
     """Customer Insights agent returns dict with output."""
     out = run_customer_insights("txn data", "feedback data", "user query")
@@ -40,7 +40,7 @@ def test_customer_insights_agent_returns_llm_output(mock_call_llm):
     assert "user query" in args[0][1]
 
 
-@patch("src.agents.competitor_intel.call_llm", return_value=MOCK_RESPONSE)
+@patch("src.data_tools.call_llm", return_value=MOCK_RESPONSE)
 def test_competitor_intel_agent_returns_llm_output(mock_call_llm):
     """Competitor Intelligence agent returns dict with output."""
     out = run_competitor_intel("competitor data", "user query")
@@ -51,7 +51,7 @@ def test_competitor_intel_agent_returns_llm_output(mock_call_llm):
     assert "user query" in args[0][1]
 
 
-@patch("src.agents.offer_design.call_llm", return_value=MOCK_RESPONSE)
+@patch("src.data_tools.call_llm", return_value=MOCK_RESPONSE)
 def test_offer_design_agent_returns_llm_output(mock_call_llm):
     """Offer Design agent returns dict with output."""
     out = run_offer_design("trends", "insights", "landscape", "whitespace", "user query")
@@ -61,3 +61,15 @@ def test_offer_design_agent_returns_llm_output(mock_call_llm):
     assert "trends" in args[0][1]
     assert "insights" in args[0][1]
     assert "user query" in args[0][1]
+    assert "TOP 3 SUMMARY TABLE" in args[0][1]
+    assert args.kwargs["cached_prefix"] is None  # nothing in the prompt is reusable across queries
+
+
+@patch("src.data_tools.call_llm", return_value='{"offer_concepts": [{"name": "Streak Week", "channel": "app"}]}')
+def test_offer_design_structured_mode(mock_call_llm):
+    """Structured mode passes the response schema and returns parsed tables."""
+    out = run_offer_design("trends", "insights", "landscape", "whitespace", "user query", structured=True)
+    assert out["tables"] == {"offer_concepts": [{"name": "Streak Week", "channel": "app"}]}
+    kwargs = mock_call_llm.call_args.kwargs
+    assert "offer_concepts" in kwargs["response_schema"]["properties"]
+    assert "TOP 3 SUMMARY TABLE" not in mock_call_llm.call_args[0][1]
@@ -3,7 +3,7 @@ Tests for Streamlit app helpers: save_session, load_session, list_sessions.
 """
 
 import json
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 
@@ -50,3 +50,146 @@ def test_list_sessions_returns_ids(patch_sessions_dir):
     ids = list_sessions()
     assert set(ids) == {"s1", "s2"}
     assert len(ids) == 2
+
+
+def test_output_to_table_json_and_markdown():
+    """output_to_table reads a JSON list first, then a markdown table."""
+    from streamlit_app import output_to_table
+    tbl = output_to_table('Offers:\n```json\n[{"name": "A", "tags": ["x", "y"]}]\n```')
+    assert list(tbl.columns) == ["name", "tags"]
+    assert "x" in tbl.iloc[0]["tags"]
+    tbl = output_to_table("| Offer name | Channel |\n|---|---|\n| A | app |")
+    assert tbl.iloc[0]["Channel"] == "app"
+    assert output_to_table("no table here") is None
+
+
+def test_step_table_parses_legacy_step_once():
+    """step_table stores parsed tables on steps that predate the tables field."""
+    from streamlit_app import step_table
+    step = {"agent": "Offer Design", "output": "| Offer name | Channel |\n|---|---|\n| A | app |"}
+    tbl = step_table(step)
+    assert tbl.iloc[0]["Offer name"] == "A"
+    assert step["tables"] == {"markdown": [{"Offer name": "A", "Channel": "app"}]}
+
+
+def test_find_similar_session_skips_missing_sessions(patch_sessions_dir, tmp_path):
+    """A semantic hit is returned with its session; hits on deleted sessions are dropped."""
+    from src.semantic_cache import SemanticCache
+    from streamlit_app import find_similar_session, save_session
+    cache = SemanticCache(tmp_path / "idx.json")
+    with patch("streamlit_app.SEMANTIC_CACHE", cache):
+        save_session("s1", "3 offers for discount hunters", [{"agent": "Offer Design", "output": "ok"}])
+        cache.add("3 offers for discount hunters", {}, "fp", "s1")
+        cache.add("3 offers for loyal customers", {}, "fp", "gone")
+        hit, sess = find_similar_session("three offers for deal seekers", {}, "fp")
+        assert hit["session_id"] == "s1" and sess["query"] == "3 offers for discount hunters"
+        assert find_similar_session("3 offers for loyal customers", {}, "fp") == (None, None)
+        assert cache.stats()["entries"] == 1
+
+
+def test_validate_api_key_calls_llm_once_per_key(monkeypatch):
+    """The live key check is cached per process: repeated sessions do not call the LLM again."""
+    import streamlit_app
+    streamlit_app._check_api_key.clear()
+    monkeypatch.setattr(streamlit_app, "get_api_key", lambda: "key-1")
+    with patch("streamlit_app.call_llm", return_value="OK") as mock_llm:
+        assert streamlit_app.validate_api_key() == (True, None)
+        assert streamlit_app.validate_api_key() == (True, None)
+        assert mock_llm.call_count == 1
+        monkeypatch.setattr(streamlit_app, "get_api_key", lambda: "key-2")
+        streamlit_app.validate_api_key()
+        assert mock_llm.call_count == 2
+    streamlit_app._check_api_key.clear()
+
+
+def test_failed_api_key_check_is_not_cached(monkeypatch):
+    """A failed check is retried on the next validation instead of being served from the cache."""
+    import streamlit_app
+    streamlit_app._check_api_key.clear()
+    monkeypatch.setattr(streamlit_app, "get_api_key", lambda: "key-1")
+    with patch("streamlit_app.call_llm", side_effect=[RuntimeError("API not enabled"), "OK", "OK"]) as mock_llm:
+        assert streamlit_app.validate_api_key() == (False, "API not enabled")
+        assert streamlit_app.validate_api_key() == (True, None)
+        assert streamlit_app.validate_api_key() == (True, None)
+        assert mock_llm.call_count == 2
+    streamlit_app._check_api_key.clear()
+
+
+def test_anonymous_quota_key_is_the_browser_session_unless_ip_opt_in(monkeypatch):
+    """Users sharing an IP (proxy, NAT) get separate quotas unless WORKFLOW_QUOTA_BY_IP is set."""
+    import streamlit_app
+    fake_st = MagicMock()
+    fake_st.user.is_logged_in = False
+    fake_st.context.ip_address = "10.0.0.1"
+    fake_st.session_state = {}
+    monkeypatch.setattr(streamlit_app, "st", fake_st)
+    monkeypatch.delenv("WORKFLOW_QUOTA_BY_IP", raising=False)
+    owner = streamlit_app.current_user_id()
+    assert owner == fake_st.session_state["client_id"] and owner == streamlit_app.current_user_id()
+    monkeypatch.setenv("WORKFLOW_QUOTA_BY_IP", "1")
+    assert streamlit_app.current_user_id() == "ip:10.0.0.1"
+
+
+def test_data_summary_cached_per_fingerprint(temp_data_dir, monkeypatch):
+    """CSV files are parsed once per data fingerprint."""
+    import pandas as pd
+    import streamlit_app
+    monkeypatch.setattr(streamlit_app, "DATA_DIR", temp_data_dir)
+    real_read_csv = pd.read_csv
+    with patch("pandas.read_csv", side_effect=real_read_csv) as mock_read:
+        first = streamlit_app.get_data_summary()
+        assert streamlit_app.get_data_summary() == first
+        assert mock_read.call_count == 4
+    assert {row["File"]: row["Rows"] for row in first}["market_trends.csv"] == 1500
+
+
+def test_step_frames_memoized_per_step_digest():
+    """Step tables are converted to DataFrames once per step result, not on every rerender."""
+    import streamlit_app
+    streamlit_app._step_frames.clear()
+    step = {"agent": "Offer Design", "output": "| Offer | Channel |\n|---|---|\n| A | app |"}
+    digest = streamlit_app.step_digest(step)
+    assert digest == streamlit_app.step_digest(dict(step, system_prompt="ignored"))
+    with patch("streamlit_app._rows_to_table", wraps=streamlit_app._rows_to_table) as mock_rows:
+        first = streamlit_app._step_frames(digest, step)
+        second = streamlit_app._step_frames(digest, dict(step))
+        assert mock_rows.call_count == 1
+    assert list(first) == list(second) and len(first[next(iter(first))]) == 1
+
+
+def test_app_import_does_not_load_heavy_modules(project_root):
+    """Importing the app (the cold-start path) does not import pandas, openai or google.generativeai."""
+    import subprocess
+    import sys
+    code = (
+        "import sys, streamlit_app; "
+        "print(sorted(m for m in ('pandas', 'openai', 'google.generativeai') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=str(project_root), capture_output=True, text=True, timeout=60)
+    assert out.stdout.strip().splitlines()[-1] == "[]", out.stderr
+
+
+def test_profiled_run_stores_report_with_session(patch_sessions_dir, tmp_path):
+    """start_workflow_job(profile=True) saves the profiling report next to the session; unprofiled runs do not."""
+    import time
+    import streamlit_app
+    from src.jobs import ACTIVE, JobManager
+    from src.semantic_cache import SemanticCache
+
+    steps = [{"agent": "Offer Design", "output": "| Offer |\n|---|\n| A |"}]
+    manager = JobManager(max_workers=1)
+    with patch("streamlit_app.run_workflow", return_value=steps), \
+            patch("streamlit_app.get_job_manager", return_value=manager), \
+            patch("streamlit_app.SEMANTIC_CACHE", SemanticCache(tmp_path / "idx.json")), \
+            patch.dict(streamlit_app._session_stores, clear=True):
+        jobs = [
+            streamlit_app.start_workflow_job("prof1", "q", {}, "fp", profile=True),
+            streamlit_app.start_workflow_job("plain1", "q", {}, "fp"),
+        ]
+        while any(j.status in ACTIVE for j in jobs):
+            time.sleep(0.01)
+        assert [j.error for j in jobs] == [None, None]
+        report = streamlit_app.session_store().profile("prof1")
+        assert report["session_id"] == "prof1" and report["cpu"]["functions"]
+        assert streamlit_app.session_store().profile("plain1") is None
+    manager.shutdown()
@@ -0,0 +1,75 @@
+"""
+Tests for scripts/benchmark.py: offline LLM stand-in, baseline comparison and a small end-to-end run.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+from src.structured import MARKET_RESEARCH_SCHEMA, parse_tables
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _benchmark():
+    scripts_dir = str(PROJECT_ROOT / "scripts")
+    if scripts_dir not in sys.path:
+        sys.path.insert(0, scripts_dir)
+    import benchmark
+    return benchmark
+
+
+def test_fake_call_llm_streams_schema_shaped_output():
+    bench = _benchmark()
+    chunks = []
+    text = bench.fake_call_llm("sys", "user", response_schema=MARKET_RESEARCH_SCHEMA, on_token=chunks.append)
+    assert "".join(chunks) == text
+    rows = json.loads(text)["trend_briefs"]
+    assert len(rows) == bench.CANNED_ROWS
+    assert set(rows[0]) == {"title", "summary", "evidence", "signal_strength", "directions"}
+    assert parse_tables(bench.fake_call_llm("sys", "user"))["markdown"]
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    bench = _benchmark()
+    baseline = {
+        "results": {
+            "a": {"min_s": 0.010},
+            "b": {"min_s": 0.010},
+            "c": {"min_s": 0.010},
+            "d": {"min_s": 0.0001},
+            "e": {"min_s": 0.010},
+        },
+        "thresholds": {"e": 1.0},
+    }
+    current = {"results": {
+        "a": {"min_s": 0.011},     # within 25%
+        "b": {"min_s": 0.020},     # 2x slower
+        "c": {"min_s": 0.005},     # 2x faster
+        "d": {"min_s": 0.0003},    # 3x slower but below MIN_DELTA_S
+        "e": {"min_s": 0.018},     # per-benchmark threshold allows 100%
+        "f": {"min_s": 0.001},     # not in the baseline
+    }}
+    status = {r["name"]: r["status"] for r in bench.compare(current, baseline, threshold=0.25)}
+    assert status == {"a": "ok", "b": "regression", "c": "improved", "d": "ok", "e": "ok", "f": "new"}
+    assert "regression" in bench.format_report(bench.compare(current, baseline))
+
+
+def test_run_benchmarks_offline_workflow_and_sessions(tmp_path, monkeypatch):
+    """Small run without network or API key: every timing is recorded with its median and best time."""
+    bench = _benchmark()
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    out = bench.run_benchmarks(groups=("workflow", "sessions"), n_sessions=30, repeat=1, work_dir=tmp_path)
+    results = out["results"]
+    assert "workflow.run_workflow.structured" in results
+    assert "sessions.list_sessions.search.n30" in results
+    assert all(m["median_s"] > 0 and m["min_s"] <= m["median_s"] for m in results.values())
+    assert out["meta"]["sessions"] == 30
+    json.dumps(out)
+
+
+def test_committed_baseline_covers_default_benchmarks():
+    baseline = json.loads((PROJECT_ROOT / "benchmarks" / "baseline.json").read_text(encoding="utf-8"))
+    names = set(baseline["results"])
+    assert {"data.load.customer_transactions.csv.x50", "workflow.run_workflow.markdown", "parse.parse_scope"} <= names
+    assert set(baseline["thresholds"]) <= names
@@ -0,0 +1,63 @@
+"""Tests for src.blob_store: chunking, dedup, compression, lazy step fields."""
+
+from src.blob_store import BlobStore, LazyStep, is_ref, split_chunks
+from src.session_store import SessionStore
+
+SYSTEM = "You are a market research analyst. " * 100
+DUMP = "\n\n".join(f"## Table {i}\n" + ("col_a,col_b,col_c\n1,2,3\n" * 120) for i in range(6))
+
+
+def _step(query, agent="Market Research"):
+    return {
+        "agent": agent,
+        "user_query": query,
+        "system_prompt": SYSTEM,
+        "user_content": f"{DUMP}\n\nUser request: {query}",
+        "input_data_sample": [{"a": i, "b": "x" * 50} for i in range(30)],
+        "output": "short output",
+    }
+
+
+def test_split_chunks_keeps_text_and_shared_prefix():
+    text = f"{DUMP}\n\nUser request: q1"
+    chunks = split_chunks(text, 1000)
+    assert "".join(chunks) == text
+    other = split_chunks(f"{DUMP}\n\nUser request: something else", 1000)
+    assert chunks[:-1] == other[:-1]
+    assert split_chunks("") == [""]
+
+
+def test_put_get_value_round_trip(tmp_path):
+    blobs = BlobStore(tmp_path)
+    ref = blobs.put_value(DUMP)
+    assert blobs.get_value(ref) == DUMP
+    rows = [{"a": 1}, {"b": [1, 2]}]
+    assert blobs.get_value(blobs.put_value(rows)) == rows
+
+
+def test_pack_step_dedupes_and_compresses(tmp_path):
+    blobs = BlobStore(tmp_path)
+    packed = [blobs.pack_step(_step(f"query {i}")) for i in range(20)]
+    assert all(is_ref(p["system_prompt"]) and is_ref(p["user_content"]) for p in packed)
+    assert packed[0]["output"] == "short output"  # small fields stay inline
+    raw = sum(len(SYSTEM) + len(DUMP) for _ in range(20))
+    assert blobs.stats()["bytes"] * 10 < raw
+
+
+def test_lazy_step_reads_blobs_on_access(tmp_path):
+    blobs = BlobStore(tmp_path)
+    lazy = LazyStep(blobs.pack_step(_step("q")), blobs)
+    assert is_ref(dict.__getitem__(lazy, "system_prompt"))
+    assert lazy["output"] == "short output"
+    assert is_ref(dict.__getitem__(lazy, "system_prompt"))  # untouched
+    assert lazy.get("system_prompt") == SYSTEM
+    assert lazy.get("missing", "d") == "d"
+    assert lazy.resolve()["input_data_sample"][0]["a"] == 0
+
+
+def test_session_store_with_blobs(tmp_path):
+    store = SessionStore(tmp_path / "s.db", BlobStore(tmp_path / "blobs"))
+    store.save("a", "q", [_step("q"), _step("q", "Offer Design")])
+    steps = store.steps("a", agents=["Offer Design"])
+    assert steps[0]["output"] == "short output"
+    assert steps[0]["user_content"].endswith("User request: q")
@@ -66,3 +66,78 @@ def test_generate_data_via_subprocess(tmp_path):
     assert result.returncode == 0
     assert (tmp_path / "market_trends.csv").exists()
     assert (tmp_path / "customer_transactions.csv").exists()
+
+
+def _generator():
+    # Importable by name, so worker processes can unpickle its shard function.
+    scripts_dir = str(PROJECT_ROOT / "scripts")
+    if scripts_dir not in sys.path:
+        sys.path.insert(0, scripts_dir)
+    import generate_data
+    return generate_data
+
+
+def test_vectorized_generator_scaled_schema_and_counts(tmp_path):
+    """numpy engine: same columns as the Faker path, row counts multiplied by scale, valid UUIDs."""
+    import uuid
+    from datetime import datetime
+    gen = _generator()
+    counts = gen.generate_vectorized(tmp_path, scale=2, seed=1, shard_rows=700, as_of=datetime(2026, 6, 30))
+    assert counts == {"market_trends": 3000, "customer_transactions": 4000, "customer_feedback": 2000, "competitor_intel": 2000}
+    tx = pd.read_csv(tmp_path / "customer_transactions.csv")
+    assert list(tx.columns) == ["transaction_id", "customer_id", "visit_date", "total_spend", "redeemed_offer", "channel"]
+    assert len(tx) == 4000 and tx["transaction_id"].is_unique
+    assert all(uuid.UUID(t).version == 4 for t in tx["transaction_id"].head(50))
+    assert tx["total_spend"].between(5.5, 25.0).all()
+    assert set(tx["redeemed_offer"].dropna()) <= set(gen.OFFERS)
+    assert pd.to_datetime(tx["visit_date"]).max() < pd.Timestamp("2026-06-30")
+    fb = pd.read_csv(tmp_path / "customer_feedback.csv")
+    assert fb["rating"].between(1, 5).all() and len(fb) == 2000
+
+
+def test_vectorized_generator_deterministic_across_workers(tmp_path):
+    """Same seed and as_of give byte-identical files with 1 or several worker processes."""
+    from datetime import datetime
+    gen = _generator()
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.mkdir()
+    b.mkdir()
+    gen.generate_vectorized(a, scale=0.5, seed=9, workers=1, shard_rows=300, as_of=datetime(2026, 1, 31))
+    gen.generate_vectorized(b, scale=0.5, seed=9, workers=2, shard_rows=300, as_of=datetime(2026, 1, 31))
+    for name in ("market_trends.csv", "customer_transactions.csv", "customer_feedback.csv", "competitor_intel.csv"):
+        assert (a / name).read_bytes() == (b / name).read_bytes()
+
+
+def test_realistic_profile_shapes_distributions(tmp_path):
+    """realistic profile: skewed customers, lunch peak, weekend lift, ratings correlated with redemptions."""
+    from datetime import datetime
+    gen = _generator()
+    gen.generate_vectorized(tmp_path, scale=10, seed=2, shard_rows=6000, as_of=datetime(2026, 9, 30), profile="realistic")
+    tx = pd.read_csv(tmp_path / "customer_transactions.csv", parse_dates=["visit_date"])
+    visits = tx["customer_id"].value_counts()
+    assert visits.head(len(visits) // 10).sum() / len(tx) > 0.3
+    hours = tx["visit_date"].dt.hour.value_counts()
+    assert hours.get(12, 0) > 5 * hours.get(3, 0)
+    days = tx["visit_date"].dt.dayofweek.value_counts()
+    assert days[5] > days[1]
+    assert tx["total_spend"].between(5.5, 25.0).all()
+    fb = pd.read_csv(tmp_path / "customer_feedback.csv")
+    per_customer = pd.concat(
+        [tx.assign(r=tx["redeemed_offer"].notna()).groupby("customer_id")["r"].mean(), fb.groupby("customer_id")["rating"].mean()],
+        axis=1,
+    ).dropna()
+    assert per_customer.corr().iloc[0, 1] > 0.2
+    mt = pd.read_csv(tmp_path / "market_trends.csv")
+    assert set(mt["trend_theme"]) == set(gen.TREND_TEMPLATES)
+
+
+def test_realistic_profile_deterministic_across_workers(tmp_path):
+    from datetime import datetime
+    gen = _generator()
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.mkdir()
+    b.mkdir()
+    for out, workers in ((a, 1), (b, 2)):
+        gen.generate_vectorized(out, scale=0.5, seed=3, workers=workers, shard_rows=400, as_of=datetime(2026, 3, 1), profile="realistic")
+    assert (a / "customer_transactions.csv").read_bytes() == (b / "customer_transactions.csv").read_bytes()
+    assert (a / "market_trends.csv").read_bytes() == (b / "market_trends.csv").read_bytes()
@@ -3,6 +3,7 @@ Tests for src/data_loaders.py: data_available, load_*, summarize_for_llm.
 """
 
 from pathlib import Path
+from unittest.mock import patch
 
 import pandas as pd
 import pytest
@@ -14,6 +15,7 @@ from src.data_loaders import (
     load_customer_feedback,
     load_competitor_intel,
     summarize_for_llm,
+    describe_for_llm,
     get_data_dir,
 )
 
@@ -96,3 +98,86 @@ def test_get_data_dir_returns_path():
     d = get_data_dir()
     assert isinstance(d, Path)
     assert "data" in str(d).lower() or d.name == "data"
+
+
+def test_summarize_for_llm_no_char_cap(temp_data_dir):
+    """summarize_for_llm with max_chars=None does not truncate."""
+    df = load_market_trends(temp_data_dir)
+    out = summarize_for_llm(df, max_rows=100, max_chars=None)
+    assert "... (truncated)" not in out
+
+
+def test_describe_for_llm_covers_all_columns(temp_data_dir):
+    """describe_for_llm reports row count and one line per column."""
+    df = load_customer_transactions(temp_data_dir)
+    out = describe_for_llm(df)
+    assert out.startswith("rows=2000")
+    for col in df.columns:
+        assert f"{col}:" in out
+
+
+def test_data_fingerprint_changes_with_data(tmp_path):
+    """data_fingerprint is stable for unchanged files and changes when a CSV changes."""
+    from src.data_loaders import data_fingerprint
+    (tmp_path / "market_trends.csv").write_text("a,b\n1,2\n")
+    fp = data_fingerprint(tmp_path)
+    assert fp == data_fingerprint(tmp_path)
+    (tmp_path / "market_trends.csv").write_text("a,b\n1,2\n3,4\n")
+    assert data_fingerprint(tmp_path) != fp
+
+
+@pytest.fixture
+def partitioned_data_dir(tmp_path):
+    """CSV plus month-partitioned Parquet (numpy engine, fixed seed and date window)."""
+    import subprocess
+    import sys
+    root = Path(__file__).resolve().parent.parent
+    result = subprocess.run(
+        [
+            sys.executable, str(root / "scripts" / "generate_data.py"), "--output-dir", str(tmp_path),
+            "--engine", "numpy", "--seed", "5", "--as-of", "2026-06-30", "--workers", "1", "--format", "both",
+        ],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    return tmp_path
+
+
+def test_manifest_lists_partitions_and_schema(partitioned_data_dir):
+    from src.data_loaders import read_manifest
+    manifest = read_manifest(partitioned_data_dir)
+    txn = manifest["tables"]["customer_transactions"]
+    assert txn["rows"] == 2000 and txn["date_column"] == "visit_date"
+    assert txn["schema"]["total_spend"] == "float64" and txn["schema"]["channel"] == "string"
+    assert sum(p["rows"] for p in txn["partitions"].values()) == 2000
+    assert all(m.startswith("2026-") or m.startswith("2025-") for m in txn["partitions"])
+
+
+def test_load_months_reads_only_those_partitions(partitioned_data_dir):
+    from src.data_loaders import read_manifest
+    parts = read_manifest(partitioned_data_dir)["tables"]["customer_transactions"]["partitions"]
+    month = sorted(parts)[-1]
+    with patch("pandas.read_parquet", side_effect=pd.read_parquet) as mock_read:
+        df = load_customer_transactions(partitioned_data_dir, months=[month])
+    assert mock_read.call_count == len(parts[month]["files"])
+    assert len(df) == parts[month]["rows"]
+    assert (pd.to_datetime(df["visit_date"]).dt.strftime("%Y-%m") == month).all()
+    assert len(load_customer_transactions(partitioned_data_dir)) == 2000
+    assert load_customer_transactions(partitioned_data_dir, months=["1999-01"]).empty
+
+
+def test_csv_fallback_filters_months(partitioned_data_dir):
+    """Without partitions in the manifest, months filters the CSV to the same rows."""
+    from src.data_loaders import read_manifest
+    parts = read_manifest(partitioned_data_dir)["tables"]["customer_feedback"]["partitions"]
+    month = sorted(parts)[0]
+    (partitioned_data_dir / "manifest.json").unlink()
+    df = load_customer_feedback(partitioned_data_dir, months=[month])
+    assert len(df) == parts[month]["rows"]
+
+
+def test_data_available_with_parquet_only(partitioned_data_dir):
+    for name in ("market_trends.csv", "customer_transactions.csv", "customer_feedback.csv", "competitor_intel.csv"):
+        (partitioned_data_dir / name).unlink()
+    assert data_available(partitioned_data_dir) is True
+    assert len(load_competitor_intel(partitioned_data_dir)) == 1000
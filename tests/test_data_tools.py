@@ -0,0 +1,122 @@
+"""
+Tests for src/data_tools.py (agent query tools over a local SQLite copy of the data) and the tool loop in call_llm_with_tools.
+"""
+
+import threading
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from src.agents.market_research import SYSTEM_PROMPT as MARKET_RESEARCH_PROMPT
+from src.data_loaders import load_customer_feedback, load_customer_transactions
+from src.data_tools import DataTools, ToolSession, run_with_tools
+from src.ingest import append_batch
+from src.orchestrator import run_evidence_stages
+from src.rate_limit import RateLimiter, set_rate_limiter
+from src.stub_llm import StubConfig, serve_stub_llm
+
+MOCK_RESULT = {"output": "### Trend Briefs\n| A |\n|---|\n| x |", "system_prompt": "", "user_content": ""}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = serve_stub_llm(StubConfig(latency_s=0.01, latency_sigma=0, tokens_per_s=0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("GEMINI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("GEMINI_API_KEY", "stub")
+    set_rate_limiter(RateLimiter(per_minute=0))
+    yield server
+    set_rate_limiter(None)
+    server.shutdown()
+    server.server_close()
+
+
+def test_aggregates_and_filters_match_pandas(temp_data_dir):
+    tools = DataTools(temp_data_dir, max_rows=3)
+    txn = load_customer_transactions(temp_data_dir)
+    result = tools.execute("group_by_aggregate", {
+        "table": "customer_transactions", "group_by": ["channel"], "metric": "sum", "column": "total_spend",
+    })
+    expected = txn.groupby("channel")["total_spend"].sum().sort_values(ascending=False)
+    assert [r["channel"] for r in result["rows"]] == list(expected.index)
+    assert [r["value"] for r in result["rows"]] == pytest.approx(list(expected.values), abs=1e-3)
+
+    hours = pd.to_datetime(txn["visit_date"], format="mixed").dt.hour
+    in_scope = txn[hours.between(5, 10) & (txn["channel"] == "app") & (txn["total_spend"] > 10)]
+    result = tools.execute("filter_rows", {
+        "table": "customer_transactions", "daypart": "breakfast", "columns": ["visit_date", "total_spend"],
+        "where": [{"column": "channel", "value": "APP"}, {"column": "total_spend", "op": ">", "value": "10"}],
+    })
+    assert result["matched"] == len(in_scope)
+    assert result["row_count"] == 3 and result["truncated"] is True
+    assert list(result["rows"][0]) == ["visit_date", "total_spend"]
+    assert result["rows"][0]["visit_date"] >= result["rows"][1]["visit_date"]
+
+    by_month = tools.execute("group_by_aggregate", {"table": "customer_transactions", "group_by": ["month"], "order": "group", "limit": 100})
+    assert by_month["row_count"] == 3 and by_month["rows"][0]["month"] < by_month["rows"][1]["month"]
+
+
+def test_text_search_and_theme_timeseries(temp_data_dir):
+    tools = DataTools(temp_data_dir)
+    result = tools.execute("search_text", {"table": "market_trends", "query": "streak app", "k": 3})
+    assert result["row_count"] == 3
+    assert "streak" in result["rows"][0]["text_content"].lower()
+    assert result["rows"][0]["score"] >= result["rows"][1]["score"]
+    assert sum(r["mentions"] for r in result["rows"]) > 3
+
+    series = tools.execute("theme_timeseries", {"theme": "gamification"})
+    assert [r["period"] for r in series["rows"]] == sorted(r["period"] for r in series["rows"])
+    assert sum(r["n_rows"] for r in series["rows"]) >= 1
+    assert all(1 <= r["mean_velocity_score"] <= 5 for r in series["rows"])
+
+
+def test_bad_arguments_come_back_as_errors(temp_data_dir):
+    tools = DataTools(temp_data_dir)
+    assert "Unknown table" in tools.execute("filter_rows", {"table": "sqlite_master"})["error"]
+    bad_column = tools.execute("group_by_aggregate", {"table": "market_trends", "group_by": ['x" FROM market_trends; --']})
+    assert "Unknown column" in bad_column["error"] and "daypart" in bad_column["error"]
+    assert "date_from" in tools.execute("filter_rows", {"table": "market_trends", "date_from": "2026-01-01' OR 1=1"})["error"]
+    assert "Unknown tool" in tools.execute("drop_table", {})["error"]
+    # Values are bound, never spliced into SQL.
+    result = tools.execute("filter_rows", {"table": "market_trends", "where": [{"column": "trend_theme", "value": "x' OR '1'='1"}]})
+    assert result["matched"] == 0
+
+
+def test_per_call_cache_and_incremental_sync_after_append(temp_data_dir):
+    tools = DataTools(temp_data_dir)
+    args = {"table": "customer_feedback", "group_by": ["month"], "order": "group", "limit": 50}
+    session = ToolSession(tools)
+    session.execute("group_by_aggregate", args)
+    session.execute("group_by_aggregate", dict(args))
+    assert [c["cached"] for c in session.calls] == [False, True]
+
+    batch = load_customer_feedback(temp_data_dir).head(30).assign(
+        feedback_date="2031-02-03 08:00:00", feedback_text="Bring back the streak rewards",
+    )
+    with patch.object(DataTools, "_rebuild", side_effect=AssertionError("rebuilt")):
+        append_batch("customer_feedback", batch, temp_data_dir)
+        result, cached = tools.call("group_by_aggregate", args)
+        found = tools.execute("search_text", {"table": "customer_feedback", "query": "streak rewards"})
+    assert not cached and result["rows"][-1] == {"month": "2031-02", "value": 30, "n_rows": 30}
+    assert found["rows"][0] == {**found["rows"][0], "feedback_text": "Bring back the streak rewards", "mentions": 30}
+    # A fresh database built from the appended data gives the same answer.
+    assert DataTools(temp_data_dir, db_path=temp_data_dir / "fresh.db").execute("group_by_aggregate", args) == result
+
+
+def test_tool_loop_against_stub_gateway(stub, temp_data_dir):
+    output, calls = run_with_tools(DataTools(temp_data_dir), MARKET_RESEARCH_PROMPT, "data")
+    assert "Trend Briefs" in output
+    assert [c["tool"] for c in calls] == ["group_by_aggregate"] and calls[0]["rows"] == 3
+    assert stub.stats.snapshot()["requests"] == 2
+
+
+@patch("src.orchestrator.run_competitor_intel", return_value=MOCK_RESULT)
+@patch("src.orchestrator.run_customer_insights", return_value=MOCK_RESULT)
+@patch("src.orchestrator.run_market_research", return_value={**MOCK_RESULT, "tool_calls": []})
+def test_tools_mode_hands_agents_the_tools_without_samples(mock_market, mock_customer, mock_competitor, temp_data_dir):
+    steps = run_evidence_stages("Offers for families", temp_data_dir, data_tools=True)
+    assert isinstance(mock_market.call_args.kwargs["tools"], DataTools)
+    assert "Sample rows" not in mock_customer.call_args[0][0] and "Summary (all rows)" in mock_customer.call_args[0][0]
+    assert not any(name.startswith("samples:") for name in steps[2]["prompt_budget"]["sections"])
+    assert steps[0]["tool_calls"] == [] and "tool_calls" not in steps[1]
@@ -0,0 +1,93 @@
+"""
+Tests for src/deep_research.py (map-reduce briefs over full tables, chunk summary cache) and deep mode in the orchestrator.
+"""
+
+import threading
+from unittest.mock import patch
+
+import pandas as pd
+
+from src.deep_research import REDUCE_FANIN, SummaryCache, chunk_rows_for, research_briefs
+from src.orchestrator import run_evidence_stages
+
+MOCK_RESULT = {"output": "### Trend Briefs\n| A |\n|---|\n| x |", "system_prompt": "", "user_content": ""}
+
+
+class FakeLLM:
+    """Stands in for call_llm: records calls and the threads they ran on."""
+
+    def __init__(self):
+        self.calls = []
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, system_prompt, user_content, model=None, **kwargs):
+        with self._lock:
+            self.calls.append(("reduce" if "merge summaries" in system_prompt else "map", user_content))
+            self.threads.add(threading.current_thread().name)
+            return f"summary {len(self.calls)}"
+
+    def count(self, kind):
+        return sum(1 for k, _ in self.calls if k == kind)
+
+
+def _trends(n, start=0):
+    return pd.DataFrame({
+        "source_id": [f"id{i}" for i in range(start, start + n)],
+        "text_content": [f"post {i}" for i in range(start, start + n)],
+        "trend_theme": ["Subscriptions"] * n,
+        "velocity_score": [1.5] * n,
+    })
+
+
+def test_chunk_size_doubles_to_stay_under_the_cap():
+    assert chunk_rows_for(1000, chunk_rows=100, max_chunks=20) == 100
+    assert chunk_rows_for(5000, chunk_rows=100, max_chunks=20) == 400
+    assert chunk_rows_for(0, chunk_rows=100, max_chunks=20) == 100
+
+
+def test_map_reduce_covers_every_chunk_in_parallel():
+    fake = FakeLLM()
+    with patch("src.deep_research.call_llm", fake):
+        briefs, report = research_briefs({"market_trends": _trends(1000)}, workers=4, chunk_rows=50, max_chunks=100)
+    assert report["tables"]["market_trends"] == {"rows": 1000, "chunks": 20, "chunk_rows": 50}
+    assert fake.count("map") == 20
+    # 20 summaries -> 3 (fan-in 8) -> 1
+    assert REDUCE_FANIN == 8 and fake.count("reduce") == 4 and report["levels"] == 2
+    assert briefs["market_trends"] == f"summary {len(fake.calls)}"
+    assert len(fake.threads) > 1
+
+
+def test_after_an_append_only_new_chunks_are_summarized(tmp_path):
+    cache = SummaryCache(tmp_path)
+    fake = FakeLLM()
+    with patch("src.deep_research.call_llm", fake):
+        research_briefs({"market_trends": _trends(230)}, cache=cache, chunk_rows=50, max_chunks=100)
+        assert fake.count("map") == 5
+        fake.calls.clear()
+        _, report = research_briefs({"market_trends": _trends(230)}, cache=cache, chunk_rows=50, max_chunks=100)
+        assert fake.calls == [] and report["cached"] == 6
+        grown = pd.concat([_trends(230), _trends(40, start=230)], ignore_index=True)
+        _, report = research_briefs({"market_trends": grown}, cache=cache, chunk_rows=50, max_chunks=100)
+    # Rows 200-229 gained 20 rows and 250-269 are new: two map calls, then one reduce.
+    assert fake.count("map") == 2 and fake.count("reduce") == 1
+    assert report["cached"] == 4
+
+
+@patch("src.orchestrator.run_competitor_intel", return_value=MOCK_RESULT)
+@patch("src.orchestrator.run_customer_insights", return_value=MOCK_RESULT)
+@patch("src.orchestrator.run_market_research", return_value=MOCK_RESULT)
+def test_deep_mode_adds_briefs_to_the_evidence_stages(mock_market, mock_customer, mock_competitor, temp_data_dir, monkeypatch):
+    monkeypatch.setenv("DEEP_RESEARCH_CHUNK_ROWS", "500")
+    fake = FakeLLM()
+    with patch("src.deep_research.call_llm", fake):
+        steps = run_evidence_stages("Offers for families", temp_data_dir, deep_research=True)
+    # 1500 trends + 2000 transactions + 1000 feedback rows in 500-row chunks, then one reduce per table.
+    assert fake.count("map") == 3 + 4 + 2 and fake.count("reduce") == 3
+    assert "Deep-research brief" in mock_market.call_args[0][0]
+    assert "Deep-research brief" in mock_customer.call_args[0][0]
+    assert "Deep-research brief" in mock_customer.call_args[0][1]
+    assert "Deep-research brief" not in mock_competitor.call_args[0][0]
+    assert steps[0]["deep_research"]["tables"]["market_trends"]["rows"] == 1500
+    assert "deep_research" not in steps[2]
+    assert "brief:market" in steps[0]["prompt_budget"]["sections"]
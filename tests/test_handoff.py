@@ -0,0 +1,83 @@
+"""
+Tests for src/handoff.py: artifact extraction, dedup, compact hand-off.
+"""
+
+import json
+
+from src.handoff import build_handoff, dedupe, extract_artifacts, fit_to_tokens, to_compact_json
+from src.prompt_budget import estimate_tokens
+
+TREND_OUTPUT = """## Trend Briefs
+
+1. **Meal Subscriptions**
+- **Summary:** Subscriptions are rising among Gen Z.
+- **Evidence:** "I'd pay $5 a month" (Reddit)
+- **Signal strength:** 4.2
+- **Recommended directions:**
+  - Fry Club pilot
+  - Coffee pass
+
+2. **Gamification**
+- Summary: Streaks and challenges drive app opens.
+- Signal strength: 3.9
+"""
+
+COMPETITOR_OUTPUT = """### Competitive landscape
+| Brand | Mechanic | Duration | Channel |
+|---|---|---|---|
+| McDonald's | Gamified App Challenge | 14 | app-exclusive |
+| Burger King | BOGO | 7 | all-channels |
+
+### Whitespace Opportunities
+1. **Late-night value:** Taco Bell owns late night, Wendy's has no equivalent.
+2. **Late-night value:** Taco Bell owns late night; Wendy's has no equivalent.
+"""
+
+
+def test_extract_trend_briefs_fields():
+    """Numbered bold titles become items; Field: value lines become keys."""
+    out = extract_artifacts(TREND_OUTPUT, "trend_briefs")
+    briefs = out["trend_briefs"]
+    assert [b["title"] for b in briefs] == ["Meal Subscriptions", "Gamification"]
+    assert briefs[0]["signal_strength"] == "4.2"
+    assert briefs[0]["directions"] == "Fry Club pilot; Coffee pass"
+
+
+def test_extract_competitor_table_and_whitespace():
+    """Markdown table rows go to competitive_landscape; whitespace heading switches the list."""
+    out = extract_artifacts(COMPETITOR_OUTPUT, "competitive_landscape")
+    assert out["competitive_landscape"][0] == {"brand": "McDonald's", "mechanic": "Gamified App Challenge", "duration": "14", "channel": "app-exclusive"}
+    assert len(out["whitespace_opportunities"]) == 2
+
+
+def test_extract_prefers_json_block():
+    """A JSON block keyed by artifact kind is used as-is."""
+    text = 'Here:\n```json\n{"trend_briefs": [{"title": "A", "summary": "B"}]}\n```'
+    assert extract_artifacts(text, "trend_briefs") == {"trend_briefs": [{"title": "A", "summary": "B"}]}
+
+
+def test_dedupe_drops_near_duplicates():
+    """Items with near-identical titles/summaries are kept once."""
+    items = [{"title": "Late night", "summary": "Taco Bell owns it"}, {"title": "Late-night", "summary": "Taco Bell owns it."}, {"title": "Breakfast"}]
+    assert [i["title"] for i in dedupe(items)] == ["Late night", "Breakfast"]
+
+
+def test_build_handoff_dedupes_and_falls_back_to_text():
+    """Unstructured output is forwarded as text; duplicates across outputs are dropped."""
+    handoff = build_handoff(TREND_OUTPUT, "Plain prose about segments.", COMPETITOR_OUTPUT + COMPETITOR_OUTPUT)
+    assert handoff["customer_insights"] == [{"text": "Plain prose about segments."}]
+    assert len(handoff["competitive_landscape"]) == 2
+    assert len(handoff["whitespace_opportunities"]) == 1
+    compact = to_compact_json(handoff)
+    assert json.loads(compact) == handoff
+    # Previously the competitor output (here already duplicated) was pasted twice.
+    assert len(compact) < len(TREND_OUTPUT) + 2 * len(COMPETITOR_OUTPUT + COMPETITOR_OUTPUT)
+
+
+def test_fit_to_tokens_drops_whole_items_from_tail():
+    """Trimmed hand-off stays valid JSON within the limit and keeps the leading items."""
+    items = [{"brand": f"Brand {i}", "mechanic": "BOGO", "lift": f"+{i}%"} for i in range(100)]
+    fitted = fit_to_tokens(items, 200)
+    assert 0 < len(fitted) < 100 and fitted == items[:len(fitted)]
+    assert estimate_tokens(to_compact_json(fitted)) <= 200
+    assert fit_to_tokens(items, 1) == []
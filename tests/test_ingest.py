@@ -0,0 +1,113 @@
+"""
+Tests for src/ingest.py (append-only ingestion, data version, incrementally maintained derived artifacts).
+"""
+
+import json
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from src.data_loaders import data_fingerprint, data_version, load_customer_feedback, load_customer_transactions
+from src.ingest import SAMPLE_ROWS, append_batch, current_stats, describe_stats, rebuild_derived
+from src.orchestrator import run_evidence_stages
+
+MOCK_RESULT = {"output": "### Trend Briefs\n| A |\n|---|\n| x |", "system_prompt": "", "user_content": ""}
+
+
+def test_append_bumps_version_and_appends_rows(temp_data_dir):
+    before = load_customer_transactions(temp_data_dir)
+    fingerprint = data_fingerprint(temp_data_dir)
+    result = append_batch("customer_transactions", before.head(50), temp_data_dir)
+    assert result == {"table": "customer_transactions", "rows": 50, "total_rows": len(before) + 50, "data_version": 1}
+    append_batch("customer_transactions.csv", before.tail(25).to_dict(orient="records"), temp_data_dir)
+    after = load_customer_transactions(temp_data_dir)
+    assert len(after) == len(before) + 75
+    assert after["transaction_id"].iloc[-1] == before["transaction_id"].iloc[-1]
+    assert data_version(temp_data_dir) == 2
+    assert data_fingerprint(temp_data_dir) != fingerprint
+    manifest = json.loads((temp_data_dir / "manifest.json").read_text())
+    assert manifest["tables"]["customer_transactions"]["rows"] == len(after)
+    assert [b["rows"] for b in manifest["batches"]] == [50, 25]
+
+
+def test_incremental_stats_match_a_full_rebuild(temp_data_dir):
+    feedback = load_customer_feedback(temp_data_dir)
+    append_batch("customer_feedback", feedback.head(200), temp_data_dir)
+    append_batch("customer_feedback", feedback.tail(100), temp_data_dir)
+    incremental = current_stats("customer_feedback", temp_data_dir)
+    assert incremental["rows"] == len(feedback) + 300
+    assert len(incremental["sample"]) == SAMPLE_ROWS
+    rebuild_derived(temp_data_dir, ["customer_feedback"])
+    rebuilt = current_stats("customer_feedback", temp_data_dir)
+    assert rebuilt["columns"] == incremental["columns"]
+    assert rebuilt["terms"] == incremental["terms"]
+    digest = describe_stats(incremental)
+    assert f"rows={len(feedback) + 300}" in digest and "feedback_text top terms:" in digest
+
+
+def test_append_to_parquet_partitions(tmp_path, project_root):
+    pytest.importorskip("pyarrow")
+    result = subprocess.run(
+        [sys.executable, str(project_root / "scripts" / "generate_data.py"), "--output-dir", str(tmp_path), "--format", "parquet"],
+        capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    before = load_customer_transactions(tmp_path)
+    batch = before.head(10).assign(visit_date=pd.Timestamp("2031-01-15 12:00"))
+    append_batch("customer_transactions", batch, tmp_path)
+    assert len(load_customer_transactions(tmp_path)) == len(before) + 10
+    assert len(load_customer_transactions(tmp_path, months=["2031-01"])) == 10
+    assert (tmp_path / "parquet" / "customer_transactions" / "month=2031-01" / "batch-000001.parquet").exists()
+
+
+def test_rejects_invalid_batches_without_changing_data(temp_data_dir):
+    txn = load_customer_transactions(temp_data_dir)
+    with pytest.raises(ValueError, match="missing"):
+        append_batch("customer_transactions", txn.drop(columns=["channel"]).head(5), temp_data_dir)
+    with pytest.raises(ValueError, match="visit_date"):
+        append_batch("customer_transactions", txn.head(5).assign(visit_date="not a date"), temp_data_dir)
+    with pytest.raises(ValueError, match="total_spend"):
+        append_batch("customer_transactions", txn.head(5).assign(total_spend="lots"), temp_data_dir)
+    with pytest.raises(ValueError, match="Unknown table"):
+        append_batch("orders", txn.head(5), temp_data_dir)
+    assert data_version(temp_data_dir) == 0
+    assert len(load_customer_transactions(temp_data_dir)) == len(txn)
+
+
+@patch("src.orchestrator.run_competitor_intel", return_value=MOCK_RESULT)
+@patch("src.orchestrator.run_customer_insights", return_value=MOCK_RESULT)
+@patch("src.orchestrator.run_market_research", return_value=MOCK_RESULT)
+def test_evidence_stages_use_derived_stats_instead_of_loading(mock_market, mock_customer, mock_competitor, temp_data_dir):
+    rebuild_derived(temp_data_dir)
+    append_batch("customer_transactions", load_customer_transactions(temp_data_dir).head(5), temp_data_dir)
+    with patch("src.orchestrator.load_customer_transactions", side_effect=AssertionError("loaded")), \
+            patch("src.orchestrator.load_market_trends", side_effect=AssertionError("loaded")):
+        steps = run_evidence_stages("Offers for families", temp_data_dir)
+    assert len(steps) == 3
+    transactions_text = mock_customer.call_args[0][0]
+    assert "rows=2005" in transactions_text and "visit_date: " in transactions_text
+
+
+def test_regenerated_data_invalidates_rebuilt_stats(temp_data_dir, project_root):
+    manifest_path = temp_data_dir / "manifest.json"
+    # An older dataset, so generated_at differs even if both runs land in the same second.
+    manifest = json.loads(manifest_path.read_text())
+    manifest_path.write_text(json.dumps({**manifest, "generated_at": "2020-01-01T00:00:00"}))
+    rebuild_derived(temp_data_dir)
+    stale = (temp_data_dir / "derived" / "customer_transactions.json").read_text()
+    subprocess.run(
+        [sys.executable, str(project_root / "scripts" / "generate_data.py"), "--output-dir", str(temp_data_dir), "--seed", "2"],
+        check=True, capture_output=True, timeout=60,
+    )
+    assert not (temp_data_dir / "derived").exists()
+    assert current_stats("customer_transactions", temp_data_dir) is None
+    # Same version 0 and row counts as the new manifest, but built from the old data.
+    (temp_data_dir / "derived").mkdir()
+    (temp_data_dir / "derived" / "customer_transactions.json").write_text(stale)
+    assert current_stats("customer_transactions", temp_data_dir) is None
+    append_batch("customer_transactions", load_customer_transactions(temp_data_dir).head(5), temp_data_dir)
+    ids = set(load_customer_transactions(temp_data_dir)["transaction_id"])
+    assert {r["transaction_id"] for r in current_stats("customer_transactions", temp_data_dir)["sample"]} <= ids
@@ -0,0 +1,93 @@
+"""
+Tests for src/jobs.py: background workflow jobs keyed by session ID.
+"""
+
+import threading
+
+from src.jobs import DONE, FAILED, JobManager
+
+
+def test_job_runs_in_background_and_exposes_partial_steps():
+    """Steps reported by the worker are visible before the job finishes."""
+    manager = JobManager(max_workers=2)
+    release = threading.Event()
+    seen = threading.Event()
+
+    def work(job):
+        job.on_agent_start("Market Trends & Deep Research", "Detecting...")
+        job.on_row("Market Trends & Deep Research", "trend_briefs", {"title": "A"})
+        job.on_step({"agent": "Market Trends & Deep Research", "output": "x"})
+        seen.set()
+        release.wait(5)
+
+    job = manager.submit("s1", "query", work)
+    assert seen.wait(5)
+    snap = job.snapshot()
+    assert snap["status"] == "running"
+    assert [s["agent"] for s in snap["steps"]] == ["Market Trends & Deep Research"]
+    assert snap["row_counts"]["Market Trends & Deep Research"] == 1
+    release.set()
+    manager.shutdown()
+    assert job.snapshot()["status"] == DONE
+
+
+def test_resubmitting_same_id_never_restarts():
+    """A reload that submits the same session ID re-attaches to the existing job."""
+    manager = JobManager(max_workers=1)
+    calls = []
+    first = manager.submit("s1", "q", lambda job: calls.append(1))
+    again = manager.submit("s1", "q", lambda job: calls.append(2))
+    manager.shutdown()
+    assert again is first and calls == [1]
+    assert manager.get("s1") is first and manager.get("missing") is None
+
+
+def test_failed_job_records_error():
+    manager = JobManager(max_workers=1)
+
+    def work(job):
+        raise RuntimeError("gateway down")
+
+    job = manager.submit("s1", "q", work)
+    manager.shutdown()
+    snap = job.snapshot()
+    assert snap["status"] == FAILED and "gateway down" in snap["error"]
+
+
+def _blocking_manager(**kwargs):
+    manager = JobManager(**kwargs)
+    release = threading.Event()
+    return manager, release, (lambda job: release.wait(5))
+
+
+def test_admission_queues_fifo_with_positions():
+    """Beyond max_workers runs wait in submission order with 1-based positions."""
+    manager, release, work = _blocking_manager(max_workers=1, max_queue=5, per_user=0)
+    manager.submit("a", "q", work)
+    manager.submit("b", "q", work)
+    manager.submit("c", "q", work)
+    import time
+    deadline = time.time() + 5
+    while manager.stats()["running"] < 1 and time.time() < deadline:
+        time.sleep(0.01)
+    assert manager.position("a") is None
+    assert (manager.position("b"), manager.position("c")) == (1, 2)
+    assert manager.stats() == {"running": 1, "queued": 2, "capacity": 1, "max_queue": 5, "shed": 0}
+    release.set()
+    manager.shutdown()
+
+
+def test_admission_sheds_when_queue_full_and_enforces_quota():
+    """A full queue and a user's quota reject new runs with a message; other users still get in."""
+    import pytest
+    from src.jobs import QueueFullError, QuotaExceededError
+    manager, release, work = _blocking_manager(max_workers=1, max_queue=1, per_user=1)
+    manager.submit("a", "q", work, owner="alice")
+    with pytest.raises(QuotaExceededError):
+        manager.submit("a2", "q", work, owner="alice")
+    manager.submit("b", "q", work, owner="bob")
+    with pytest.raises(QueueFullError, match="capacity"):
+        manager.submit("c", "q", work, owner="carol")
+    assert manager.stats()["shed"] == 2
+    release.set()
+    manager.shutdown()
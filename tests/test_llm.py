@@ -21,3 +21,103 @@ def test_call_llm_raises_when_no_key():
     with patch("src.llm.get_api_key", return_value=None):
         with pytest.raises(ValueError, match="GEMINI_API_KEY"):
             call_llm("system", "user")
+
+
+def test_call_llm_structured_and_streaming_via_gateway():
+    """Gateway path sends response_format for a schema and streams chunks to on_token."""
+    from types import SimpleNamespace
+    from unittest.mock import MagicMock
+
+    chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=c))]) for c in ('{"a"', ": 1}")]
+    client = MagicMock()
+    client.chat.completions.create.return_value = iter(chunks)
+    received = []
+    with patch("src.llm.get_api_key", return_value="k"), \
+            patch("src.llm.get_base_url", return_value="http://gateway"), \
+            patch("openai.OpenAI", return_value=client):
+        out = call_llm("system", "user", response_schema={"type": "object"}, on_token=received.append)
+    assert out == '{"a": 1}'
+    assert received == ['{"a"', ": 1}"]
+    kwargs = client.chat.completions.create.call_args.kwargs
+    assert kwargs["stream"] is True
+    assert kwargs["response_format"]["json_schema"]["schema"] == {"type": "object"}
+
+
+def test_call_llm_cached_prefix_sends_only_suffix(monkeypatch):
+    """With CONTEXT_CACHE=1 on direct Gemini, the prefix is cached once and later calls send only the suffix."""
+    from unittest.mock import MagicMock
+    from src.llm import ContextCache, set_context_cache
+
+    monkeypatch.setenv("CONTEXT_CACHE", "1")
+    genai = MagicMock()
+    genai.GenerativeModel.from_cached_content.return_value.generate_content.return_value.text = "answer"
+    cache = ContextCache(ttl_seconds=60)
+    set_context_cache(cache)
+    try:
+        with patch("src.llm.get_api_key", return_value="k"), \
+                patch("src.llm.get_base_url", return_value=None), \
+                patch("src.llm._get_client", return_value=genai):
+            for query in ("query one", "query two"):
+                out = call_llm("system", "DATA CONTEXT\n\nUser request: " + query, cached_prefix="DATA CONTEXT")
+                assert out == "answer"
+    finally:
+        set_context_cache(None)
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+    sent = genai.GenerativeModel.from_cached_content.return_value.generate_content.call_args[0][0]
+    assert sent == "User request: query two"
+    genai.GenerativeModel.assert_not_called()
+
+
+def test_call_llm_cached_prefix_disabled_sends_full_content(monkeypatch):
+    """Without CONTEXT_CACHE the full user content goes out as before."""
+    from unittest.mock import MagicMock
+
+    monkeypatch.delenv("CONTEXT_CACHE", raising=False)
+    genai = MagicMock()
+    genai.GenerativeModel.return_value.generate_content.return_value.text = "answer"
+    with patch("src.llm.get_api_key", return_value="k"), \
+            patch("src.llm.get_base_url", return_value=None), \
+            patch("src.llm._get_client", return_value=genai):
+        call_llm("system", "DATA\n\nUser request: q", cached_prefix="DATA")
+    assert genai.GenerativeModel.return_value.generate_content.call_args[0][0] == "DATA\n\nUser request: q"
+
+
+def test_context_cache_uncacheable_prefix_falls_back():
+    """A provider error on create is remembered as uncacheable (None) only briefly, then retried."""
+    from src.llm import ContextCache
+
+    class FailingCache(ContextCache):
+        creates = 0
+
+        def _create(self, model, system_prompt, prefix):
+            self.creates += 1
+            raise RuntimeError("quota exceeded")
+
+    cache = FailingCache(ttl_seconds=3600)
+    assert cache.get_or_create("m", "s", "p") is None
+    assert cache.get_or_create("m", "s", "p") is None
+    assert cache.stats()["hits"] == 1 and cache.creates == 1
+    retrying = FailingCache(ttl_seconds=3600, failure_retry_seconds=0)
+    retrying.get_or_create("m", "s", "p")
+    retrying.get_or_create("m", "s", "p")
+    assert retrying.creates == 2
+
+
+def test_gemini_context_cache_skips_prefixes_below_the_minimum(monkeypatch, caplog):
+    """Direct Gemini: a prefix under the model's CachedContent minimum is never sent to create (logged once)."""
+    from src.llm import GeminiContextCache
+
+    monkeypatch.delenv("CONTEXT_CACHE_MIN_TOKENS", raising=False)
+    cache = GeminiContextCache(ttl_seconds=3600)
+    assert cache.min_tokens("models/gemini-1.5-flash-002") == 32768
+    assert cache.min_tokens("gemini-2.5-flash-lite") == 1024
+    assert cache.min_tokens("some-new-model") == 32768
+    small = "data " * 4000
+    with patch.object(GeminiContextCache, "_create", return_value="handle") as create, caplog.at_level("INFO", "src.llm"):
+        assert cache.get_or_create("gemini-1.5-flash", "s", small) is None
+        assert cache.get_or_create("gemini-1.5-flash", "s", small + "more") is None
+        assert cache.get_or_create("gemini-2.5-flash", "s", small) == "handle"
+    assert create.call_count == 1
+    assert sum("below the 32768-token minimum" in r.getMessage() for r in caplog.records) == 1
+    monkeypatch.setenv("CONTEXT_CACHE_MIN_TOKENS", "100")
+    assert cache.min_tokens("gemini-1.5-flash") == 100
@@ -0,0 +1,94 @@
+"""
+Tests for src/metrics.py: sharded counters/histograms, text format, exporters, and the call_llm instrumentation.
+"""
+
+import threading
+import urllib.request
+
+import pytest
+
+from src.agents.market_research import SYSTEM_PROMPT as MARKET_RESEARCH_PROMPT
+from src.llm import call_llm
+from src.metrics import LLM_REQUESTS, LLM_TOKENS, Registry, agent_label, serve_metrics, write_metrics_file
+from src.rate_limit import RateLimiter, set_rate_limiter
+from src.stub_llm import StubConfig, serve_stub_llm
+
+
+def test_counter_is_exact_across_threads_including_exited_ones():
+    counter = Registry().counter("hits_total", "Hits.", ("kind",))
+    barrier = threading.Barrier(8)
+
+    def work():
+        barrier.wait()
+        for _ in range(5000):
+            counter.inc(kind="a")
+        counter.inc(2, kind="b")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    del threads
+    assert counter.value(kind="a") == 40000
+    assert counter.value(kind="b") == 16
+    assert len(counter._live) <= 1  # exited threads were folded into the total
+
+
+def test_histogram_and_gauge_render_prometheus_text():
+    registry = Registry()
+    hist = registry.histogram("load_seconds", "Load time.", ("table",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        hist.observe(v, table='x"y')
+    registry.gauge("queue_depth", "Queued.", lambda: {("queued",): 3}, ("state",))
+    registry.gauge("broken", "Raises.", lambda: 1 / 0)
+    text = registry.render()
+    assert "# TYPE load_seconds histogram" in text
+    assert 'load_seconds_bucket{table="x\\"y",le="0.1"} 1' in text
+    assert 'load_seconds_bucket{table="x\\"y",le="1"} 2' in text
+    assert 'load_seconds_bucket{table="x\\"y",le="+Inf"} 3' in text
+    assert 'load_seconds_count{table="x\\"y"} 3' in text
+    assert 'queue_depth{state="queued"} 3' in text
+    assert "# TYPE broken gauge" in text and "\nbroken " not in text
+    assert hist.count(table='x"y') == 3
+
+
+def test_http_endpoint_and_file_writer(tmp_path):
+    registry = Registry()
+    registry.counter("runs_total", "Runs.").inc(3)
+    server = serve_metrics(registry, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as resp:
+            assert resp.headers["Content-Type"].startswith("text/plain")
+            assert "runs_total 3" in resp.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+    path = tmp_path / "out" / "app.prom"
+    write_metrics_file(path, registry)
+    assert "runs_total 3" in path.read_text()
+    assert list(path.parent.iterdir()) == [path]
+
+
+@pytest.fixture
+def stub_gateway(monkeypatch):
+    server = serve_stub_llm(StubConfig(latency_s=0, latency_sigma=0, tokens_per_s=0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("GEMINI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("GEMINI_API_KEY", "stub")
+    monkeypatch.setenv("GEMINI_MODEL", "metrics-test-model")
+    set_rate_limiter(RateLimiter(per_minute=0))
+    yield server
+    set_rate_limiter(None)
+    server.shutdown()
+    server.server_close()
+
+
+def test_call_llm_records_requests_and_tokens_by_agent(stub_gateway):
+    labels = {"agent": "Market Research", "model": "metrics-test-model"}
+    before = LLM_REQUESTS.value(status="ok", **labels)
+    with agent_label("Market Research"):
+        call_llm(MARKET_RESEARCH_PROMPT, "data")
+    assert LLM_REQUESTS.value(status="ok", **labels) == before + 1
+    assert LLM_TOKENS.value(kind="completion", **labels) > 0
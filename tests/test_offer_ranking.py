@@ -0,0 +1,154 @@
+"""
+Tests for src/offer_ranking.py (parallel Offer Design candidates, offer parsing, merging and deterministic ranking).
+"""
+
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from src.offer_ranking import (
+    OfferScorer,
+    candidate_settings,
+    design_offer_candidates,
+    merge_offers,
+    parse_offers,
+)
+from src.orchestrator import run_workflow
+
+MOCK_RESULT = {"output": "Mocked agent output.", "system_prompt": "", "user_content": ""}
+
+PROSE_OUTPUT = """## Offer 1: Streak Week
+- **Mechanic:** Visit 3 days in a row, get a free Frosty
+- **Channel:** App
+- **Target:** Discount hunters
+
+TOP 3 SUMMARY TABLE
+
+| Offer name | Channel | Target segment | Duration | Evidence |
+|---|---|---|---|---|
+| Streak Week | App | Discount hunters | 2 weeks | Trend: gamification; competitor whitespace |
+| Family Bundle | In-store | Families | 4 weeks | Customer insights |
+"""
+
+HANDOFF = {
+    "trend_briefs": [{"title": "Gamification", "summary": "Streak challenges and daily rewards trend on social"}],
+    "customer_insights": [{"segment": "Discount hunters", "summary": "Redeem app deals, visit for daily rewards"}],
+    "competitive_landscape": [{"title": "McDonald's", "summary": "BOGO bundles everywhere"}],
+    "whitespace_opportunities": [{"title": "Streak rewards", "summary": "Nobody runs daily streak challenges"}],
+}
+SIGNALS = {
+    "channels": {"app": 900, "in-store": 600, "drive-thru": 300},
+    "competitor_mechanics": {"BOGO": 40, "Bundle": 50, "Loyalty points": 10},
+}
+STREAK = {
+    "name": "Streak Week",
+    "mechanic": "Daily streak challenge with growing rewards",
+    "channel": "App",
+    "target": "Discount hunters",
+    "evidence": "Trend: gamification on social; customer insight: daily rewards; competitor whitespace: streaks",
+}
+BUNDLE = {
+    "name": "Family Bundle",
+    "mechanic": "Bundle of four meals",
+    "channel": "Drive-thru",
+    "target": "Families",
+    "evidence": "Market trend: bundles",
+}
+
+
+def test_parse_offers_from_json_and_from_prose():
+    concepts = {"offer_concepts": [
+        {"name": "Streak Week", "mechanic": "Daily streak", "channel": "App", "target_segment": "Discount hunters",
+         "evidence_map": {"trends": "gamification", "competitors": "whitespace"}},
+        {"name": "", "mechanic": "dropped: no name"},
+    ]}
+    (offer,) = parse_offers(json.dumps(concepts))
+    assert offer["target"] == "Discount hunters"
+    assert offer["evidence"] == "trends: gamification; competitors: whitespace"
+
+    offers = parse_offers(PROSE_OUTPUT)
+    # The "Offer 1:" heading and the summary table row are one offer.
+    assert [o["name"] for o in offers] == ["Streak Week", "Family Bundle"]
+    assert offers[0]["mechanic"].startswith("Visit 3 days") and offers[0]["duration"] == "2 weeks"
+
+
+def test_merge_offers_groups_the_same_offer_across_candidates():
+    offers = [
+        {**STREAK, "candidate": 0},
+        {"name": "Streak Week Challenge", "mechanic": "app-only daily streak challenge", "duration": "3 weeks", "candidate": 2},
+        {**BUNDLE, "candidate": 2},
+        {"name": "Breakfast 2 for $5", "mechanic": "two breakfast sandwiches", "candidate": 1},
+        {"name": "Breakfast 3 for $5", "mechanic": "three breakfast sandwiches", "candidate": 1},
+    ]
+    merged = merge_offers(offers)
+    assert [o["name"] for o in merged] == ["Streak Week", "Family Bundle", "Breakfast 2 for $5", "Breakfast 3 for $5"]
+    assert merged[0]["candidates"] == [0, 2] and merged[0]["duration"] == "3 weeks"
+    assert "candidate" not in merged[0]
+
+
+def test_scorer_is_deterministic_and_prefers_grounded_whitespace_offers():
+    scorer = OfferScorer(HANDOFF, "Offers for discount hunters", SIGNALS, k=2)
+    streak, bundle = {**STREAK, "candidates": [0, 1]}, {**BUNDLE, "candidates": [1]}
+    s = scorer.score(streak)
+    b = scorer.score(bundle)
+    assert s == scorer.score(dict(streak))
+    assert s["evidence"] > b["evidence"]
+    assert s["segment_fit"] == 1.0 and b["segment_fit"] == pytest.approx(0.5 * 300 / 900, abs=1e-3)
+    assert s["whitespace"] > b["whitespace"]
+    assert s["agreement"] == 1.0 and b["agreement"] == 0.5
+    assert [o["name"] for o in scorer.rank([bundle, streak])] == ["Streak Week", "Family Bundle"]
+    # Equal scores fall back to candidate count, then name.
+    tied = scorer.rank([{**bundle, "name": "B"}, {**bundle, "name": "A"}])
+    assert [o["name"] for o in tied] == ["A", "B"]
+
+
+def test_candidates_run_in_parallel_with_varied_sampling():
+    calls, threads = [], set()
+    lock = threading.Lock()
+
+    def fake_offer_design(*args, temperature=None, seed=None, **kwargs):
+        time.sleep(0.2)
+        with lock:
+            calls.append((temperature, seed))
+            threads.add(threading.current_thread().name)
+        if seed == 3:
+            raise RuntimeError("candidate failed")
+        rows = [STREAK, BUNDLE] if seed == 1 else [{**STREAK, "name": "Streak Week!"}, {"name": f"Extra {seed}", "mechanic": "m"}]
+        return {"output": json.dumps({"offer_concepts": rows}), "system_prompt": "sys", "user_content": "usr"}
+
+    rows = []
+    scorer = OfferScorer(HANDOFF, "Offers for discount hunters", SIGNALS, k=4)
+    start = time.perf_counter()
+    with patch("src.offer_ranking.run_offer_design", side_effect=fake_offer_design):
+        res = design_offer_candidates(
+            "t", "c", "l", "w", "Offers for discount hunters", k=4, scorer=scorer,
+            on_row=lambda table, row: rows.append(row["name"]),
+        )
+    assert time.perf_counter() - start < 0.6
+    assert sorted(calls) == [(s["temperature"], s["seed"]) for s in candidate_settings(4)]
+    assert len({t for t, _ in calls}) == 4 and len(threads) > 1
+    report = res["candidates"]
+    assert (report["succeeded"], report["failed"], report["offers"]) == (3, 1, 6)
+    assert report["unique"] == 4 and report["ranking"][0]["name"] == "Streak Week"
+    assert report["ranking"][0]["candidates"] == [0, 1, 3]
+    assert [r["name"] for r in res["tables"]["offer_concepts"]] == rows and len(rows) == 3
+    assert "TOP 3 SUMMARY TABLE" in res["output"] and res["system_prompt"] == "sys"
+
+
+@patch("src.orchestrator.run_offer_design")
+@patch("src.orchestrator.run_competitor_intel", return_value=MOCK_RESULT)
+@patch("src.orchestrator.run_customer_insights", return_value=MOCK_RESULT)
+@patch("src.orchestrator.run_market_research", return_value=MOCK_RESULT)
+def test_run_workflow_ranks_offer_candidates(mock_market, mock_customer, mock_competitor, mock_single, temp_data_dir):
+    output = json.dumps({"offer_concepts": [STREAK, BUNDLE]})
+    with patch("src.offer_ranking.run_offer_design", return_value={**MOCK_RESULT, "output": output}) as mock_offer:
+        steps = run_workflow("Offers for discount hunters", data_dir=temp_data_dir, offer_candidates=3)
+    mock_single.assert_not_called()
+    assert mock_offer.call_count == 3
+    assert {c.kwargs["seed"] for c in mock_offer.call_args_list} == {1, 2, 3}
+    report = steps[3]["offer_candidates"]
+    assert (report["k"], report["offers"], report["unique"]) == (3, 6, 2)
+    assert [r["name"] for r in steps[3]["tables"]["offer_concepts"]] == ["Streak Week", "Family Bundle"]
@@ -85,3 +85,132 @@ def test_run_workflow_injects_scope(mock_market, mock_customer, mock_competitor,
     effective_query = call_args[0][1]
     assert "daypart=breakfast" in effective_query
     assert "time_horizon=Q1" in effective_query
+
+
+@patch("src.orchestrator.run_offer_design", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_competitor_intel", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_customer_insights", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_market_research", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+def test_run_workflow_respects_prompt_budget(mock_market, mock_customer, mock_competitor, mock_offer, temp_data_dir, monkeypatch):
+    """Data text handed to agents is packed into the prompt token budget."""
+    from src.prompt_budget import estimate_tokens
+    monkeypatch.setenv("PROMPT_TOKEN_BUDGET", "1500")
+    steps = run_workflow("test query", data_dir=temp_data_dir)
+    for step in steps:
+        assert step["prompt_budget"]["budget"] == 1500
+        assert step["prompt_budget"]["used"] <= 1500
+    market_text = mock_market.call_args[0][0]
+    assert "rows=1500" in market_text
+    assert estimate_tokens(market_text) <= 1500
+
+
+@patch("src.orchestrator.run_offer_design", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_competitor_intel", return_value={"output": "### Whitespace Opportunities\n1. **Late-night value:** no Wendy's equivalent", "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_customer_insights", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_market_research", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+def test_run_workflow_hands_off_compact_artifacts(mock_market, mock_customer, mock_competitor, mock_offer, temp_data_dir):
+    """Offer Design gets each artifact once as compact JSON, not the competitor output twice."""
+    import json
+    steps = run_workflow("test query", data_dir=temp_data_dir)
+    trends, insights, landscape, whitespace, _ = mock_offer.call_args[0]
+    assert json.loads(whitespace) == [{"title": "Late-night value", "summary": "no Wendy's equivalent"}]
+    assert json.loads(landscape) == []
+    assert json.loads(trends) == [{"text": MOCK_AGENT_RESPONSE}]
+    assert steps[3]["handoff_artifacts"]["whitespace_opportunities"][0]["title"] == "Late-night value"
+
+
+@patch("src.orchestrator.run_offer_design", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_competitor_intel", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_customer_insights", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_market_research", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+def test_run_workflow_records_routing(mock_market, mock_customer, mock_competitor, mock_offer, temp_data_dir, monkeypatch):
+    """Each agent runs on its routed model and the decision is kept in the trace."""
+    monkeypatch.setenv("GEMINI_MODEL_FAST", "fast-model")
+    monkeypatch.setenv("GEMINI_MODEL_STRONG", "strong-model")
+    steps = run_workflow("test query", data_dir=temp_data_dir)
+    assert mock_market.call_args.kwargs["model"] == "fast-model"
+    assert mock_offer.call_args.kwargs["model"] == "strong-model"
+    assert [s["routing"]["tier"] for s in steps] == ["fast", "fast", "fast", "strong"]
+    assert all("latency_s" in s["routing"] for s in steps)
+
+
+@patch("src.orchestrator.run_offer_design", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_competitor_intel", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_customer_insights", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_market_research", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+def test_run_workflow_data_context_stable_across_queries(mock_market, mock_customer, mock_competitor, mock_offer, temp_data_dir):
+    """Data text handed to agents does not depend on the query, so it can be context-cached."""
+    run_workflow("short", data_dir=temp_data_dir)
+    first = mock_market.call_args[0][0], mock_customer.call_args[0][:2]
+    run_workflow("a much longer query " * 20, data_dir=temp_data_dir, scope={"daypart": "breakfast", "time_horizon": None})
+    assert (mock_market.call_args[0][0], mock_customer.call_args[0][:2]) == first
+
+
+@patch("src.orchestrator.run_offer_design", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_competitor_intel", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_customer_insights", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_market_research", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+def test_run_workflow_reuses_cached_evidence_stages(mock_market, mock_customer, mock_competitor, mock_offer, temp_data_dir, tmp_path):
+    """A paraphrased grid request reuses the evidence stages; only Offer Design runs again."""
+    from src.orchestrator import parse_scope
+    from src.stage_cache import StageCache
+    cache = StageCache(tmp_path / "stages")
+    q1 = "Increase traffic offers for Discount hunters, Breakfast, Next quarter"
+    steps = run_workflow(q1, data_dir=temp_data_dir, scope=parse_scope(q1), stage_cache=cache)
+    assert [s.get("stage_cache", {}).get("status") for s in steps[:3]] == ["stored"] * 3
+    q2 = "Develop 3 breakfast offers for deal seekers next quarter"
+    steps = run_workflow(q2, data_dir=temp_data_dir, scope=parse_scope(q2), stage_cache=cache)
+    assert [s["stage_cache"]["status"] for s in steps[:3]] == ["hit"] * 3
+    assert steps[0]["output"] == MOCK_AGENT_RESPONSE and steps[0]["user_query"] == q2
+    assert mock_market.call_count == 1 and mock_offer.call_count == 2
+    # Anything beyond grid facets is not cached
+    run_workflow(q2 + " using TikTok creators", data_dir=temp_data_dir, stage_cache=cache)
+    assert mock_market.call_count == 2
+
+
+BIG_COMPETITOR_OUTPUT = '{"competitive_landscape": [' + ",".join(
+    '{"brand": "Brand %d", "mechanic": "BOGO {%d}", "duration": "2 weeks", "channel": "app", "lift": "+%d%%"}' % (i, i, i)
+    for i in range(300)
+) + '], "whitespace_opportunities": []}'
+
+
+@patch("src.orchestrator.run_offer_design", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_competitor_intel", return_value={"output": BIG_COMPETITOR_OUTPUT, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_customer_insights", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_market_research", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+def test_run_workflow_trims_large_handoff_to_budget(mock_market, mock_customer, mock_competitor, mock_offer, temp_data_dir, monkeypatch):
+    """A hand-off larger than the budget is trimmed item by item: valid JSON, leading items kept, budget held."""
+    import json
+    from src.prompt_budget import estimate_tokens
+    monkeypatch.setenv("PROMPT_TOKEN_BUDGET", "1500")
+    steps = run_workflow("test query", data_dir=temp_data_dir)
+    landscape = json.loads(mock_offer.call_args[0][2])
+    assert 0 < len(landscape) < 300
+    assert landscape[0]["brand"] == "Brand 0"
+    report = steps[3]["prompt_budget"]
+    assert report["used"] <= 1500
+    assert report["sections"]["upstream:competitive_landscape"]["tokens"] == estimate_tokens(mock_offer.call_args[0][2])
+
+
+@patch("src.orchestrator.run_offer_design", return_value={"output": "| a | b |\n|---|---|\n| 1 | 2 |", "tables": {}, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_competitor_intel", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_customer_insights", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_market_research", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.parse_tables")
+def test_run_workflow_keeps_agent_tables_without_reparsing(mock_parse, mock_market, mock_customer, mock_competitor, mock_offer, temp_data_dir):
+    """Tables from the agent's stream parser are used as-is, even when empty."""
+    mock_parse.return_value = {}
+    steps = run_workflow("test query", data_dir=temp_data_dir)
+    assert steps[3]["tables"] == {}
+    assert mock_parse.call_count == 3  # only the mocked evidence agents, which return no tables
+
+
+@patch("src.orchestrator.run_offer_design", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_competitor_intel", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_customer_insights", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+@patch("src.orchestrator.run_market_research", return_value={"output": MOCK_AGENT_RESPONSE, "system_prompt": "", "user_content": ""})
+def test_run_workflow_reports_each_step(mock_market, mock_customer, mock_competitor, mock_offer, temp_data_dir):
+    """on_step receives every step as it completes, in order."""
+    seen = []
+    steps = run_workflow("test query", data_dir=temp_data_dir, on_step=lambda step: seen.append(step["agent"]))
+    assert seen == [s["agent"] for s in steps]
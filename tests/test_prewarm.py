@@ -0,0 +1,58 @@
+"""
+Tests for src/prewarm.py: grid expansion, background run, progress and call budget.
+"""
+
+from unittest.mock import patch
+
+from src.prewarm import PrewarmJob, grid_queries
+from src.rate_limit import BACKGROUND, current_priority
+from src.stage_cache import StageCache
+
+MOCK = {"output": "Mocked agent output.", "system_prompt": "", "user_content": ""}
+
+
+def test_grid_queries_cover_every_combination():
+    queries = grid_queries(["Increase traffic", "Increase profit"], ["Discount hunters"], ["Breakfast", "Lunch"], ["Q1"])
+    assert len(queries) == 4
+    assert queries[0] == "Increase traffic offers for Discount hunters, Breakfast, Q1"
+
+
+@patch("src.orchestrator.run_competitor_intel", return_value=MOCK)
+@patch("src.orchestrator.run_customer_insights", return_value=MOCK)
+@patch("src.orchestrator.run_market_research")
+def test_prewarm_fills_stage_cache_at_background_priority(mock_market, mock_customer, mock_competitor, temp_data_dir, tmp_path):
+    """Each grid request runs once in background priority; a second job only hits the cache."""
+    priorities = []
+    mock_market.side_effect = lambda *a, **k: priorities.append(current_priority()) or MOCK
+    cache = StageCache(tmp_path / "stages")
+    queries = grid_queries(["Increase traffic"], ["Discount hunters", "Loyal repeaters"], ["Breakfast"], ["Q1"])
+    job = PrewarmJob(queries, temp_data_dir, cache, "fp", max_calls=0).start()
+    job.join(30)
+    prog = job.progress()
+    assert prog["status"] == "done" and prog["done"] == 2
+    assert prog["llm_calls"] == 6 and prog["est_input_tokens"] > 0
+    assert priorities == [BACKGROUND, BACKGROUND]
+    again = PrewarmJob(queries, temp_data_dir, cache, "fp", max_calls=0)
+    again.run()
+    assert again.progress()["cache_hits"] == 6 and again.progress()["llm_calls"] == 0
+
+
+@patch("src.orchestrator.run_competitor_intel", return_value=MOCK)
+@patch("src.orchestrator.run_customer_insights", return_value=MOCK)
+@patch("src.orchestrator.run_market_research", return_value=MOCK)
+def test_prewarm_stops_at_call_budget(mock_market, mock_customer, mock_competitor, temp_data_dir, tmp_path):
+    queries = grid_queries(["Increase traffic"], ["Discount hunters", "Loyal repeaters", "App-first users"], ["Lunch"], ["Q1"])
+    job = PrewarmJob(queries, temp_data_dir, StageCache(tmp_path / "stages"), "fp", max_calls=4)
+    job.run()
+    prog = job.progress()
+    assert prog["status"] == "budget exhausted" and prog["llm_calls"] == 3
+
+
+def test_malformed_env_values_fall_back(monkeypatch, tmp_path):
+    """PREWARM_MAX_CALLS / SEMANTIC_CACHE_THRESHOLD with bad values use the defaults."""
+    from src.prewarm import DEFAULT_MAX_CALLS, max_calls_from_env
+    from src.semantic_cache import DEFAULT_THRESHOLD, SemanticCache
+    monkeypatch.setenv("PREWARM_MAX_CALLS", "lots")
+    monkeypatch.setenv("SEMANTIC_CACHE_THRESHOLD", "high")
+    assert max_calls_from_env() == DEFAULT_MAX_CALLS
+    assert SemanticCache(tmp_path / "idx.json").threshold == DEFAULT_THRESHOLD
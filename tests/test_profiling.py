@@ -0,0 +1,57 @@
+"""
+Tests for src/profiling.py: opt-in switch, CPU and memory reports, concurrent runs, errors.
+"""
+
+import json
+import tracemalloc
+
+import pytest
+
+from src import profiling
+from src.profiling import profile_call, profiling_enabled
+
+
+def _work(n):
+    blocks = [bytearray(1024) for _ in range(n)]
+    return sum(len(b) for b in blocks)
+
+
+def test_profiling_off_by_default(monkeypatch):
+    monkeypatch.delenv("WORKFLOW_PROFILE", raising=False)
+    assert not profiling_enabled()
+    monkeypatch.setenv("WORKFLOW_PROFILE", "1")
+    assert profiling_enabled()
+
+
+def test_profile_call_reports_functions_and_peak_memory():
+    result, report = profile_call(_work, 2000, top_n=10)
+    assert result == 2000 * 1024
+    assert report["wall_s"] > 0 and report["notes"] == []
+    functions = report["cpu"]["functions"]
+    assert len(functions) <= 10
+    assert any("_work" in f["function"] for f in functions)
+    assert functions == sorted(functions, key=lambda f: f["cumtime_s"], reverse=True)
+    assert "cumulative" in report["cpu"]["text"]
+    assert report["memory"]["peak_bytes"] >= 2000 * 1024
+    assert report["memory"]["top_allocations"]
+    assert not tracemalloc.is_tracing()
+    json.dumps(report)
+
+
+def test_concurrent_profiled_run_skips_memory():
+    with profiling._memory_lock:
+        _, report = profile_call(_work, 10)
+    assert report["memory"] is None
+    assert report["cpu"] is not None
+    assert "Memory profile skipped" in report["notes"][0]
+
+
+def test_profile_call_propagates_errors_and_cleans_up():
+    def boom():
+        raise RuntimeError("bad run")
+
+    with pytest.raises(RuntimeError, match="bad run"):
+        profile_call(boom)
+    assert not tracemalloc.is_tracing()
+    assert profiling._memory_lock.acquire(blocking=False)
+    profiling._memory_lock.release()
@@ -0,0 +1,85 @@
+"""
+Tests for src/prompt_budget.py: token estimate, truncation, priority packing.
+"""
+
+import os
+from unittest.mock import patch
+
+from src.prompt_budget import (
+    DEFAULT_PROMPT_BUDGET,
+    estimate_tokens,
+    format_budget_report,
+    get_prompt_budget,
+    pack_sections,
+    truncate_to_tokens,
+)
+
+
+def test_estimate_tokens_grows_with_text():
+    """Token estimate is zero for empty text and grows with length."""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens(None) == 0
+    short = estimate_tokens("BOGO offers for lunch")
+    assert short > 0
+    assert estimate_tokens("BOGO offers for lunch " * 10) > short * 5
+
+
+def test_truncate_to_tokens_cuts_on_lines():
+    """Truncation keeps whole lines and stays within the limit."""
+    text = "\n".join(f"row {i} value {i * 3}" for i in range(200))
+    out = truncate_to_tokens(text, 50)
+    assert out.endswith("... (truncated)")
+    assert estimate_tokens(out) <= 50
+    assert all(line.startswith("row") for line in out.split("\n")[:-1])
+    assert truncate_to_tokens("short", 50) == "short"
+
+
+def test_truncate_to_tokens_enforces_limit_on_single_punctuation_heavy_line():
+    """A single long line of compact JSON is cut until the estimate fits, not by a chars-per-token guess."""
+    line = ",".join('{"a":"b","c":[1,2]}' for _ in range(500))
+    for limit in (5, 40, 1000):
+        out = truncate_to_tokens(line, limit)
+        assert estimate_tokens(out) <= limit
+    assert estimate_tokens(truncate_to_tokens(line, 1000)) > 900
+
+
+def test_pack_sections_keeps_high_priority_first():
+    """Query and digest survive intact; samples are trimmed to the remaining budget."""
+    sections = {
+        "query": "3 offers for discount hunters",
+        "digest:market": "rows=1500\ntrend_theme: Gamification (300)",
+        "samples:market": "\n".join(f"sample row {i} with some text" for i in range(500)),
+    }
+    packed, report = pack_sections(sections, budget=300, reserve=50)
+    assert packed["query"] == sections["query"]
+    assert packed["digest:market"] == sections["digest:market"]
+    assert report["sections"]["samples:market"]["truncated"] is True
+    assert report["used"] <= 300
+    assert list(packed) == list(sections)
+
+
+def test_pack_sections_drops_section_when_budget_exhausted():
+    """Low-priority sections get nothing once higher ones use the budget."""
+    sections = {"query": "word " * 100, "samples:x": "data " * 100}
+    packed, report = pack_sections(sections, budget=110)
+    assert packed["samples:x"] == ""
+    assert "samples:x=0/" in format_budget_report(report)
+
+
+def test_pack_sections_splits_same_priority_evenly():
+    """Two large sections at the same priority each get a fair share (unused share rolls forward)."""
+    big = "\n".join(f"line {i} text text" for i in range(400))
+    packed, report = pack_sections({"samples:a": big, "samples:b": big}, budget=400)
+    a = report["sections"]["samples:a"]["tokens"]
+    b = report["sections"]["samples:b"]["tokens"]
+    assert min(a, b) >= 400 // 3
+    assert a + b <= 400
+
+
+def test_get_prompt_budget_per_model_and_override():
+    """Known models map to their budget; prefixes match; env overrides."""
+    assert get_prompt_budget("gemini-2.5-pro") == 12000
+    assert get_prompt_budget("gemini-2.5-flash-lite") == 8000
+    assert get_prompt_budget("unknown-model") == DEFAULT_PROMPT_BUDGET
+    with patch.dict(os.environ, {"PROMPT_TOKEN_BUDGET": "1234"}):
+        assert get_prompt_budget("gemini-2.5-pro") == 1234
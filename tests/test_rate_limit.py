@@ -0,0 +1,66 @@
+"""
+Tests for src/rate_limit.py: token bucket and interactive-first priority.
+"""
+
+import threading
+import time
+
+from src.rate_limit import BACKGROUND, INTERACTIVE, RateLimiter, current_priority, llm_priority
+
+
+def test_llm_priority_context():
+    """Calls default to interactive; llm_priority switches and restores."""
+    assert current_priority() == INTERACTIVE
+    with llm_priority(BACKGROUND):
+        assert current_priority() == BACKGROUND
+    assert current_priority() == INTERACTIVE
+
+
+def test_burst_then_timeout():
+    """A full bucket admits the burst; the next call times out at a low refill rate."""
+    limiter = RateLimiter(per_minute=1, burst=3)
+    assert all(limiter.acquire(timeout=0) for _ in range(3))
+    assert limiter.acquire(timeout=0.05) is False
+
+
+def test_background_keeps_reserve_for_interactive():
+    """Background calls stop at the reserve; interactive calls can still use it."""
+    limiter = RateLimiter(per_minute=1, burst=4)
+    assert limiter.acquire(BACKGROUND, timeout=0)
+    assert limiter.acquire(BACKGROUND, timeout=0)
+    assert limiter.acquire(BACKGROUND, timeout=0.05) is False
+    assert limiter.acquire(INTERACTIVE, timeout=0)
+    assert limiter.stats()[BACKGROUND] == 2 and limiter.stats()[INTERACTIVE] == 1
+
+
+def test_background_yields_to_waiting_interactive():
+    """While an interactive call waits, background calls are not admitted."""
+    limiter = RateLimiter(per_minute=600, burst=1)
+    assert limiter.acquire(INTERACTIVE, timeout=0)
+    order = []
+    t_int = threading.Thread(target=lambda: limiter.acquire(INTERACTIVE) and order.append(INTERACTIVE), daemon=True)
+    t_bg = threading.Thread(target=lambda: limiter.acquire(BACKGROUND) and order.append(BACKGROUND), daemon=True)
+    t_int.start()
+    time.sleep(0.01)
+    t_bg.start()
+    t_int.join(2)
+    t_bg.join(2)
+    assert order == [INTERACTIVE, BACKGROUND]
+
+
+def test_disabled_limit_never_blocks():
+    limiter = RateLimiter(per_minute=0)
+    assert all(limiter.acquire(timeout=0) for _ in range(50))
+
+
+def test_malformed_env_falls_back_to_defaults(monkeypatch):
+    """Bad LLM_RATE_LIMIT_* values do not crash; defaults apply."""
+    from src.rate_limit import DEFAULT_BURST, DEFAULT_PER_MINUTE, get_rate_limiter, set_rate_limiter
+    monkeypatch.setenv("LLM_RATE_LIMIT_PER_MIN", "sixty")
+    monkeypatch.setenv("LLM_RATE_LIMIT_BURST", "1.5x")
+    set_rate_limiter(None)
+    try:
+        limiter = get_rate_limiter()
+        assert limiter.per_minute == DEFAULT_PER_MINUTE and limiter.burst == DEFAULT_BURST
+    finally:
+        set_rate_limiter(None)
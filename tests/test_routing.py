@@ -0,0 +1,89 @@
+"""
+Tests for src/routing.py: tier routing, p95 tracking, SLO fallback.
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from src.routing import LatencyTracker, MIN_SAMPLES, record_latency, route
+
+
+@pytest.fixture
+def tier_env(monkeypatch):
+    monkeypatch.setenv("GEMINI_MODEL_FAST", "gemini-2.0-flash")
+    monkeypatch.setenv("GEMINI_MODEL_STRONG", "gemini-2.5-pro")
+
+
+def test_route_evidence_agents_fast_offer_design_strong(tier_env):
+    """Evidence agents get the fast model; Offer Design gets the strong one."""
+    tracker = LatencyTracker()
+    assert route("Customer Insights", tracker)["model"] == "gemini-2.0-flash"
+    decision = route("Offer Design", tracker)
+    assert decision["model"] == "gemini-2.5-pro"
+    assert decision["tier"] == "strong" and decision["fallback"] is False
+
+
+def test_route_falls_back_when_p95_exceeds_slo(tier_env):
+    """Offer Design switches to the fast model once its p95 exceeds the SLO."""
+    tracker = LatencyTracker()
+    for _ in range(MIN_SAMPLES):
+        tracker.record("gemini-2.5-pro", 120.0)
+    decision = route("Offer Design", tracker)
+    assert decision["fallback"] is True
+    assert decision["model"] == "gemini-2.0-flash"
+    assert "exceeds SLO" in decision["reason"]
+
+
+def test_route_needs_min_samples_before_fallback(tier_env):
+    """A single slow call does not trigger fallback."""
+    tracker = LatencyTracker()
+    tracker.record("gemini-2.5-pro", 120.0)
+    assert route("Offer Design", tracker)["fallback"] is False
+
+
+def test_tier_defaults_to_default_model(monkeypatch):
+    """Without tier env vars, every agent uses the default model."""
+    monkeypatch.delenv("GEMINI_MODEL_FAST", raising=False)
+    monkeypatch.delenv("GEMINI_MODEL_STRONG", raising=False)
+    with patch("src.routing.get_model_name", return_value="gemini-2.0-flash"):
+        assert route("Offer Design", LatencyTracker())["model"] == "gemini-2.0-flash"
+
+
+def test_latency_tracker_p95_and_record_latency():
+    """p95 is nearest-rank over the window; record_latency annotates the decision."""
+    tracker = LatencyTracker(window=20)
+    for v in range(1, 21):
+        tracker.record("m", float(v))
+    assert tracker.p95("m") == 19.0
+    assert tracker.p95("other") is None
+    decision = {"model": "m"}
+    record_latency(decision, 1.23456, tracker)
+    assert decision["latency_s"] == 1.235
+    assert tracker.count("m") == 20
+
+
+def test_route_recovers_via_probes(tier_env):
+    """After a fallback, probes measure the strong model again and routing returns to it once it is fast."""
+    tracker = LatencyTracker()
+    for _ in range(MIN_SAMPLES):
+        tracker.record("gemini-2.5-pro", 100.0)
+    decisions = []
+    for _ in range(200):
+        decision = route("Offer Design", tracker)
+        decisions.append(decision)
+        record_latency(decision, 2.0, tracker)
+    assert decisions[0]["fallback"] is True
+    assert any(d.get("probe") and d["model"] == "gemini-2.5-pro" for d in decisions)
+    assert decisions[-1]["model"] == "gemini-2.5-pro" and decisions[-1]["fallback"] is False
+
+
+def test_route_recovers_when_slow_samples_expire(tier_env):
+    """Slow samples older than the max age stop counting, ending the fallback."""
+    now = [0.0]
+    tracker = LatencyTracker(max_age_s=60.0, clock=lambda: now[0])
+    for _ in range(MIN_SAMPLES):
+        tracker.record("gemini-2.5-pro", 100.0)
+    assert route("Offer Design", tracker)["fallback"] is True
+    now[0] = 61.0
+    assert route("Offer Design", tracker)["model"] == "gemini-2.5-pro"
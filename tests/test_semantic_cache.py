@@ -0,0 +1,81 @@
+"""
+Tests for src/semantic_cache.py: canonicalization, similarity, index lookup, eviction, metrics.
+"""
+
+from src.semantic_cache import SemanticCache, canonicalize, cosine, vectorize
+
+
+def test_canonicalize_maps_synonyms_and_defaults():
+    """Number words, segment synonyms and the agents' default goal are normalized."""
+    assert canonicalize("develop three traffic offers for deal seekers") == ["3", "goal_traffic", "offers", "seg_discount_hunters"]
+    assert "seg_discount_hunters" in canonicalize("3 offers for discount hunters")
+    assert "scope_daypart=breakfast" in canonicalize("offers", {"daypart": "breakfast", "time_horizon": None})
+
+
+def test_similar_phrasings_score_high_and_different_segments_low():
+    """Paraphrases are near-identical; a different segment is not."""
+    base = vectorize("3 offers for discount hunters")
+    assert cosine(base, vectorize("develop three traffic offers for deal seekers")) > 0.9
+    assert cosine(base, vectorize("3 offers for loyal customers")) < 0.7
+
+
+def test_lookup_hit_requires_same_fingerprint(tmp_path):
+    """A paraphrase hits on the same data fingerprint and misses on another."""
+    cache = SemanticCache(tmp_path / "idx.json", threshold=0.82)
+    cache.add("3 offers for discount hunters", {}, "fp1", "s1")
+    hit = cache.lookup("Develop three offers for deal seekers", {}, "fp1")
+    assert hit["session_id"] == "s1" and hit["similarity"] >= 0.82
+    assert cache.lookup("Develop three offers for deal seekers", {}, "fp2") is None
+    assert cache.lookup("breakfast offers for loyal customers", {}, "fp1") is None
+    stats = cache.stats()
+    assert stats["lookups"] == 3 and stats["hits"] == 1
+    assert stats["hit_rate"] == round(1 / 3, 4)
+
+
+def test_eviction_keeps_most_recently_used(tmp_path):
+    """Past max_entries the least recently used entries are evicted."""
+    cache = SemanticCache(tmp_path / "idx.json", threshold=0.82, max_entries=2)
+    cache.add("offers for discount hunters", {}, "fp", "s1")
+    cache.add("offers for loyal customers", {}, "fp", "s2")
+    assert cache.lookup("offers for discount hunters", {}, "fp")["session_id"] == "s1"
+    cache.add("offers for app-first users", {}, "fp", "s3")
+    assert cache.lookup("offers for loyal customers", {}, "fp") is None
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_remove_drops_session(tmp_path):
+    """remove() drops entries for a session."""
+    cache = SemanticCache(tmp_path / "idx.json")
+    cache.add("offers for discount hunters", {}, "fp", "s1")
+    cache.remove("s1")
+    assert cache.stats()["entries"] == 0
+
+
+def test_different_mechanics_and_audiences_do_not_match(tmp_path):
+    """Requests that differ in a mechanic or audience word stay below the default threshold."""
+    cache = SemanticCache(tmp_path / "idx.json")
+    cache.add("BOGO offers for discount hunters", {}, "fp", "s1")
+    cache.add("3 offers for Gen Z discount hunters", {}, "fp", "s2")
+    assert cache.lookup("free fries offers for discount hunters", {}, "fp") is None
+    assert cache.lookup("3 offers for families discount hunters", {}, "fp") is None
+    assert cosine(vectorize("BOGO offers for discount hunters"), vectorize("free fries offers for discount hunters")) < 0.5
+
+
+def test_lookup_requires_identical_parsed_scope(tmp_path):
+    """Same wording with a different parsed time horizon or daypart is a miss."""
+    cache = SemanticCache(tmp_path / "idx.json")
+    cache.add("3 breakfast offers for discount hunters next quarter", {"daypart": "breakfast", "time_horizon": "quarter"}, "fp", "s1")
+    assert cache.lookup("3 breakfast offers for discount hunters next month", {"daypart": "breakfast", "time_horizon": None}, "fp") is None
+    assert cache.lookup("3 breakfast offers for deal seekers next quarter", {"daypart": "breakfast", "time_horizon": "quarter"}, "fp")["session_id"] == "s1"
+
+
+def test_index_from_older_canonicalization_is_rebuilt(tmp_path):
+    """Entries stored under an older CANON_VERSION are re-vectorized from their query on load."""
+    import json
+    path = tmp_path / "idx.json"
+    path.write_text(json.dumps({"entries": [{
+        "session_id": "s1", "query": "3 offers for discount hunters", "scope": {}, "fingerprint": "fp",
+        "vector": {"1": 1.0}, "created": 9e12, "last_used": 9e12,
+    }]}))
+    assert SemanticCache(path).lookup("develop three offers for deal seekers", {}, "fp")["session_id"] == "s1"
@@ -0,0 +1,105 @@
+"""Tests for src.session_store: save/load, pagination, search and filters, JSON migration."""
+
+import json
+
+from src.session_store import SessionStore, session_facets
+
+
+def _steps(n=4):
+    return [{"agent": f"Agent {i}", "output": f"out {i}", "system_prompt": "S" * 100} for i in range(n)]
+
+
+def test_save_load_round_trip(tmp_path):
+    store = SessionStore(tmp_path / "s.db")
+    store.save("a1", "Breakfast offers for deal seekers", _steps())
+    loaded = store.load("a1")
+    assert loaded["session_id"] == "a1"
+    assert loaded["query"] == "Breakfast offers for deal seekers"
+    assert [s["agent"] for s in loaded["steps"]] == [f"Agent {i}" for i in range(4)]
+    meta = store.get("a1")
+    assert meta["segment"] == "discount_hunters" and meta["daypart"] == "breakfast" and meta["n_steps"] == 4
+    assert store.load("missing") is None
+
+
+def test_save_replaces_steps(tmp_path):
+    store = SessionStore(tmp_path / "s.db")
+    store.save("a1", "q", _steps(4))
+    store.save("a1", "q", _steps(2))
+    assert len(store.steps("a1")) == 2
+    assert store.count() == 1
+
+
+def test_lazy_steps_by_agent(tmp_path):
+    store = SessionStore(tmp_path / "s.db")
+    store.save("a1", "q", _steps())
+    only = store.steps("a1", agents=["Agent 3"])
+    assert [s["output"] for s in only] == ["out 3"]
+
+
+def test_pagination_newest_first(tmp_path):
+    store = SessionStore(tmp_path / "s.db")
+    for i in range(25):
+        store.save(f"s{i:02d}", f"query {i}", [], created=1000.0 + i)
+    first = store.list_page(0, 10)
+    assert [r["id"] for r in first][:3] == ["s24", "s23", "s22"]
+    last = store.list_page(20, 10)
+    assert [r["id"] for r in last] == ["s04", "s03", "s02", "s01", "s00"]
+    assert store.count() == 25
+
+
+def test_search_and_filters(tmp_path):
+    store = SessionStore(tmp_path / "s.db")
+    store.save("b", "BOGO breakfast offers for discount hunters", [])
+    store.save("l", "Lunch bundles for loyal customers", [])
+    store.save("n", "Late-night app deals for app users", [])
+    assert [r["id"] for r in store.list_page(search="bogo")] == ["b"]
+    assert [r["id"] for r in store.list_page(search="bund")] == ["l"]  # prefix match
+    assert [r["id"] for r in store.list_page(segment="loyal")] == ["l"]
+    assert [r["id"] for r in store.list_page(daypart="late-night")] == ["n"]
+    assert store.list_page(search="bogo", daypart="lunch") == []
+    assert store.count(segment="discount_hunters") == 1
+    assert "app_first" in store.segments()
+
+
+def test_migrate_json_dir_once(tmp_path):
+    (tmp_path / "old1.json").write_text(json.dumps({"session_id": "old1", "query": "Lunch offers", "steps": _steps(2)}))
+    (tmp_path / "broken.json").write_text("{not json")
+    store = SessionStore(tmp_path / "s.db")
+    assert store.migrate_json_dir(tmp_path) == 1
+    assert store.load("old1")["steps"][1]["output"] == "out 1"
+    assert store.get("old1")["daypart"] == "lunch"
+    (tmp_path / "old2.json").write_text(json.dumps({"session_id": "old2", "query": "q", "steps": []}))
+    assert store.migrate_json_dir(tmp_path) == 0
+    assert store.get("old2") is None
+
+
+def test_session_facets_defaults():
+    assert session_facets("3 offers, Q1") == {"segment": "value_conscious", "daypart": None, "time_horizon": "Q1"}
+
+
+def test_profile_saved_with_session_and_shared(tmp_path):
+    from src.storage import LocalStorage
+
+    shared = LocalStorage(tmp_path / "shared")
+    store = SessionStore(tmp_path / "a.db", storage=shared)
+    store.save("a1", "q", _steps())
+    assert store.profile("a1") is None
+    store.save_profile("a1", {"wall_s": 1.5, "cpu": None})
+    assert store.profile("a1") == {"wall_s": 1.5, "cpu": None}
+    other = SessionStore(tmp_path / "b.db", storage=shared)
+    assert other.profile("a1")["wall_s"] == 1.5
+    store.delete("a1")
+    assert store.profile("a1") is None
+    assert not shared.exists("profiles/a1.json")
+
+
+def test_sync_skips_the_stores_own_directory(tmp_path):
+    from src.storage import LocalStorage
+
+    storage = LocalStorage(tmp_path)
+    SessionStore(tmp_path / "sessions.db", storage=storage).save("a1", "q", _steps())
+    (tmp_path / "sessions.db").unlink()
+    store = SessionStore(tmp_path / "sessions.db", storage=storage, sync_interval_s=0)
+    assert store.sync() == 0 and store.count() == 0
+    # A forced sync still re-indexes manifests when the index was lost.
+    assert store.sync(force=True) == 1 and store.count() == 1
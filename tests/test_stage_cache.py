@@ -0,0 +1,35 @@
+"""
+Tests for src/stage_cache.py: facet request keys and the on-disk stage cache.
+"""
+
+from src.stage_cache import StageCache, request_key
+
+
+def test_request_key_ignores_wording_but_not_facets():
+    """Paraphrases of one grid cell share a key; other segments or extra content do not."""
+    key = request_key("Increase traffic offers for Discount hunters, Breakfast, Q1", {"daypart": "breakfast", "time_horizon": "Q1"})
+    assert key == request_key("3 breakfast offers for deal seekers in Q1", {"daypart": "breakfast", "time_horizon": "Q1"})
+    assert key != request_key("Increase traffic offers for Loyal repeaters, Breakfast, Q1", {"daypart": "breakfast", "time_horizon": "Q1"})
+    assert request_key("Breakfast offers for deal seekers built around TikTok", {}) is None
+
+
+def test_stage_cache_roundtrip_and_stats(tmp_path):
+    """put/get round-trips; hits and misses are counted; keys depend on model and data fingerprint."""
+    cache = StageCache(tmp_path / "stages")
+    key = StageCache.key("Customer Insights", "m1", "fp", False, "goal_traffic")
+    assert key != StageCache.key("Customer Insights", "m2", "fp", False, "goal_traffic")
+    assert key != StageCache.key("Customer Insights", "m1", "fp2", False, "goal_traffic")
+    assert cache.get(key) is None
+    cache.put(key, {"output": "x", "tables": {}})
+    assert cache.get(key) == {"output": "x", "tables": {}}
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_stage_cache_evicts_oldest(tmp_path, monkeypatch):
+    """Beyond max_entries the oldest entries are removed."""
+    import src.stage_cache as stage_cache
+    monkeypatch.setattr(stage_cache, "_EVICT_EVERY", 1)
+    cache = StageCache(tmp_path / "stages", max_entries=2)
+    for i in range(4):
+        cache.put(f"k{i}", {"output": str(i)})
+    assert cache.stats()["entries"] == 2
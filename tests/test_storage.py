@@ -0,0 +1,187 @@
+"""Tests for src.storage: local atomic writes and locking, HTTP shared store, read-through cache, multi-instance sessions."""
+
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.blob_store import BlobStore
+from src.session_store import SessionStore
+from src.stage_cache import StageCache
+from src.storage import CachedStorage, HttpStorage, LocalStorage, Storage, serve_storage
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def shared_store(tmp_path):
+    """HTTP stand-in for the shared store, backed by tmp_path/shared."""
+    backing = LocalStorage(tmp_path / "shared")
+    server = serve_storage(backing)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", backing
+    server.shutdown()
+    server.server_close()
+
+
+class CountingStorage(Storage):
+    def __init__(self, inner: Storage, delay: float = 0.0):
+        self.inner = inner
+        self.delay = delay
+        self.gets = 0
+
+    def get(self, key):
+        self.gets += 1
+        time.sleep(self.delay)
+        return self.inner.get(key)
+
+    def put(self, key, data):
+        self.inner.put(key, data)
+
+    def delete(self, key):
+        self.inner.delete(key)
+
+    def stat(self, key):
+        return self.inner.stat(key)
+
+    def list(self, prefix=""):
+        return self.inner.list(prefix)
+
+
+def test_local_storage_round_trip(tmp_path):
+    store = LocalStorage(tmp_path)
+    assert store.get("a/b.json") is None
+    store.put("a/b.json", b"one")
+    store.put("a/b.json", b"two")
+    store.put("c.txt", b"x")
+    assert store.get("a/b.json") == b"two"
+    assert store.list() == ["a/b.json", "c.txt"]
+    assert store.list("a/") == ["a/b.json"]
+    assert store.stat("c.txt")[0] == 1
+    store.delete("c.txt")
+    store.delete("c.txt")
+    assert not store.exists("c.txt")
+    assert not [p for p in tmp_path.rglob("*.tmp")]
+
+
+def test_local_list_walks_only_the_prefix_directory(tmp_path):
+    store = LocalStorage(tmp_path)
+    store.put("manifests/s1.json", b"{}")
+    store.put("manifests/t1.json", b"{}")
+    store.put("blobs/ab/cd.bin", b"x")
+    with patch.object(Path, "rglob", autospec=True, side_effect=Path.rglob) as rglob:
+        assert store.list("manifests/") == ["manifests/s1.json", "manifests/t1.json"]
+        assert store.list("manifests/s") == ["manifests/s1.json"]
+        assert store.list("missing/") == []
+    assert [call.args[0] for call in rglob.call_args_list] == [tmp_path / "manifests"] * 2
+
+
+@pytest.mark.parametrize("key", ["", "../x", "/abs", "a//b", "a/../b", "sp ace"])
+def test_invalid_keys_rejected(tmp_path, key):
+    with pytest.raises(ValueError):
+        LocalStorage(tmp_path).put(key, b"x")
+
+
+def test_local_lock_serializes_threads(tmp_path):
+    store = LocalStorage(tmp_path)
+    store.put("counter", b"0")
+
+    def bump():
+        for _ in range(25):
+            with store.lock("counter"):
+                n = int(store.get("counter"))
+                store.put("counter", str(n + 1).encode())
+
+    threads = [threading.Thread(target=bump) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.get("counter") == b"150"
+
+
+def test_local_lock_excludes_other_processes(tmp_path):
+    code = (
+        "import sys, time; sys.path.insert(0, sys.argv[1]);"
+        "from src.storage import LocalStorage;"
+        "s = LocalStorage(sys.argv[2]);"
+        "cm = s.lock('k'); cm.__enter__(); print('locked', flush=True); time.sleep(1.0); cm.__exit__(None, None, None)"
+    )
+    proc = subprocess.Popen([sys.executable, "-c", code, str(PROJECT_ROOT), str(tmp_path)], stdout=subprocess.PIPE, text=True)
+    assert proc.stdout.readline().strip() == "locked"
+    start = time.monotonic()
+    with LocalStorage(tmp_path).lock("k"):
+        waited = time.monotonic() - start
+    proc.wait(timeout=10)
+    assert waited > 0.5
+
+
+def test_http_storage_protocol(shared_store):
+    url, backing = shared_store
+    store = HttpStorage(url, prefix="sessions/")
+    assert store.get("x.json") is None
+    assert store.stat("x.json") is None
+    store.put("x.json", b'{"a":1}')
+    assert backing.get("sessions/x.json") == b'{"a":1}'
+    assert store.get("x.json") == b'{"a":1}'
+    assert store.stat("x.json")[0] == 7
+    assert store.list() == ["x.json"]
+    store.delete("x.json")
+    assert store.list() == []
+
+
+def test_cached_storage_single_fetch_for_concurrent_misses(tmp_path):
+    backend = CountingStorage(LocalStorage(tmp_path / "backend"), delay=0.2)
+    backend.put("blobs/ab/abc", b"payload")
+    cached = CachedStorage(backend, LocalStorage(tmp_path / "cache"))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cached.get("blobs/ab/abc"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [b"payload"] * 8
+    assert backend.gets == 1
+    assert cached.get("blobs/ab/abc") == b"payload" and backend.gets == 1
+
+
+def test_cached_storage_mutable_keys_expire(tmp_path):
+    backend = CountingStorage(LocalStorage(tmp_path / "backend"))
+    backend.put("manifests/a.json", b"v1")
+    cached = CachedStorage(backend, LocalStorage(tmp_path / "cache"), ttl_s=0.0)
+    assert cached.get("manifests/a.json") == b"v1"
+    backend.put("manifests/a.json", b"v2")
+    assert cached.get("manifests/a.json") == b"v2"
+    assert backend.gets == 2
+
+
+def test_sessions_shared_between_instances(tmp_path, shared_store):
+    url, _ = shared_store
+
+    def instance(name):
+        storage = CachedStorage(HttpStorage(url, prefix="sessions/"), LocalStorage(tmp_path / name / ".cache"))
+        return SessionStore(tmp_path / name / "sessions.db", BlobStore(storage), storage)
+
+    a, b = instance("a"), instance("b")
+    steps = [{"agent": "Offer Design", "output": "top 3", "system_prompt": "S" * 5000}]
+    a.save("s1", "Breakfast offers for loyal customers", steps)
+    assert b.count() == 0
+    assert b.sync(force=True) == 1
+    assert [r["id"] for r in b.list_page(segment="loyal")] == ["s1"]
+    assert b.load("s1")["steps"][0]["system_prompt"] == "S" * 5000
+    a.save("s2", "Lunch offers", [])
+    assert b.get("s2")["daypart"] == "lunch"  # unknown IDs are fetched on demand
+
+
+def test_stage_cache_on_shared_storage(tmp_path, shared_store):
+    url, _ = shared_store
+    one = StageCache(HttpStorage(url, prefix="stages/"))
+    two = StageCache(HttpStorage(url, prefix="stages/"))
+    one.put("k1", {"output": "x"})
+    assert two.get("k1") == {"output": "x"}
+    assert two.contains("k1") and two.stats()["entries"] == 1
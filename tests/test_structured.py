@@ -0,0 +1,72 @@
+"""
+Tests for src/structured.py: incremental JSON / markdown table parsing.
+"""
+
+from src.structured import TableStreamParser, parse_tables, primary_table
+
+MIXED_OUTPUT = """Intro [see note]
+```json
+{"trend_briefs": [{"title": "A \\"quoted\\" }", "evidence": ["x", {"y": 1}]}, {"title": "B"}]}
+```
+
+| Offer name | Channel |
+|---|---|
+| Streak Week | app |
+| Fry Club | all |
+"""
+
+
+def test_parse_tables_json_and_markdown():
+    """Rows of top-level JSON arrays are grouped by key; markdown rows by table."""
+    tables = parse_tables(MIXED_OUTPUT)
+    assert tables["trend_briefs"] == [{"title": 'A "quoted" }', "evidence": ["x", {"y": 1}]}, {"title": "B"}]
+    assert tables["markdown"] == [{"Offer name": "Streak Week", "Channel": "app"}, {"Offer name": "Fry Club", "Channel": "all"}]
+
+
+def test_parse_tables_bare_array():
+    """A bare JSON array of objects becomes the "json" table."""
+    assert parse_tables('[{"a": 1}, {"a": 2}]') == {"json": [{"a": 1}, {"a": 2}]}
+
+
+def test_stream_parser_emits_rows_as_chunks_arrive():
+    """Feeding small chunks gives the same tables, and rows are reported once complete."""
+    seen = []
+    parser = TableStreamParser(on_row=lambda table, row: seen.append((table, row)))
+    parser.feed(MIXED_OUTPUT[:100])
+    assert seen and seen[0][0] == "trend_briefs"
+    for i in range(100, len(MIXED_OUTPUT), 7):
+        parser.feed(MIXED_OUTPUT[i:i + 7])
+    assert parser.finish() == parse_tables(MIXED_OUTPUT)
+    assert len(seen) == 4
+
+
+def test_parse_tables_ignores_truncated_json():
+    """An unterminated row is not emitted; earlier complete rows are kept."""
+    tables = parse_tables('{"offer_concepts": [{"name": "A"}, {"name": "B", "channel": "ap')
+    assert tables == {"offer_concepts": [{"name": "A"}]}
+
+
+def test_primary_table_prefers_json():
+    """primary_table picks the first JSON table over markdown."""
+    assert primary_table(parse_tables(MIXED_OUTPUT))[0]["title"] == 'A "quoted" }'
+    assert primary_table({"markdown": [{"a": "1"}]}) == [{"a": "1"}]
+    assert primary_table({}) is None
+
+
+def test_parse_tables_markdown_without_outer_pipes():
+    """GFM tables without leading/trailing pipes are recognized once the delimiter row follows the header."""
+    text = "Summary below.\n\nOffer name | Channel\n--- | ---\nStreak Week | app\nFry Club | all-channels\n\nDone | here"
+    assert parse_tables(text) == {"markdown": [
+        {"Offer name": "Streak Week", "Channel": "app"},
+        {"Offer name": "Fry Club", "Channel": "all-channels"},
+    ]}
+
+
+def test_failing_on_row_callback_is_logged_not_raised(caplog):
+    """A broken callback does not abort parsing; the error is logged."""
+    def boom(table, row):
+        raise RuntimeError("display failed")
+    parser = TableStreamParser(boom)
+    parser.feed('{"offer_concepts": [{"name": "A"}]}')
+    assert parser.finish()["offer_concepts"] == [{"name": "A"}]
+    assert "on_row callback failed" in caplog.text
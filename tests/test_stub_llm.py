@@ -0,0 +1,107 @@
+"""
+Tests for src/stub_llm.py (stub gateway, driven through call_llm) and the scripts/load_test.py harness.
+"""
+
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from src.agents.competitor_intel import SYSTEM_PROMPT as COMPETITOR_INTEL_PROMPT
+from src.agents.market_research import SYSTEM_PROMPT as MARKET_RESEARCH_PROMPT
+from src.handoff import extract_artifacts
+from src.llm import call_llm
+from src.rate_limit import RateLimiter, set_rate_limiter
+from src.structured import MARKET_RESEARCH_SCHEMA, parse_tables
+from src.stub_llm import CANNED_ROWS, StubConfig, canned_output, serve_stub_llm
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Start a stub gateway with the given config and point call_llm at it."""
+    servers = []
+
+    def _start(**config):
+        server = serve_stub_llm(StubConfig(**config))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setenv("GEMINI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+        monkeypatch.setenv("GEMINI_API_KEY", "stub")
+        return server
+
+    set_rate_limiter(RateLimiter(per_minute=0))
+    yield _start
+    set_rate_limiter(None)
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_canned_output_has_the_agents_tables():
+    competitor = extract_artifacts(canned_output(COMPETITOR_INTEL_PROMPT), "competitive_landscape")
+    assert len(competitor["competitive_landscape"]) == CANNED_ROWS
+    assert len(competitor["whitespace_opportunities"]) == CANNED_ROWS
+    structured = json.loads(canned_output(MARKET_RESEARCH_PROMPT, structured=True))
+    assert list(structured) == ["trend_briefs"]
+
+
+def test_call_llm_against_stub_plain_streamed_and_structured(stub):
+    server = stub(latency_s=0.01, latency_sigma=0, tokens_per_s=0)
+    assert parse_tables(call_llm(MARKET_RESEARCH_PROMPT, "data"))["markdown"]
+    chunks = []
+    text = call_llm(MARKET_RESEARCH_PROMPT, "data", response_schema=MARKET_RESEARCH_SCHEMA, on_token=chunks.append)
+    assert len(chunks) > 1 and "".join(chunks).strip() == text
+    assert len(json.loads(text)["trend_briefs"]) == CANNED_ROWS
+    assert server.stats.snapshot() == {"requests": 2, "streamed": 1, "completed": 2, "errors": 0, "rate_limited": 0}
+
+
+def test_stub_latency_and_streaming_speed(stub):
+    stub(latency_s=0.2, latency_sigma=0, tokens_per_s=0)
+    t0 = time.monotonic()
+    call_llm(MARKET_RESEARCH_PROMPT, "data")
+    assert time.monotonic() - t0 >= 0.2
+
+
+def test_stub_rate_limits_and_errors_surface_after_client_retries(stub):
+    from openai import InternalServerError, RateLimitError
+
+    server = stub(latency_s=0, rate_limit_rate=1.0, retry_after_s=0)
+    with pytest.raises(RateLimitError):
+        call_llm(MARKET_RESEARCH_PROMPT, "data")
+    assert server.stats.snapshot()["rate_limited"] >= 2  # the openai client retried
+    stub(latency_s=0, error_rate=1.0)
+    with pytest.raises(InternalServerError):
+        call_llm(MARKET_RESEARCH_PROMPT, "data")
+
+
+def _load_test():
+    scripts_dir = str(PROJECT_ROOT / "scripts")
+    if scripts_dir not in sys.path:
+        sys.path.insert(0, scripts_dir)
+    import load_test
+    return load_test
+
+
+def test_load_test_percentiles_and_summary():
+    lt = _load_test()
+    assert lt.percentile([], 50) is None
+    values = [float(i) for i in range(1, 101)]
+    assert (lt.percentile(values, 50), lt.percentile(values, 95), lt.percentile(values, 99)) == (50.0, 95.0, 99.0)
+    summary = lt.summarize([(1.0, None), (3.0, None), (0.5, "TimeoutError: slow")], elapsed_s=30)
+    assert summary["ok"] == 2 and summary["failed"] == 1
+    assert summary["throughput_per_min"] == 4.0
+    assert summary["errors"] == {"TimeoutError: slow": 1}
+    assert "p95" in lt.format_report(summary)
+
+
+def test_load_test_workflow_users_against_stub(stub, temp_data_dir):
+    lt = _load_test()
+    server = stub(latency_s=0.01, latency_sigma=0, tokens_per_s=0)
+    results, elapsed = lt.run_users(3, lt.workflow_runner(temp_data_dir, structured=False, stream=True), runs_per_user=1)
+    assert [err for _, err in results] == [None, None, None]
+    assert server.stats.snapshot()["completed"] == 12